@@ -11,6 +11,7 @@ from app.services.image_service import image_service
 from app.services.cache_service import cache_headers
 from app.models.guess import GuessResponse, GuessHistory
 from app.models.puzzle import PuzzleResponse
+from app.api.responses import FastJSONResponse, PreSerializedJSONResponse, model_response
 from app.auth.middleware import get_current_user
 from app.database.exceptions import ItemNotFoundError
 from app.middleware.rate_limiting import guess_rate_limit
@@ -48,10 +49,9 @@ class PuzzleStatusResponse(BaseModel):
 @router.post("/guess", response_model=GuessResponse)
 async def submit_guess(
     guess_request: GuessRequest,
-    response: Response,
     current_user: dict = Depends(get_current_user),
     _rate_limit: bool = Depends(guess_rate_limit)
-) -> GuessResponse:
+) -> Response:
     """
     Submit a character name guess for today's puzzle
     
@@ -111,10 +111,8 @@ async def submit_guess(
         
         # Set cache headers for personalized response
         headers = cache_headers.get_no_cache_headers()
-        for key, value in headers.items():
-            response.headers[key] = value
         
-        return result
+        return model_response(result, headers=headers)
         
     except ValidationError:
         raise  # Re-raise validation errors as-is
@@ -128,10 +126,9 @@ async def submit_guess(
 
 @router.get("/puzzle/today", response_model=PuzzleResponse)
 async def get_today_puzzle(
-    response: Response,
     universe: str = Query(..., description="Comic universe (marvel, DC, image)"),
     current_user: dict = Depends(get_current_user)
-) -> PuzzleResponse:
+) -> Response:
     """
     Get today's puzzle for a specific universe
     
@@ -156,10 +153,9 @@ async def get_today_puzzle(
         
         # Set cache headers for puzzle metadata (public cache)
         headers = cache_headers.get_puzzle_cache_headers(is_personalized=False)
-        for key, value in headers.items():
-            response.headers[key] = value
         
-        return puzzle_response
+        # The body is serialized once per cached PuzzleResponse
+        return PreSerializedJSONResponse(puzzle_response.json_bytes, headers=headers)
         
     except ValidationError:
         raise  # Re-raise validation errors as-is
@@ -170,10 +166,9 @@ async def get_today_puzzle(
 @router.get("/puzzle/{puzzle_id}/status", response_model=PuzzleStatusResponse)
 async def get_puzzle_status(
     puzzle_id: str,
-    response: Response,
     user_id: str = Query(..., description="User ID to check status for"),
     current_user: dict = Depends(get_current_user)
-) -> PuzzleStatusResponse:
+) -> Response:
     """
     Get puzzle status for a specific user
     
@@ -210,10 +205,8 @@ async def get_puzzle_status(
         
         # Set cache headers for personalized response
         headers = cache_headers.get_puzzle_cache_headers(is_personalized=True)
-        for key, value in headers.items():
-            response.headers[key] = value
         
-        return PuzzleStatusResponse(
+        return model_response(PuzzleStatusResponse(
             puzzle_id=puzzle_id,
             universe=universe,
             active_date=puzzle.active_date,
@@ -222,7 +215,7 @@ async def get_puzzle_status(
             attempts_used=guess_status["attempts_used"],
             attempts_remaining=guess_status["attempts_remaining"],
             max_attempts=guess_status["max_attempts"]
-        )
+        ), headers=headers)
         
     except HTTPException:
         raise
@@ -235,7 +228,7 @@ async def get_guess_history(
     puzzle_id: str,
     user_id: str = Query(..., description="User ID to get history for"),
     current_user: dict = Depends(get_current_user)
-) -> GuessHistory:
+) -> Response:
     """
     Get user's guess history for a specific puzzle
     
@@ -263,7 +256,7 @@ async def get_guess_history(
         # Get guess history
         history = await guess_service.get_user_guess_history(user_id, puzzle_id)
         
-        return history
+        return model_response(history)
         
     except HTTPException:
         raise
@@ -276,7 +269,7 @@ async def get_daily_progress(
     user_id: str = Query(..., description="User ID to get progress for"),
     date: Optional[str] = Query(None, description="Date in YYYY-MM-DD format (defaults to today)"),
     current_user: dict = Depends(get_current_user)
-) -> dict:
+) -> Response:
     """
     Get user's daily progress across all universes
     
@@ -288,11 +281,12 @@ async def get_daily_progress(
     try:
         progress = await guess_service.get_daily_progress(user_id, date)
         
-        return {
+        # Built from validated models; render directly instead of re-encoding
+        return FastJSONResponse({
             "date": date or puzzle_service.get_today_date(),
             "user_id": user_id,
             "universes": progress
-        }
+        })
         
     except Exception as e:
         logger.error(f"Error getting daily progress: {e}")
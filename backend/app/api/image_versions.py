@@ -110,7 +110,9 @@ async def invalidate_image_version(
     - **character_name**: Specific character name (optional, defaults to all in universe)
     - **force_refresh**: Force refresh of version information
     
-    Returns invalidation result
+    Returns invalidation result. Other workers serve the new version within
+    IMAGE_MANIFEST_SYNC_INTERVAL seconds when Redis is configured, otherwise
+    after their next manifest refresh (IMAGE_MANIFEST_REFRESH_INTERVAL).
     """
     try:
         # Validate universe
@@ -2,9 +2,13 @@
 Image serving API endpoints with CDN integration and fallback handling.
 """
 
-from fastapi import APIRouter, HTTPException, Query, Response
-from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import Optional, Tuple
+from datetime import datetime
+from email.utils import format_datetime, parsedate_to_datetime
 import logging
+from azure.core.exceptions import ResourceModifiedError, ResourceNotFoundError
 from app.services.image_service import image_service
 from app.services.cache_service import cache_headers
 
@@ -16,6 +20,7 @@ router = APIRouter(prefix="/images", tags=["images"])
 async def get_character_image(
     universe: str,
     character_name: str,
+    request: Request,
     width: Optional[int] = Query(None, ge=50, le=2000, description="Image width in pixels"),
     height: Optional[int] = Query(None, ge=50, le=2000, description="Image height in pixels"),
     quality: Optional[int] = Query(None, ge=1, le=100, description="Image quality (1-100)"),
@@ -32,13 +37,14 @@ async def get_character_image(
         height: Optional image height
         quality: Optional image quality
         use_cdn: Whether to use CDN URLs
+        request: Incoming request (Accept header selects the variant format)
         response: FastAPI response object for headers
         
     Returns:
         Image information with URL and metadata
     """
     # Validate universe
-    valid_universes = ["marvel", "DC", "image"]
+    valid_universes = ["marvel", "dc", "image"]
     if universe.lower() not in valid_universes:
         raise HTTPException(
             status_code=400,
@@ -49,7 +55,8 @@ async def get_character_image(
         # Get optimized image URL if parameters provided
         if width or height or quality:
             image_info = await image_service.get_optimized_image_url(
-                universe.lower(), character_name, width, height, quality
+                universe.lower(), character_name, width, height, quality,
+                accept=request.headers.get("accept")
             )
         else:
             image_info = await image_service.get_character_image_url(
@@ -65,6 +72,10 @@ async def get_character_image(
         else:
             headers = cache_headers.get_image_cache_headers()
         
+        if image_info.get("variant"):
+            # The variant format depends on the Accept header
+            headers["Vary"] = "Accept, Accept-Encoding"
+        
         for header, value in headers.items():
             response.headers[header] = value
         
@@ -96,7 +107,7 @@ async def preload_universe_images(
         List of all character images in the universe
     """
     # Validate universe
-    valid_universes = ["marvel", "DC", "image"]
+    valid_universes = ["marvel", "dc", "image"]
     if universe.lower() not in valid_universes:
         raise HTTPException(
             status_code=400,
@@ -122,6 +133,51 @@ async def preload_universe_images(
             detail="Failed to preload universe images"
         )
 
+@router.get("/srcset/{universe}/{character_name}")
+async def get_character_image_srcset(
+    universe: str,
+    character_name: str,
+    use_cdn: bool = Query(True, description="Use CDN for image delivery"),
+    response: Response = None
+):
+    """
+    Get the responsive variants of a character image as srcset strings.
+    
+    Args:
+        universe: Comic universe (marvel, DC, image)
+        character_name: Name of the character
+        use_cdn: Whether to use CDN URLs
+        response: FastAPI response object for headers
+        
+    Returns:
+        One srcset per variant format, most efficient format first
+    """
+    # Validate universe
+    valid_universes = ["marvel", "dc", "image"]
+    if universe.lower() not in valid_universes:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid universe. Must be one of: {', '.join(valid_universes)}"
+        )
+    
+    try:
+        srcset = image_service.get_image_srcset(universe.lower(), character_name, use_cdn)
+        
+        # Variant URLs are versioned, but the set changes when an image is re-uploaded
+        response.headers["Cache-Control"] = "public, max-age=3600"  # 1 hour
+        
+        return {
+            "success": True,
+            "data": srcset
+        }
+        
+    except Exception as e:
+        logger.error(f"Error listing image variants for {character_name} in {universe}: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to list character image variants"
+        )
+
 @router.get("/validate/{universe}/{character_name}")
 async def validate_character_image(
     universe: str,
@@ -138,7 +194,7 @@ async def validate_character_image(
         Validation result
     """
     # Validate universe
-    valid_universes = ["marvel", "DC", "image"]
+    valid_universes = ["marvel", "dc", "image"]
     if universe.lower() not in valid_universes:
         raise HTTPException(
             status_code=400,
@@ -162,4 +218,181 @@ async def validate_character_image(
         raise HTTPException(
             status_code=500,
             detail="Failed to validate character image"
-        )
\ No newline at end of file
+        )
+
+# Request headers that select the variant served by the origin endpoint
+CLIENT_HINTS = ("Sec-CH-Width", "Sec-CH-DPR", "Sec-CH-Viewport-Width", "Save-Data")
+
+def _hint(request: Request, *names: str) -> Optional[float]:
+    """First client hint among ``names`` (current and legacy spellings) as a number."""
+    for name in names:
+        value = request.headers.get(name)
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                return None
+    return None
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against the current ETag."""
+    if header.strip() == "*":
+        return True
+    tags = (tag.strip() for tag in header.split(","))
+    return any(tag.removeprefix("W/").strip('"') == etag for tag in tags)
+
+def _not_modified_since(header: str, last_modified: Optional[datetime]) -> bool:
+    """Whether an If-Modified-Since header is at or after the last modification."""
+    if last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        return False
+    # HTTP dates have one-second resolution
+    return last_modified.replace(microsecond=0) <= since
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single ``bytes=`` range into an inclusive (start, end) pair.
+    
+    Returns None for headers that should be ignored (other units, malformed
+    or multiple ranges), which serves the full image. Raises a 416 for a
+    range that lies entirely outside the image.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    start_text, sep, end_text = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if not start_text:
+            # Suffix range: the last N bytes
+            suffix = int(end_text)
+            if suffix <= 0:
+                raise ValueError(suffix)
+            start, end = max(size - suffix, 0), size - 1
+        else:
+            start = int(start_text)
+            end = int(end_text) if end_text else size - 1
+            if end_text and end < start:
+                return None
+    except ValueError:
+        return None
+    if start >= size:
+        raise HTTPException(status_code=416, detail="Requested range not satisfiable",
+                            headers={"Content-Range": f"bytes */{size}"})
+    return start, min(end, size - 1)
+
+@router.get("/origin/{universe}/{character_name}")
+async def serve_character_image(
+    universe: str,
+    character_name: str,
+    request: Request,
+    w: Optional[int] = Query(None, ge=1, le=4000, description="Display width in device pixels")
+):
+    """
+    Serve character image content from storage (CDN origin and fallback path).
+    
+    When a display width is known (``w`` or client hints), the stored variant
+    in the best format the ``Accept`` header allows is served instead of the
+    original. Conditional requests are answered with 304 from the manifest
+    ETag and last-modified time, without a storage call. Content is streamed
+    from storage in chunks and single byte ranges are supported.
+    
+    Args:
+        universe: Comic universe (marvel, DC, image)
+        character_name: Name of the character
+        request: Incoming request (Accept, client hint, conditional and Range headers)
+        w: Display width in device pixels
+        
+    Returns:
+        Streaming image response, or 304 when the client copy is current
+    """
+    # Validate universe
+    valid_universes = ["marvel", "dc", "image"]
+    if universe.lower() not in valid_universes:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid universe. Must be one of: {', '.join(valid_universes)}"
+        )
+    
+    try:
+        # A revision that changed after it was resolved is resolved again once
+        for attempt in range(2):
+            entry = image_service.select_image_variant(
+                universe.lower(), character_name,
+                accept=request.headers.get("accept"),
+                width=w or _hint(request, "sec-ch-width", "width"),
+                dpr=_hint(request, "sec-ch-dpr", "dpr"),
+                viewport_width=_hint(request, "sec-ch-viewport-width", "viewport-width"),
+                save_data=request.headers.get("save-data", "").lower() == "on"
+            ) or await image_service.resolve_image(universe.lower(), character_name)
+            if entry is None:
+                raise HTTPException(status_code=404, detail="Character image not found")
+            
+            headers = image_service.get_versioned_cache_headers(version=entry.version, etag=entry.etag)
+            headers["Vary"] = ", ".join(("Accept", "Accept-Encoding") + CLIENT_HINTS)
+            headers["Accept-CH"] = ", ".join(CLIENT_HINTS)
+            last_modified = datetime.fromisoformat(entry.last_modified) if entry.last_modified else None
+            if last_modified is not None:
+                headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+            
+            # If-None-Match takes precedence over If-Modified-Since
+            if_none_match = request.headers.get("if-none-match")
+            if_modified_since = request.headers.get("if-modified-since")
+            if if_none_match is not None:
+                not_modified = _etag_matches(if_none_match, entry.etag)
+            else:
+                not_modified = if_modified_since is not None and _not_modified_since(if_modified_since, last_modified)
+            if not_modified:
+                return Response(status_code=304, headers=headers)
+            
+            byte_range = None
+            size = entry.content_length
+            range_header = request.headers.get("range")
+            if_range = request.headers.get("if-range")
+            if range_header and size and (if_range is None or if_range.strip() == f'"{entry.etag}"'):
+                byte_range = _parse_range(range_header, size)
+            
+            try:
+                if byte_range:
+                    start, end = byte_range
+                    chunks = await image_service.open_image_stream(entry, offset=start, length=end - start + 1)
+                else:
+                    chunks = await image_service.open_image_stream(entry)
+            except ResourceModifiedError:
+                if attempt == 0:
+                    continue
+                raise
+            break
+        
+        headers["Accept-Ranges"] = "bytes"
+        status_code = 200
+        if byte_range:
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(end - start + 1)
+            status_code = 206
+        elif size is not None:
+            headers["Content-Length"] = str(size)
+        
+        return StreamingResponse(
+            chunks,
+            status_code=status_code,
+            media_type=entry.content_type or "application/octet-stream",
+            headers=headers
+        )
+        
+    except HTTPException:
+        raise
+    except ResourceNotFoundError:
+        raise HTTPException(status_code=404, detail="Character image not found")
+    except Exception as e:
+        logger.error(f"Error streaming image for {character_name} in {universe}: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to serve character image"
+        )
@@ -6,11 +6,13 @@ Provides health checks, metrics, and system information.
 import os
 from datetime import datetime
 from fastapi import APIRouter, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, Iterator
 
 from ..monitoring.error_tracking import health_checker, error_tracker
 from ..monitoring.logging_config import get_logger
+from ..monitoring.metrics import metrics_registry
 
 router = APIRouter()
 logger = get_logger("api.monitoring")
@@ -66,13 +68,10 @@ async def readiness_check():
             timestamp=datetime.utcnow().isoformat()
         )
 
-@router.get("/metrics")
-async def metrics():
-    """
-    Prometheus-style metrics endpoint.
-    Returns metrics in text/plain format for monitoring systems.
-    """
-    # Basic application metrics
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+def _application_metrics() -> str:
+    """Process-level metrics that are not kept in the metrics registry"""
     metrics_data = [
         "# HELP app_up Application is running",
         "# TYPE app_up gauge",
@@ -95,15 +94,23 @@ async def metrics():
         "",
         "# HELP app_error_rate_per_hour Error rate per hour",
         "# TYPE app_error_rate_per_hour gauge",
-        f"app_error_rate_per_hour {error_summary['error_rate']}"
+        f"app_error_rate_per_hour {error_summary['error_rate']}",
+        ""
     ])
     
-    metrics_text = "\n".join(metrics_data)
-    
-    return Response(
-        content=metrics_text,
-        media_type="text/plain"
-    )
+    return "\n".join(metrics_data)
+
+def _exposition() -> Iterator[str]:
+    yield _application_metrics()
+    yield from metrics_registry.generate_exposition()
+
+@router.get("/metrics")
+async def metrics():
+    """
+    Prometheus text exposition endpoint.
+    Streams application and registry metrics one metric family at a time.
+    """
+    return StreamingResponse(_exposition(), media_type=PROMETHEUS_CONTENT_TYPE)
 
 @router.get("/version", response_model=VersionResponse)
 async def version_info():
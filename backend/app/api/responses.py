@@ -0,0 +1,79 @@
+"""Fast JSON response classes shared by the API routers"""
+
+import json
+from datetime import date, datetime, time
+from enum import Enum
+from typing import Any, Dict, Optional
+
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    """Fallback for values the JSON encoder does not handle natively"""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _stdlib_default(obj: Any) -> Any:
+    """Fallback for the standard library encoder, which lacks datetime support"""
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, Enum):
+        return obj.value
+    return _default(obj)
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize content to compact UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+        default=_stdlib_default,
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson when available.
+
+    Used as the application's default_response_class. Endpoints may also
+    return it directly with data they built themselves, which skips
+    FastAPI's response-model validation and jsonable_encoder pass.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class PreSerializedJSONResponse(Response):
+    """Response for a JSON body that was serialized ahead of time"""
+
+    media_type = "application/json"
+
+    def __init__(self, body: bytes, status_code: int = 200,
+                 headers: Optional[Dict[str, str]] = None):
+        super().__init__(content=body, status_code=status_code, headers=headers)
+
+
+def model_response(model: BaseModel, status_code: int = 200,
+                   headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    Serialize a model we constructed ourselves straight to JSON bytes.
+
+    FastAPI would otherwise dump the model, validate it again against the
+    response_model and re-encode it; the model is already valid.
+    """
+    return PreSerializedJSONResponse(model.model_dump_json().encode("utf-8"), status_code, headers)
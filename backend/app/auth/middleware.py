@@ -7,6 +7,7 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
 from app.auth.jwt_handler import JWTError
 from app.auth.session import session_manager, UserSession
+from app.security.content_moderation import security_headers
 from app.repositories.user_repository import UserRepository
 from app.models.user import User
 
@@ -202,10 +203,14 @@ async def add_security_headers(request: Request, call_next):
     """
     response = await call_next(request)
     
-    # Add security headers
-    response.headers["X-Content-Type-Options"] = "nosniff"
-    response.headers["X-Frame-Options"] = "DENY"
-    response.headers["X-XSS-Protection"] = "1; mode=block"
-    response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
+    # Add the precompiled security headers for this route class
+    block = security_headers.get_header_block(request.url.path)
+    successful = 200 <= response.status_code < 300
+    for name, value in block.headers.items():
+        if name in security_headers.DEFAULT_ONLY_HEADERS:
+            if successful:
+                response.headers.setdefault(name, value)
+        else:
+            response.headers[name] = value
     
     return response
\ No newline at end of file
@@ -3,13 +3,16 @@
 import logging
 import secrets
 import hashlib
-from typing import Optional, Dict, Any, Set
+import time
+from typing import Optional, Dict, Any, Set, List, Tuple
 from datetime import datetime, timezone, timedelta
-from dataclasses import dataclass, field
-from collections import defaultdict
+from dataclasses import dataclass, field, asdict
+from collections import defaultdict, OrderedDict
 import json
+from abc import ABC, abstractmethod
 
 from app.auth.jwt_handler import jwt_handler, JWTError
+from app.config import settings
 from app.models.user import User
 
 logger = logging.getLogger(__name__)
@@ -127,6 +130,51 @@ class UserSession:
         """Check if session is considered high risk"""
         return self.calculate_risk_score() > 0.7
     
+    def to_record(self) -> Dict[str, str]:
+        """Serialize the session into a flat string mapping for a session store"""
+        return {
+            "user_id": self.user_id,
+            "username": self.username,
+            "email": self.email,
+            "session_id": self.session_id,
+            "created_at": str(self.created_at.timestamp()),
+            "last_activity": str(self.last_activity.timestamp()),
+            "access_token": self.access_token,
+            "refresh_token": self.refresh_token or "",
+            "token_family": self.token_family or "",
+            "login_attempts": str(self.login_attempts),
+            "max_idle_time": str(self.max_idle_time.total_seconds()),
+            "absolute_timeout": str(self.absolute_timeout.total_seconds()),
+            "security_info": json.dumps(asdict(self.security_info)) if self.security_info else ""
+        }
+    
+    @classmethod
+    def from_record(cls, record: Dict[str, str]) -> "UserSession":
+        """Rebuild a session from a mapping produced by to_record"""
+        security_info = record.get("security_info")
+        return cls(
+            user_id=record["user_id"],
+            username=record["username"],
+            email=record["email"],
+            session_id=record["session_id"],
+            created_at=datetime.fromtimestamp(float(record["created_at"]), tz=timezone.utc),
+            last_activity=datetime.fromtimestamp(float(record["last_activity"]), tz=timezone.utc),
+            access_token=record["access_token"],
+            refresh_token=record.get("refresh_token") or None,
+            token_family=record.get("token_family") or None,
+            login_attempts=int(record.get("login_attempts", 0)),
+            max_idle_time=timedelta(seconds=float(record["max_idle_time"])),
+            absolute_timeout=timedelta(seconds=float(record["absolute_timeout"])),
+            security_info=SessionSecurityInfo(**json.loads(security_info)) if security_info else None
+        )
+    
+    def time_to_live(self) -> timedelta:
+        """Time until the session hits its idle or absolute timeout"""
+        now = datetime.now(timezone.utc)
+        idle_deadline = self.last_activity + self.max_idle_time
+        absolute_deadline = self.created_at + self.absolute_timeout
+        return max(min(idle_deadline, absolute_deadline) - now, timedelta(0))
+    
     def to_dict(self) -> Dict[str, Any]:
         """Convert session to dictionary"""
         return {
@@ -149,17 +197,359 @@ class UserSession:
             } if self.security_info else None
         }
 
+class SessionStore(ABC):
+    """Storage backend for sessions and failed-login counters"""
+    
+    # Whether the store is shared between workers (and worth near-caching)
+    is_shared = False
+    
+    @abstractmethod
+    def get(self, user_id: str) -> Optional[UserSession]:
+        """Get the session for a user"""
+        pass
+    
+    @abstractmethod
+    def get_by_id(self, session_id: str) -> Optional[UserSession]:
+        """Get a session by its session ID"""
+        pass
+    
+    @abstractmethod
+    def save(self, session: UserSession) -> None:
+        """Store a new or replaced session"""
+        pass
+    
+    @abstractmethod
+    def touch(self, session: UserSession) -> None:
+        """Persist the session's activity timestamp and security info"""
+        pass
+    
+    @abstractmethod
+    def delete(self, session: UserSession) -> None:
+        """Remove a session"""
+        pass
+    
+    @abstractmethod
+    def all_sessions(self) -> List[UserSession]:
+        """List every stored session"""
+        pass
+    
+    @abstractmethod
+    def count(self) -> int:
+        """Number of stored sessions"""
+        pass
+    
+    @abstractmethod
+    def record_failed_login(self, user_id: str, ip_address: str, window: timedelta) -> Dict[str, Any]:
+        """Increment the failed-login counter and return the updated attempt info"""
+        pass
+    
+    @abstractmethod
+    def get_failed_logins(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Get the failed-login attempt info for a user"""
+        pass
+    
+    @abstractmethod
+    def clear_failed_logins(self, user_id: str) -> None:
+        """Reset the failed-login counter for a user"""
+        pass
+
+class InMemorySessionStore(SessionStore):
+    """Process-local session storage (sessions are lost on restart)"""
+    
+    def __init__(self):
+        self.sessions: Dict[str, UserSession] = {}
+        self.sessions_by_id: Dict[str, UserSession] = {}
+        self.failed_logins: Dict[str, Dict] = defaultdict(dict)
+    
+    def get(self, user_id: str) -> Optional[UserSession]:
+        return self.sessions.get(user_id)
+    
+    def get_by_id(self, session_id: str) -> Optional[UserSession]:
+        return self.sessions_by_id.get(session_id)
+    
+    def save(self, session: UserSession) -> None:
+        self.sessions[session.user_id] = session
+        self.sessions_by_id[session.session_id] = session
+    
+    def touch(self, session: UserSession) -> None:
+        # Stored objects are the live sessions; nothing to persist
+        pass
+    
+    def delete(self, session: UserSession) -> None:
+        if session.user_id in self.sessions:
+            del self.sessions[session.user_id]
+        if session.session_id in self.sessions_by_id:
+            del self.sessions_by_id[session.session_id]
+    
+    def all_sessions(self) -> List[UserSession]:
+        return list(self.sessions.values())
+    
+    def count(self) -> int:
+        return len(self.sessions)
+    
+    def record_failed_login(self, user_id: str, ip_address: str, window: timedelta) -> Dict[str, Any]:
+        current_time = datetime.now(timezone.utc)
+        
+        if user_id not in self.failed_logins:
+            self.failed_logins[user_id] = {
+                "count": 0,
+                "last_attempt": current_time,
+                "ip_addresses": set()
+            }
+        
+        attempt_info = self.failed_logins[user_id]
+        attempt_info["count"] += 1
+        attempt_info["last_attempt"] = current_time
+        attempt_info["ip_addresses"].add(ip_address)
+        return attempt_info
+    
+    def get_failed_logins(self, user_id: str) -> Optional[Dict[str, Any]]:
+        if user_id not in self.failed_logins:
+            return None
+        return self.failed_logins[user_id]
+    
+    def clear_failed_logins(self, user_id: str) -> None:
+        if user_id in self.failed_logins:
+            del self.failed_logins[user_id]
+
+class RedisSessionStore(SessionStore):
+    """
+    Redis-backed session storage shared by all workers.
+    
+    Each session is a hash whose TTL tracks its idle/absolute timeout, with a
+    secondary session-id key pointing at the owning user. Activity updates and
+    failed-login counters are applied in MULTI/EXEC pipelines so concurrent
+    workers never lose increments.
+    """
+    
+    is_shared = True
+    
+    TOUCH_SCRIPT = """
+    if redis.call('EXISTS', KEYS[1]) == 1 then
+        redis.call('HSET', KEYS[1], 'last_activity', ARGV[1], 'security_info', ARGV[2])
+        redis.call('EXPIRE', KEYS[1], ARGV[3])
+        redis.call('EXPIRE', KEYS[2], ARGV[3])
+        return 1
+    end
+    return 0
+    """
+    
+    def __init__(self, redis_client, key_prefix: str = "session"):
+        self.redis = redis_client
+        self.key_prefix = key_prefix
+        self._touch_script = redis_client.register_script(self.TOUCH_SCRIPT)
+    
+    def _user_key(self, user_id: str) -> str:
+        return f"{self.key_prefix}:user:{user_id}"
+    
+    def _id_key(self, session_id: str) -> str:
+        return f"{self.key_prefix}:id:{session_id}"
+    
+    def _failed_key(self, user_id: str) -> str:
+        return f"{self.key_prefix}:failed:{user_id}"
+    
+    @staticmethod
+    def _decode(record: Dict) -> Dict[str, str]:
+        return {
+            (k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+            for k, v in record.items()
+        }
+    
+    @staticmethod
+    def _ttl_seconds(session: UserSession) -> int:
+        return max(int(session.time_to_live().total_seconds()), 1)
+    
+    def get(self, user_id: str) -> Optional[UserSession]:
+        record = self.redis.hgetall(self._user_key(user_id))
+        if not record:
+            return None
+        return UserSession.from_record(self._decode(record))
+    
+    def get_by_id(self, session_id: str) -> Optional[UserSession]:
+        user_id = self.redis.get(self._id_key(session_id))
+        if not user_id:
+            return None
+        session = self.get(user_id.decode() if isinstance(user_id, bytes) else user_id)
+        if session and session.session_id == session_id:
+            return session
+        return None
+    
+    def save(self, session: UserSession) -> None:
+        ttl = self._ttl_seconds(session)
+        user_key = self._user_key(session.user_id)
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.delete(user_key)
+        pipe.hset(user_key, mapping=session.to_record())
+        pipe.expire(user_key, ttl)
+        pipe.set(self._id_key(session.session_id), session.user_id, ex=ttl)
+        pipe.execute()
+    
+    def touch(self, session: UserSession) -> None:
+        record = session.to_record()
+        # Only refresh an existing session; never resurrect an invalidated one
+        self._touch_script(
+            keys=[self._user_key(session.user_id), self._id_key(session.session_id)],
+            args=[record["last_activity"], record["security_info"], self._ttl_seconds(session)]
+        )
+    
+    def delete(self, session: UserSession) -> None:
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.delete(self._user_key(session.user_id))
+        pipe.delete(self._id_key(session.session_id))
+        pipe.execute()
+    
+    def all_sessions(self) -> List[UserSession]:
+        sessions = []
+        for key in self.redis.scan_iter(match=self._user_key("*"), count=500):
+            record = self.redis.hgetall(key)
+            if record:
+                sessions.append(UserSession.from_record(self._decode(record)))
+        return sessions
+    
+    def count(self) -> int:
+        return sum(1 for _ in self.redis.scan_iter(match=self._user_key("*"), count=500))
+    
+    def record_failed_login(self, user_id: str, ip_address: str, window: timedelta) -> Dict[str, Any]:
+        now = datetime.now(timezone.utc)
+        failed_key = self._failed_key(user_id)
+        ips_key = f"{failed_key}:ips"
+        ttl = max(int(window.total_seconds()), 1)
+        
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hincrby(failed_key, "count", 1)
+        pipe.hset(failed_key, "last_attempt", str(now.timestamp()))
+        pipe.expire(failed_key, ttl)
+        pipe.sadd(ips_key, ip_address)
+        pipe.expire(ips_key, ttl)
+        pipe.smembers(ips_key)
+        results = pipe.execute()
+        
+        return {
+            "count": int(results[0]),
+            "last_attempt": now,
+            "ip_addresses": {ip.decode() if isinstance(ip, bytes) else ip for ip in results[-1]}
+        }
+    
+    def get_failed_logins(self, user_id: str) -> Optional[Dict[str, Any]]:
+        record = self._decode(self.redis.hgetall(self._failed_key(user_id)) or {})
+        if not record:
+            return None
+        ips = self.redis.smembers(f"{self._failed_key(user_id)}:ips") or set()
+        return {
+            "count": int(record.get("count", 0)),
+            "last_attempt": datetime.fromtimestamp(float(record["last_attempt"]), tz=timezone.utc),
+            "ip_addresses": {ip.decode() if isinstance(ip, bytes) else ip for ip in ips}
+        }
+    
+    def clear_failed_logins(self, user_id: str) -> None:
+        self.redis.delete(self._failed_key(user_id), f"{self._failed_key(user_id)}:ips")
+
+class SessionNearCache:
+    """
+    Small per-worker cache in front of a shared session store.
+    
+    Entries live for a few seconds so repeated lookups within a burst of
+    requests skip the network hop; invalidations on other workers become
+    visible once the entry ages out.
+    """
+    
+    def __init__(self, ttl_seconds: float = 2.0, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, UserSession]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, user_id: str) -> Optional[UserSession]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        
+        expires_at, session = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[user_id]
+            self.misses += 1
+            return None
+        
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return session
+    
+    def put(self, session: UserSession) -> None:
+        self._entries[session.user_id] = (time.monotonic() + self.ttl_seconds, session)
+        self._entries.move_to_end(session.user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def discard(self, user_id: str) -> None:
+        self._entries.pop(user_id, None)
+    
+    def clear(self) -> None:
+        self._entries.clear()
+
+def create_session_store() -> SessionStore:
+    """Build the configured session store, falling back to in-memory storage"""
+    backend = getattr(settings, 'session_store', 'memory')
+    redis_url = getattr(settings, 'redis_url', None)
+    
+    if backend == "redis" and redis_url:
+        try:
+            import redis
+            client = redis.from_url(redis_url)
+            client.ping()  # Test connection
+            logger.info("Connected to Redis for shared session storage")
+            return RedisSessionStore(client)
+        except Exception as e:
+            logger.warning(f"Redis not available, using in-memory session storage: {e}")
+    
+    return InMemorySessionStore()
+
 class SessionManager:
     """Manages user sessions and authentication state with advanced security"""
     
-    def __init__(self):
-        # In a production environment, you might want to use Redis or another
-        # persistent storage for sessions. For now, we'll use in-memory storage.
-        self._active_sessions: Dict[str, UserSession] = {}
-        self._session_by_id: Dict[str, UserSession] = {}
-        self._failed_login_attempts: Dict[str, Dict] = defaultdict(dict)
+    def __init__(self, store: Optional[SessionStore] = None,
+                 near_cache_ttl: float = 2.0, activity_write_interval: float = 60.0):
+        # Sessions live in the store; shared stores get a per-worker near-cache
+        self.store = store or InMemorySessionStore()
+        self._near_cache = SessionNearCache(near_cache_ttl) if self.store.is_shared else None
+        # Activity timestamps are written back at most this often per session;
+        # last write times, oldest first, only for writes within the interval
+        self._activity_write_interval = activity_write_interval
+        self._last_activity_write: "OrderedDict[str, float]" = OrderedDict()
         self._concurrent_session_limit = 5  # Max concurrent sessions per user
         self._session_cleanup_interval = timedelta(hours=1)
+        self._lockout_threshold = 5
+        self._lockout_window = timedelta(minutes=15)
+    
+    def _load_session(self, user_id: str) -> Optional[UserSession]:
+        """Load a session, consulting the near-cache before the store"""
+        if self._near_cache is not None:
+            session = self._near_cache.get(user_id)
+            if session is not None:
+                return session
+        
+        session = self.store.get(user_id)
+        if session is not None and self._near_cache is not None:
+            self._near_cache.put(session)
+        return session
+    
+    def _persist_activity(self, session: UserSession, force: bool = False):
+        """Write activity back to the store, throttled per session"""
+        if not self.store.is_shared:
+            return
+        
+        now = time.monotonic()
+        last_write = self._last_activity_write.get(session.session_id, 0.0)
+        if force or now - last_write >= self._activity_write_interval:
+            self.store.touch(session)
+            self._last_activity_write.pop(session.session_id, None)
+            self._last_activity_write[session.session_id] = now
+            # Older writes no longer throttle anything; sessions that expired in
+            # the store by TTL are dropped here too
+            while (self._last_activity_write and
+                   next(iter(self._last_activity_write.values())) <= now - self._activity_write_interval):
+                self._last_activity_write.popitem(last=False)
     
     def create_session(self, user: User, ip_address: Optional[str] = None, 
                       user_agent: Optional[str] = None, device_fingerprint: Optional[str] = None) -> UserSession:
@@ -203,12 +593,12 @@ class SessionManager:
             )
             
             # Store session
-            self._active_sessions[user.id] = session
-            self._session_by_id[session.session_id] = session
+            self.store.save(session)
+            if self._near_cache is not None:
+                self._near_cache.put(session)
             
             # Clear failed login attempts
-            if user.id in self._failed_login_attempts:
-                del self._failed_login_attempts[user.id]
+            self.store.clear_failed_logins(user.id)
             
             logger.info(f"Created session for user: {user.id}, session_id: {session.session_id}")
             return session
@@ -219,22 +609,27 @@ class SessionManager:
     
     def _get_user_sessions(self, user_id: str) -> list[UserSession]:
         """Get all active sessions for a user"""
-        return [session for session in self._active_sessions.values() 
+        if self.store.is_shared:
+            session = self.store.get(user_id)
+            return [session] if session and not session.is_expired() else []
+        
+        return [session for session in self.store.all_sessions()
                 if session.user_id == user_id and not session.is_expired()]
     
     def _remove_session(self, session: UserSession):
         """Remove a session from storage"""
-        if session.user_id in self._active_sessions:
-            del self._active_sessions[session.user_id]
-        if session.session_id in self._session_by_id:
-            del self._session_by_id[session.session_id]
+        self.store.delete(session)
+        self._last_activity_write.pop(session.session_id, None)
+        if self._near_cache is not None:
+            self._near_cache.discard(session.user_id)
     
     def get_session(self, user_id: str) -> Optional[UserSession]:
         """Get an active session by user ID"""
-        session = self._active_sessions.get(user_id)
+        session = self._load_session(user_id)
         
         if session and not session.is_expired():
             session.update_activity()
+            self._persist_activity(session)
             return session
         elif session:
             # Session is expired, remove it
@@ -267,7 +662,7 @@ class SessionManager:
                        ip_address: Optional[str] = None, user_agent: Optional[str] = None) -> Optional[UserSession]:
         """Refresh a user session using refresh token with enhanced security"""
         try:
-            session = self._active_sessions.get(user_id)
+            session = self.store.get(user_id)
             
             if not session or session.refresh_token != refresh_token:
                 logger.warning(f"Invalid refresh attempt for user: {user_id}")
@@ -290,6 +685,11 @@ class SessionManager:
             # Update activity and security info
             session.update_activity(ip_address, user_agent)
             
+            # Persist the new tokens so every worker sees them
+            if self.store.is_shared:
+                self.store.save(session)
+                self._near_cache.put(session)
+            
             logger.info(f"Refreshed session for user: {user_id}, rotated: {token_result.get('rotated', False)}")
             return session
             
@@ -305,7 +705,7 @@ class SessionManager:
     def invalidate_session(self, user_id: str) -> bool:
         """Invalidate a user session"""
         try:
-            session = self._active_sessions.get(user_id)
+            session = self.store.get(user_id)
             if session:
                 # Revoke JWT tokens
                 try:
@@ -327,7 +727,7 @@ class SessionManager:
     def invalidate_session_by_id(self, session_id: str) -> bool:
         """Invalidate a session by session ID"""
         try:
-            session = self._session_by_id.get(session_id)
+            session = self.store.get_by_id(session_id)
             if session:
                 return self.invalidate_session(session.user_id)
             return False
@@ -342,7 +742,9 @@ class SessionManager:
             jwt_handler.revoke_all_user_tokens(user_id)
             
             # Remove all user sessions
-            sessions_to_remove = [s for s in self._active_sessions.values() if s.user_id == user_id]
+            sessions_to_remove = self._get_user_sessions(user_id) if self.store.is_shared else [
+                s for s in self.store.all_sessions() if s.user_id == user_id
+            ]
             for session in sessions_to_remove:
                 self._remove_session(session)
             
@@ -355,33 +757,20 @@ class SessionManager:
     
     def record_failed_login(self, user_id: str, ip_address: str):
         """Record a failed login attempt"""
-        current_time = datetime.now(timezone.utc)
-        
-        if user_id not in self._failed_login_attempts:
-            self._failed_login_attempts[user_id] = {
-                "count": 0,
-                "last_attempt": current_time,
-                "ip_addresses": set()
-            }
-        
-        attempt_info = self._failed_login_attempts[user_id]
-        attempt_info["count"] += 1
-        attempt_info["last_attempt"] = current_time
-        attempt_info["ip_addresses"].add(ip_address)
+        attempt_info = self.store.record_failed_login(user_id, ip_address, self._lockout_window)
         
         logger.warning(f"Failed login attempt for user {user_id} from IP {ip_address}. Total attempts: {attempt_info['count']}")
     
     def is_account_locked(self, user_id: str) -> bool:
         """Check if account is locked due to failed login attempts"""
-        if user_id not in self._failed_login_attempts:
+        attempt_info = self.store.get_failed_logins(user_id)
+        if not attempt_info:
             return False
         
-        attempt_info = self._failed_login_attempts[user_id]
-        
         # Lock account after 5 failed attempts within 15 minutes
-        if attempt_info["count"] >= 5:
+        if attempt_info["count"] >= self._lockout_threshold:
             time_since_last = datetime.now(timezone.utc) - attempt_info["last_attempt"]
-            if time_since_last < timedelta(minutes=15):
+            if time_since_last < self._lockout_window:
                 return True
         
         return False
@@ -406,14 +795,16 @@ class SessionManager:
     def cleanup_expired_sessions(self) -> int:
         """Clean up expired sessions and return count of cleaned sessions"""
         try:
-            expired_sessions = []
+            # Shared stores expire sessions through key TTLs
+            if self.store.is_shared:
+                return 0
             
-            for user_id, session in self._active_sessions.items():
-                if session.is_expired():
-                    expired_sessions.append(user_id)
+            expired_sessions = [
+                session for session in self.store.all_sessions() if session.is_expired()
+            ]
             
-            for user_id in expired_sessions:
-                del self._active_sessions[user_id]
+            for session in expired_sessions:
+                self._remove_session(session)
             
             if expired_sessions:
                 logger.info(f"Cleaned up {len(expired_sessions)} expired sessions")
@@ -426,7 +817,7 @@ class SessionManager:
     
     def get_active_session_count(self) -> int:
         """Get the number of active sessions"""
-        return len(self._active_sessions)
+        return self.store.count()
     
     def is_user_logged_in(self, user_id: str) -> bool:
         """Check if a user has an active session"""
@@ -449,7 +840,10 @@ class SessionManager:
         return None
 
 # Global session manager instance
-session_manager = SessionManager()
+session_manager = SessionManager(
+    store=create_session_store(),
+    near_cache_ttl=getattr(settings, 'session_near_cache_ttl', 2.0)
+)
 
 # Convenience functions
 def create_session(user: User) -> UserSession:
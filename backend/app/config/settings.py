@@ -50,6 +50,14 @@ class Settings(BaseSettings):
     azure_storage_account_name: str = "devstorageaccount1"
     azure_storage_account_key: str = "test-key-for-development"
     azure_storage_container_name: str = "character-images"
+    azure_storage_max_connections: int = 100
+    azure_storage_upload_concurrency: int = 4
+    # Bytes fetched per storage request when streaming an image (bounds per-request memory)
+    azure_storage_download_chunk_size: int = 262144
+    # Seconds between image manifest refreshes (0 disables the manifest)
+    image_manifest_refresh_interval: float = 300.0
+    # Seconds between checks for invalidations made by other processes (needs REDIS_URL)
+    image_manifest_sync_interval: float = 1.0
     
     # Authentication Configuration
     jwt_secret_key: str = "test-jwt-secret-key-for-development-min-32-chars"
@@ -65,10 +73,22 @@ class Settings(BaseSettings):
     bcrypt_rounds: int = 12
     session_secret: str = "test-session-secret-for-development"
     
+    # Session Storage Configuration ("memory" or "redis")
+    session_store: str = "memory"
+    session_near_cache_ttl: float = 2.0
+    redis_url: Optional[str] = None
+    
     # Monitoring Configuration
     enable_metrics: bool = True
     metrics_port: int = 9090
     health_check_timeout: int = 30
+    slo_evaluation_interval: float = 30.0
+    
+    # Tracing Configuration (errors and slow traces are always kept)
+    trace_sample_rate: float = 1.0
+    trace_slow_threshold_ms: float = 1000.0
+    trace_export_dir: Optional[str] = None
+    trace_export_endpoint: Optional[str] = None
     
     # Azure Key Vault Configuration (Optional)
     azure_key_vault_url: Optional[str] = None
@@ -81,6 +101,10 @@ class Settings(BaseSettings):
     log_file: str = "/app/logs/app.log"
     log_max_size: str = "10MB"
     log_backup_count: int = 5
+    log_async: bool = True
+    log_queue_size: int = 10000
+    # Per-route request log sampling, e.g. "/api/puzzle=0.1,/health=0"
+    log_route_sample_rates: str = ""
     
     # Cloudflare Configuration
     cloudflare_zone_id: Optional[str] = None
@@ -125,6 +149,16 @@ class Settings(BaseSettings):
         """Check if running in staging environment."""
         return self.app_env == "staging"
     
+    @property
+    def route_sample_rates(self) -> dict:
+        """Parse log_route_sample_rates into {path prefix: rate}."""
+        rates = {}
+        for item in self.log_route_sample_rates.split(","):
+            prefix, _, rate = item.strip().rpartition("=")
+            if prefix:
+                rates[prefix] = float(rate)
+        return rates
+    
     @property
     def cosmos_connection_string(self) -> str:
         """Generate Cosmos DB connection string."""
@@ -0,0 +1,275 @@
+"""
+Pure ASGI middleware pipeline.
+
+The function middlewares registered with ``app.middleware("http")`` run inside
+Starlette's ``BaseHTTPMiddleware``, which spawns a task per layer, re-streams
+the response body through a memory channel and materialises a ``Response``
+object just so headers can be edited. The classes here wrap the ASGI
+callable directly: they inspect the scope, reject early when needed and
+otherwise only touch the ``http.response.start`` message on its way out,
+appending header lists that were encoded once at startup.
+
+The policy objects (``CSRFMiddleware``, ``ThreatProtectionMiddleware`` and
+``RateLimiter``) are reused unchanged, so both styles enforce the same rules.
+"""
+
+import logging
+import secrets
+import time
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from fastapi import Request, status
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.middleware.rate_limiting import RateLimiter, get_endpoint_type, rate_limiter
+from app.security.content_moderation import SecurityHeadersManager, security_headers
+
+logger = logging.getLogger(__name__)
+
+RawHeaders = List[Tuple[bytes, bytes]]
+
+def merge_headers(message: Message, extra: Iterable[Tuple[bytes, bytes]],
+                  defaults: Iterable[Tuple[bytes, bytes]] = ()) -> None:
+    """
+    Set headers on an http.response.start message, replacing same-named ones.
+    ``defaults`` are only added when the response does not already carry them.
+    """
+    names = {name for name, _ in extra}
+    headers = [header for header in message.get("headers", ()) if header[0] not in names]
+    if defaults:
+        present = {name for name, _ in headers}
+        headers.extend(header for header in defaults if header[0] not in present)
+    headers.extend(extra)
+    message["headers"] = headers
+
+
+def _replay_body(body: bytes, receive: Receive) -> Receive:
+    """Build a receive callable that yields an already-consumed body first"""
+    sent = False
+
+    async def replay() -> Message:
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+
+    return replay
+
+
+class FastPathMiddleware:
+    """
+    Answers fixed GET endpoints (health checks, the API banner) from
+    pre-rendered bytes without entering the rest of the stack. The route
+    class's security headers are baked in unless ``security_headers_enabled``
+    is off, mirroring whether ``SecurityHeadersMiddleware`` is installed.
+    """
+
+    def __init__(self, app: ASGIApp, responses: Mapping[str, Any],
+                 manager: Optional[SecurityHeadersManager] = None,
+                 security_headers_enabled: bool = True):
+        self.app = app
+        manager = manager or security_headers
+        self.responses: Dict[str, Tuple[Message, Message]] = {}
+
+        for path, content in responses.items():
+            rendered = JSONResponse(content)
+            headers = rendered.raw_headers
+            if security_headers_enabled:
+                block = manager.get_header_block(path)
+                headers = headers + list(block.raw_defaults + block.raw_headers)
+            self.responses[path] = (
+                {
+                    "type": "http.response.start",
+                    "status": rendered.status_code,
+                    "headers": headers,
+                },
+                {"type": "http.response.body", "body": rendered.body},
+            )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope["method"] == "GET":
+            response = self.responses.get(scope["path"])
+            if response is not None:
+                start, body = response
+                await send(start)
+                await send(body)
+                return
+
+        await self.app(scope, receive, send)
+
+
+class SecurityHeadersMiddleware:
+    """
+    Appends the precompiled security header block for the request's route
+    class. With ``csp_nonce`` enabled, blocks whose policy allows it get a
+    fresh script nonce per request, exposed as ``request.state.csp_nonce``.
+    """
+
+    def __init__(self, app: ASGIApp, manager: Optional[SecurityHeadersManager] = None,
+                 csp_nonce: bool = False):
+        self.app = app
+        self.manager = manager or security_headers
+        self.csp_nonce = csp_nonce
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        block = self.manager.get_header_block(scope["path"])
+        if self.csp_nonce and block.supports_nonce:
+            nonce = secrets.token_urlsafe(16)
+            scope.setdefault("state", {})["csp_nonce"] = nonce
+            raw_headers = block.with_nonce(nonce)
+        else:
+            raw_headers = block.raw_headers
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                # Caching defaults only make sense for successful payloads
+                defaults = block.raw_defaults if 200 <= message["status"] < 300 else ()
+                merge_headers(message, raw_headers, defaults)
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+class CSRFASGIMiddleware:
+    """ASGI front-end for ``CSRFMiddleware``"""
+
+    def __init__(self, app: ASGIApp, policy):
+        self.app = app
+        self.policy = policy
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # Exempt paths and safe methods never need a Request object
+        if (scope["type"] != "http" or
+                scope["path"] in self.policy.exempt_paths or
+                scope["method"] not in self.policy.protected_methods):
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope)
+        try:
+            user_id = self.policy._get_user_id(request)
+            session_id = self.policy._get_session_id(request)
+            csrf_token = self.policy.csrf_protection.get_csrf_token_from_request(request)
+
+            if not csrf_token:
+                logger.warning(f"CSRF protection: No token provided for {request.method} {request.url.path}")
+                rejection = JSONResponse(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    content={"detail": "CSRF token required"}
+                )
+            elif not await self.policy.csrf_protection.validate_token_async(csrf_token, user_id, session_id):
+                logger.warning(f"CSRF protection: Invalid token for {request.method} {request.url.path}")
+                rejection = JSONResponse(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    content={"detail": "Invalid CSRF token"}
+                )
+            else:
+                rejection = None
+        except Exception as e:
+            logger.error(f"CSRF middleware error: {e}")
+            rejection = JSONResponse(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                content={"detail": "CSRF protection error"}
+            )
+
+        if rejection is not None:
+            await rejection(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
+
+
+class ThreatProtectionASGIMiddleware:
+    """ASGI front-end for ``ThreatProtectionMiddleware``"""
+
+    def __init__(self, app: ASGIApp, policy):
+        self.app = app
+        self.policy = policy
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope, receive)
+        try:
+            user_id = self.policy._extract_user_id(request)
+            ip_address = self.policy.detector._get_client_ip(request)
+            rejection = await self.policy.screen_request(request, ip_address, user_id)
+        except Exception as e:
+            logger.error(f"Threat protection middleware error: {e}")
+            await self.app(scope, receive, send)
+            return
+
+        if rejection is not None:
+            await rejection(scope, receive, send)
+            return
+
+        # CAPTCHA screening may have consumed the body; hand it on downstream
+        body = getattr(request, "_body", None)
+        if body is not None:
+            receive = _replay_body(body, receive)
+
+        await self.app(scope, receive, send)
+
+        try:
+            self.policy.record_outcome(request, ip_address, user_id)
+        except Exception as e:
+            logger.error(f"Threat protection middleware error: {e}")
+
+
+class RateLimitASGIMiddleware:
+    """ASGI front-end for ``RateLimiter``"""
+
+    def __init__(self, app: ASGIApp, limiter: Optional[RateLimiter] = None):
+        self.app = app
+        self.limiter = limiter or rate_limiter
+
+    @staticmethod
+    def _rate_headers(info: dict) -> RawHeaders:
+        """Encode X-RateLimit-* headers for the current limiter state"""
+        ip_info = info["ip"]
+        headers = [
+            (b"x-ratelimit-limit", str(ip_info["limit"]).encode("latin-1")),
+            (b"x-ratelimit-remaining", str(ip_info["remaining"]).encode("latin-1")),
+            (b"x-ratelimit-reset", str(int(time.time() + ip_info["window"])).encode("latin-1")),
+        ]
+
+        # Add user rate limit headers if user is identified
+        user_info = info["user"]
+        if user_info:
+            headers.append((b"x-ratelimit-user-limit", str(user_info["limit"]).encode("latin-1")))
+            headers.append((b"x-ratelimit-user-remaining", str(user_info["remaining"]).encode("latin-1")))
+        return headers
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope)
+        endpoint_type = get_endpoint_type(scope["path"])
+        client_ip = self.limiter._get_client_ip(request)
+        user_id = self.limiter._get_user_id(request)
+
+        rejection = self.limiter.check_identity(client_ip, user_id, endpoint_type)
+        if rejection is not None:
+            await rejection(scope, receive, send)
+            return
+
+        async def send_with_limits(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                try:
+                    info = self.limiter.identity_info(client_ip, user_id, endpoint_type)
+                    merge_headers(message, self._rate_headers(info))
+                except Exception as e:
+                    logger.error(f"Error adding rate limit headers: {e}")
+            await send(message)
+
+        await self.app(scope, receive, send_with_limits)
@@ -71,7 +71,14 @@ class RateLimiter:
         """
         client_ip = self._get_client_ip(request)
         user_id = self._get_user_id(request)
-        
+        return self.check_identity(client_ip, user_id, endpoint_type)
+    
+    def check_identity(self, client_ip: str, user_id: Optional[str],
+                       endpoint_type: str = "default") -> Optional[JSONResponse]:
+        """
+        Check rate limits for an already-resolved client IP and user
+        Returns JSONResponse if rate limited, None if allowed
+        """
         # Get rate limit configuration for endpoint
         config = self.limits.get(endpoint_type, self.limits["default"])
         
@@ -162,6 +169,11 @@ class RateLimiter:
         """Get current rate limit status for debugging/monitoring"""
         client_ip = self._get_client_ip(request)
         user_id = self._get_user_id(request)
+        return self.identity_info(client_ip, user_id, endpoint_type)
+    
+    def identity_info(self, client_ip: str, user_id: Optional[str],
+                      endpoint_type: str = "default") -> dict:
+        """Get current rate limit status for an already-resolved client IP and user"""
         config = self.limits.get(endpoint_type, self.limits["default"])
         
         with self.lock:
@@ -195,14 +207,18 @@ class RateLimiter:
 # Global rate limiter instance
 rate_limiter = RateLimiter()
 
+def get_endpoint_type(path: str) -> str:
+    """Map a request path to its rate limit configuration"""
+    if "/guess" in path:
+        return "guess"
+    return "default"
+
 async def rate_limit_middleware(request: Request, call_next):
     """
     FastAPI middleware for rate limiting
     """
     # Determine endpoint type based on path
-    endpoint_type = "default"
-    if "/guess" in request.url.path:
-        endpoint_type = "guess"
+    endpoint_type = get_endpoint_type(request.url.path)
     
     # Check rate limits
     rate_limit_response = await rate_limiter.check_rate_limit(request, endpoint_type)
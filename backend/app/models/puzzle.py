@@ -1,4 +1,5 @@
-from pydantic import BaseModel, Field, field_validator, model_validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
+from functools import cached_property
 from typing import List, Optional
 from datetime import datetime
 import re
@@ -151,8 +152,15 @@ class PuzzleCreate(BaseModel):
 
 class PuzzleResponse(BaseModel):
     """Model for puzzle API responses (without revealing the answer)"""
+    model_config = ConfigDict(frozen=True)
+    
     id: str
     universe: str
     active_date: str
     # Note: character and character_aliases are intentionally excluded
-    # to prevent revealing the answer before it's solved
\ No newline at end of file
+    # to prevent revealing the answer before it's solved
+    
+    @cached_property
+    def json_bytes(self) -> bytes:
+        """Serialized response body, computed once per (immutable) instance"""
+        return self.model_dump_json().encode("utf-8")
\ No newline at end of file
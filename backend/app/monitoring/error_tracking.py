@@ -3,16 +3,29 @@ Error tracking and alerting system for ComicGuess application.
 Provides structured error handling, alerting, and recovery mechanisms.
 """
 
+import hashlib
 import logging
+import math
+import os
+import re
+import threading
+import time
 import traceback
 import json
-from typing import Dict, Any, Optional, List
-from datetime import datetime, timedelta
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List, Tuple
+from datetime import datetime
 from enum import Enum
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field
 from functools import wraps
 
 from .logging_config import get_logger, get_correlation_id, metrics
+from .metrics import metrics_registry
+from .shared_metrics import SharedMetricsSegment, SharedRing, read_shared_rings
+
+# Registry counter, aggregated across workers in multi-process mode
+ERRORS_TOTAL = metrics_registry.counter(
+    "errors_total", "Tracked application errors", ("severity", "category"))
 
 # Configure error tracking logger with appropriate levels
 error_logger = logging.getLogger(__name__)
@@ -60,15 +73,151 @@ class ErrorEvent:
     context: Optional[ErrorContext]
     resolved: bool = False
     resolution_notes: Optional[str] = None
+    fingerprint: Optional[str] = None
+
+class RollingCount:
+    """
+    Event count over a sliding window, kept as a ring of fixed-width buckets.
+    
+    Minute buckets cover the last hour and hour buckets the last day, so
+    memory is constant and a window query touches at most 60 buckets.
+    Windows longer than a day are capped at a day.
+    
+    With a shared segment the buckets are also kept as ``SharedRing`` pairs
+    in it; counts given the merged ``rings`` cover every worker, the others
+    this worker only.
+    """
+    
+    MINUTE_BUCKETS = 60
+    HOUR_BUCKETS = 24
+    
+    def __init__(self, segment: Optional[SharedMetricsSegment] = None,
+                 name: str = "error_window", labels: Tuple[str, ...] = ()):
+        self._minutes = [[-1, 0] for _ in range(self.MINUTE_BUCKETS)]
+        self._hours = [[-1, 0] for _ in range(self.HOUR_BUCKETS)]
+        self._shared = None
+        if segment is not None:
+            self._shared = (
+                SharedRing(segment, name, labels + ("minute",), self.MINUTE_BUCKETS, 60),
+                SharedRing(segment, name, labels + ("hour",), self.HOUR_BUCKETS, 3600),
+            )
+    
+    @staticmethod
+    def _add(buckets: List[List[int]], index: int, amount: int):
+        bucket = buckets[index % len(buckets)]
+        if bucket[0] != index:
+            bucket[0], bucket[1] = index, 0
+        bucket[1] += amount
+    
+    @staticmethod
+    def _sum(buckets: List[List[int]], current: int, span: int) -> int:
+        oldest = current - min(span, len(buckets)) + 1
+        return sum(count for index, count in buckets if oldest <= index <= current)
+    
+    def add(self, now: float, amount: int = 1):
+        if self._shared is not None:
+            for ring in self._shared:
+                ring.add(now, amount)
+        self._add(self._minutes, int(now // 60), amount)
+        self._add(self._hours, int(now // 3600), amount)
+    
+    def count(self, seconds: float, now: float, rings=None) -> int:
+        """Events in the last ``seconds``, to bucket granularity."""
+        if self._shared is not None and rings is not None:
+            minute_ring, hour_ring = self._shared
+            if seconds <= self.MINUTE_BUCKETS * 60:
+                return int(minute_ring.window_sum(rings, now, math.ceil(seconds / 60)))
+            return int(hour_ring.window_sum(rings, now, math.ceil(seconds / 3600)))
+        if seconds <= self.MINUTE_BUCKETS * 60:
+            return self._sum(self._minutes, int(now // 60), math.ceil(seconds / 60))
+        return self._sum(self._hours, int(now // 3600), math.ceil(seconds / 3600))
+
+@dataclass
+class ErrorGroup:
+    """All occurrences of one distinct error, identified by its fingerprint."""
+    fingerprint: str
+    exception_type: str
+    category: ErrorCategory
+    severity: ErrorSeverity
+    route: Optional[str]
+    first_seen: datetime
+    last_seen: datetime
+    count: int = 0
+    last_error_id: Optional[str] = None
+    last_message: Optional[str] = None
+    exemplars: List[ErrorEvent] = field(default_factory=list)
+    rate: RollingCount = field(default_factory=RollingCount)
+    
+    def to_dict(self, seconds: Optional[float] = None, now: Optional[float] = None) -> Dict[str, Any]:
+        return {
+            'fingerprint': self.fingerprint,
+            'exception_type': self.exception_type,
+            'category': self.category.value,
+            'severity': self.severity.value,
+            'route': self.route,
+            'count': self.count,
+            'window_count': self.rate.count(seconds, now) if seconds else self.count,
+            'first_seen': self.first_seen.isoformat(),
+            'last_seen': self.last_seen.isoformat(),
+            'last_error_id': self.last_error_id,
+            'last_message': self.last_message,
+            'exemplar_ids': [event.error_id for event in self.exemplars]
+        }
+
+# Path segments that identify a resource rather than a route
+_ID_SEGMENT = re.compile(
+    r"^(\d+|[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}"
+    r"|(?=[^/]*\d)[0-9a-fA-F]{16,}|(?=[^/]*\d)[A-Za-z0-9_-]{24,})$"
+)
+
+def normalize_route(method: Optional[str], path: Optional[str]) -> Optional[str]:
+    """Route key with IDs replaced, e.g. ``GET /api/users/{id}``."""
+    if not path:
+        return None
+    segments = ["{id}" if _ID_SEGMENT.match(segment) else segment for segment in path.split("/")]
+    route = "/".join(segments)
+    return f"{method} {route}" if method else route
+
+def error_fingerprint(exception: BaseException, route: Optional[str] = None) -> str:
+    """
+    Stable identifier for an error: exception type, normalized stack and route.
+    
+    Stack frames contribute file name and function but not line numbers or
+    the message, so the same failure groups together across deploys and
+    regardless of the IDs it mentions.
+    """
+    frames = traceback.extract_tb(exception.__traceback__) if exception.__traceback__ else []
+    stack = "|".join(f"{os.path.basename(frame.filename)}:{frame.name}" for frame in frames)
+    exception_type = f"{type(exception).__module__}.{type(exception).__qualname__}"
+    return hashlib.sha1(f"{exception_type}\n{stack}\n{route or ''}".encode()).hexdigest()[:16]
 
 class ErrorTracker:
-    """Central error tracking and alerting system."""
+    """
+    Central error tracking and alerting system.
     
-    def __init__(self):
+    Errors are grouped by fingerprint; each group keeps counters, a rolling
+    rate and the first few events in full. Memory and summary cost grow with
+    the number of distinct errors, not with error volume.
+    
+    With a shared metrics segment, the total, per-category and per-severity
+    rates are also kept in it, so summaries count the errors of every worker.
+    Groups (with their exemplars) and alert thresholds stay per worker.
+    """
+    
+    def __init__(self, max_groups: int = 1000, max_exemplars: int = 3,
+                 segment: Optional[SharedMetricsSegment] = None):
         self.logger = get_logger("error_tracker")
-        self.error_counts: Dict[str, int] = {}
-        self.recent_errors: List[ErrorEvent] = []
-        self.max_recent_errors = 1000
+        self.max_groups = max_groups
+        self.max_exemplars = max_exemplars
+        self.segment = segment
+        self.groups: "OrderedDict[str, ErrorGroup]" = OrderedDict()
+        self.evicted_groups = 0
+        self.total_rate = RollingCount(segment, labels=("total",))
+        self.category_rates: Dict[ErrorCategory, RollingCount] = {
+            c: RollingCount(segment, labels=("category", c.value)) for c in ErrorCategory}
+        self.severity_rates: Dict[ErrorSeverity, RollingCount] = {
+            s: RollingCount(segment, labels=("severity", s.value)) for s in ErrorSeverity}
+        self._lock = threading.Lock()
     
     def track_error(
         self,
@@ -95,41 +244,67 @@ class ErrorTracker:
         
         error_id = str(uuid.uuid4())
         correlation_id = get_correlation_id()
+        exception_type = type(exception).__name__
+        route = normalize_route(context.request_method, context.request_path) if context else None
+        fingerprint = error_fingerprint(exception, route)
+        now = time.time()
+        timestamp = datetime.utcnow()
         
-        # Create error event
-        error_event = ErrorEvent(
-            error_id=error_id,
-            timestamp=datetime.utcnow(),
-            severity=severity,
-            category=category,
-            message=str(exception),
-            exception_type=type(exception).__name__,
-            stack_trace=traceback.format_exception(type(exception), exception, exception.__traceback__),
-            correlation_id=correlation_id,
-            context=context
-        )
-        
-        # Add to recent errors
-        self.recent_errors.append(error_event)
-        if len(self.recent_errors) > self.max_recent_errors:
-            self.recent_errors.pop(0)
-        
-        # Update error counts
-        error_key = f"{category.value}:{type(exception).__name__}"
-        self.error_counts[error_key] = self.error_counts.get(error_key, 0) + 1
+        with self._lock:
+            group = self.groups.get(fingerprint)
+            if group is None:
+                group = ErrorGroup(fingerprint, exception_type, category, severity, route, timestamp, timestamp)
+                self.groups[fingerprint] = group
+                if len(self.groups) > self.max_groups:
+                    self.groups.popitem(last=False)
+                    self.evicted_groups += 1
+            else:
+                self.groups.move_to_end(fingerprint)
+            
+            group.count += 1
+            group.last_seen = timestamp
+            group.last_error_id = error_id
+            group.last_message = str(exception)
+            group.rate.add(now)
+            self.total_rate.add(now)
+            self.category_rates[category].add(now)
+            self.severity_rates[severity].add(now)
+            
+            # Only the first few occurrences pay for a formatted stack trace
+            keep_exemplar = len(group.exemplars) < self.max_exemplars
+            stack_trace = traceback.format_exception(type(exception), exception, exception.__traceback__) \
+                if keep_exemplar else []
+            error_event = ErrorEvent(
+                error_id=error_id,
+                timestamp=timestamp,
+                severity=severity,
+                category=category,
+                message=str(exception),
+                exception_type=exception_type,
+                stack_trace=stack_trace,
+                correlation_id=correlation_id,
+                context=context,
+                fingerprint=fingerprint
+            )
+            if keep_exemplar:
+                group.exemplars.append(error_event)
+            occurrences = group.count
+            recent_count = self.total_rate.count(300, now)
         
         # Log structured error
         self.logger.error(
             f"Error tracked: {exception}",
             extra={
                 'error_id': error_id,
+                'fingerprint': fingerprint,
+                'occurrences': occurrences,
                 'severity': severity.value,
                 'category': category.value,
-                'exception_type': type(exception).__name__,
+                'exception_type': exception_type,
                 'correlation_id': correlation_id,
                 'context': asdict(context) if context else None,
                 'additional_info': additional_info,
-                'stack_trace': error_event.stack_trace
+                'stack_trace': stack_trace or None
             }
         )
         
@@ -139,16 +314,17 @@ class ErrorTracker:
             tags={
                 'severity': severity.value,
                 'category': category.value,
-                'exception_type': type(exception).__name__
+                'exception_type': exception_type
             }
         )
+        ERRORS_TOTAL.labels(severity.value, category.value).inc()
         
         # Check for alerting conditions
-        self._check_alerting_conditions(error_event)
+        self._check_alerting_conditions(error_event, occurrences, recent_count)
         
         return error_id
     
-    def _check_alerting_conditions(self, error_event: ErrorEvent):
+    def _check_alerting_conditions(self, error_event: ErrorEvent, occurrences: int, recent_count: int):
         """Check if error conditions warrant alerting."""
         
         # Critical errors always trigger alerts
@@ -156,18 +332,14 @@ class ErrorTracker:
             self._send_alert(error_event, "Critical error occurred")
         
         # Check for error rate spikes
-        recent_errors_count = len([
-            e for e in self.recent_errors 
-            if e.timestamp > datetime.utcnow() - timedelta(minutes=5)
-        ])
-        
-        if recent_errors_count > 10:  # More than 10 errors in 5 minutes
-            self._send_alert(error_event, f"High error rate: {recent_errors_count} errors in 5 minutes")
+        if recent_count > 10:  # More than 10 errors in 5 minutes
+            self._send_alert(error_event, f"High error rate: {recent_count} errors in 5 minutes")
         
         # Check for repeated errors
-        error_key = f"{error_event.category.value}:{error_event.exception_type}"
-        if self.error_counts.get(error_key, 0) > 5:  # Same error type more than 5 times
-            self._send_alert(error_event, f"Repeated error: {error_key} occurred {self.error_counts[error_key]} times")
+        if occurrences > 5:  # Same error more than 5 times
+            error_key = f"{error_event.category.value}:{error_event.exception_type}"
+            self._send_alert(error_event, f"Repeated error: {error_key} ({error_event.fingerprint}) "
+                                          f"occurred {occurrences} times")
     
     def _send_alert(self, error_event: ErrorEvent, alert_message: str):
         """Send alert for error condition."""
@@ -176,9 +348,10 @@ class ErrorTracker:
             extra={
                 'alert_type': 'error_condition',
                 'error_id': error_event.error_id,
+                'fingerprint': error_event.fingerprint,
                 'severity': error_event.severity.value,
                 'category': error_event.category.value,
-                'message': alert_message
+                'alert_message': alert_message
             }
         )
         
@@ -188,32 +361,56 @@ class ErrorTracker:
         # - Email notifications
         # - SMS alerts
     
+    def get_error_group(self, fingerprint: str) -> Optional[ErrorGroup]:
+        """Get the group for a fingerprint, if it is still tracked."""
+        with self._lock:
+            return self.groups.get(fingerprint)
+    
     def get_error_summary(self, hours: int = 24) -> Dict[str, Any]:
-        """Get error summary for the specified time period."""
-        cutoff_time = datetime.utcnow() - timedelta(hours=hours)
-        recent_errors = [e for e in self.recent_errors if e.timestamp > cutoff_time]
+        """
+        Get error summary for the specified time period.
         
-        # Group by category and severity
-        by_category = {}
-        by_severity = {}
+        Periods longer than the hour buckets (24 hours) are clamped to them,
+        so counts and the hourly rate cover the same window; ``hours`` in
+        the summary is the period actually used.
+        """
+        if hours <= 0:
+            raise ValueError("hours must be positive")
+        hours = min(hours, RollingCount.HOUR_BUCKETS)
+        seconds = hours * 3600
+        now = time.time()
+        # One pass over the worker segments serves every shared count
+        rings = read_shared_rings(self.segment.directory) if self.segment is not None else None
         
-        for error in recent_errors:
-            category = error.category.value
-            severity = error.severity.value
-            
-            by_category[category] = by_category.get(category, 0) + 1
-            by_severity[severity] = by_severity.get(severity, 0) + 1
+        with self._lock:
+            total = self.total_rate.count(seconds, now, rings)
+            by_category = {c.value: n for c, rate in self.category_rates.items()
+                           if (n := rate.count(seconds, now, rings))}
+            by_severity = {s.value: n for s, rate in self.severity_rates.items()
+                           if (n := rate.count(seconds, now, rings))}
+            active = [(group.rate.count(seconds, now), group) for group in self.groups.values()]
+        
+        active = [(count, group) for count, group in active if count]
+        active.sort(key=lambda item: item[0], reverse=True)
+        
+        most_common = {}
+        for count, group in active:
+            error_key = f"{group.category.value}:{group.exception_type}"
+            most_common[error_key] = most_common.get(error_key, 0) + count
         
         return {
-            'total_errors': len(recent_errors),
+            'total_errors': total,
             'by_category': by_category,
             'by_severity': by_severity,
-            'error_rate': len(recent_errors) / hours,  # errors per hour
-            'most_common_errors': dict(sorted(self.error_counts.items(), key=lambda x: x[1], reverse=True)[:10])
+            'hours': hours,
+            'error_rate': total / hours,  # errors per hour
+            'distinct_errors': len(active),
+            'most_common_errors': dict(sorted(most_common.items(), key=lambda x: x[1], reverse=True)[:10]),
+            'top_error_groups': [group.to_dict(seconds, now) for _, group in active[:10]]
         }
 
-# Global error tracker instance
-error_tracker = ErrorTracker()
+# Global error tracker instance (rates shared across workers when METRICS_MULTIPROCESS_DIR is set)
+error_tracker = ErrorTracker(segment=metrics_registry.segment)
 
 def track_errors(
     severity: ErrorSeverity = ErrorSeverity.MEDIUM,
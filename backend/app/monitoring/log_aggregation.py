@@ -4,16 +4,27 @@ Provides centralized log collection, indexing, and search capabilities.
 """
 
 import json
+import logging
+import math
+import threading
 import time
 import asyncio
-from typing import Dict, List, Any, Optional, Union
+from typing import Dict, Iterable, List, Any, Optional, Tuple, Union
 from datetime import datetime, timedelta
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field
 from enum import Enum
 import re
-from collections import defaultdict, deque
+from collections import OrderedDict, defaultdict, deque
+from itertools import islice
 
-from .logging_config import get_logger
+from .logging_config import JSONFormatter, get_logger
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+_LITERAL_PATTERN = re.compile(r"[\w ]+")
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased word tokens of a message, in order of first appearance."""
+    return list(dict.fromkeys(_TOKEN_PATTERN.findall(text.lower())))
 
 class LogLevel(Enum):
     """Log levels for filtering."""
@@ -37,6 +48,10 @@ class LogEntry:
     function: Optional[str] = None
     line: Optional[int] = None
     extra_fields: Dict[str, Any] = None
+    # Search tokens, filled in when the entry is indexed by a LogAggregator
+    tokens: frozenset = field(default=frozenset(), init=False, repr=False, compare=False)
+    # Position in the aggregator's arrival order, filled in with the tokens
+    sequence: int = field(default=0, init=False, repr=False, compare=False)
     
     def __post_init__(self):
         if self.extra_fields is None:
@@ -66,6 +81,7 @@ class LogFilter:
         self.level: Optional[LogLevel] = None
         self.logger_pattern: Optional[str] = None
         self.message_pattern: Optional[str] = None
+        self.text: Optional[str] = None  # All words must appear in the message
         self.correlation_id: Optional[str] = None
         self.trace_id: Optional[str] = None
         self.start_time: Optional[float] = None
@@ -86,6 +102,12 @@ class LogFilter:
         if self.message_pattern and not re.search(self.message_pattern, entry.message, re.IGNORECASE):
             return False
         
+        # Full-text filter
+        if self.text:
+            entry_tokens = entry.tokens or frozenset(tokenize(entry.message))
+            if not all(token in entry_tokens for token in tokenize(self.text)):
+                return False
+        
         # Correlation ID filter
         if self.correlation_id and entry.correlation_id != self.correlation_id:
             return False
@@ -106,20 +128,147 @@ class LogFilter:
                 return False
         
         return True
+    
+    def required_tokens(self, indexed_fields: Tuple[str, ...] = ()) -> List[str]:
+        """
+        Index tokens every matching entry must carry.
+        
+        These are the words of ``text``, the inner words of a plain-word
+        ``message_pattern`` (its first and last words may match part of a
+        longer word, the inner ones cannot) and ``field=value`` tokens for
+        extra filters on indexed fields.
+        """
+        tokens = tokenize(self.text) if self.text else []
+        if self.message_pattern and _LITERAL_PATTERN.fullmatch(self.message_pattern):
+            tokens.extend(tokenize(" ".join(self.message_pattern.split()[1:-1])))
+        for key, value in self.extra_filters.items():
+            if key in indexed_fields:
+                tokens.append(f"{key}={value}")
+        return tokens
+
+class BoundedIndex:
+    """
+    Index from one field value to the most recent entries with that value.
+    
+    Each key holds a deque capped at ``max_entries_per_key`` and keys are kept
+    in least-recently-written order, so the index never tracks more than
+    ``max_keys`` values. Adding and removing an entry are both O(1).
+    
+    Capping makes a key's list incomplete for older entries (see
+    ``complete_from``); searches scan the buffer for those instead.
+    """
+    
+    def __init__(self, max_keys: int = 10000, max_entries_per_key: int = 1000):
+        self.max_keys = max_keys
+        self.max_entries_per_key = max_entries_per_key
+        self._keys: "OrderedDict[str, deque]" = OrderedDict()
+        # Sequence number of the entry each key was (re)created for
+        self._created: Dict[str, int] = {}
+        # Sequence numbers at which keys were evicted, oldest first
+        self._evictions: deque = deque()
+    
+    def add(self, key: str, entry: LogEntry):
+        """Index an entry under ``key``, evicting the least recently used key if full."""
+        entries = self._keys.get(key)
+        if entries is None:
+            if len(self._keys) >= self.max_keys:
+                evicted, _ = self._keys.popitem(last=False)
+                del self._created[evicted]
+                if not self._evictions or self._evictions[-1] != entry.sequence:
+                    self._evictions.append(entry.sequence)
+            entries = self._keys[key] = deque(maxlen=self.max_entries_per_key)
+            self._created[key] = entry.sequence
+        else:
+            self._keys.move_to_end(key)
+        entries.append(entry)
+    
+    def complete_from(self, key: str, oldest: int) -> float:
+        """
+        Sequence number from which the list for ``key`` holds every buffered
+        entry with that key, given the oldest buffered sequence number.
+        
+        Older entries may be missing if a key was evicted while they were
+        buffered (the evicted key may be this one) or the list is full.
+        """
+        # Evictions before the oldest buffered entry cannot hide anything
+        while self._evictions and self._evictions[0] <= oldest:
+            self._evictions.popleft()
+        
+        complete_from = oldest
+        created = self._created.get(key)
+        if self._evictions and (created is None or created > self._evictions[0]):
+            complete_from = created if created is not None else math.inf
+        
+        entries = self._keys.get(key)
+        if entries is not None and len(entries) == entries.maxlen:
+            complete_from = max(complete_from, entries[0].sequence)
+        return complete_from
+    
+    def discard(self, key: str, entry: LogEntry):
+        """
+        Drop an entry that is leaving the main buffer.
+        
+        Entries leave the buffer in the order they were added, so an entry
+        still in the index is always the oldest one under its key.
+        """
+        entries = self._keys.get(key)
+        if entries and entries[0] is entry:
+            entries.popleft()
+            if not entries:
+                del self._keys[key]
+                del self._created[key]
+    
+    def get(self, key: str, default=None):
+        return self._keys.get(key, default)
+    
+    def __getitem__(self, key: str) -> Iterable[LogEntry]:
+        return self._keys.get(key, ())
+    
+    def __contains__(self, key: str) -> bool:
+        return key in self._keys
+    
+    def __len__(self) -> int:
+        return len(self._keys)
+    
+    def keys(self):
+        return self._keys.keys()
+
+# Extra fields indexed for exact-match search, as "field=value" tokens
+DEFAULT_INDEXED_FIELDS = ('method', 'path', 'status_code', 'error_id', 'error_type', 'exception_type')
 
 class LogAggregator:
-    """Centralized log aggregation and management."""
+    """
+    Centralized log aggregation and management.
     
-    def __init__(self, max_entries: int = 100000, retention_hours: int = 168):  # 7 days
+    Entries live in a ring buffer of ``max_entries``; the field indices only
+    reference entries that are still in the buffer and are trimmed as entries
+    leave it, so memory is capped by ``max_entries`` and ``max_index_keys``.
+    
+    Message words and ``indexed_fields`` values also go into an inverted
+    index whose posting lists are in arrival order, so searches walk the
+    shortest relevant posting list from the newest end and stop once they
+    have a page of results. Tokens beyond ``max_token_keys`` evict the least
+    recently seen token; buffered entries a posting list no longer covers
+    are found by scanning the buffer.
+    """
+    
+    def __init__(self, max_entries: int = 100000, retention_hours: int = 168,  # 7 days
+                 max_index_keys: int = 10000, max_token_keys: int = 100000,
+                 indexed_fields: Tuple[str, ...] = DEFAULT_INDEXED_FIELDS):
         self.max_entries = max_entries
         self.retention_hours = retention_hours
+        self.indexed_fields = tuple(indexed_fields)
         self.entries: deque = deque(maxlen=max_entries)
-        self.indices: Dict[str, Dict[str, List[LogEntry]]] = {
-            'level': defaultdict(list),
-            'logger': defaultdict(list),
-            'correlation_id': defaultdict(list),
-            'trace_id': defaultdict(list)
+        self.indices: Dict[str, BoundedIndex] = {
+            'level': BoundedIndex(max_index_keys),
+            'logger': BoundedIndex(max_index_keys),
+            'correlation_id': BoundedIndex(max_index_keys),
+            'trace_id': BoundedIndex(max_index_keys)
         }
+        self.token_index = BoundedIndex(max_token_keys, max_entries_per_key=max_entries)
+        self._sequence = 0
+        # Entries are added from the log listener thread and read from request handlers
+        self._lock = threading.Lock()
         self.logger = get_logger("log_aggregator")
         self._cleanup_task = None
         
@@ -131,49 +280,86 @@ class LogAggregator:
             # No event loop running, cleanup task will be started later
             pass
     
+    @staticmethod
+    def _index_keys(entry: LogEntry) -> Iterable[Tuple[str, str]]:
+        yield 'level', entry.level.value
+        yield 'logger', entry.logger
+        yield 'correlation_id', entry.correlation_id
+        if entry.trace_id:
+            yield 'trace_id', entry.trace_id
+    
+    def _entry_tokens(self, entry: LogEntry) -> frozenset:
+        tokens = tokenize(entry.message)
+        for key in self.indexed_fields:
+            value = entry.extra_fields.get(key)
+            if value is not None:
+                tokens.append(f"{key}={value}")
+        return frozenset(tokens)
+    
+    def _evict(self, entry: LogEntry):
+        """Remove an entry that is leaving the ring buffer from the indices."""
+        for index_type, key in self._index_keys(entry):
+            self.indices[index_type].discard(key, entry)
+        for token in entry.tokens:
+            self.token_index.discard(token, entry)
+    
     def add_entry(self, entry: LogEntry):
         """Add a log entry to the aggregator."""
-        self.entries.append(entry)
-        
-        # Update indices
-        self.indices['level'][entry.level.value].append(entry)
-        self.indices['logger'][entry.logger].append(entry)
-        self.indices['correlation_id'][entry.correlation_id].append(entry)
-        if entry.trace_id:
-            self.indices['trace_id'][entry.trace_id].append(entry)
-        
-        # Limit index sizes
-        for index_type, index in self.indices.items():
-            for key, entries in index.items():
-                if len(entries) > 1000:  # Keep only recent 1000 entries per index key
-                    entries[:] = entries[-1000:]
+        entry.tokens = self._entry_tokens(entry)
+        with self._lock:
+            self._sequence += 1
+            entry.sequence = self._sequence
+            if len(self.entries) == self.max_entries:
+                self._evict(self.entries[0])
+            self.entries.append(entry)
+            
+            # Update indices
+            for index_type, key in self._index_keys(entry):
+                self.indices[index_type].add(key, entry)
+            for token in entry.tokens:
+                self.token_index.add(token, entry)
     
     def search(self, filter_obj: LogFilter, limit: int = 1000, offset: int = 0) -> List[LogEntry]:
-        """Search log entries with filtering."""
-        matching_entries = []
-        
-        # Use indices for efficient filtering when possible
-        candidate_entries = None
+        """
+        Search log entries with filtering, most recently added first.
         
-        if filter_obj.level:
-            candidate_entries = self.indices['level'][filter_obj.level.value]
-        elif filter_obj.correlation_id:
-            candidate_entries = self.indices['correlation_id'][filter_obj.correlation_id]
-        elif filter_obj.trace_id:
-            candidate_entries = self.indices['trace_id'][filter_obj.trace_id]
-        else:
-            candidate_entries = list(self.entries)
-        
-        # Apply all filters
-        for entry in candidate_entries:
-            if filter_obj.matches(entry):
-                matching_entries.append(entry)
+        Candidates come from the cheapest posting list among the filter's
+        level, correlation ID, trace ID and required tokens, followed by the
+        older buffered entries that list does not cover (if any); every
+        candidate is checked against the full filter and the walk stops after
+        ``offset + limit`` matches.
+        """
+        required_tokens = filter_obj.required_tokens(self.indexed_fields)
+        matching_entries = []
+        wanted = offset + limit
         
-        # Sort by timestamp (newest first)
-        matching_entries.sort(key=lambda x: x.timestamp, reverse=True)
+        with self._lock:
+            lookups = []
+            if filter_obj.level:
+                lookups.append((self.indices['level'], filter_obj.level.value))
+            if filter_obj.correlation_id:
+                lookups.append((self.indices['correlation_id'], filter_obj.correlation_id))
+            if filter_obj.trace_id:
+                lookups.append((self.indices['trace_id'], filter_obj.trace_id))
+            for token in required_tokens:
+                lookups.append((self.token_index, token))
+            
+            if lookups:
+                candidates = min((self._posting(index, key) for index, key in lookups),
+                                 key=lambda candidate: len(candidate[0]) + candidate[1])
+                candidate_entries = self._candidates(*candidates)
+            else:
+                candidate_entries = reversed(self.entries)
+            
+            # Apply all filters, newest first
+            for entry in candidate_entries:
+                if filter_obj.matches(entry):
+                    matching_entries.append(entry)
+                    if len(matching_entries) >= wanted:
+                        break
         
         # Apply pagination
-        return matching_entries[offset:offset + limit]
+        return matching_entries[offset:wanted]
     
     def get_stats(self, time_window_hours: int = 1) -> Dict[str, Any]:
         """Get log statistics for the specified time window."""
@@ -188,7 +374,8 @@ class LogAggregator:
             'time_window_hours': time_window_hours
         }
         
-        recent_entries = [e for e in self.entries if e.timestamp > cutoff_time]
+        with self._lock:
+            recent_entries = [e for e in self.entries if e.timestamp > cutoff_time]
         stats['total_entries'] = len(recent_entries)
         
         error_messages = defaultdict(int)
@@ -214,13 +401,36 @@ class LogAggregator:
         
         return stats
     
+    def _posting(self, index: BoundedIndex, key: str) -> Tuple[Iterable[LogEntry], int]:
+        """
+        Posting list for ``key`` and the number of older buffered entries it
+        may be missing (which have to be scanned).
+        """
+        if not self.entries:
+            return (), 0
+        oldest = self.entries[0].sequence
+        complete_from = min(index.complete_from(key, oldest), self._sequence + 1)
+        return index[key], int(complete_from) - oldest
+    
+    def _candidates(self, posting: Iterable[LogEntry], unindexed: int) -> Iterable[LogEntry]:
+        """Newest first: the posting list, then the buffered entries it does not cover."""
+        yield from reversed(posting)
+        if unindexed:
+            yield from islice(reversed(self.entries), len(self.entries) - unindexed, None)
+    
     def get_trace_logs(self, trace_id: str) -> List[LogEntry]:
         """Get all log entries for a specific trace."""
-        return self.indices['trace_id'].get(trace_id, [])
+        with self._lock:
+            entries = [entry for entry in self._candidates(*self._posting(self.indices['trace_id'], trace_id))
+                       if entry.trace_id == trace_id]
+        return entries[::-1]
     
     def get_correlation_logs(self, correlation_id: str) -> List[LogEntry]:
         """Get all log entries for a specific correlation ID."""
-        return self.indices['correlation_id'].get(correlation_id, [])
+        with self._lock:
+            posting = self._posting(self.indices['correlation_id'], correlation_id)
+            entries = [entry for entry in self._candidates(*posting) if entry.correlation_id == correlation_id]
+        return entries[::-1]
     
     def export_logs(self, filter_obj: LogFilter, format: str = 'json') -> Union[str, List[Dict]]:
         """Export filtered logs in specified format."""
@@ -256,19 +466,13 @@ class LogAggregator:
         """Remove old log entries beyond retention period."""
         cutoff_time = time.time() - (self.retention_hours * 3600)
         
-        # Clean main entries
-        original_count = len(self.entries)
-        self.entries = deque(
-            (entry for entry in self.entries if entry.timestamp > cutoff_time),
-            maxlen=self.max_entries
-        )
-        
-        # Clean indices
-        for index_type, index in self.indices.items():
-            for key, entries in index.items():
-                entries[:] = [e for e in entries if e.timestamp > cutoff_time]
+        # Entries arrive in time order, so expired ones are at the head of the buffer
+        cleaned_count = 0
+        with self._lock:
+            while self.entries and self.entries[0].timestamp <= cutoff_time:
+                self._evict(self.entries.popleft())
+                cleaned_count += 1
         
-        cleaned_count = original_count - len(self.entries)
         if cleaned_count > 0:
             self.logger.info(f"Cleaned up {cleaned_count} old log entries")
 
@@ -318,6 +522,19 @@ class AggregatingLogHandler:
 # Global log handler
 log_handler = AggregatingLogHandler(log_aggregator)
 
+class AggregatorLoggingHandler(logging.Handler):
+    """``logging`` handler feeding records to an AggregatingLogHandler (runs on the log listener thread)."""
+    
+    def __init__(self, handler: AggregatingLogHandler, level: int = logging.NOTSET):
+        super().__init__(level)
+        self.handler = handler
+        self.formatter = JSONFormatter()
+    
+    def emit(self, record: logging.LogRecord):
+        record_dict = self.formatter.to_dict(record)
+        record_dict['timestamp'] = record.created
+        self.handler.handle_log(record_dict)
+
 def search_logs(
     level: Optional[str] = None,
     logger_pattern: Optional[str] = None,
@@ -326,7 +543,8 @@ def search_logs(
     trace_id: Optional[str] = None,
     hours_back: Optional[int] = None,
     limit: int = 100,
-    offset: int = 0
+    offset: int = 0,
+    text: Optional[str] = None
 ) -> List[Dict[str, Any]]:
     """Convenience function to search logs."""
     filter_obj = LogFilter()
@@ -343,6 +561,9 @@ def search_logs(
     if message_pattern:
         filter_obj.message_pattern = message_pattern
     
+    if text:
+        filter_obj.text = text
+    
     if correlation_id:
         filter_obj.correlation_id = correlation_id
     
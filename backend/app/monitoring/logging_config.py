@@ -5,9 +5,15 @@ Provides structured logging with correlation IDs and performance metrics.
 
 import logging
 import logging.config
+import logging.handlers
+import copy
 import json
+import queue
+import sys
 import time
 import uuid
+import zlib
+from collections import defaultdict
 from typing import Dict, Any, Optional
 from contextvars import ContextVar
 from functools import wraps
@@ -23,10 +29,78 @@ class CorrelationFilter(logging.Filter):
         record.correlation_id = correlation_id.get() or 'no-correlation-id'
         return True
 
+class RequestLogSampler(logging.Filter):
+    """
+    Sample per-request log lines by route.
+    
+    Records that carry a ``path`` and are below WARNING are kept at the rate
+    of the longest matching route prefix (``default_rate`` otherwise). The
+    decision hashes the correlation ID, so the start and completion lines of
+    one request are kept or dropped together.
+    """
+    
+    def __init__(self, route_rates: Optional[Dict[str, float]] = None, default_rate: float = 1.0):
+        super().__init__()
+        self.route_rates = sorted((route_rates or {}).items(), key=lambda item: len(item[0]), reverse=True)
+        self.default_rate = default_rate
+        self.sampled_out = 0
+    
+    def rate_for(self, path: str) -> float:
+        for prefix, rate in self.route_rates:
+            if path.startswith(prefix):
+                return rate
+        return self.default_rate
+    
+    def filter(self, record):
+        path = getattr(record, 'path', None)
+        if path is None or record.levelno >= logging.WARNING:
+            return True
+        
+        rate = self.rate_for(path)
+        if rate >= 1.0:
+            return True
+        key = getattr(record, 'correlation_id', None) or correlation_id.get() or ''
+        if zlib.crc32(key.encode('utf-8')) / 0xFFFFFFFF < rate:
+            return True
+        
+        self.sampled_out += 1
+        return False
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hot-path handler that hands records to a background listener.
+    
+    Only the message is resolved on the calling thread; JSON formatting,
+    aggregation and I/O run on the ``QueueListener`` thread. When the bounded
+    queue is full the record is dropped and counted instead of blocking.
+    """
+    
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped: Dict[str, int] = defaultdict(int)
+    
+    def prepare(self, record):
+        # Resolve args now, since the objects they reference may change later
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+    
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped[record.levelname] += 1
+
 class JSONFormatter(logging.Formatter):
     """JSON formatter for structured logging."""
     
     def format(self, record):
+        return json.dumps(self.to_dict(record))
+    
+    def to_dict(self, record) -> Dict[str, Any]:
+        """Structured fields of a record, including its extras."""
         log_entry = {
             'timestamp': self.formatTime(record),
             'level': record.levelname,
@@ -52,19 +126,62 @@ class JSONFormatter(logging.Formatter):
                           'filename', 'module', 'lineno', 'funcName', 'created', 
                           'msecs', 'relativeCreated', 'thread', 'threadName', 
                           'processName', 'process', 'getMessage', 'exc_info', 
-                          'exc_text', 'stack_info', 'correlation_id']:
+                          'exc_text', 'stack_info', 'correlation_id', 'message']:
                 log_entry[key] = value
         
-        return json.dumps(log_entry)
+        return log_entry
 
-def setup_logging(log_level: str = "INFO", enable_json: bool = True) -> None:
+class LoggingPipeline:
+    """Queue handler plus the listener thread that drains it."""
+    
+    def __init__(self, handlers: list, level: str, queue_size: int,
+                 route_sample_rates: Optional[Dict[str, float]] = None):
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.sampler = RequestLogSampler(route_sample_rates)
+        self.handler = NonBlockingQueueHandler(self.queue)
+        self.handler.setLevel(level)
+        self.handler.addFilter(CorrelationFilter())
+        self.handler.addFilter(self.sampler)
+        self.listener = logging.handlers.QueueListener(self.queue, *handlers, respect_handler_level=True)
+        self.running = False
+    
+    def start(self):
+        self.listener.start()
+        self.running = True
+    
+    def stop(self):
+        """Flush queued records and stop the listener thread."""
+        if self.running:
+            self.running = False
+            self.listener.stop()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'queued': self.queue.qsize(),
+            'dropped': dict(self.handler.dropped),
+            'sampled_out': self.sampler.sampled_out
+        }
+
+# Active asynchronous pipeline, if setup_logging enabled one
+logging_pipeline: Optional[LoggingPipeline] = None
+
+def setup_logging(log_level: str = "INFO", enable_json: bool = True, async_logging: bool = True,
+                  queue_size: int = 10000, route_sample_rates: Optional[Dict[str, float]] = None,
+                  aggregate: bool = True) -> None:
     """
     Configure application logging.
     
     Args:
         log_level: Logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
         enable_json: Whether to use JSON formatting
+        async_logging: Enqueue records on the hot path and format/write them
+            on a background listener thread
+        queue_size: Records buffered before new ones are dropped (and counted)
+        route_sample_rates: Path prefix -> fraction of request log lines kept
+        aggregate: Also feed records into the searchable log aggregator
     """
+    global logging_pipeline
+    stop_logging()
     
     config = {
         'version': 1,
@@ -115,6 +232,31 @@ def setup_logging(log_level: str = "INFO", enable_json: bool = True) -> None:
     }
     
     logging.config.dictConfig(config)
+    
+    if not async_logging:
+        return
+    
+    # Same console output, moved behind a queue
+    console = logging.StreamHandler(sys.stdout)
+    console.setLevel(log_level)
+    console.setFormatter(JSONFormatter() if enable_json else logging.Formatter(
+        config['formatters']['standard']['format']))
+    handlers = [console]
+    if aggregate:
+        from .log_aggregation import AggregatorLoggingHandler, log_handler
+        handlers.append(AggregatorLoggingHandler(log_handler))
+    
+    logging_pipeline = LoggingPipeline(handlers, log_level, queue_size, route_sample_rates)
+    for name in [None, *config['loggers']]:
+        logging.getLogger(name).handlers = [logging_pipeline.handler]
+    logging_pipeline.start()
+
+def stop_logging() -> None:
+    """Flush and stop the asynchronous logging pipeline, if one is running."""
+    global logging_pipeline
+    if logging_pipeline is not None:
+        logging_pipeline.stop()
+        logging_pipeline = None
 
 def get_logger(name: str) -> logging.Logger:
     """Get a logger instance with the specified name."""
@@ -4,8 +4,11 @@ Provides detailed metrics for p95/p99 latency, error rates, cache hit rates, and
 """
 
 import time
+import math
 import asyncio
-from typing import Dict, List, Any, Optional, Tuple
+import threading
+from bisect import bisect_left
+from typing import Dict, List, Any, Iterator, Optional, Tuple
 from dataclasses import dataclass, field
 from collections import defaultdict, deque
 from enum import Enum
@@ -14,6 +17,10 @@ import json
 from datetime import datetime, timedelta
 
 from .logging_config import get_logger
+from .shared_metrics import (
+    LIVE_SAMPLE, SharedMetricsSegment, SharedRing, decode_key, encode_key, read_shared_rings,
+    segment_from_environment
+)
 
 class MetricType(Enum):
     """Types of metrics."""
@@ -29,51 +36,171 @@ class MetricPoint:
     value: float
     tags: Dict[str, str] = field(default_factory=dict)
 
+# Default buckets for latency (in milliseconds)
+DEFAULT_LATENCY_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
 @dataclass
 class HistogramBucket:
     """Histogram bucket for latency measurements."""
     upper_bound: float
     count: int = 0
 
+class QuantileSketch:
+    """
+    Mergeable quantile sketch with bounded relative error.
+    
+    Positive values are counted in logarithmic bins whose width grows by a
+    factor of ``gamma``, so any quantile is reported within
+    ``relative_accuracy`` of the true value. Memory depends on the range of
+    values rather than their number, is capped at ``max_bins`` by folding the
+    lowest bins together, and sketches from different workers merge by adding
+    their bin counts.
+    """
+    
+    def __init__(self, relative_accuracy: float = 0.01, max_bins: int = 2048):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.max_bins = max_bins
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0  # Values <= 0 (latencies are never negative)
+        self.count = 0
+        self.min = float('inf')
+        self.max = float('-inf')
+    
+    def add(self, value: float, count: int = 1):
+        """Record a value."""
+        self.count += count
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        
+        if value <= 0:
+            self.zero_count += count
+            return
+        
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self.bins[index] = self.bins.get(index, 0) + count
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+    
+    def _collapse(self):
+        """Fold the lowest bins into one so memory stays bounded."""
+        indexes = sorted(self.bins)
+        excess = len(indexes) - self.max_bins + 1
+        target = indexes[excess]
+        for index in indexes[:excess]:
+            self.bins[target] += self.bins.pop(index)
+    
+    def merge(self, other: 'QuantileSketch'):
+        """Fold another sketch (with the same accuracy) into this one."""
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+    
+    def quantile(self, q: float) -> float:
+        """Estimate the q-quantile (0 <= q <= 1)."""
+        return self.quantiles([q])[0]
+    
+    def quantiles(self, qs: List[float]) -> List[float]:
+        """Estimate several quantiles in one pass over the bins."""
+        if self.count == 0:
+            return [0.0 for _ in qs]
+        
+        ranks = sorted((min(int(q * self.count), self.count - 1), i) for i, q in enumerate(qs))
+        results = [self.max] * len(qs)
+        pending = iter(ranks)
+        rank, slot = next(pending)
+        
+        # Values <= 0 sit below every bin
+        seen = self.zero_count
+        while rank < seen:
+            results[slot] = min(max(0.0, self.min), self.max)
+            rank, slot = next(pending, (None, None))
+            if rank is None:
+                return results
+        
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            while rank < seen:
+                # Midpoint of the bin (gamma^(i-1), gamma^i] in relative terms
+                estimate = 2 * self.gamma ** index / (self.gamma + 1)
+                results[slot] = min(max(estimate, self.min), self.max)
+                rank, slot = next(pending, (None, None))
+                if rank is None:
+                    return results
+        
+        return results
+
 class Histogram:
-    """Histogram for tracking latency distributions."""
+    """
+    Histogram for tracking latency distributions.
+    
+    Observations land in one fixed bucket (found by bisection) and in a
+    ``QuantileSketch`` for percentiles, so recording is O(log buckets) and
+    memory does not grow with traffic. Bucket counts are exported cumulatively
+    as Prometheus expects, and histograms with the same buckets can be merged.
+    """
     
-    def __init__(self, buckets: List[float] = None):
+    def __init__(self, buckets: List[float] = None, relative_accuracy: float = 0.01):
         if buckets is None:
-            # Default buckets for latency (in milliseconds)
-            buckets = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+            buckets = DEFAULT_LATENCY_BUCKETS
         
-        self.buckets = [HistogramBucket(bound) for bound in sorted(buckets)]
-        self.buckets.append(HistogramBucket(float('inf')))  # +Inf bucket
+        self.bounds = sorted(buckets)
+        # Per-bucket (non-cumulative) counts; the last slot is the +Inf bucket
+        self.bucket_counts = [0] * (len(self.bounds) + 1)
+        self.sketch = QuantileSketch(relative_accuracy)
         self.sum = 0.0
         self.count = 0
-        self.values = deque(maxlen=10000)  # Keep recent values for percentile calculation
     
     def observe(self, value: float):
         """Record a value in the histogram."""
         self.sum += value
         self.count += 1
-        self.values.append(value)
+        self.bucket_counts[bisect_left(self.bounds, value)] += 1
+        self.sketch.add(value)
+    
+    def merge(self, other: 'Histogram'):
+        """Fold another histogram with the same buckets into this one."""
+        if other.bounds != self.bounds:
+            raise ValueError("Cannot merge histograms with different buckets")
         
-        # Update buckets
-        for bucket in self.buckets:
-            if value <= bucket.upper_bound:
-                bucket.count += 1
+        for i, count in enumerate(other.bucket_counts):
+            self.bucket_counts[i] += count
+        self.sketch.merge(other.sketch)
+        self.sum += other.sum
+        self.count += other.count
     
     def get_percentile(self, percentile: float) -> float:
-        """Calculate percentile from recent values."""
-        if not self.values:
-            return 0.0
-        
-        sorted_values = sorted(self.values)
-        index = int((percentile / 100.0) * len(sorted_values))
-        if index >= len(sorted_values):
-            index = len(sorted_values) - 1
-        return sorted_values[index]
+        """Estimate a percentile from the quantile sketch."""
+        return self.sketch.quantile(percentile / 100.0)
+    
+    def get_percentiles(self, percentiles: List[float]) -> List[float]:
+        """Estimate several percentiles with a single pass over the sketch."""
+        return self.sketch.quantiles([p / 100.0 for p in percentiles])
     
     def get_bucket_counts(self) -> List[Tuple[float, int]]:
-        """Get bucket counts for histogram export."""
-        return [(bucket.upper_bound, bucket.count) for bucket in self.buckets]
+        """Get cumulative bucket counts for histogram export."""
+        counts = []
+        cumulative = 0
+        for bound, count in zip(self.bounds + [float('inf')], self.bucket_counts):
+            cumulative += count
+            counts.append((bound, cumulative))
+        return counts
+    
+    @property
+    def buckets(self) -> List[HistogramBucket]:
+        """Cumulative buckets, including the +Inf bucket."""
+        return [HistogramBucket(bound, count) for bound, count in self.get_bucket_counts()]
 
 class Counter:
     """Counter metric for tracking totals."""
@@ -117,15 +244,331 @@ class Gauge:
         """Get current gauge value."""
         return self.value
 
-class MetricsRegistry:
-    """Registry for all application metrics."""
+class ShardedCounter:
+    """
+    Counter child whose increments go to a per-thread shard.
+    
+    Each thread adds to its own cell, so concurrent request handlers never
+    contend on a shared value; the shards are summed when the metric is read.
+    """
     
     def __init__(self):
+        self._local = threading.local()
+        self._shards: List[List[float]] = []
+        self._lock = threading.Lock()
+    
+    def _shard(self) -> List[float]:
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = [0.0]
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+    
+    def inc(self, amount: float = 1.0):
+        """Increment the counter."""
+        self._shard()[0] += amount
+    
+    def get_value(self) -> float:
+        """Sum of all shards."""
+        with self._lock:
+            shards = list(self._shards)
+        return sum(shard[0] for shard in shards)
+
+class ShardedHistogram:
+    """Histogram child with a per-thread ``Histogram`` shard, merged on read."""
+    
+    def __init__(self, buckets: List[float]):
+        self.bounds = buckets
+        self._local = threading.local()
+        self._shards: List[Histogram] = []
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float):
+        """Record a value in this thread's shard."""
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = Histogram(self.bounds)
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        shard.observe(value)
+    
+    def collect(self) -> Histogram:
+        """Merge all shards into a single histogram snapshot."""
+        with self._lock:
+            shards = list(self._shards)
+        merged = Histogram(self.bounds)
+        for shard in shards:
+            merged.merge(shard)
+        return merged
+
+class SharedCounter:
+    """Counter child stored in the worker's shared metrics segment."""
+    
+    def __init__(self, segment: SharedMetricsSegment, key: str):
+        self.segment = segment
+        self.key = key
+        segment.add(key, 0.0)
+    
+    def inc(self, amount: float = 1.0):
+        """Increment the counter."""
+        self.segment.add(self.key, amount)
+    
+    def get_value(self) -> float:
+        """This worker's value (the registry reads the aggregate)."""
+        return self.segment.get(self.key)
+
+class SharedGauge(Gauge):
+    """Gauge child stored in the shared segment; worker values are summed on read."""
+    
+    def __init__(self, segment: SharedMetricsSegment, key: str):
+        super().__init__()
+        self.segment = segment
+        self.key = key
+        segment.set(key, 0.0)
+    
+    def set(self, value: float):
+        super().set(value)
+        self.segment.set(self.key, value)
+    
+    def increment(self, amount: float = 1.0):
+        super().increment(amount)
+        self.segment.add(self.key, amount)
+    
+    def decrement(self, amount: float = 1.0):
+        super().decrement(amount)
+        self.segment.add(self.key, -amount)
+
+class SharedHistogram:
+    """
+    Histogram child stored in the shared segment.
+    
+    Bucket counts, sum, count and the quantile sketch bins each live under
+    their own key, so summing keys across workers yields the merged histogram.
+    """
+    
+    def __init__(self, segment: SharedMetricsSegment, name: str, values: Tuple[str, ...],
+                 buckets: List[float], relative_accuracy: float = 0.01):
+        self.segment = segment
+        self.name = name
+        self.values = values
+        self.bounds = buckets
+        self._log_gamma = QuantileSketch(relative_accuracy)._log_gamma
+        self._bucket_keys = [encode_key(name, values, 'bucket', i) for i in range(len(buckets) + 1)]
+        self._sum_key = encode_key(name, values, 'sum')
+        self._count_key = encode_key(name, values, 'count')
+        self._zero_key = encode_key(name, values, 'zero')
+        self._bin_keys: Dict[int, str] = {}
+        segment.add_many([(key, 0.0) for key in self._bucket_keys + [self._sum_key, self._count_key]])
+    
+    def observe(self, value: float):
+        """Record a value in this worker's segment."""
+        if value <= 0:
+            sketch_key = self._zero_key
+        else:
+            index = math.ceil(math.log(value) / self._log_gamma)
+            sketch_key = self._bin_keys.get(index)
+            if sketch_key is None:
+                sketch_key = self._bin_keys.setdefault(index, encode_key(self.name, self.values, 'bin', index))
+        
+        self.segment.add_many((
+            (self._bucket_keys[bisect_left(self.bounds, value)], 1.0),
+            (self._sum_key, value),
+            (self._count_key, 1.0),
+            (sketch_key, 1.0),
+        ))
+    
+    def collect(self) -> Histogram:
+        """This worker's histogram (the registry reads the aggregate)."""
+        samples = {}
+        for key in list(self._bin_keys.values()) + self._bucket_keys + [
+                self._sum_key, self._count_key, self._zero_key]:
+            _, _, sample, index = decode_key(key)
+            samples[(sample, index)] = self.segment.get(key)
+        return _histogram_from_samples(self.bounds, samples)
+
+def _histogram_from_samples(buckets: List[float], samples: Dict[Tuple[str, Any], float]) -> Histogram:
+    """Rebuild a histogram from its shared-segment samples."""
+    histogram = Histogram(buckets)
+    for i in range(len(histogram.bucket_counts)):
+        histogram.bucket_counts[i] = int(samples.get(('bucket', i), 0))
+    histogram.sum = samples.get(('sum', None), 0.0)
+    histogram.count = int(samples.get(('count', None), 0))
+    
+    sketch = histogram.sketch
+    sketch.zero_count = int(samples.get(('zero', None), 0))
+    for (sample, index), count in samples.items():
+        if sample == 'bin' and count:
+            sketch.bins[int(index)] = int(count)
+    sketch.count = sketch.zero_count + sum(sketch.bins.values())
+    # Exact extremes are not shared, so bound them by the outermost bins
+    if sketch.bins:
+        sketch.min = 0.0 if sketch.zero_count else sketch.gamma ** (min(sketch.bins) - 1)
+        sketch.max = sketch.gamma ** max(sketch.bins)
+    elif sketch.zero_count:
+        sketch.min = sketch.max = 0.0
+    if len(sketch.bins) > sketch.max_bins:
+        sketch._collapse()
+    return histogram
+
+class MetricFamily:
+    """
+    A named metric with a fixed set of label names.
+    
+    ``labels()`` returns the child for one combination of label values and
+    caches it, so callers can bind children once (at import or first use)
+    and record on the hot path without building metric names.
+    """
+    
+    metric_type = MetricType.COUNTER
+    
+    def __init__(self, name: str, documentation: str = "", labelnames: Tuple[str, ...] = (),
+                 segment: Optional[SharedMetricsSegment] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.segment = segment
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+    
+    def _new_child(self, values: Tuple[str, ...]):
+        raise NotImplementedError
+    
+    def labels(self, *values: str, **labels: str):
+        """Get (or create) the child for a set of label values."""
+        if labels:
+            values = tuple(str(labels[name]) for name in self.labelnames)
+        
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._new_child(values)
+        return child
+    
+    def children(self) -> List[Tuple[Tuple[str, ...], Any]]:
+        """Snapshot of (label values, child) pairs."""
+        return list(self._children.items())
+
+class CounterFamily(MetricFamily):
+    """Family of sharded counters."""
+    
+    metric_type = MetricType.COUNTER
+    
+    def _new_child(self, values: Tuple[str, ...]):
+        if self.segment is not None:
+            return SharedCounter(self.segment, encode_key(self.name, values))
+        return ShardedCounter()
+
+class GaugeFamily(MetricFamily):
+    """
+    Family of gauges (last write wins, so they are not sharded).
+    
+    In multi-process mode the aggregated value is the sum over live workers,
+    which suits per-worker quantities such as in-flight requests or pool sizes.
+    """
+    
+    metric_type = MetricType.GAUGE
+    
+    def _new_child(self, values: Tuple[str, ...]) -> Gauge:
+        if self.segment is not None:
+            return SharedGauge(self.segment, encode_key(self.name, values, LIVE_SAMPLE))
+        return Gauge()
+
+class HistogramFamily(MetricFamily):
+    """Family of sharded histograms sharing one set of buckets."""
+    
+    metric_type = MetricType.HISTOGRAM
+    
+    def __init__(self, name: str, documentation: str = "", labelnames: Tuple[str, ...] = (),
+                 segment: Optional[SharedMetricsSegment] = None, buckets: List[float] = None):
+        super().__init__(name, documentation, labelnames, segment)
+        self.buckets = sorted(buckets) if buckets else list(DEFAULT_LATENCY_BUCKETS)
+    
+    def _new_child(self, values: Tuple[str, ...]):
+        if self.segment is not None:
+            return SharedHistogram(self.segment, self.name, values, self.buckets)
+        return ShardedHistogram(self.buckets)
+
+def _format_value(value: float) -> str:
+    """Format a sample value the way the Prometheus text format expects."""
+    if value == float('inf'):
+        return "+Inf"
+    if value == float('-inf'):
+        return "-Inf"
+    if value != value:
+        return "NaN"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _escape_label_value(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape_label_value(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _parse_legacy_name(metric_name: str) -> Tuple[str, Tuple[str, ...], Tuple[str, ...]]:
+    """Split a ``name{k=v,...}`` registry key into its name and labels."""
+    if not metric_name.endswith('}') or '{' not in metric_name:
+        return metric_name, (), ()
+    name, _, tag_part = metric_name[:-1].partition('{')
+    pairs = [pair.partition('=') for pair in tag_part.split(',') if pair]
+    return name, tuple(key for key, _, _ in pairs), tuple(value for _, _, value in pairs)
+
+class MetricsRegistry:
+    """
+    Registry for all application metrics.
+    
+    With a ``SharedMetricsSegment`` the labeled families write to this
+    worker's memory-mapped file and exports report the sum over all workers.
+    """
+    
+    def __init__(self, segment: Optional[SharedMetricsSegment] = None):
+        self.segment = segment
         self.counters: Dict[str, Counter] = {}
         self.histograms: Dict[str, Histogram] = {}
         self.gauges: Dict[str, Gauge] = {}
+        self.families: Dict[str, MetricFamily] = {}
+        self._families_lock = threading.Lock()
         self.logger = get_logger("metrics_registry")
     
+    def _get_family(self, family_class, name: str, documentation: str,
+                    labelnames: Tuple[str, ...], **kwargs) -> MetricFamily:
+        family = self.families.get(name)
+        if family is None:
+            with self._families_lock:
+                family = self.families.get(name)
+                if family is None:
+                    family = family_class(name, documentation, labelnames, self.segment, **kwargs)
+                    self.families[name] = family
+        if not isinstance(family, family_class) or family.labelnames != tuple(labelnames):
+            raise ValueError(f"Metric {name} is already registered with a different type or labels")
+        return family
+    
+    def counter(self, name: str, documentation: str = "",
+                labelnames: Tuple[str, ...] = ()) -> CounterFamily:
+        """Get or create a labeled counter family."""
+        return self._get_family(CounterFamily, name, documentation, labelnames)
+    
+    def gauge(self, name: str, documentation: str = "",
+              labelnames: Tuple[str, ...] = ()) -> GaugeFamily:
+        """Get or create a labeled gauge family."""
+        return self._get_family(GaugeFamily, name, documentation, labelnames)
+    
+    def histogram(self, name: str, documentation: str = "", labelnames: Tuple[str, ...] = (),
+                  buckets: List[float] = None) -> HistogramFamily:
+        """Get or create a labeled histogram family."""
+        return self._get_family(HistogramFamily, name, documentation, labelnames, buckets=buckets)
+    
     def get_counter(self, name: str) -> Counter:
         """Get or create a counter metric."""
         if name not in self.counters:
@@ -188,14 +631,15 @@ class MetricsRegistry:
         
         # Export histograms
         for name, histogram in self.histograms.items():
+            p50, p95, p99, p99_9 = histogram.get_percentiles([50, 95, 99, 99.9])
             metrics['histograms'][name] = {
                 'count': histogram.count,
                 'sum': histogram.sum,
                 'buckets': histogram.get_bucket_counts(),
-                'p50': histogram.get_percentile(50),
-                'p95': histogram.get_percentile(95),
-                'p99': histogram.get_percentile(99),
-                'p99_9': histogram.get_percentile(99.9)
+                'p50': p50,
+                'p95': p95,
+                'p99': p99,
+                'p99_9': p99_9
             }
         
         # Export gauges
@@ -205,10 +649,117 @@ class MetricsRegistry:
                 'last_updated': gauge.last_updated
             }
         
+        # Export labeled families under the same name{k=v} keys
+        for family, samples in self._family_samples():
+            for values, sample in samples:
+                name = self._build_metric_name(family.name, dict(zip(family.labelnames, values)))
+                if family.metric_type is MetricType.COUNTER:
+                    metrics['counters'][name] = {'value': sample, 'last_updated': None}
+                elif family.metric_type is MetricType.GAUGE:
+                    metrics['gauges'][name] = {'value': sample, 'last_updated': None}
+                else:
+                    histogram = sample
+                    p50, p95, p99, p99_9 = histogram.get_percentiles([50, 95, 99, 99.9])
+                    metrics['histograms'][name] = {
+                        'count': histogram.count,
+                        'sum': histogram.sum,
+                        'buckets': histogram.get_bucket_counts(),
+                        'p50': p50,
+                        'p95': p95,
+                        'p99': p99,
+                        'p99_9': p99_9
+                    }
+        
         return metrics
+    
+    def generate_exposition(self) -> Iterator[str]:
+        """
+        Render all metrics in the Prometheus text exposition format.
+        
+        Yields one chunk per metric so the scrape response can be streamed
+        instead of built as a single string.
+        """
+        for family, samples in self._family_samples():
+            lines = []
+            if family.documentation:
+                lines.append(f"# HELP {family.name} {family.documentation}")
+            lines.append(f"# TYPE {family.name} {family.metric_type.value}")
+            
+            for values, sample in samples:
+                if family.metric_type is MetricType.HISTOGRAM:
+                    lines.extend(self._histogram_lines(family.name, family.labelnames, values, sample))
+                else:
+                    labels = _format_labels(family.labelnames, values)
+                    lines.append(f"{family.name}{labels} {_format_value(sample)}")
+            yield "\n".join(lines) + "\n"
+        
+        # Metrics recorded through the name{k=v} API, grouped by base name
+        legacy = ((MetricType.COUNTER, self.counters), (MetricType.GAUGE, self.gauges),
+                  (MetricType.HISTOGRAM, self.histograms))
+        for metric_type, metrics in legacy:
+            grouped: Dict[str, List[str]] = defaultdict(list)
+            for metric_name, metric in list(metrics.items()):
+                name, labelnames, values = _parse_legacy_name(metric_name)
+                if name in self.families:
+                    continue
+                if metric_type is MetricType.HISTOGRAM:
+                    grouped[name].extend(self._histogram_lines(name, labelnames, values, metric))
+                else:
+                    labels = _format_labels(labelnames, values)
+                    grouped[name].append(f"{name}{labels} {_format_value(metric.get_value())}")
+            
+            for name, lines in grouped.items():
+                yield f"# TYPE {name} {metric_type.value}\n" + "\n".join(lines) + "\n"
+    
+    def _family_samples(self) -> Iterator[Tuple[MetricFamily, List[Tuple[Tuple[str, ...], Any]]]]:
+        """
+        Current value of every family child: a float for counters and gauges,
+        a ``Histogram`` for histograms.
+        
+        In multi-process mode the values are read from all worker segments in
+        one pass, so children created only by other workers are included.
+        """
+        families = list(self.families.values())
+        if self.segment is None:
+            for family in families:
+                yield family, [
+                    (values, child.collect() if family.metric_type is MetricType.HISTOGRAM
+                     else child.get_value())
+                    for values, child in family.children()
+                ]
+            return
+        
+        grouped: Dict[str, Dict[Tuple[str, ...], Dict[Tuple[str, Any], float]]] = defaultdict(dict)
+        for key, value in self.segment.collect().items():
+            name, values, sample, index = decode_key(key)
+            grouped[name].setdefault(values, {})[(sample, index)] = value
+        
+        for family in families:
+            children = sorted(grouped.get(family.name, {}).items())
+            if family.metric_type is MetricType.HISTOGRAM:
+                yield family, [(values, _histogram_from_samples(family.buckets, samples))
+                               for values, samples in children]
+            else:
+                # Gauges of exited workers are not in the totals at all
+                sample = LIVE_SAMPLE if family.metric_type is MetricType.GAUGE else 'value'
+                yield family, [(values, samples[(sample, None)])
+                               for values, samples in children if (sample, None) in samples]
+    
+    @staticmethod
+    def _histogram_lines(name: str, labelnames: Tuple[str, ...], values: Tuple[str, ...],
+                         histogram: Histogram) -> List[str]:
+        """Bucket, sum and count samples for one histogram."""
+        lines = []
+        for bound, count in histogram.get_bucket_counts():
+            labels = _format_labels(labelnames, values, f'le="{_format_value(bound)}"')
+            lines.append(f"{name}_bucket{labels} {count}")
+        labels = _format_labels(labelnames, values)
+        lines.append(f"{name}_sum{labels} {_format_value(histogram.sum)}")
+        lines.append(f"{name}_count{labels} {histogram.count}")
+        return lines
 
-# Global metrics registry
-metrics_registry = MetricsRegistry()
+# Global metrics registry (shared across workers when METRICS_MULTIPROCESS_DIR is set)
+metrics_registry = MetricsRegistry(segment_from_environment())
 
 @dataclass
 class SLOTarget:
@@ -232,14 +783,88 @@ class SLOStatus:
     measurement_period_end: datetime
     total_measurements: int
     successful_measurements: int
+    burn_rates: Dict[str, float] = field(default_factory=dict)  # Error budget burn rate per window
+
+# Windows for multi-window burn-rate alerting (short windows confirm the long ones)
+BURN_RATE_WINDOWS = {"5m": 300, "30m": 1800, "1h": 3600, "6h": 21600}
+
+class SLOWindow:
+    """
+    Good/bad measurement counts for one SLO in a ring of one-minute buckets.
+    
+    Recording is O(1) and a query is one pass over the ring, so the cost of
+    evaluating an SLO depends on its window length, not on traffic.
+    """
+    
+    BUCKET_SECONDS = 60
+    
+    def __init__(self, window_hours: float):
+        size = max(1, int(window_hours * 3600 // self.BUCKET_SECONDS))
+        self._index = [-1] * size
+        self._good = [0] * size
+        self._bad = [0] * size
+    
+    @property
+    def size(self) -> int:
+        """Number of one-minute buckets in the ring."""
+        return len(self._index)
+    
+    def record(self, timestamp: float, good: bool):
+        index = int(timestamp // self.BUCKET_SECONDS)
+        slot = index % len(self._index)
+        if self._index[slot] != index:
+            if self._index[slot] > index:
+                return  # Older than the window
+            self._index[slot] = index
+            self._good[slot] = self._bad[slot] = 0
+        if good:
+            self._good[slot] += 1
+        else:
+            self._bad[slot] += 1
+    
+    def totals(self, windows: List[float], now: float) -> List[Tuple[int, int]]:
+        """(good, bad) counts for each window in seconds, capped at the ring length."""
+        current = int(now // self.BUCKET_SECONDS)
+        spans = [math.ceil(seconds / self.BUCKET_SECONDS) for seconds in windows]
+        good = [0] * len(windows)
+        bad = [0] * len(windows)
+        for index, good_count, bad_count in zip(self._index, self._good, self._bad):
+            age = current - index
+            if index < 0 or age < 0:
+                continue
+            for i, span in enumerate(spans):
+                if age < span:
+                    good[i] += good_count
+                    bad[i] += bad_count
+        return list(zip(good, bad))
 
 class SLOMonitor:
-    """Service Level Objective monitoring."""
+    """
+    Service Level Objective monitoring.
+    
+    Measurements are folded into per-SLO ``SLOWindow`` buckets as they are
+    recorded. ``evaluate`` computes every status in one pass per SLO and
+    caches it; readers get the cached status while it is fresher than
+    ``max_status_age`` (the background ``SLOEvaluator`` keeps it fresh).
     
-    def __init__(self, metrics_registry: MetricsRegistry):
+    When the registry has a shared segment, the buckets live in it as
+    ``SharedRing`` pairs (good, bad) and every worker evaluates the SLOs
+    over the measurements of all workers.
+    """
+    
+    def __init__(self, metrics_registry: MetricsRegistry, max_status_age: float = 60.0):
         self.metrics_registry = metrics_registry
         self.slo_targets: Dict[str, SLOTarget] = {}
-        self.measurement_history: Dict[str, deque] = defaultdict(lambda: deque(maxlen=10000))
+        self.windows: Dict[str, SLOWindow] = {}
+        self.segment = metrics_registry.segment
+        self.shared_windows: Dict[str, Tuple[SharedRing, SharedRing]] = {}
+        self.max_status_age = max_status_age
+        self._status_cache: Dict[str, SLOStatus] = {}
+        self.last_evaluated: Optional[float] = None
+        self._lock = threading.Lock()
+        # Outcome totals go through the registry so they aggregate across workers
+        self.measurements_total = self.metrics_registry.counter(
+            "slo_measurements_total", "SLO measurements by outcome", ("slo", "outcome"))
         self.logger = get_logger("slo_monitor")
         
         # Define default SLOs
@@ -294,7 +919,16 @@ class SLOMonitor:
     
     def add_slo_target(self, target: SLOTarget):
         """Add an SLO target to monitor."""
-        self.slo_targets[target.name] = target
+        with self._lock:
+            self.slo_targets[target.name] = target
+            self.windows[target.name] = SLOWindow(target.measurement_window_hours)
+            if self.segment is not None:
+                size = self.windows[target.name].size
+                self.shared_windows[target.name] = tuple(
+                    SharedRing(self.segment, "slo_window", (target.name, outcome), size, SLOWindow.BUCKET_SECONDS)
+                    for outcome in ("good", "bad")
+                )
+            self.last_evaluated = None
         self.logger.info(f"Added SLO target: {target.name} - {target.description}")
     
     def record_measurement(self, slo_name: str, value: float, timestamp: float = None):
@@ -302,39 +936,71 @@ class SLOMonitor:
         if timestamp is None:
             timestamp = time.time()
         
-        if slo_name in self.slo_targets:
-            self.measurement_history[slo_name].append((timestamp, value))
+        target = self.slo_targets.get(slo_name)
+        if target is not None:
+            good = self._is_successful(target, value)
+            shared = self.shared_windows.get(slo_name)
+            if shared is not None:
+                shared[0 if good else 1].add(timestamp)
+            else:
+                with self._lock:
+                    self.windows[slo_name].record(timestamp, good)
+            self.measurements_total.labels(slo_name, "good" if good else "bad").inc()
+    
+    @staticmethod
+    def _is_successful(target: SLOTarget, value: float) -> bool:
+        """Whether a measurement meets the target threshold."""
+        if target.comparison == "lt":
+            return value < target.threshold_value
+        if target.comparison == "gt":
+            return value > target.threshold_value
+        if target.comparison == "eq":
+            return value == target.threshold_value
+        return False
+    
+    @staticmethod
+    def _burn_rate(target: SLOTarget, good: int, bad: int) -> float:
+        """How many times faster than sustainable the error budget is being spent."""
+        total = good + bad
+        if total == 0:
+            return 0.0
+        budget = 1 - target.target_percentage / 100
+        if budget <= 0:
+            return math.inf if bad else 0.0
+        return (bad / total) / budget
+    
+    def _window_totals(self, slo_name: str, windows: List[float], now: float,
+                       rings=None) -> List[Tuple[int, int]]:
+        """(good, bad) counts per window, over all workers when the buckets are shared."""
+        shared = self.shared_windows.get(slo_name)
+        if shared is None:
+            with self._lock:
+                return self.windows[slo_name].totals(windows, now)
+        
+        if rings is None:
+            rings = read_shared_rings(self.segment.directory)
+        good_ring, bad_ring = shared
+        spans = [math.ceil(seconds / SLOWindow.BUCKET_SECONDS) for seconds in windows]
+        return [(int(good_ring.window_sum(rings, now, span)), int(bad_ring.window_sum(rings, now, span)))
+                for span in spans]
     
-    def calculate_slo_status(self, slo_name: str) -> Optional[SLOStatus]:
-        """Calculate current SLO status."""
+    def calculate_slo_status(self, slo_name: str, now: Optional[float] = None,
+                             rings=None) -> Optional[SLOStatus]:
+        """Calculate current SLO status from the bucketed measurements."""
         if slo_name not in self.slo_targets:
             return None
         
         target = self.slo_targets[slo_name]
-        measurements = self.measurement_history[slo_name]
+        now = time.time() if now is None else now
+        window_seconds = target.measurement_window_hours * 3600
         
-        if not measurements:
-            return None
+        totals = self._window_totals(slo_name, [window_seconds, *BURN_RATE_WINDOWS.values()], now, rings)
         
-        # Filter measurements within the window
-        window_start = time.time() - (target.measurement_window_hours * 3600)
-        recent_measurements = [(ts, val) for ts, val in measurements if ts >= window_start]
-        
-        if not recent_measurements:
+        successful_measurements, failed_measurements = totals[0]
+        total_measurements = successful_measurements + failed_measurements
+        if not total_measurements:
             return None
         
-        # Calculate success rate based on comparison
-        total_measurements = len(recent_measurements)
-        successful_measurements = 0
-        
-        for _, value in recent_measurements:
-            if target.comparison == "lt" and value < target.threshold_value:
-                successful_measurements += 1
-            elif target.comparison == "gt" and value > target.threshold_value:
-                successful_measurements += 1
-            elif target.comparison == "eq" and value == target.threshold_value:
-                successful_measurements += 1
-        
         current_percentage = (successful_measurements / total_measurements) * 100
         is_meeting_target = current_percentage >= target.target_percentage
         
@@ -349,29 +1015,37 @@ class SLOMonitor:
             current_percentage=current_percentage,
             is_meeting_target=is_meeting_target,
             error_budget_remaining=error_budget_remaining_pct,
-            measurement_period_start=datetime.fromtimestamp(window_start),
-            measurement_period_end=datetime.now(),
+            measurement_period_start=datetime.fromtimestamp(now - window_seconds),
+            measurement_period_end=datetime.fromtimestamp(now),
             total_measurements=total_measurements,
-            successful_measurements=successful_measurements
+            successful_measurements=successful_measurements,
+            burn_rates={name: self._burn_rate(target, good, bad)
+                        for name, (good, bad) in zip(BURN_RATE_WINDOWS, totals[1:])}
         )
     
-    def get_all_slo_status(self) -> Dict[str, SLOStatus]:
-        """Get status for all SLO targets."""
+    def evaluate(self) -> Dict[str, SLOStatus]:
+        """Recompute every SLO status and refresh the cache."""
+        now = time.time()
+        # One pass over the worker segments serves every SLO
+        rings = read_shared_rings(self.segment.directory) if self.shared_windows else None
         status_dict = {}
-        for slo_name in self.slo_targets:
-            status = self.calculate_slo_status(slo_name)
+        for slo_name in list(self.slo_targets):
+            status = self.calculate_slo_status(slo_name, now, rings)
             if status:
                 status_dict[slo_name] = status
+        self._status_cache = status_dict
+        self.last_evaluated = now
         return status_dict
     
+    def get_all_slo_status(self) -> Dict[str, SLOStatus]:
+        """Get status for all SLO targets (cached, re-evaluated when stale)."""
+        if self.last_evaluated is None or time.time() - self.last_evaluated > self.max_status_age:
+            return self.evaluate()
+        return dict(self._status_cache)
+    
     def check_slo_violations(self) -> List[SLOStatus]:
         """Check for SLO violations and return list of violated SLOs."""
-        violations = []
-        for slo_name in self.slo_targets:
-            status = self.calculate_slo_status(slo_name)
-            if status and not status.is_meeting_target:
-                violations.append(status)
-        return violations
+        return [status for status in self.get_all_slo_status().values() if not status.is_meeting_target]
 
 # Global SLO monitor
 slo_monitor = SLOMonitor(metrics_registry)
@@ -389,6 +1063,9 @@ class AlertManager:
         self.error_budget_warning_threshold = 25.0  # Warn when 25% error budget remaining
         self.error_budget_critical_threshold = 10.0  # Critical when 10% error budget remaining
         self.cooldown_period = 300  # 5 minutes between same alerts
+        # Multi-window burn rates: (long window, short window, threshold)
+        self.fast_burn = ("1h", "5m", 14.4)  # 2% of a 30-day budget in an hour
+        self.slow_burn = ("6h", "30m", 6.0)  # 5% of a 30-day budget in six hours
     
     def check_alerts(self):
         """Check for alert conditions and send notifications."""
@@ -403,6 +1080,7 @@ class AlertManager:
         all_status = self.slo_monitor.get_all_slo_status()
         for slo_name, status in all_status.items():
             self._check_error_budget_alerts(slo_name, status, current_time)
+            self._check_burn_rate_alerts(slo_name, status, current_time)
     
     def _handle_slo_violation(self, violation: SLOStatus, current_time: float):
         """Handle SLO violation alert."""
@@ -453,6 +1131,32 @@ class AlertManager:
                 self._send_alert(alert)
                 self.alert_cooldowns[alert_key] = current_time
     
+    def _check_burn_rate_alerts(self, slo_name: str, status: SLOStatus, current_time: float):
+        """Alert when the error budget burns fast over both a long and a short window."""
+        for alert_type, severity, (long_window, short_window, threshold) in (
+                ('burn_rate_fast', 'critical', self.fast_burn),
+                ('burn_rate_slow', 'warning', self.slow_burn)):
+            long_rate = status.burn_rates.get(long_window, 0.0)
+            short_rate = status.burn_rates.get(short_window, 0.0)
+            if long_rate < threshold or short_rate < threshold:
+                continue
+            
+            alert_key = f"{alert_type}_{slo_name}"
+            if self._should_send_alert(alert_key, current_time):
+                alert = {
+                    'type': alert_type,
+                    'severity': severity,
+                    'slo_name': slo_name,
+                    'description': f"Error budget burning at {long_rate:.1f}x over {long_window} "
+                                   f"({short_rate:.1f}x over {short_window})",
+                    'burn_rates': status.burn_rates,
+                    'timestamp': current_time
+                }
+                self._send_alert(alert)
+                self.alert_cooldowns[alert_key] = current_time
+            # A fast burn already implies the slow one
+            break
+    
     def _should_send_alert(self, alert_key: str, current_time: float) -> bool:
         """Check if alert should be sent based on cooldown."""
         last_sent = self.alert_cooldowns.get(alert_key, 0)
@@ -484,6 +1188,49 @@ class AlertManager:
 # Global alert manager
 alert_manager = AlertManager(slo_monitor)
 
+class SLOEvaluator:
+    """Background task that refreshes SLO status and checks alerts on a fixed schedule."""
+    
+    def __init__(self, slo_monitor: SLOMonitor, alert_manager: AlertManager, interval: float = 30.0):
+        self.slo_monitor = slo_monitor
+        self.alert_manager = alert_manager
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.logger = get_logger("slo_evaluator")
+    
+    def evaluate_once(self):
+        self.slo_monitor.evaluate()
+        self.alert_manager.check_alerts()
+    
+    def start(self, interval: Optional[float] = None):
+        """Start the evaluator on the running event loop if not already running."""
+        if interval is not None:
+            self.interval = interval
+        # Cached status must not go stale between runs
+        self.slo_monitor.max_status_age = max(self.slo_monitor.max_status_age, self.interval * 2)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self):
+        while True:
+            try:
+                self.evaluate_once()
+            except Exception as e:
+                self.logger.error(f"Error evaluating SLOs: {e}")
+            await asyncio.sleep(self.interval)
+
+# Global SLO evaluator (started with the application)
+slo_evaluator = SLOEvaluator(slo_monitor, alert_manager)
+
 # Convenience functions for metrics collection
 def increment_counter(name: str, amount: float = 1.0, tags: Dict[str, str] = None):
     """Increment a counter metric."""
@@ -5,34 +5,119 @@ Provides request/response logging, performance monitoring, and error tracking.
 
 import time
 import json
-from typing import Callable
+from contextlib import contextmanager
+from typing import Callable, Iterator
 from fastapi import Request, Response
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from .logging_config import get_logger, set_correlation_id, get_correlation_id, metrics
 from .error_tracking import error_tracker, ErrorSeverity, ErrorCategory, ErrorContext
 from .tracing import TracingContext, SpanKind, set_trace_context, get_trace_id, get_span_id
+from .metrics import metrics_registry
+from app.middleware.asgi import merge_headers
 
-class MonitoringMiddleware(BaseHTTPMiddleware):
-    """Middleware for comprehensive request monitoring."""
+# Registry families for request metrics; children are bound per label set
+HTTP_REQUESTS_TOTAL = metrics_registry.counter(
+    "http_requests_total", "HTTP requests handled", ("method", "route", "status_code")
+)
+HTTP_REQUEST_DURATION_MS = metrics_registry.histogram(
+    "http_request_duration_ms", "HTTP request latency in milliseconds", ("method", "route", "status_code")
+)
+
+class MonitoringMiddleware:
+    """
+    Middleware for comprehensive request monitoring.
+
+    Runs as a pure ASGI middleware; ``dispatch`` keeps the request/response
+    form available for callers that compose it as an http function middleware.
+    """
     
-    def __init__(self, app, exclude_paths: list = None):
-        super().__init__(app)
+    def __init__(self, app: ASGIApp, exclude_paths: list = None):
+        self.app = app
         self.logger = get_logger("middleware.monitoring")
-        self.exclude_paths = exclude_paths or ["/health", "/metrics", "/docs", "/openapi.json"]
+        self.exclude_paths = tuple(exclude_paths or ["/health", "/metrics", "/docs", "/openapi.json"])
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # Skip monitoring for excluded paths
+        if scope["type"] != "http" or scope["path"].startswith(self.exclude_paths):
+            await self.app(scope, receive, send)
+            return
+        
+        request = Request(scope)
+        correlation_id = request.headers.get("X-Correlation-ID") or set_correlation_id()
+        response_started = False
+        status_code = 500
+        response_size = 0
+        
+        with self._trace_request(request, correlation_id) as trace_ctx:
+            start_time = time.time()
+            self._log_request_started(request)
+            
+            async def send_with_tracing(message: Message) -> None:
+                nonlocal response_started, status_code, response_size
+                if message["type"] == "http.response.start":
+                    response_started = True
+                    status_code = message["status"]
+                    headers = MutableHeaders(scope=message)
+                    response_size = headers.get("content-length", 0)
+                    headers.update(self._tracing_headers(correlation_id))
+                await send(message)
+            
+            try:
+                await self.app(scope, receive, send_with_tracing)
+            except Exception as e:
+                duration = time.time() - start_time
+                error_response = self._handle_error(request, trace_ctx, e, duration, correlation_id)
+                self._record_request(request, 500, duration)
+                if response_started:
+                    raise
+                await error_response(scope, receive, send)
+                return
+            
+            self._log_request_completed(
+                request, trace_ctx, status_code, response_size, time.time() - start_time
+            )
     
     async def dispatch(self, request: Request, call_next: Callable) -> Response:
         # Skip monitoring for excluded paths
-        if any(request.url.path.startswith(path) for path in self.exclude_paths):
+        if request.url.path.startswith(self.exclude_paths):
             return await call_next(request)
         
         # Set correlation ID
         correlation_id = request.headers.get("X-Correlation-ID") or set_correlation_id()
         
+        with self._trace_request(request, correlation_id) as trace_ctx:
+            # Start timing
+            start_time = time.time()
+            self._log_request_started(request)
+            
+            try:
+                # Process request
+                response = await call_next(request)
+                
+                self._log_request_completed(
+                    request, trace_ctx, response.status_code,
+                    response.headers.get('content-length', 0), time.time() - start_time
+                )
+                
+                # Add tracing headers to response
+                for name, value in self._tracing_headers(correlation_id).items():
+                    response.headers[name] = value
+                
+                return response
+                
+            except Exception as e:
+                # Calculate duration for failed requests
+                duration = time.time() - start_time
+                return self._handle_error(request, trace_ctx, e, duration, correlation_id)
+    
+    @contextmanager
+    def _trace_request(self, request: Request, correlation_id: str) -> Iterator[TracingContext]:
+        """Open the server span for a request, tagged with request details"""
         # Set up distributed tracing
         trace_id_header = request.headers.get("X-Trace-ID")
-        span_id_header = request.headers.get("X-Span-ID")
         parent_span_id_header = request.headers.get("X-Parent-Span-ID")
         
         # Create tracing context for the request
@@ -49,151 +134,116 @@ class MonitoringMiddleware(BaseHTTPMiddleware):
             trace_ctx.add_tag("http.user_agent", request.headers.get('user-agent', ''))
             trace_ctx.add_tag("http.client_ip", self._get_client_ip(request))
             trace_ctx.add_tag("correlation_id", correlation_id)
-            
-            # Start timing
-            start_time = time.time()
+            yield trace_ctx
+    
+    def _log_request_started(self, request: Request) -> None:
+        """Log request start and count it"""
+        # Log request with tracing context
+        self.logger.info(
+            f"Request started",
+            extra={
+                'method': request.method,
+                'path': request.url.path,
+                'query_params': str(request.query_params),
+                'user_agent': request.headers.get('user-agent'),
+                'client_ip': self._get_client_ip(request),
+                'content_length': request.headers.get('content-length', 0),
+                'trace_id': get_trace_id(),
+                'span_id': get_span_id()
+            }
+        )
+    
+    def _log_request_completed(self, request: Request, trace_ctx: TracingContext,
+                               status_code: int, response_size, duration: float) -> None:
+        """Tag the span, log the response and record response metrics"""
+        # Add response tags to span
+        trace_ctx.add_tag("http.status_code", status_code)
+        trace_ctx.add_tag("http.response_size", response_size)
         
-            # Log request with tracing context
-            self.logger.info(
-                f"Request started",
-                extra={
-                    'method': request.method,
-                    'path': request.url.path,
-                    'query_params': str(request.query_params),
-                    'user_agent': request.headers.get('user-agent'),
-                    'client_ip': self._get_client_ip(request),
-                    'content_length': request.headers.get('content-length', 0),
-                    'trace_id': get_trace_id(),
-                    'span_id': get_span_id()
-                }
-            )
+        # Log response with tracing context
+        self.logger.info(
+            f"Request completed",
+            extra={
+                'method': request.method,
+                'path': request.url.path,
+                'status_code': status_code,
+                'duration_ms': round(duration * 1000, 2),
+                'response_size': response_size,
+                'trace_id': get_trace_id(),
+                'span_id': get_span_id()
+            }
+        )
         
-            # Record request metrics
-            metrics.increment_counter(
-                'requests_total',
-                tags={
-                    'method': request.method,
-                    'path': request.url.path
-                }
-            )
-            
-            try:
-                # Process request
-                response = await call_next(request)
-                
-                # Calculate duration
-                duration = time.time() - start_time
-                
-                # Add response tags to span
-                trace_ctx.add_tag("http.status_code", response.status_code)
-                trace_ctx.add_tag("http.response_size", response.headers.get('content-length', 0))
-                
-                # Log response with tracing context
-                self.logger.info(
-                    f"Request completed",
-                    extra={
-                        'method': request.method,
-                        'path': request.url.path,
-                        'status_code': response.status_code,
-                        'duration_ms': round(duration * 1000, 2),
-                        'response_size': response.headers.get('content-length', 0),
-                        'trace_id': get_trace_id(),
-                        'span_id': get_span_id()
-                    }
-                )
-                
-                # Record response metrics
-                metrics.record_histogram(
-                    'request_duration_ms',
-                    duration * 1000,
-                    tags={
-                        'method': request.method,
-                        'path': request.url.path,
-                        'status_code': str(response.status_code)
-                    }
-                )
-                
-                metrics.increment_counter(
-                    'responses_total',
-                    tags={
-                        'method': request.method,
-                        'path': request.url.path,
-                        'status_code': str(response.status_code)
-                    }
-                )
-                
-                # Add tracing headers to response
-                response.headers["X-Correlation-ID"] = correlation_id
-                response.headers["X-Trace-ID"] = get_trace_id() or ""
-                response.headers["X-Span-ID"] = get_span_id() or ""
-                
-                return response
-                
-            except Exception as e:
-                # Calculate duration for failed requests
-                duration = time.time() - start_time
-                
-                # Add error tags to span
-                trace_ctx.add_tag("error", True)
-                trace_ctx.add_tag("error.type", type(e).__name__)
-                trace_ctx.add_tag("error.message", str(e))
-                
-                # Create error context
-                error_context = ErrorContext(
-                    request_path=request.url.path,
-                    request_method=request.method,
-                    user_agent=request.headers.get('user-agent'),
-                    ip_address=self._get_client_ip(request)
-                )
-                
-                # Track error
-                error_id = error_tracker.track_error(
-                    e,
-                    ErrorSeverity.HIGH,
-                    ErrorCategory.SYSTEM,
-                    error_context
-                )
-                
-                # Log error with tracing context
-                self.logger.error(
-                    f"Request failed",
-                    extra={
-                        'method': request.method,
-                        'path': request.url.path,
-                        'duration_ms': round(duration * 1000, 2),
-                        'error_id': error_id,
-                        'error_type': type(e).__name__,
-                        'error_message': str(e),
-                        'trace_id': get_trace_id(),
-                        'span_id': get_span_id()
-                    }
-                )
-                
-                # Record error metrics
-                metrics.increment_counter(
-                    'request_errors_total',
-                    tags={
-                        'method': request.method,
-                        'path': request.url.path,
-                        'error_type': type(e).__name__
-                    }
-                )
-                
-                # Return error response with tracing headers
-                return JSONResponse(
-                    status_code=500,
-                    content={
-                        "error": "Internal server error",
-                        "error_id": error_id,
-                        "correlation_id": correlation_id,
-                        "trace_id": get_trace_id()
-                    },
-                    headers={
-                        "X-Correlation-ID": correlation_id,
-                        "X-Trace-ID": get_trace_id() or "",
-                        "X-Span-ID": get_span_id() or ""
-                    }
-                )
+        self._record_request(request, status_code, duration)
+    
+    @staticmethod
+    def _record_request(request: Request, status_code: int, duration: float) -> None:
+        """Record request count and latency in the metrics registry"""
+        # Label by route template so path parameters don't explode cardinality
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        labels = (request.method, route, str(status_code))
+        HTTP_REQUESTS_TOTAL.labels(*labels).inc()
+        HTTP_REQUEST_DURATION_MS.labels(*labels).observe(duration * 1000)
+    
+    def _handle_error(self, request: Request, trace_ctx: TracingContext, error: Exception,
+                      duration: float, correlation_id: str) -> JSONResponse:
+        """Track a failed request and build the error response"""
+        # Add error tags to span
+        trace_ctx.add_tag("error", True)
+        trace_ctx.add_tag("error.type", type(error).__name__)
+        trace_ctx.add_tag("error.message", str(error))
+        
+        # Create error context
+        error_context = ErrorContext(
+            request_path=request.url.path,
+            request_method=request.method,
+            user_agent=request.headers.get('user-agent'),
+            ip_address=self._get_client_ip(request)
+        )
+        
+        # Track error
+        error_id = error_tracker.track_error(
+            error,
+            ErrorSeverity.HIGH,
+            ErrorCategory.SYSTEM,
+            error_context
+        )
+        
+        # Log error with tracing context
+        self.logger.error(
+            f"Request failed",
+            extra={
+                'method': request.method,
+                'path': request.url.path,
+                'duration_ms': round(duration * 1000, 2),
+                'error_id': error_id,
+                'error_type': type(error).__name__,
+                'error_message': str(error),
+                'trace_id': get_trace_id(),
+                'span_id': get_span_id()
+            }
+        )
+        
+        # Return error response with tracing headers
+        return JSONResponse(
+            status_code=500,
+            content={
+                "error": "Internal server error",
+                "error_id": error_id,
+                "correlation_id": correlation_id,
+                "trace_id": get_trace_id()
+            },
+            headers=self._tracing_headers(correlation_id)
+        )
+    
+    @staticmethod
+    def _tracing_headers(correlation_id: str) -> dict:
+        """Tracing headers echoed back on every monitored response"""
+        return {
+            "X-Correlation-ID": correlation_id,
+            "X-Trace-ID": get_trace_id() or "",
+            "X-Span-ID": get_span_id() or ""
+        }
     
     def _get_client_ip(self, request: Request) -> str:
         """Extract client IP address from request."""
@@ -209,26 +259,40 @@ class MonitoringMiddleware(BaseHTTPMiddleware):
         # Fallback to direct client IP
         return request.client.host if request.client else 'unknown'
 
-class PerformanceMiddleware(BaseHTTPMiddleware):
+class PerformanceMiddleware:
     """Middleware for detailed performance monitoring."""
     
-    def __init__(self, app, slow_request_threshold: float = 1.0):
-        super().__init__(app)
+    def __init__(self, app: ASGIApp, slow_request_threshold: float = 1.0):
+        self.app = app
         self.logger = get_logger("middleware.performance")
         self.slow_request_threshold = slow_request_threshold  # seconds
     
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
         start_time = time.time()
         
         # Add performance markers
-        request.state.start_time = start_time
+        scope.setdefault("state", {})["start_time"] = start_time
         
-        response = await call_next(request)
+        duration = 0.0
         
-        duration = time.time() - start_time
+        async def send_with_timing(message: Message) -> None:
+            nonlocal duration
+            if message["type"] == "http.response.start":
+                duration = time.time() - start_time
+                
+                # Add performance headers
+                MutableHeaders(scope=message)["X-Response-Time"] = f"{round(duration * 1000, 2)}ms"
+            await send(message)
+        
+        await self.app(scope, receive, send_with_timing)
         
         # Log slow requests
         if duration > self.slow_request_threshold:
+            request = Request(scope)
             self.logger.warning(
                 f"Slow request detected",
                 extra={
@@ -248,76 +312,77 @@ class PerformanceMiddleware(BaseHTTPMiddleware):
                     'path': request.url.path
                 }
             )
-        
-        # Add performance headers
-        response.headers["X-Response-Time"] = f"{round(duration * 1000, 2)}ms"
-        
-        return response
 
-class SecurityMiddleware(BaseHTTPMiddleware):
+class SecurityMiddleware:
     """Middleware for security monitoring and logging."""
     
-    def __init__(self, app):
-        super().__init__(app)
+    # Security headers, encoded once
+    SECURITY_HEADERS = [
+        (b"x-content-type-options", b"nosniff"),
+        (b"x-frame-options", b"DENY"),
+        (b"x-xss-protection", b"1; mode=block"),
+        (b"referrer-policy", b"strict-origin-when-cross-origin"),
+    ]
+    
+    def __init__(self, app: ASGIApp):
+        self.app = app
         self.logger = get_logger("middleware.security")
         self.suspicious_patterns = [
             'script', 'javascript:', 'vbscript:', 'onload', 'onerror',
             '../', '..\\', '/etc/passwd', 'cmd.exe', 'powershell'
         ]
+        self.bad_user_agents = ['sqlmap', 'nikto', 'nmap', 'masscan', 'nessus']
     
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        # Check for suspicious patterns in URL and headers
-        suspicious_activity = False
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        request = Request(scope)
+        if self._is_suspicious(request):
+            self._log_suspicious(request)
+        
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                merge_headers(message, self.SECURITY_HEADERS)
+            await send(message)
         
+        await self.app(scope, receive, send_with_headers)
+    
+    def _is_suspicious(self, request: Request) -> bool:
+        """Check for suspicious patterns in URL, query and User-Agent"""
         # Check URL path
         path_lower = request.url.path.lower()
-        for pattern in self.suspicious_patterns:
-            if pattern in path_lower:
-                suspicious_activity = True
-                break
+        if any(pattern in path_lower for pattern in self.suspicious_patterns):
+            return True
         
         # Check query parameters
-        if not suspicious_activity:
-            query_string = str(request.query_params).lower()
-            for pattern in self.suspicious_patterns:
-                if pattern in query_string:
-                    suspicious_activity = True
-                    break
+        query_string = str(request.query_params).lower()
+        if any(pattern in query_string for pattern in self.suspicious_patterns):
+            return True
         
         # Check User-Agent for known bad patterns
         user_agent = request.headers.get('user-agent', '').lower()
-        bad_user_agents = ['sqlmap', 'nikto', 'nmap', 'masscan', 'nessus']
-        if any(bad_agent in user_agent for bad_agent in bad_user_agents):
-            suspicious_activity = True
-        
-        # Log suspicious activity
-        if suspicious_activity:
-            self.logger.warning(
-                f"Suspicious request detected",
-                extra={
-                    'method': request.method,
-                    'path': request.url.path,
-                    'query_params': str(request.query_params),
-                    'user_agent': request.headers.get('user-agent'),
-                    'client_ip': request.client.host if request.client else 'unknown',
-                    'referer': request.headers.get('referer')
-                }
-            )
-            
-            metrics.increment_counter(
-                'suspicious_requests_total',
-                tags={
-                    'method': request.method,
-                    'client_ip': request.client.host if request.client else 'unknown'
-                }
-            )
-        
-        response = await call_next(request)
-        
-        # Add security headers
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-XSS-Protection"] = "1; mode=block"
-        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
+        return any(bad_agent in user_agent for bad_agent in self.bad_user_agents)
+    
+    def _log_suspicious(self, request: Request) -> None:
+        """Log suspicious activity"""
+        self.logger.warning(
+            f"Suspicious request detected",
+            extra={
+                'method': request.method,
+                'path': request.url.path,
+                'query_params': str(request.query_params),
+                'user_agent': request.headers.get('user-agent'),
+                'client_ip': request.client.host if request.client else 'unknown',
+                'referer': request.headers.get('referer')
+            }
+        )
         
-        return response
\ No newline at end of file
+        metrics.increment_counter(
+            'suspicious_requests_total',
+            tags={
+                'method': request.method,
+                'client_ip': request.client.host if request.client else 'unknown'
+            }
+        )
@@ -0,0 +1,289 @@
+"""
+Memory-mapped metric storage shared between worker processes.
+
+When ``METRICS_MULTIPROCESS_DIR`` is set, every worker writes its metric
+values into its own file in that directory (``worker_<pid>.db``) through an
+mmap, and any worker can build the aggregated view by mapping all of the
+files and summing values per key. There is no IPC on either path: writers
+only touch their own segment and readers never talk to other workers.
+
+Segment layout (all integers little-endian)::
+    
+    [uint64 used bytes]
+    entry*: [uint32 key length][key bytes, padded to 8][float64 value]
+
+Entries are append-only, so a value keeps its offset for the life of the
+process and readers can parse a segment that is being written to. The
+directory should be emptied when the service is (re)deployed, before the
+workers start, otherwise counters from previous runs are added in.
+
+Segments of workers that have exited stay in the directory: their counters
+and rings still describe events that happened, but their live-only samples
+(gauges) are skipped once the pid is gone.
+
+Windowed counts (SLO outcomes, error rates) are kept in rings of time
+buckets (``SharedRing``): each slot stores the bucket it holds next to its
+count, so rings from all workers can be merged by bucket.
+"""
+
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+MULTIPROCESS_DIR_ENV = "METRICS_MULTIPROCESS_DIR"
+
+_HEADER = struct.Struct("<Q")
+_KEY_LENGTH = struct.Struct("<I")
+_VALUE = struct.Struct("<d")
+_INITIAL_SIZE = 1 << 20  # 1 MiB, enough for the default metric set
+
+# Sample names with special aggregation
+LIVE_SAMPLE = "live"  # Only counted while the writing worker is alive
+RING_INDEX_SAMPLE = "ring_index"
+RING_COUNT_SAMPLE = "ring_count"
+_LIVE_SUFFIX = f',"{LIVE_SAMPLE}",null]'
+_RING_MARKER = '"ring_'
+
+def _padded(length: int) -> int:
+    return (length + 7) & ~7
+
+def encode_key(name: str, labels: Tuple[str, ...], sample: str = "value", index: Any = None) -> str:
+    """Key under which one sample of a metric child is stored."""
+    return json.dumps([name, list(labels), sample, index], separators=(",", ":"))
+
+def decode_key(key: str) -> Tuple[str, Tuple[str, ...], str, Any]:
+    name, labels, sample, index = json.loads(key)
+    return name, tuple(labels), sample, index
+
+class SharedMetricsSegment:
+    """This worker's memory-mapped metric file (named after ``worker_id``, the pid by default)."""
+    
+    def __init__(self, directory: str, worker_id: Optional[str] = None,
+                 initial_size: int = _INITIAL_SIZE):
+        self.directory = directory
+        self.worker_id = worker_id
+        self.initial_size = initial_size
+        self._lock = threading.Lock()
+        self._open()
+        # A forked child must not keep writing into its parent's file
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reopen_after_fork)
+    
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, f"worker_{self.worker_id or os.getpid()}.db")
+        self._file = open(self.path, "a+b")
+        if os.fstat(self._file.fileno()).st_size < self.initial_size:
+            self._file.truncate(self.initial_size)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._offsets: Dict[str, int] = {}
+        self._used = _HEADER.unpack_from(self._map, 0)[0] or _HEADER.size
+        
+        # Reopening an existing file (same worker) keeps its values
+        for key, offset, _ in _iter_entries(self._map, self._used):
+            self._offsets[key] = offset
+    
+    def _reopen_after_fork(self):
+        self.worker_id = None
+        self._lock = threading.Lock()
+        self._open()
+    
+    def _grow(self, needed: int):
+        size = len(self._map)
+        while size < needed:
+            size *= 2
+        self._map.close()
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+    
+    def _allocate(self, key: str) -> int:
+        encoded = key.encode("utf-8")
+        # Keep values 8-byte aligned so each write is a single aligned store
+        key_end = _padded(self._used + _KEY_LENGTH.size + len(encoded))
+        entry_end = key_end + _VALUE.size
+        if entry_end > len(self._map):
+            self._grow(entry_end)
+        
+        _KEY_LENGTH.pack_into(self._map, self._used, len(encoded))
+        self._map[self._used + _KEY_LENGTH.size:self._used + _KEY_LENGTH.size + len(encoded)] = encoded
+        _VALUE.pack_into(self._map, key_end, 0.0)
+        # Publish the entry only after it is fully written
+        self._used = entry_end
+        _HEADER.pack_into(self._map, 0, self._used)
+        self._offsets[key] = key_end
+        return key_end
+    
+    def add(self, key: str, amount: float = 1.0):
+        """Add to the value stored under ``key``."""
+        with self._lock:
+            offset = self._offsets.get(key)
+            if offset is None:
+                offset = self._allocate(key)
+            _VALUE.pack_into(self._map, offset, _VALUE.unpack_from(self._map, offset)[0] + amount)
+    
+    def add_many(self, updates: Iterable[Tuple[str, float]]):
+        """Apply several additions under one lock (e.g. one histogram observation)."""
+        with self._lock:
+            for key, amount in updates:
+                offset = self._offsets.get(key)
+                if offset is None:
+                    offset = self._allocate(key)
+                _VALUE.pack_into(self._map, offset, _VALUE.unpack_from(self._map, offset)[0] + amount)
+    
+    def add_bucketed(self, index_key: str, count_key: str, index: int, amount: float = 1.0):
+        """
+        Add to a ring slot's count, first claiming the slot for ``index`` if it
+        holds an older bucket. Additions for a bucket older than the slot's
+        are dropped (they are outside every window the ring covers).
+        """
+        with self._lock:
+            index_offset = self._offsets.get(index_key) or self._allocate(index_key)
+            count_offset = self._offsets.get(count_key) or self._allocate(count_key)
+            current = _VALUE.unpack_from(self._map, index_offset)[0]
+            if current != index:
+                if current > index:
+                    return
+                # Reset the count before publishing the new bucket
+                _VALUE.pack_into(self._map, count_offset, 0.0)
+                _VALUE.pack_into(self._map, index_offset, float(index))
+            _VALUE.pack_into(self._map, count_offset, _VALUE.unpack_from(self._map, count_offset)[0] + amount)
+    
+    def set(self, key: str, value: float):
+        """Overwrite the value stored under ``key``."""
+        with self._lock:
+            offset = self._offsets.get(key)
+            if offset is None:
+                offset = self._allocate(key)
+            _VALUE.pack_into(self._map, offset, value)
+    
+    def get(self, key: str) -> float:
+        """This worker's own value for ``key``."""
+        offset = self._offsets.get(key)
+        return _VALUE.unpack_from(self._map, offset)[0] if offset is not None else 0.0
+    
+    def collect(self) -> Dict[str, float]:
+        """Values for every key, summed over all worker segments."""
+        return read_shared_metrics(self.directory)
+    
+    def close(self):
+        with self._lock:
+            self._map.close()
+            self._file.close()
+
+def _iter_entries(buffer, used: int):
+    position = _HEADER.size
+    while position + _KEY_LENGTH.size <= used:
+        length = _KEY_LENGTH.unpack_from(buffer, position)[0]
+        key_start = position + _KEY_LENGTH.size
+        value_offset = _padded(key_start + length)
+        if value_offset + _VALUE.size > used:
+            break
+        key = bytes(buffer[key_start:key_start + length]).decode("utf-8")
+        yield key, value_offset, _VALUE.unpack_from(buffer, value_offset)[0]
+        position = value_offset + _VALUE.size
+
+def _worker_alive(path: str) -> bool:
+    """Whether the worker that owns a segment file is still running."""
+    worker_id = os.path.basename(path)[len("worker_"):-len(".db")]
+    if not worker_id.isdigit():
+        # Named (non-pid) workers cannot be checked
+        return True
+    pid = int(worker_id)
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _read_segments(directory: str) -> Iterator[Tuple[str, List[Tuple[str, float]]]]:
+    """(path, [(key, value)]) for every worker segment in ``directory``."""
+    for path in sorted(glob.glob(os.path.join(directory, "worker_*.db"))):
+        try:
+            with open(path, "rb") as handle:
+                if os.fstat(handle.fileno()).st_size < _HEADER.size:
+                    continue
+                with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as segment:
+                    used = min(_HEADER.unpack_from(segment, 0)[0], len(segment))
+                    entries = [(key, value) for key, _, value in _iter_entries(segment, used)]
+        except (OSError, ValueError):
+            # A worker file that vanished or is mid-truncate is skipped this round
+            continue
+        yield path, entries
+
+def read_shared_metrics(directory: str) -> Dict[str, float]:
+    """
+    Map every worker segment in ``directory`` and sum values per key.
+    
+    Live-only samples are left out for workers that have exited.
+    """
+    totals: Dict[str, float] = {}
+    for path, entries in _read_segments(directory):
+        alive = _worker_alive(path)
+        for key, value in entries:
+            if not alive and key.endswith(_LIVE_SUFFIX):
+                continue
+            totals[key] = totals.get(key, 0.0) + value
+    return totals
+
+RingBuckets = Dict[Tuple[str, Tuple[str, ...]], Dict[int, float]]
+
+def read_shared_rings(directory: str) -> RingBuckets:
+    """Bucket -> count for every ring, merged over all worker segments."""
+    rings: RingBuckets = {}
+    for _, entries in _read_segments(directory):
+        slots: Dict[Tuple[str, Tuple[str, ...], int], Dict[str, float]] = {}
+        for key, value in entries:
+            if _RING_MARKER not in key:
+                continue
+            name, labels, sample, slot = decode_key(key)
+            if sample in (RING_INDEX_SAMPLE, RING_COUNT_SAMPLE):
+                slots.setdefault((name, labels, slot), {})[sample] = value
+        for (name, labels, _), slot in slots.items():
+            count = slot.get(RING_COUNT_SAMPLE)
+            if count and RING_INDEX_SAMPLE in slot:
+                buckets = rings.setdefault((name, labels), {})
+                index = int(slot[RING_INDEX_SAMPLE])
+                buckets[index] = buckets.get(index, 0.0) + count
+    return rings
+
+class SharedRing:
+    """
+    Event counts per time bucket, kept in a ring of ``size`` slots in this
+    worker's segment. ``window_sum`` reads the merged view of every worker's
+    ring from ``read_shared_rings``.
+    """
+    
+    def __init__(self, segment: SharedMetricsSegment, name: str, labels: Tuple[str, ...],
+                 size: int, bucket_seconds: float):
+        self.segment = segment
+        self.key = (name, tuple(labels))
+        self.size = size
+        self.bucket_seconds = bucket_seconds
+        self._index_keys = [encode_key(name, labels, RING_INDEX_SAMPLE, slot) for slot in range(size)]
+        self._count_keys = [encode_key(name, labels, RING_COUNT_SAMPLE, slot) for slot in range(size)]
+    
+    def add(self, timestamp: float, amount: float = 1.0):
+        index = int(timestamp // self.bucket_seconds)
+        slot = index % self.size
+        self.segment.add_bucketed(self._index_keys[slot], self._count_keys[slot], index, amount)
+    
+    def window_sum(self, rings: RingBuckets, now: float, buckets: int) -> float:
+        """Count over the last ``buckets`` buckets (at most the ring size) across all workers."""
+        current = int(now // self.bucket_seconds)
+        oldest = current - min(buckets, self.size) + 1
+        return sum(count for index, count in rings.get(self.key, {}).items() if oldest <= index <= current)
+
+def segment_from_environment() -> Optional[SharedMetricsSegment]:
+    """The shared segment for this worker, if multi-process mode is enabled."""
+    directory = os.environ.get(MULTIPROCESS_DIR_ENV)
+    if not directory:
+        return None
+    return SharedMetricsSegment(directory)
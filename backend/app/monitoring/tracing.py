@@ -6,6 +6,13 @@ Provides trace and span correlation across frontend-backend boundaries.
 import uuid
 import time
 import json
+import logging
+import os
+import queue
+import threading
+import urllib.request
+import zlib
+from collections import OrderedDict
 from typing import Dict, Any, Optional, List
 from contextvars import ContextVar
 from dataclasses import dataclass, asdict
@@ -19,6 +26,7 @@ from .logging_config import get_logger
 trace_id: ContextVar[Optional[str]] = ContextVar('trace_id', default=None)
 span_id: ContextVar[Optional[str]] = ContextVar('span_id', default=None)
 parent_span_id: ContextVar[Optional[str]] = ContextVar('parent_span_id', default=None)
+current_span: ContextVar[Optional['Span']] = ContextVar('current_span', default=None)
 
 class SpanKind(Enum):
     """Types of spans for categorization."""
@@ -57,6 +65,8 @@ class Span:
     tags: Dict[str, Any] = None
     logs: List[SpanEvent] = None
     error: Optional[str] = None
+    # True for the first span of a trace in this process (no active parent span)
+    is_local_root: bool = False
     
     def __post_init__(self):
         if self.tags is None:
@@ -90,44 +100,265 @@ class Span:
         self.end_time = time.time()
         self.duration_ms = round((self.end_time - self.start_time) * 1000, 2)
 
+# OTLP enum values
+_OTLP_SPAN_KIND = {
+    SpanKind.INTERNAL: 1, SpanKind.SERVER: 2, SpanKind.CLIENT: 3,
+    SpanKind.PRODUCER: 4, SpanKind.CONSUMER: 5
+}
+_OTLP_STATUS_OK = 1
+_OTLP_STATUS_ERROR = 2
+
+def _otlp_id(value: str, length: int) -> str:
+    """Hex ID of the length OTLP expects (32 for traces, 16 for spans)."""
+    hex_id = value.replace("-", "").lower()
+    try:
+        int(hex_id, 16)
+    except ValueError:
+        hex_id = format(zlib.crc32(value.encode("utf-8")), "08x")
+    return hex_id[:length].rjust(length, "0")
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def _otlp_attributes(values: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in values.items()]
+
+def span_to_otlp(span: Span) -> Dict[str, Any]:
+    """Convert a finished span to an OTLP/JSON span."""
+    otlp_span = {
+        "traceId": _otlp_id(span.trace_id, 32),
+        "spanId": _otlp_id(span.span_id, 16),
+        "name": span.operation_name,
+        "kind": _OTLP_SPAN_KIND[span.kind],
+        "startTimeUnixNano": str(int(span.start_time * 1e9)),
+        "endTimeUnixNano": str(int((span.end_time or span.start_time) * 1e9)),
+        "attributes": _otlp_attributes(span.tags),
+        "events": [
+            {"timeUnixNano": str(int(event.timestamp * 1e9)), "name": event.name,
+             "attributes": _otlp_attributes(event.attributes)}
+            for event in span.logs
+        ],
+        "status": {"code": _OTLP_STATUS_ERROR} if span.status == SpanStatus.ERROR
+                  else {"code": _OTLP_STATUS_OK},
+    }
+    if span.parent_span_id:
+        otlp_span["parentSpanId"] = _otlp_id(span.parent_span_id, 16)
+    if span.error:
+        otlp_span["status"]["message"] = span.error
+    return otlp_span
+
+class BatchSpanExporter:
+    """
+    Exports kept spans in batches from a background thread.
+    
+    Spans are queued without blocking (and counted as dropped when the queue
+    is full), then written as one OTLP/JSON ``ExportTraceServiceRequest`` per
+    batch: to a file in ``directory`` and/or POSTed to ``endpoint`` (for
+    example a local collector at ``http://localhost:4318/v1/traces``).
+    """
+    
+    def __init__(self, directory: Optional[str] = None, endpoint: Optional[str] = None,
+                 service_name: str = "comicguess-api", max_batch_size: int = 512,
+                 flush_interval: float = 5.0, max_queue_size: int = 8192):
+        self.directory = directory
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self.dropped_spans = 0
+        self.exported_spans = 0
+        self.logger = get_logger("tracing.exporter")
+        self._batch_number = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+    
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+            self._thread.start()
+    
+    def shutdown(self):
+        """Stop the background thread after exporting everything queued."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+    
+    def export(self, spans: List[Span]):
+        """Queue spans for export."""
+        for span in spans:
+            try:
+                self.queue.put_nowait(span)
+            except queue.Full:
+                self.dropped_spans += 1
+    
+    def _drain(self) -> List[Span]:
+        batch = []
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+    
+    def flush(self):
+        """Export everything currently queued on the calling thread."""
+        batch = self._drain()
+        while batch:
+            self._export_batch(batch)
+            batch = self._drain()
+    
+    def _run(self):
+        while not self._stop.is_set():
+            deadline = time.monotonic() + self.flush_interval
+            while self.queue.qsize() < self.max_batch_size and not self._stop.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._stop.wait(min(remaining, 0.1))
+            batch = self._drain()
+            if batch:
+                self._export_batch(batch)
+    
+    def to_otlp(self, spans: List[Span]) -> Dict[str, Any]:
+        """Build an OTLP/JSON trace export request for a batch of spans."""
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": _otlp_attributes({"service.name": self.service_name})},
+                "scopeSpans": [{
+                    "scope": {"name": "app.monitoring.tracing"},
+                    "spans": [span_to_otlp(span) for span in spans],
+                }],
+            }]
+        }
+    
+    def _export_batch(self, spans: List[Span]):
+        body = json.dumps(self.to_otlp(spans)).encode("utf-8")
+        try:
+            if self.directory:
+                self._batch_number += 1
+                path = os.path.join(
+                    self.directory, f"spans-{int(time.time() * 1000)}-{self._batch_number}.json")
+                with open(path, "wb") as handle:
+                    handle.write(body)
+            if self.endpoint:
+                request = urllib.request.Request(
+                    self.endpoint, data=body, headers={"Content-Type": "application/json"})
+                with urllib.request.urlopen(request, timeout=5) as response:
+                    response.read()
+            self.exported_spans += len(spans)
+        except Exception as e:
+            self.dropped_spans += len(spans)
+            self.logger.warning(f"Span export failed: {e}")
+
 class TraceCollector:
-    """Collects and manages distributed traces."""
+    """
+    Collects traces with head and tail sampling.
     
-    def __init__(self):
-        self.spans: Dict[str, List[Span]] = {}
+    Spans are buffered per trace until the trace's local root span finishes.
+    The trace is then kept if it was head-sampled (``head_sample_rate``,
+    decided from the trace ID so every span of a trace agrees), contains an
+    error, or its root took at least ``slow_threshold_ms``; otherwise it is
+    discarded. Both the pending buffer and the kept-trace store are bounded,
+    evicting the oldest traces first, and kept traces go to the exporter.
+    """
+    
+    def __init__(self, head_sample_rate: float = 1.0, slow_threshold_ms: float = 1000.0,
+                 max_traces: int = 1000, max_pending_traces: int = 10000,
+                 exporter: Optional[BatchSpanExporter] = None):
+        self.spans: "OrderedDict[str, List[Span]]" = OrderedDict()
+        self.pending: "OrderedDict[str, List[Span]]" = OrderedDict()
         self.logger = get_logger("tracing")
         self.max_spans_per_trace = 1000
+        self.head_sample_rate = head_sample_rate
+        self.slow_threshold_ms = slow_threshold_ms
+        self.max_traces = max_traces
+        self.max_pending_traces = max_pending_traces
+        self.exporter = exporter
+        self.dropped_traces = 0
+        self._lock = threading.Lock()
+    
+    def configure(self, head_sample_rate: Optional[float] = None, slow_threshold_ms: Optional[float] = None,
+                  exporter: Optional[BatchSpanExporter] = None):
+        """Update sampling settings and install an exporter (started here)."""
+        if head_sample_rate is not None:
+            self.head_sample_rate = head_sample_rate
+        if slow_threshold_ms is not None:
+            self.slow_threshold_ms = slow_threshold_ms
+        if exporter is not None:
+            if self.exporter is not None:
+                self.exporter.shutdown()
+            self.exporter = exporter
+            exporter.start()
+    
+    def is_head_sampled(self, trace_id: str) -> bool:
+        """Head sampling decision, derived from the trace ID alone."""
+        if self.head_sample_rate >= 1.0:
+            return True
+        return zlib.crc32(trace_id.encode("utf-8")) / 0xFFFFFFFF < self.head_sample_rate
     
     def add_span(self, span: Span):
-        """Add a span to the trace collection."""
-        if span.trace_id not in self.spans:
-            self.spans[span.trace_id] = []
-        
-        self.spans[span.trace_id].append(span)
-        
-        # Prevent memory leaks by limiting spans per trace
-        if len(self.spans[span.trace_id]) > self.max_spans_per_trace:
-            self.spans[span.trace_id].pop(0)
+        """Add a finished span; completes the trace when it is the local root."""
+        with self._lock:
+            spans = self.pending.get(span.trace_id)
+            if spans is None:
+                spans = self.pending[span.trace_id] = []
+                if len(self.pending) > self.max_pending_traces:
+                    self.pending.popitem(last=False)
+                    self.dropped_traces += 1
+            
+            spans.append(span)
+            
+            # Prevent memory leaks by limiting spans per trace
+            if len(spans) > self.max_spans_per_trace:
+                spans.pop(0)
+            
+            if not span.is_local_root:
+                return
+            
+            spans = self.pending.pop(span.trace_id)
+            if not self._should_keep(span, spans):
+                self.dropped_traces += 1
+                return
+            
+            kept = self.spans.setdefault(span.trace_id, [])
+            kept.extend(spans)
+            del kept[:-self.max_spans_per_trace]
+            self.spans.move_to_end(span.trace_id)
+            while len(self.spans) > self.max_traces:
+                self.spans.popitem(last=False)
         
-        # Log span completion
-        self.logger.info(
-            f"Span completed: {span.operation_name}",
-            extra={
-                'trace_id': span.trace_id,
-                'span_id': span.span_id,
-                'parent_span_id': span.parent_span_id,
-                'operation_name': span.operation_name,
-                'duration_ms': span.duration_ms,
-                'status': span.status.value,
-                'kind': span.kind.value,
-                'tags': span.tags,
-                'error': span.error
-            }
-        )
+        if self.exporter is not None:
+            self.exporter.export(spans)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(
+                f"Trace kept: {span.operation_name}",
+                extra={'trace_id': span.trace_id, 'span_count': len(spans),
+                       'duration_ms': span.duration_ms, 'status': span.status.value}
+            )
+    
+    def _should_keep(self, root: Span, spans: List[Span]) -> bool:
+        """Tail decision for a completed trace."""
+        if self.is_head_sampled(root.trace_id):
+            return True
+        if root.duration_ms is not None and root.duration_ms >= self.slow_threshold_ms:
+            return True
+        return any(span.status == SpanStatus.ERROR for span in spans)
     
     def get_trace(self, trace_id: str) -> List[Span]:
-        """Get all spans for a trace."""
-        return self.spans.get(trace_id, [])
+        """Get all spans for a trace (kept, or still in progress)."""
+        with self._lock:
+            return list(self.spans.get(trace_id) or self.pending.get(trace_id) or [])
     
     def export_trace(self, trace_id: str) -> Dict[str, Any]:
         """Export trace in OpenTelemetry-compatible format."""
@@ -159,14 +390,22 @@ class TraceCollector:
     def cleanup_old_traces(self, max_age_hours: int = 24):
         """Remove traces older than specified hours."""
         cutoff_time = time.time() - (max_age_hours * 3600)
-        traces_to_remove = []
-        
-        for trace_id, spans in self.spans.items():
-            if spans and spans[-1].end_time and spans[-1].end_time < cutoff_time:
-                traces_to_remove.append(trace_id)
         
-        for trace_id in traces_to_remove:
-            del self.spans[trace_id]
+        with self._lock:
+            traces_to_remove = [
+                trace_id for trace_id, spans in self.spans.items()
+                if spans and spans[-1].end_time and spans[-1].end_time < cutoff_time
+            ]
+            for trace_id in traces_to_remove:
+                del self.spans[trace_id]
+            
+            # Traces whose root never finished
+            stale_pending = [
+                trace_id for trace_id, spans in self.pending.items()
+                if spans and spans[-1].end_time and spans[-1].end_time < cutoff_time
+            ]
+            for trace_id in stale_pending:
+                del self.pending[trace_id]
         
         if traces_to_remove:
             self.logger.info(f"Cleaned up {len(traces_to_remove)} old traces")
@@ -189,12 +428,14 @@ class TracingContext:
         self.prev_trace_id = None
         self.prev_span_id = None
         self.prev_parent_span_id = None
+        self.prev_span = None
     
     def __enter__(self) -> 'TracingContext':
         # Store previous context
         self.prev_trace_id = trace_id.get()
         self.prev_span_id = span_id.get()
         self.prev_parent_span_id = parent_span_id.get()
+        self.prev_span = current_span.get()
         
         # Create new span
         current_trace_id = self.parent_trace_id or self.prev_trace_id or str(uuid.uuid4())
@@ -207,13 +448,16 @@ class TracingContext:
             parent_span_id=current_parent_span_id,
             operation_name=self.operation_name,
             start_time=time.time(),
-            kind=self.kind
+            kind=self.kind,
+            # Remote parents (from headers) still make this the root in this process
+            is_local_root=self.prev_span_id is None or self.parent_span_id is not None
         )
         
         # Set context variables
         trace_id.set(current_trace_id)
         span_id.set(current_span_id)
         parent_span_id.set(current_parent_span_id)
+        current_span.set(self.span)
         
         return self
     
@@ -229,6 +473,7 @@ class TracingContext:
         trace_id.set(self.prev_trace_id)
         span_id.set(self.prev_span_id)
         parent_span_id.set(self.prev_parent_span_id)
+        current_span.set(self.prev_span)
     
     def add_tag(self, key: str, value: Any):
         """Add tag to current span."""
@@ -248,6 +493,10 @@ def get_span_id() -> Optional[str]:
     """Get current span ID."""
     return span_id.get()
 
+def get_current_span() -> Optional[Span]:
+    """Get the span of the innermost active TracingContext."""
+    return current_span.get()
+
 def get_parent_span_id() -> Optional[str]:
     """Get current parent span ID."""
     return parent_span_id.get()
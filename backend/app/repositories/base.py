@@ -1,6 +1,5 @@
 """Base repository class with common database operations"""
 
-import asyncio
 import logging
 from typing import Optional, List, Dict, Any, TypeVar, Generic
 from abc import ABC, abstractmethod
@@ -9,6 +8,7 @@ from azure.cosmos.container import ContainerProxy
 
 from app.database.connection import get_cosmos_db
 from app.database.exceptions import DatabaseError, ItemNotFoundError, DuplicateItemError
+from app.monitoring.executor import run_in_executor
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +21,10 @@ class BaseRepository(Generic[T], ABC):
         self.container_name = container_name
         self._container: Optional[ContainerProxy] = None
     
+    def _span_tags(self) -> Dict[str, str]:
+        """Tags for the client span around each Cosmos DB call"""
+        return {"db.type": "cosmosdb", "db.container": self.container_name}
+    
     async def _get_container(self) -> ContainerProxy:
         """Get the container for this repository"""
         if self._container is None:
@@ -37,10 +41,11 @@ class BaseRepository(Generic[T], ABC):
             if not self._has_partition_key(item, partition_key):
                 item = self._add_partition_key(item, partition_key)
             
-            result = await asyncio.get_event_loop().run_in_executor(
-                None,
+            result = await run_in_executor(
+                "db.create_item",
                 container.create_item,
-                item
+                item,
+                tags=self._span_tags()
             )
             
             logger.info(f"Created item with id: {item.get('id')} in {self.container_name}")
@@ -61,11 +66,12 @@ class BaseRepository(Generic[T], ABC):
         try:
             container = await self._get_container()
             
-            result = await asyncio.get_event_loop().run_in_executor(
-                None,
+            result = await run_in_executor(
+                "db.read_item",
                 container.read_item,
                 item_id,
-                partition_key
+                partition_key,
+                tags=self._span_tags()
             )
             
             return result
@@ -88,11 +94,12 @@ class BaseRepository(Generic[T], ABC):
             if not self._has_partition_key(item, partition_key):
                 item = self._add_partition_key(item, partition_key)
             
-            result = await asyncio.get_event_loop().run_in_executor(
-                None,
+            result = await run_in_executor(
+                "db.replace_item",
                 container.replace_item,
                 item['id'],
-                item
+                item,
+                tags=self._span_tags()
             )
             
             logger.info(f"Updated item with id: {item.get('id')} in {self.container_name}")
@@ -112,11 +119,12 @@ class BaseRepository(Generic[T], ABC):
         try:
             container = await self._get_container()
             
-            await asyncio.get_event_loop().run_in_executor(
-                None,
+            await run_in_executor(
+                "db.delete_item",
                 container.delete_item,
                 item_id,
-                partition_key
+                partition_key,
+                tags=self._span_tags()
             )
             
             logger.info(f"Deleted item with id: {item_id} from {self.container_name}")
@@ -147,9 +155,10 @@ class BaseRepository(Generic[T], ABC):
             if partition_key:
                 query_kwargs['partition_key'] = partition_key
             
-            items = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: list(container.query_items(**query_kwargs))
+            items = await run_in_executor(
+                "db.query_items",
+                lambda: list(container.query_items(**query_kwargs)),
+                tags=self._span_tags()
             )
             
             return items
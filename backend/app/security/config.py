@@ -25,6 +25,8 @@ class SecurityConfig:
     CSRF_COOKIE_SECURE = os.getenv("CSRF_COOKIE_SECURE", "true").lower() == "true"
     CSRF_COOKIE_HTTPONLY = True
     CSRF_COOKIE_SAMESITE = "strict"
+    # Stateless tokens validate on any worker sharing CSRF_SECRET_KEY
+    CSRF_STATELESS = os.getenv("CSRF_STATELESS", "true").lower() == "true"
     
     # Rate Limiting
     RATE_LIMIT_REQUESTS_PER_MINUTE = int(os.getenv("RATE_LIMIT_REQUESTS_PER_MINUTE", "60"))
@@ -63,6 +65,7 @@ class SecurityConfig:
     HSTS_MAX_AGE = int(os.getenv("HSTS_MAX_AGE", "31536000"))  # 1 year
     CSP_REPORT_URI = os.getenv("CSP_REPORT_URI")
     SECURITY_HEADERS_ENABLED = os.getenv("SECURITY_HEADERS_ENABLED", "true").lower() == "true"
+    CSP_NONCE_ENABLED = os.getenv("CSP_NONCE_ENABLED", "false").lower() == "true"
     
     # CORS Configuration
     CORS_ALLOWED_ORIGINS = os.getenv("CORS_ALLOWED_ORIGINS", "http://localhost:3000").split(",")
@@ -114,7 +117,8 @@ class SecurityConfig:
             "token_lifetime": timedelta(hours=cls.CSRF_TOKEN_LIFETIME_HOURS),
             "cookie_secure": cls.CSRF_COOKIE_SECURE,
             "cookie_httponly": cls.CSRF_COOKIE_HTTPONLY,
-            "cookie_samesite": cls.CSRF_COOKIE_SAMESITE
+            "cookie_samesite": cls.CSRF_COOKIE_SAMESITE,
+            "stateless": cls.CSRF_STATELESS
         }
     
     @classmethod
@@ -142,7 +146,8 @@ class SecurityConfig:
         return {
             "enabled": cls.SECURITY_HEADERS_ENABLED,
             "hsts_max_age": cls.HSTS_MAX_AGE,
-            "csp_report_uri": cls.CSP_REPORT_URI
+            "csp_report_uri": cls.CSP_REPORT_URI,
+            "csp_nonce": cls.CSP_NONCE_ENABLED
         }
     
     @classmethod
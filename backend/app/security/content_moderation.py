@@ -11,6 +11,11 @@ import json
 import hashlib
 from datetime import datetime, timezone
 
+from app.security.pattern_scanner import (
+    LEETSPEAK_MAP, PROFANITY_WORDS, SPAM_RULES, PatternScanner, ScanResult,
+    compiled_obfuscation_pattern, default_scanner, obfuscation_pattern
+)
+
 logger = logging.getLogger(__name__)
 
 class ModerationAction(Enum):
@@ -39,27 +44,27 @@ class ModerationResult:
 class ProfanityFilter:
     """Advanced profanity filtering with context awareness"""
     
-    def __init__(self):
-        # Basic profanity list (sanitized for code)
-        self.profanity_words = {
-            # Mild profanity
-            "damn", "hell", "crap", "suck", "stupid", "idiot", "moron",
-            # Placeholder for actual profanity words - in production, load from secure config
-            "badword1", "badword2", "offensive1", "offensive2"
+    def __init__(self, scanner: Optional[PatternScanner] = None):
+        # Shared single-pass scanner for obfuscated profanity and spam patterns
+        self.scanner = scanner or default_scanner
+        self._scanned_words = {
+            rule.name for rule in self.scanner.rules if rule.category == "profanity"
         }
         
+        # Basic profanity list (sanitized for code)
+        self.profanity_words = set(PROFANITY_WORDS)
+        
         # Leetspeak and obfuscation patterns
-        self.leetspeak_map = {
-            '4': 'a', '@': 'a', '3': 'e', '1': 'i', '!': 'i',
-            '0': 'o', '5': 's', '$': 's', '7': 't', '+': 't'
-        }
+        self.leetspeak_map = dict(LEETSPEAK_MAP)
+        
+        # Single alternation used to mask profanity in filtered content, and
+        # the word set it was built from
+        self._mask_words: frozenset = frozenset()
+        self._mask_pattern: Optional[re.Pattern] = None
         
         # Context-aware patterns
         self.context_patterns = {
-            'repeated_chars': re.compile(r'(.)\1{2,}'),  # aaaaaa
-            'excessive_caps': re.compile(r'[A-Z]{4,}'),   # AAAA
-            'mixed_case_spam': re.compile(r'([a-z][A-Z]){3,}'),  # aBcDeFg
-            'number_substitution': re.compile(r'[0-9@$!+]{2,}'),  # 1337 speak
+            rule.name: re.compile(rule.pattern) for rule in SPAM_RULES
         }
         
         # Severity levels
@@ -81,25 +86,20 @@ class ProfanityFilter:
             'destroyer', 'warpath', 'havok', 'psylocke'
         }
     
+    @property
+    def _profanity_mask_pattern(self) -> re.Pattern:
+        """Mask pattern for the current word set, rebuilt when words are added or removed"""
+        if self._mask_pattern is None or self._mask_words != self.profanity_words:
+            self._mask_words = frozenset(self.profanity_words)
+            self._mask_pattern = re.compile(
+                "|".join(re.escape(word) for word in sorted(self._mask_words, key=len, reverse=True)),
+                re.IGNORECASE
+            )
+        return self._mask_pattern
+    
     def normalize_text(self, text: str) -> str:
         """Normalize text for consistent filtering"""
-        if not text:
-            return ""
-        
-        # Convert to lowercase
-        normalized = text.lower().strip()
-        
-        # Remove excessive whitespace
-        normalized = re.sub(r'\s+', ' ', normalized)
-        
-        # Decode leetspeak
-        for leet, normal in self.leetspeak_map.items():
-            normalized = normalized.replace(leet, normal)
-        
-        # Remove non-alphanumeric characters for pattern matching
-        pattern_text = re.sub(r'[^a-z0-9\s]', '', normalized)
-        
-        return pattern_text
+        return self.scanner.normalize(text)
     
     def check_profanity(self, text: str, category: ContentCategory) -> ModerationResult:
         """Check text for profanity and inappropriate content"""
@@ -107,6 +107,7 @@ class ProfanityFilter:
             return ModerationResult(ModerationAction.ALLOW, 1.0, [])
         
         normalized = self.normalize_text(text)
+        scan = self.scanner.scan(text, categories=("profanity", "spam"))
         reasons = []
         confidence = 0.0
         action = ModerationAction.ALLOW
@@ -116,11 +117,11 @@ class ProfanityFilter:
         confidence = max(confidence, profanity_score)
         
         # Check for obfuscated profanity
-        obfuscation_score = self._check_obfuscated_profanity(text, reasons)
+        obfuscation_score = self._check_obfuscated_profanity(scan, reasons)
         confidence = max(confidence, obfuscation_score)
         
         # Check for spam patterns
-        spam_score = self._check_spam_patterns(text, reasons)
+        spam_score = self._check_spam_patterns(scan, reasons)
         confidence = max(confidence, spam_score)
         
         # Category-specific checks
@@ -161,15 +162,19 @@ class ProfanityFilter:
         
         return max_score
     
-    def _check_obfuscated_profanity(self, text: str, reasons: List[str]) -> float:
+    def _check_obfuscated_profanity(self, scan: ScanResult, reasons: List[str]) -> float:
         """Check for obfuscated or disguised profanity"""
         max_score = 0.0
         
-        # Check for character substitution patterns
-        for profane_word in self.profanity_words:
-            # Create regex pattern for obfuscated versions
-            pattern = self._create_obfuscation_pattern(profane_word)
-            if re.search(pattern, text, re.IGNORECASE):
+        # Character substitution patterns were matched by the shared scan
+        for profane_word in scan.rule_names("profanity"):
+            if profane_word in self.profanity_words:
+                reasons.append(f"Contains obfuscated profanity: {profane_word}")
+                max_score = max(max_score, 0.7)
+        
+        # Words added to this filter after the scanner was built use cached patterns
+        for profane_word in self.profanity_words - self._scanned_words:
+            if compiled_obfuscation_pattern(profane_word).search(scan.text):
                 reasons.append(f"Contains obfuscated profanity: {profane_word}")
                 max_score = max(max_score, 0.7)
         
@@ -177,42 +182,28 @@ class ProfanityFilter:
     
     def _create_obfuscation_pattern(self, word: str) -> str:
         """Create regex pattern to match obfuscated versions of a word"""
-        pattern = ""
-        for char in word:
-            if char == 'a':
-                pattern += r'[a@4]'
-            elif char == 'e':
-                pattern += r'[e3]'
-            elif char == 'i':
-                pattern += r'[i1!]'
-            elif char == 'o':
-                pattern += r'[o0]'
-            elif char == 's':
-                pattern += r'[s5$]'
-            elif char == 't':
-                pattern += r'[t7+]'
-            else:
-                pattern += char
-        
-        return pattern
-    
-    def _check_spam_patterns(self, text: str, reasons: List[str]) -> float:
+        return obfuscation_pattern(word)
+    
+    def _check_spam_patterns(self, scan: ScanResult, reasons: List[str]) -> float:
         """Check for spam-like patterns"""
         max_score = 0.0
+        matched = {}
+        for match in scan.by_category("spam"):
+            matched.setdefault(match.rule.name, []).append(match.text)
         
         # Repeated characters
-        if self.context_patterns['repeated_chars'].search(text):
+        if 'repeated_chars' in matched:
             reasons.append("Contains repeated characters")
             max_score = max(max_score, 0.4)
         
         # Excessive caps
-        caps_matches = self.context_patterns['excessive_caps'].findall(text)
-        if caps_matches and len(''.join(caps_matches)) > len(text) * 0.5:
+        caps_matches = matched.get('excessive_caps')
+        if caps_matches and len(''.join(caps_matches)) > len(scan.text) * 0.5:
             reasons.append("Excessive use of capital letters")
             max_score = max(max_score, 0.5)
         
         # Mixed case spam
-        if self.context_patterns['mixed_case_spam'].search(text):
+        if 'mixed_case_spam' in matched:
             reasons.append("Suspicious mixed case pattern")
             max_score = max(max_score, 0.6)
         
@@ -269,11 +260,7 @@ class ProfanityFilter:
             return "[CONTENT UNDER REVIEW]"
         elif action == ModerationAction.WARN:
             # Replace profanity with asterisks
-            filtered = text
-            for word in self.profanity_words:
-                pattern = re.compile(re.escape(word), re.IGNORECASE)
-                filtered = pattern.sub('*' * len(word), filtered)
-            return filtered
+            return self._profanity_mask_pattern.sub(lambda match: '*' * len(match.group(0)), text)
         
         return text
 
@@ -465,9 +452,68 @@ class ContentModerationManager:
                                 if len(violations) >= 3])
         }
 
+RawHeaders = Tuple[Tuple[bytes, bytes], ...]
+
+@dataclass(frozen=True)
+class SecurityHeaderBlock:
+    """Security headers for one route class, encoded once for the ASGI layer"""
+    route_class: str
+    headers: Dict[str, str]
+    raw_headers: RawHeaders
+    # Applied only to 2xx responses whose endpoint has not set the header itself
+    raw_defaults: RawHeaders = ()
+    # raw_headers without Content-Security-Policy, plus the CSP split around
+    # the nonce, for blocks whose policy can carry a per-request nonce
+    raw_headers_without_csp: RawHeaders = ()
+    csp_nonce_template: Optional[Tuple[bytes, bytes]] = None
+    
+    @property
+    def supports_nonce(self) -> bool:
+        return self.csp_nonce_template is not None
+    
+    def with_nonce(self, nonce: str) -> List[Tuple[bytes, bytes]]:
+        """Header list with a per-request CSP nonce spliced into the policy"""
+        if self.csp_nonce_template is None:
+            return list(self.raw_headers)
+        prefix, suffix = self.csp_nonce_template
+        headers = list(self.raw_headers_without_csp)
+        headers.append((b"content-security-policy", prefix + nonce.encode("ascii") + suffix))
+        return headers
+
 class SecurityHeadersManager:
     """Manages security headers for HTTP responses"""
     
+    # Route classes, matched by path prefix in order; anything else is "default"
+    ROUTE_CLASSES = (
+        ("api", "/api/"),
+        ("images", "/images/"),
+        # FastAPI's interactive docs (Swagger UI and ReDoc load from a CDN)
+        ("docs", "/docs"),
+        ("docs", "/redoc"),
+        ("docs", "/openapi.json"),
+    )
+    
+    # Swagger UI and ReDoc bundles, styles and workers
+    DOCS_CSP = "; ".join([
+        "default-src 'self'",
+        "script-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net",
+        "style-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net https://fonts.googleapis.com",
+        "font-src 'self' https://fonts.gstatic.com",
+        "img-src 'self' data: https:",
+        "worker-src 'self' blob:",
+        "connect-src 'self'",
+        "object-src 'none'",
+        "base-uri 'self'",
+        "frame-ancestors 'none'"
+    ])
+    
+    # Headers that describe caching rather than security, so an endpoint's own
+    # value wins over the route class default and errors never get them
+    DEFAULT_ONLY_HEADERS = frozenset({"Cache-Control"})
+    
+    # Marker used to split the CSP around the nonce when compiling blocks
+    _NONCE_MARKER = "\x00"
+    
     def __init__(self):
         self.default_headers = {
             # Prevent MIME type sniffing
@@ -496,12 +542,26 @@ class SecurityHeadersManager:
             'Cross-Origin-Opener-Policy': 'same-origin',
             'Cross-Origin-Resource-Policy': 'same-origin'
         }
+        
+        # Header sets are compiled once per route class; responses only copy them
+        self.route_headers = {
+            route_class: self._build_route_headers(route_class)
+            for route_class in self.route_classes()
+        }
+        self.header_blocks = {
+            route_class: self._compile_header_block(route_class)
+            for route_class in self.route_classes()
+        }
     
-    def _build_csp_header(self) -> str:
-        """Build Content Security Policy header"""
+    def _build_csp_header(self, nonce: Optional[str] = None) -> str:
+        """Build Content Security Policy header, optionally allowing a script nonce"""
+        script_src = "script-src 'self' 'unsafe-inline' https://www.google.com https://www.gstatic.com"  # For reCAPTCHA
+        if nonce is not None:
+            script_src += f" 'nonce-{nonce}'"
+        
         csp_directives = [
             "default-src 'self'",
-            "script-src 'self' 'unsafe-inline' https://www.google.com https://www.gstatic.com",  # For reCAPTCHA
+            script_src,
             "style-src 'self' 'unsafe-inline' https://fonts.googleapis.com",
             "font-src 'self' https://fonts.gstatic.com",
             "img-src 'self' data: https:",  # Allow images from CDN
@@ -516,23 +576,79 @@ class SecurityHeadersManager:
         
         return "; ".join(csp_directives)
     
-    def get_security_headers(self, request_path: str = None, 
-                           additional_headers: Dict[str, str] = None) -> Dict[str, str]:
-        """Get security headers for a response"""
+    @classmethod
+    def route_classes(cls) -> List[str]:
+        """All route classes headers are compiled for"""
+        return list(dict.fromkeys(route_class for route_class, _ in cls.ROUTE_CLASSES)) + ["default"]
+    
+    @classmethod
+    def classify_path(cls, request_path: Optional[str]) -> str:
+        """Map a request path to its route class"""
+        if request_path:
+            for route_class, prefix in cls.ROUTE_CLASSES:
+                if request_path.startswith(prefix):
+                    return route_class
+        return "default"
+    
+    def _build_route_headers(self, route_class: str) -> Dict[str, str]:
+        """Build the header set for a route class"""
         headers = self.default_headers.copy()
         
         # Path-specific header modifications
-        if request_path:
-            if request_path.startswith('/api/'):
-                # API endpoints don't need some browser security headers
-                headers.pop('X-Frame-Options', None)
-                # More restrictive CSP for API
-                headers['Content-Security-Policy'] = "default-src 'none'"
-            
-            elif request_path.startswith('/images/'):
-                # Image endpoints
-                headers['Cache-Control'] = 'public, max-age=31536000, immutable'
-                headers['Cross-Origin-Resource-Policy'] = 'cross-origin'
+        if route_class == "api":
+            # API endpoints don't need some browser security headers
+            headers.pop('X-Frame-Options', None)
+            # More restrictive CSP for API
+            headers['Content-Security-Policy'] = "default-src 'none'"
+        
+        elif route_class == "images":
+            # Image endpoints
+            headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+            headers['Cross-Origin-Resource-Policy'] = 'cross-origin'
+        
+        elif route_class == "docs":
+            # CDN assets carry no CORP header, so cross-origin isolation would block them
+            headers['Content-Security-Policy'] = self.DOCS_CSP
+            headers.pop('Cross-Origin-Embedder-Policy', None)
+        
+        return headers
+    
+    def _compile_header_block(self, route_class: str) -> SecurityHeaderBlock:
+        """Encode a route class's headers into the raw form ASGI responses use"""
+        headers = self.route_headers[route_class]
+        raw_headers = []
+        raw_defaults = []
+        for name, value in headers.items():
+            target = raw_defaults if name in self.DEFAULT_ONLY_HEADERS else raw_headers
+            target.append((name.lower().encode("latin-1"), value.encode("latin-1")))
+        
+        # Only the browser-facing policy (the default CSP) takes script nonces
+        csp_nonce_template = None
+        raw_headers_without_csp = ()
+        if headers.get('Content-Security-Policy') == self._build_csp_header():
+            prefix, suffix = self._build_csp_header(self._NONCE_MARKER).split(self._NONCE_MARKER)
+            csp_nonce_template = (prefix.encode("latin-1"), suffix.encode("latin-1"))
+            raw_headers_without_csp = tuple(
+                header for header in raw_headers if header[0] != b"content-security-policy"
+            )
+        
+        return SecurityHeaderBlock(
+            route_class=route_class,
+            headers=dict(headers),
+            raw_headers=tuple(raw_headers),
+            raw_defaults=tuple(raw_defaults),
+            raw_headers_without_csp=raw_headers_without_csp,
+            csp_nonce_template=csp_nonce_template
+        )
+    
+    def get_header_block(self, request_path: Optional[str] = None) -> SecurityHeaderBlock:
+        """Get the precompiled header block for a request path"""
+        return self.header_blocks[self.classify_path(request_path)]
+    
+    def get_security_headers(self, request_path: str = None, 
+                           additional_headers: Dict[str, str] = None) -> Dict[str, str]:
+        """Get security headers for a response"""
+        headers = self.route_headers[self.classify_path(request_path)].copy()
         
         # Add any additional headers
         if additional_headers:
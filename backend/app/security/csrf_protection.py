@@ -2,17 +2,24 @@
 CSRF (Cross-Site Request Forgery) protection utilities
 """
 
+import asyncio
 import secrets
 import hmac
 import hashlib
 import logging
-from typing import Optional, Dict, Any
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
 from datetime import datetime, timedelta, timezone
 from dataclasses import dataclass
+from threading import Lock
 
 from fastapi import Request, HTTPException, status
 from fastapi.responses import Response
 
+from app.auth.jwt_handler import jwt_handler
+from app.security.config import SecurityConfig
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -88,6 +95,15 @@ class CSRFProtection:
                 detail="Failed to generate CSRF token"
             )
     
+    async def prefetch(self, user_id: Optional[str] = None):
+        """Load any shared state a token for ``user_id`` needs without blocking the event loop"""
+    
+    async def validate_token_async(self, token: str, user_id: Optional[str] = None,
+                                   session_id: Optional[str] = None) -> bool:
+        """Validate a CSRF token from async code (the request path)"""
+        await self.prefetch(user_id)
+        return self.validate_token(token, user_id, session_id)
+    
     def validate_token(self, token: str, user_id: Optional[str] = None,
                       session_id: Optional[str] = None, mark_used: bool = True) -> bool:
         """Validate a CSRF token"""
@@ -243,6 +259,231 @@ class CSRFProtection:
             "valid_tokens": total_tokens - expired_tokens - used_tokens
         }
 
+class CSRFGenerationStore:
+    """
+    Per-user CSRF token generation counters.
+    
+    With a Redis client the counters are shared by every worker and bumped
+    with an atomic INCR; without one they live in this process only. Reads
+    are cached for ``cache_ttl`` seconds in an LRU of ``max_cached_users``
+    entries, so a revocation made on another worker takes effect there within
+    that window. The request path fills the cache with ``prefetch``, which
+    runs the Redis read in a worker thread.
+    """
+    
+    def __init__(self, redis_client=None, cache_ttl: float = 1.0,
+                 key_prefix: str = "csrf_generation", max_cached_users: int = 10000):
+        self.redis_client = redis_client
+        self.cache_ttl = cache_ttl
+        self.key_prefix = key_prefix
+        self.max_cached_users = max_cached_users
+        # Only users whose tokens were revoked have an entry here
+        self.local_generations: Dict[str, int] = {}
+        self._cache: "OrderedDict[str, Tuple[float, int]]" = OrderedDict()
+        self._lock = Lock()
+    
+    def _key(self, user_id: str) -> str:
+        return f"{self.key_prefix}:{user_id}"
+    
+    def _cached(self, user_id: str) -> Optional[int]:
+        """Cached generation for a user, if still fresh"""
+        with self._lock:
+            cached = self._cache.get(user_id)
+            if cached is None:
+                return None
+            if cached[0] <= time.monotonic():
+                del self._cache[user_id]
+                return None
+            self._cache.move_to_end(user_id)
+            return cached[1]
+    
+    def _cache_put(self, user_id: str, generation: int):
+        with self._lock:
+            self._cache[user_id] = (time.monotonic() + self.cache_ttl, generation)
+            self._cache.move_to_end(user_id)
+            while len(self._cache) > self.max_cached_users:
+                self._cache.popitem(last=False)
+    
+    def get(self, user_id: str) -> int:
+        """Get a user's current generation, using the read cache when fresh"""
+        if self.redis_client is None:
+            return self.local_generations.get(user_id, 0)
+        
+        generation = self._cached(user_id)
+        if generation is not None:
+            return generation
+        
+        value = self.redis_client.get(self._key(user_id))
+        generation = int(value) if value is not None else 0
+        self._cache_put(user_id, generation)
+        return generation
+    
+    async def prefetch(self, user_id: str):
+        """Fill the read cache for a user off the event loop, so ``get`` is answered from it"""
+        if self.redis_client is not None and self._cached(user_id) is None:
+            await asyncio.to_thread(self.get, user_id)
+    
+    def increment(self, user_id: str) -> int:
+        """Atomically bump a user's generation and return the new value"""
+        if self.redis_client is None:
+            with self._lock:
+                generation = self.local_generations.get(user_id, 0) + 1
+                self.local_generations[user_id] = generation
+            return generation
+        
+        generation = int(self.redis_client.incr(self._key(user_id)))
+        self._cache_put(user_id, generation)
+        return generation
+    
+    def revoked_users(self) -> int:
+        """Number of users with a bumped generation"""
+        if self.redis_client is None:
+            return len(self.local_generations)
+        return sum(1 for _ in self.redis_client.scan_iter(match=self._key("*"), count=500))
+
+class StatelessCSRFProtection(CSRFProtection):
+    """
+    CSRF protection without a server-side token table.
+    
+    Tokens carry their own expiry and a per-user generation number and are
+    HMAC-signed together with the user/session binding, so any worker that
+    shares the secret key can validate them without a lookup. Revoking a
+    user's tokens bumps their generation counter instead of deleting tokens.
+    Because nothing is stored per token, single-use (replay) tracking is not
+    available in this mode; tokens are valid until they expire or are revoked.
+    """
+    
+    TOKEN_VERSION = "v1"
+    
+    def __init__(self, secret_key: str, token_lifetime: timedelta = timedelta(hours=1),
+                 generation_store: Optional[CSRFGenerationStore] = None):
+        super().__init__(secret_key, token_lifetime)
+        self.generation_store = generation_store or CSRFGenerationStore()
+        self.tokens_issued = 0
+        self.validation_failures = 0
+    
+    def _current_generation(self, user_id: Optional[str]) -> int:
+        """Get the current token generation for a user"""
+        if not user_id:
+            return 0
+        return self.generation_store.get(user_id)
+    
+    async def prefetch(self, user_id: Optional[str] = None):
+        """Read the user's generation off the event loop before generating or validating"""
+        if user_id:
+            await self.generation_store.prefetch(user_id)
+    
+    def _sign(self, nonce: str, expires: int, generation: int,
+              user_id: Optional[str], session_id: Optional[str]) -> str:
+        """Compute the token signature over its fields and binding"""
+        payload = (
+            f"{self.TOKEN_VERSION}:{nonce}:{expires}:{generation}:"
+            f"{user_id or 'anonymous'}:{session_id or 'no_session'}"
+        )
+        return hmac.new(self.secret_key, payload.encode(), hashlib.sha256).hexdigest()
+    
+    def _parse_token(self, token: str) -> Optional[Tuple[str, str, int, int, str]]:
+        """Split a token into (version, nonce, expires, generation, signature)"""
+        parts = token.split('.')
+        if len(parts) != 5:
+            return None
+        
+        version, nonce, expires, generation, signature = parts
+        if version != self.TOKEN_VERSION or not expires.isdigit() or not generation.isdigit():
+            return None
+        
+        return version, nonce, int(expires), int(generation), signature
+    
+    def generate_token(self, user_id: Optional[str] = None,
+                      session_id: Optional[str] = None) -> str:
+        """Generate a new self-contained CSRF token"""
+        try:
+            nonce = secrets.token_urlsafe(16)
+            expires = int(time.time() + self.token_lifetime.total_seconds())
+            generation = self._current_generation(user_id)
+            signature = self._sign(nonce, expires, generation, user_id, session_id)
+            
+            self.tokens_issued += 1
+            logger.debug(f"Generated stateless CSRF token for user: {user_id}")
+            return f"{self.TOKEN_VERSION}.{nonce}.{expires}.{generation}.{signature}"
+            
+        except Exception as e:
+            logger.error(f"Error generating CSRF token: {e}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to generate CSRF token"
+            )
+    
+    def validate_token(self, token: str, user_id: Optional[str] = None,
+                      session_id: Optional[str] = None, mark_used: bool = True) -> bool:
+        """Validate a CSRF token by signature, expiry and generation"""
+        try:
+            if not token:
+                logger.warning("CSRF validation failed: No token provided")
+                self.validation_failures += 1
+                return False
+            
+            parsed = self._parse_token(token)
+            if not parsed:
+                logger.warning("CSRF validation failed: Invalid token format")
+                self.validation_failures += 1
+                return False
+            
+            _, nonce, expires, generation, signature = parsed
+            
+            # Constant-time comparison; also enforces the user/session binding
+            expected_signature = self._sign(nonce, expires, generation, user_id, session_id)
+            if not hmac.compare_digest(signature, expected_signature):
+                logger.warning("CSRF validation failed: Invalid signature")
+                self.validation_failures += 1
+                return False
+            
+            if time.time() > expires:
+                logger.warning("CSRF validation failed: Token expired")
+                self.validation_failures += 1
+                return False
+            
+            if generation != self._current_generation(user_id):
+                logger.warning("CSRF validation failed: Token revoked")
+                self.validation_failures += 1
+                return False
+            
+            logger.debug(f"CSRF token validated successfully for user: {user_id}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error validating CSRF token: {e}")
+            return False
+    
+    def get_token_info(self, token: str) -> Optional[Dict[str, Any]]:
+        """Decode the unauthenticated fields of a token (for debugging/monitoring)"""
+        parsed = self._parse_token(token) if token else None
+        if not parsed:
+            return None
+        
+        _, _, expires, generation, _ = parsed
+        expires_at = datetime.fromtimestamp(expires, tz=timezone.utc)
+        return {
+            "expires_at": expires_at.isoformat(),
+            "generation": generation,
+            "time_remaining": (expires_at - datetime.now(timezone.utc)).total_seconds(),
+            "stateless": True
+        }
+    
+    def revoke_user_tokens(self, user_id: str):
+        """Revoke all outstanding CSRF tokens for a user by bumping their generation"""
+        generation = self.generation_store.increment(user_id)
+        logger.info(f"Revoked CSRF tokens for user: {user_id} (generation {generation})")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get CSRF protection statistics"""
+        return {
+            "mode": "stateless",
+            "tokens_issued": self.tokens_issued,
+            "validation_failures": self.validation_failures,
+            "revoked_users": self.generation_store.revoked_users()
+        }
+
 class CSRFMiddleware:
     """FastAPI middleware for CSRF protection"""
     
@@ -278,7 +519,7 @@ class CSRFMiddleware:
                 )
             
             # Validate CSRF token
-            if not self.csrf_protection.validate_token(csrf_token, user_id, session_id):
+            if not await self.csrf_protection.validate_token_async(csrf_token, user_id, session_id):
                 logger.warning(f"CSRF protection: Invalid token for {request.method} {request.url.path}")
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
@@ -413,10 +654,19 @@ class DependencyScanner:
         }
 
 # Global instances
-csrf_protection = CSRFProtection(
-    secret_key="your-csrf-secret-key",  # Should be loaded from secure config
-    token_lifetime=timedelta(hours=1)
-)
+_csrf_config = SecurityConfig.get_csrf_config()
+if _csrf_config["stateless"]:
+    # Share generation counters through the token revocation Redis client
+    csrf_protection = StatelessCSRFProtection(
+        secret_key=_csrf_config["secret_key"],
+        token_lifetime=_csrf_config["token_lifetime"],
+        generation_store=CSRFGenerationStore(jwt_handler.revocation_store.redis_client)
+    )
+else:
+    csrf_protection = CSRFProtection(
+        secret_key=_csrf_config["secret_key"],
+        token_lifetime=_csrf_config["token_lifetime"]
+    )
 
 dependency_scanner = DependencyScanner()
 
@@ -425,6 +675,11 @@ def generate_csrf_token(user_id: str = None, session_id: str = None) -> str:
     """Generate a CSRF token"""
     return csrf_protection.generate_token(user_id, session_id)
 
+async def generate_csrf_token_async(user_id: str = None, session_id: str = None) -> str:
+    """Generate a CSRF token from async code, without blocking the event loop"""
+    await csrf_protection.prefetch(user_id)
+    return csrf_protection.generate_token(user_id, session_id)
+
 def validate_csrf_token(token: str, user_id: str = None, session_id: str = None) -> bool:
     """Validate a CSRF token"""
     return csrf_protection.validate_token(token, user_id, session_id)
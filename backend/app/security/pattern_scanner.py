@@ -0,0 +1,246 @@
+"""
+Shared multi-pattern scanner used by content moderation and threat detection
+"""
+
+import re
+import string
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Pattern, Sequence, Tuple
+
+# Leetspeak substitutions understood by normalization and obfuscation matching
+LEETSPEAK_MAP = {
+    '4': 'a', '@': 'a', '3': 'e', '1': 'i', '!': 'i',
+    '0': 'o', '5': 's', '$': 's', '7': 't', '+': 't'
+}
+
+# Character classes used when building obfuscated variants of a word
+OBFUSCATION_CLASSES = {
+    'a': r'[a@4]',
+    'e': r'[e3]',
+    'i': r'[i1!]',
+    'o': r'[o0]',
+    's': r'[s5$]',
+    't': r'[t7+]',
+}
+
+# Basic profanity list (sanitized for code)
+PROFANITY_WORDS = frozenset({
+    # Mild profanity
+    "damn", "hell", "crap", "suck", "stupid", "idiot", "moron",
+    # Placeholder for actual profanity words - in production, load from secure config
+    "badword1", "badword2", "offensive1", "offensive2"
+})
+
+# One translation table: lowercase leetspeak is decoded, remaining ASCII
+# punctuation and control characters are dropped.
+_NORMALIZE_TABLE = str.maketrans({
+    **{char: None for char in string.punctuation if char not in LEETSPEAK_MAP},
+    **{chr(code): None for code in range(32) if not chr(code).isspace()},
+    '\x7f': None,
+    **LEETSPEAK_MAP,
+})
+
+# Fallback for non-ASCII input, which the translation table cannot enumerate
+_NON_ALNUM_PATTERN = re.compile(r'[^a-z0-9\s]')
+
+# Marker cached for category requests that select no rules
+_NO_RULES = ()
+
+
+@dataclass(frozen=True)
+class ScanRule:
+    """A named pattern registered with the scanner"""
+    name: str
+    pattern: str
+    category: str
+    ignore_case: bool = False
+
+
+@dataclass(frozen=True)
+class ScanMatch:
+    """A single rule hit produced by a scan"""
+    rule: ScanRule
+    start: int
+    end: int
+    text: str
+
+
+@dataclass
+class ScanResult:
+    """All rule hits for one input, in rule priority order"""
+    text: str
+    matches: List[ScanMatch]
+
+    def by_category(self, category: str) -> List[ScanMatch]:
+        """Return matches belonging to a category"""
+        return [match for match in self.matches if match.rule.category == category]
+
+    def first(self, category: str) -> Optional[ScanMatch]:
+        """Return the highest-priority match in a category"""
+        for match in self.matches:
+            if match.rule.category == category:
+                return match
+        return None
+
+    def rule_names(self, category: str) -> List[str]:
+        """Return distinct rule names that matched in a category"""
+        names: List[str] = []
+        for match in self.matches:
+            if match.rule.category == category and match.rule.name not in names:
+                names.append(match.rule.name)
+        return names
+
+
+# Patterns that indicate suspicious behavior in free-text input (priority order)
+SUSPICIOUS_INPUT_RULES = [
+    # Bot-like behavior patterns
+    ScanRule("bot_prefix", r'^(bot|crawler|spider|scraper)', "suspicious", ignore_case=True),
+    ScanRule("automation_terms", r'(automated|script|tool)', "suspicious", ignore_case=True),
+
+    # Injection attempt patterns
+    ScanRule("quoted_markup", r'[<>"\'].*?[<>"\']', "suspicious", ignore_case=True),
+    ScanRule("sql_keywords", r'(union|select|insert|update|delete|drop)', "suspicious", ignore_case=True),
+    ScanRule("script_handlers", r'(javascript|vbscript|onload|onerror)', "suspicious", ignore_case=True),
+
+    # Enumeration patterns
+    ScanRule("reserved_prefix", r'^(admin|test|user|guest|root)', "suspicious", ignore_case=True),
+    ScanRule("ip_address", r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}', "suspicious"),  # IP addresses as usernames
+
+    # Brute force patterns
+    ScanRule("length_extremes", r'^.{1,2}$|^.{50,}$', "suspicious"),  # Very short or very long inputs
+]
+
+# Context-aware spam patterns
+SPAM_RULES = [
+    ScanRule("repeated_chars", r'(?P<repeated_char>.)(?P=repeated_char){2,}', "spam"),  # aaaaaa
+    ScanRule("excessive_caps", r'[A-Z]{4,}', "spam"),  # AAAA
+    ScanRule("mixed_case_spam", r'([a-z][A-Z]){3,}', "spam"),  # aBcDeFg
+    ScanRule("number_substitution", r'[0-9@$!+]{2,}', "spam"),  # 1337 speak
+]
+
+
+def _rename_groups(pattern: str, suffix: str) -> str:
+    """Suffix named groups so a rule body can appear twice in one expression"""
+    pattern = re.sub(r'\(\?P<(\w+)>', rf'(?P<\1{suffix}>', pattern)
+    return re.sub(r'\(\?P=(\w+)\)', rf'(?P=\1{suffix})', pattern)
+
+
+@lru_cache(maxsize=1024)
+def obfuscation_pattern(word: str) -> str:
+    """Build (and cache) a regex source matching obfuscated versions of a word"""
+    return "".join(OBFUSCATION_CLASSES.get(char, re.escape(char)) for char in word)
+
+
+@lru_cache(maxsize=1024)
+def compiled_obfuscation_pattern(word: str) -> Pattern:
+    """Compiled, case-insensitive form of obfuscation_pattern"""
+    return re.compile(obfuscation_pattern(word), re.IGNORECASE)
+
+
+def profanity_rules(words: Iterable[str]) -> List[ScanRule]:
+    """Build obfuscation-aware rules for a profanity word list"""
+    return [
+        ScanRule(word, obfuscation_pattern(word), "profanity", ignore_case=True)
+        for word in sorted(words)
+    ]
+
+
+class PatternScanner:
+    """
+    Matches many regex rules against an input in a single pass.
+
+    All rules are folded into one compiled expression in which every rule sits
+    in its own optional lookahead, so one scan reports every rule that fires
+    (including overlapping hits from different rules) while each rule still
+    yields the same non-overlapping matches it would produce on its own.
+    """
+
+    def __init__(self, rules: Sequence[ScanRule]):
+        self.rules: List[ScanRule] = list(rules)
+        self._compiled: Dict[FrozenSet[str], Tuple[Pattern, List[Tuple[int, ScanRule]]]] = {}
+        self._categories = frozenset(rule.category for rule in self.rules)
+        self._by_request: Dict[Optional[Tuple[str, ...]], Tuple] = {}
+
+        # Compile the full rule set eagerly so the cost is paid at startup
+        self._get_compiled(self._categories)
+
+    def _get_compiled(self, categories: FrozenSet[str]) -> Tuple[Pattern, List[Tuple[int, ScanRule]]]:
+        """Return the combined pattern for a category subset, compiling it once"""
+        compiled = self._compiled.get(categories)
+        if compiled is not None:
+            return compiled
+
+        gate = []
+        parts = []
+        groups = []
+        for index, rule in enumerate(self.rules):
+            if rule.category not in categories:
+                continue
+            group = f"_rule{index}"
+            flags = "i" if rule.ignore_case else "-i"
+            parts.append(f"(?:(?=(?P<{group}>(?{flags}:{rule.pattern}))))?")
+            gate.append(f"(?{flags}:{_rename_groups(rule.pattern, f'_gate{index}')})")
+            groups.append((group, rule))
+
+        # The leading gate lets the regex engine skip positions where no rule
+        # matches, so only real hits surface to Python.
+        pattern = re.compile(f"(?=(?:{'|'.join(gate)}))" + "".join(parts))
+        compiled = (pattern, [(pattern.groupindex[group], rule) for group, rule in groups])
+        self._compiled[categories] = compiled
+        return compiled
+
+    def scan(self, text: str, categories: Optional[Iterable[str]] = None) -> ScanResult:
+        """
+        Scan text against all rules (or only those in the given categories)
+
+        Returns:
+            ScanResult whose matches are ordered by rule priority, then position
+        """
+        if not text:
+            return ScanResult(text=text or "", matches=[])
+
+        key = categories if categories is None or isinstance(categories, tuple) else tuple(categories)
+        compiled = self._by_request.get(key)
+        if compiled is None:
+            wanted = self._categories if key is None else frozenset(key) & self._categories
+            compiled = self._get_compiled(wanted) if wanted else _NO_RULES
+            self._by_request[key] = compiled
+        if compiled is _NO_RULES:
+            return ScanResult(text=text, matches=[])
+
+        pattern, groups = compiled
+        hits: List[Tuple[int, ScanMatch]] = []
+        last_end: Dict[int, int] = {}
+
+        for position in pattern.finditer(text):
+            spans = position.regs
+            for slot, (group, rule) in enumerate(groups):
+                start, end = spans[group]
+                # Skip misses and hits overlapping this rule's previous match
+                if start < 0 or start < last_end.get(slot, -1):
+                    continue
+                hits.append((slot, ScanMatch(rule=rule, start=start, end=end, text=text[start:end])))
+                last_end[slot] = end if end > start else end + 1
+
+        hits.sort(key=lambda hit: hit[0])
+        return ScanResult(text=text, matches=[match for _, match in hits])
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Lowercase, decode leetspeak, strip punctuation and collapse whitespace"""
+        if not text:
+            return ""
+
+        normalized = " ".join(text.lower().translate(_NORMALIZE_TABLE).split())
+
+        if not normalized.isascii():
+            normalized = " ".join(_NON_ALNUM_PATTERN.sub('', normalized).split())
+
+        return normalized
+
+
+# Shared scanner instance, compiled once at import time
+default_scanner = PatternScanner(
+    SUSPICIOUS_INPUT_RULES + SPAM_RULES + profanity_rules(PROFANITY_WORDS)
+)
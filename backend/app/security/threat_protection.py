@@ -18,6 +18,8 @@ from fastapi import Request, HTTPException, status
 from fastapi.responses import JSONResponse
 import httpx
 
+from app.security.pattern_scanner import default_scanner
+
 logger = logging.getLogger(__name__)
 
 class ThreatLevel(Enum):
@@ -116,7 +118,7 @@ class ThreatDetector:
         self.threat_events: List[ThreatEvent] = []
         self.ip_penalties: Dict[str, ProgressivePenalty] = defaultdict(ProgressivePenalty)
         self.user_penalties: Dict[str, ProgressivePenalty] = defaultdict(ProgressivePenalty)
-        self.suspicious_patterns = self._load_suspicious_patterns()
+        self.scanner = default_scanner
         self.blocked_ips: Set[str] = set()
         self.blocked_users: Set[str] = set()
         
@@ -128,27 +130,6 @@ class ThreatDetector:
             'captcha_failures': {'count': 3, 'window': 300},  # 3 CAPTCHA failures in 5 minutes
         }
     
-    def _load_suspicious_patterns(self) -> List[re.Pattern]:
-        """Load patterns that indicate suspicious behavior"""
-        patterns = [
-            # Bot-like behavior patterns
-            re.compile(r'^(bot|crawler|spider|scraper)', re.IGNORECASE),
-            re.compile(r'(automated|script|tool)', re.IGNORECASE),
-            
-            # Injection attempt patterns
-            re.compile(r'[<>"\'].*?[<>"\']', re.IGNORECASE),
-            re.compile(r'(union|select|insert|update|delete|drop)', re.IGNORECASE),
-            re.compile(r'(javascript|vbscript|onload|onerror)', re.IGNORECASE),
-            
-            # Enumeration patterns
-            re.compile(r'^(admin|test|user|guest|root)', re.IGNORECASE),
-            re.compile(r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}'),  # IP addresses as usernames
-            
-            # Brute force patterns
-            re.compile(r'^.{1,2}$|^.{50,}$'),  # Very short or very long inputs
-        ]
-        return patterns
-    
     def detect_threats(self, request: Request, user_id: Optional[str] = None, 
                       guess: Optional[str] = None) -> List[ThreatEvent]:
         """
@@ -248,19 +229,20 @@ class ThreatDetector:
     def _detect_suspicious_patterns(self, ip_address: str, user_id: Optional[str], 
                                    guess: str, current_time: datetime) -> Optional[ThreatEvent]:
         """Detect suspicious patterns in user input"""
-        for pattern in self.suspicious_patterns:
-            if pattern.search(guess):
-                return ThreatEvent(
-                    timestamp=current_time,
-                    ip_address=ip_address,
-                    user_id=user_id,
-                    threat_type="suspicious_pattern",
-                    threat_level=ThreatLevel.MEDIUM,
-                    details={
-                        "pattern": pattern.pattern,
-                        "input": guess[:100]  # Truncate for logging
-                    }
-                )
+        match = self.scanner.scan(guess, categories=("suspicious",)).first("suspicious")
+        if match:
+            return ThreatEvent(
+                timestamp=current_time,
+                ip_address=ip_address,
+                user_id=user_id,
+                threat_type="suspicious_pattern",
+                threat_level=ThreatLevel.MEDIUM,
+                details={
+                    "pattern": match.rule.pattern,
+                    "rule": match.rule.name,
+                    "input": guess[:100]  # Truncate for logging
+                }
+            )
         
         return None
     
@@ -414,85 +396,15 @@ class ThreatProtectionMiddleware:
             user_id = self._extract_user_id(request)
             ip_address = self.detector._get_client_ip(request)
             
-            # Check if already blocked
-            is_blocked, block_reason = self.detector.is_blocked(ip_address, user_id)
-            if is_blocked:
-                return JSONResponse(
-                    status_code=429,
-                    content={
-                        "error": "Access Blocked",
-                        "detail": block_reason,
-                        "blocked": True
-                    }
-                )
-            
-            # For guess endpoints, check if CAPTCHA is required
-            if (request.url.path in self.captcha_required_endpoints and 
-                self.captcha_provider and request.method == "POST"):
-                
-                captcha_required = await self._should_require_captcha(ip_address, user_id)
-                if captcha_required:
-                    # Check for CAPTCHA in request
-                    body = await request.body()
-                    if body:
-                        try:
-                            data = json.loads(body)
-                            captcha_response = data.get('captcha_response')
-                            
-                            if not captcha_response:
-                                return JSONResponse(
-                                    status_code=400,
-                                    content={
-                                        "error": "CAPTCHA Required",
-                                        "detail": "Please complete the CAPTCHA verification",
-                                        "captcha_required": True,
-                                        "site_key": self.captcha_provider.site_key
-                                    }
-                                )
-                            
-                            # Verify CAPTCHA
-                            captcha_valid = await self.captcha_provider.verify_captcha(
-                                captcha_response, ip_address
-                            )
-                            
-                            if not captcha_valid:
-                                # Record CAPTCHA failure as threat
-                                threat = ThreatEvent(
-                                    timestamp=datetime.utcnow(),
-                                    ip_address=ip_address,
-                                    user_id=user_id,
-                                    threat_type="captcha_failure",
-                                    threat_level=ThreatLevel.MEDIUM,
-                                    details={"captcha_response": captcha_response[:20]}
-                                )
-                                self.detector.threat_events.append(threat)
-                                
-                                return JSONResponse(
-                                    status_code=400,
-                                    content={
-                                        "error": "CAPTCHA Verification Failed",
-                                        "detail": "Please try the CAPTCHA again",
-                                        "captcha_required": True,
-                                        "site_key": self.captcha_provider.site_key
-                                    }
-                                )
-                        except json.JSONDecodeError:
-                            pass
+            rejection = await self.screen_request(request, ip_address, user_id)
+            if rejection:
+                return rejection
             
             # Process request normally
             response = await call_next(request)
             
             # Detect threats after processing (for failed guesses, etc.)
-            if hasattr(request.state, 'guess_failed') and request.state.guess_failed:
-                threat = ThreatEvent(
-                    timestamp=datetime.utcnow(),
-                    ip_address=ip_address,
-                    user_id=user_id,
-                    threat_type="failed_guess",
-                    threat_level=ThreatLevel.LOW,
-                    details={"endpoint": request.url.path}
-                )
-                self.detector.threat_events.append(threat)
+            self.record_outcome(request, ip_address, user_id)
             
             return response
             
@@ -501,6 +413,92 @@ class ThreatProtectionMiddleware:
             # Continue processing on middleware errors
             return await call_next(request)
     
+    async def screen_request(self, request: Request, ip_address: str,
+                             user_id: Optional[str]) -> Optional[JSONResponse]:
+        """
+        Run the pre-request checks (blocks and CAPTCHA)
+        Returns JSONResponse if the request must be rejected, None if allowed
+        """
+        # Check if already blocked
+        is_blocked, block_reason = self.detector.is_blocked(ip_address, user_id)
+        if is_blocked:
+            return JSONResponse(
+                status_code=429,
+                content={
+                    "error": "Access Blocked",
+                    "detail": block_reason,
+                    "blocked": True
+                }
+            )
+        
+        # For guess endpoints, check if CAPTCHA is required
+        if (request.url.path in self.captcha_required_endpoints and 
+            self.captcha_provider and request.method == "POST"):
+            
+            captcha_required = await self._should_require_captcha(ip_address, user_id)
+            if captcha_required:
+                # Check for CAPTCHA in request
+                body = await request.body()
+                if body:
+                    try:
+                        data = json.loads(body)
+                        captcha_response = data.get('captcha_response')
+                        
+                        if not captcha_response:
+                            return JSONResponse(
+                                status_code=400,
+                                content={
+                                    "error": "CAPTCHA Required",
+                                    "detail": "Please complete the CAPTCHA verification",
+                                    "captcha_required": True,
+                                    "site_key": self.captcha_provider.site_key
+                                }
+                            )
+                        
+                        # Verify CAPTCHA
+                        captcha_valid = await self.captcha_provider.verify_captcha(
+                            captcha_response, ip_address
+                        )
+                        
+                        if not captcha_valid:
+                            # Record CAPTCHA failure as threat
+                            threat = ThreatEvent(
+                                timestamp=datetime.utcnow(),
+                                ip_address=ip_address,
+                                user_id=user_id,
+                                threat_type="captcha_failure",
+                                threat_level=ThreatLevel.MEDIUM,
+                                details={"captcha_response": captcha_response[:20]}
+                            )
+                            self.detector.threat_events.append(threat)
+                            
+                            return JSONResponse(
+                                status_code=400,
+                                content={
+                                    "error": "CAPTCHA Verification Failed",
+                                    "detail": "Please try the CAPTCHA again",
+                                    "captcha_required": True,
+                                    "site_key": self.captcha_provider.site_key
+                                }
+                            )
+                    except json.JSONDecodeError:
+                        pass
+        
+        return None
+    
+    def record_outcome(self, request: Request, ip_address: str, user_id: Optional[str]) -> None:
+        """Record threats that only become visible after the request was handled"""
+        if hasattr(request.state, 'guess_failed') and request.state.guess_failed:
+            threat = ThreatEvent(
+                timestamp=datetime.utcnow(),
+                ip_address=ip_address,
+                user_id=user_id,
+                threat_type="failed_guess",
+                threat_level=ThreatLevel.LOW,
+                details={"endpoint": request.url.path}
+            )
+            self.detector.threat_events.append(threat)
+    
     def _extract_user_id(self, request: Request) -> Optional[str]:
         """Extract user ID from request"""
         auth_header = request.headers.get("Authorization")
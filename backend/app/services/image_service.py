@@ -5,10 +5,16 @@ Provides optimized image URLs and handles missing assets gracefully.
 
 import logging
 import hashlib
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, AsyncIterator
 from urllib.parse import urljoin
 from datetime import datetime, timezone
+from azure.core.exceptions import ResourceModifiedError, ResourceNotFoundError
 from app.storage.blob_storage import blob_storage_service
+from app.storage.image_manifest import image_manifest, compute_image_version, ManifestEntry
+from app.storage.image_variants import (
+    FORMAT_PREFERENCE, VARIANT_FORMATS, VARIANT_PREFIX, VARIANT_WIDTHS,
+    accepted_formats, choose_width, parse_variant_path, target_width, variant_blob_path, variant_prefix
+)
 from app.config import settings
 from app.services.cache_service import cache_service
 
@@ -28,6 +34,8 @@ class ImageService:
         }
         # Version tracking for cache invalidation
         self._image_versions = {}
+        # Blob path -> etag/version map; answers lookups without storage calls once loaded
+        self.manifest = image_manifest
     
     def _get_cdn_base_url(self) -> Optional[str]:
         """
@@ -69,16 +77,25 @@ class ImageService:
             Dictionary containing image URL and metadata
         """
         try:
-            # First try to get the direct image URL
-            image_url = await self.blob_service.get_image_url(universe, character_name)
+            blob_path = self.blob_service._get_blob_path(universe, character_name)
+            
+            if self.manifest.is_authoritative(blob_path):
+                entry = self.manifest.get(blob_path)
+                image_url = entry.url if entry else None
+                version_info = entry.version_info() if entry else None
+            else:
+                # First try to get the direct image URL
+                image_url = await self.blob_service.get_image_url(universe, character_name)
+                version_info = None
+                if image_url:
+                    # Get or generate version information
+                    version_info = await self._get_image_version(universe, character_name)
+                elif self.manifest.loaded:
+                    self.manifest.record_missing(blob_path)
             
             if image_url:
-                # Get or generate version information
-                version_info = await self._get_image_version(universe, character_name)
-                
                 # Use CDN URL if available and requested
                 if use_cdn and self.cdn_base_url:
-                    blob_path = self.blob_service._get_blob_path(universe, character_name)
                     image_url = f"{self.cdn_base_url}/{blob_path}"
                 
                 # Add version parameter for cache busting if requested
@@ -156,11 +173,15 @@ class ImageService:
         character_name: str,
         width: Optional[int] = None,
         height: Optional[int] = None,
-        quality: Optional[int] = None
+        quality: Optional[int] = None,
+        accept: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Get optimized image URL with specific dimensions and quality.
-        This would integrate with image processing services in production.
+        
+        A stored variant is used when one covers the requested width (in the
+        best format ``accept`` allows); otherwise the parameters are passed to
+        the CDN as query parameters.
         
         Args:
             universe: The comic universe (marvel, DC, image)
@@ -168,6 +189,7 @@ class ImageService:
             width: Desired width in pixels
             height: Desired height in pixels
             quality: Image quality (1-100)
+            accept: Client ``Accept`` header, for variant format selection
             
         Returns:
             Dictionary containing optimized image URL and metadata
@@ -175,7 +197,25 @@ class ImageService:
         # Get base image info
         image_info = await self.get_character_image_url(universe, character_name)
         
-        if not image_info["is_fallback"] and (width or height or quality):
+        variant = None
+        if not image_info["is_fallback"] and width:
+            variant = self.select_image_variant(universe, character_name, accept=accept, width=width)
+        
+        if variant is not None:
+            variant_width, variant_format = parse_variant_path(variant.blob_path)
+            image_info["url"] = self._variant_url(variant)
+            image_info["optimized"] = True
+            image_info["variant"] = {
+                "width": variant_width,
+                "format": variant_format,
+                "content_type": VARIANT_FORMATS[variant_format][1]
+            }
+            image_info["optimization_params"] = {
+                "width": width,
+                "height": height,
+                "quality": quality
+            }
+        elif not image_info["is_fallback"] and (width or height or quality):
             # In production, this would use Azure Image Processing or similar service
             # For now, we'll append query parameters that could be processed by CDN
             base_url = image_info["url"]
@@ -213,6 +253,10 @@ class ImageService:
             Dictionary containing version information
         """
         try:
+            blob_path = self.blob_service._get_blob_path(universe, character_name)
+            if self.manifest.is_authoritative(blob_path) and self.manifest.get(blob_path):
+                return self.manifest.get(blob_path).version_info()
+            
             # Get image metadata from blob storage
             metadata = await self.blob_service.get_image_metadata(universe, character_name)
             
@@ -222,8 +266,11 @@ class ImageService:
                 etag = metadata.get("etag", "").strip('"')
                 
                 # Generate a short version hash from etag and last modified
-                version_string = f"{etag}:{last_modified}" if last_modified else etag
-                version_hash = hashlib.md5(version_string.encode()).hexdigest()[:8]
+                version_hash = compute_image_version(etag, last_modified)
+                
+                if self.manifest.loaded:
+                    # Re-record a stale entry so the next lookup needs no storage calls
+                    self.manifest.record(metadata)
                 
                 return {
                     "version": version_hash,
@@ -273,6 +320,9 @@ class ImageService:
             cache_key = f"{universe}:{character_name}"
             if cache_key in self._image_versions:
                 del self._image_versions[cache_key]
+            blob_path = self.blob_service._get_blob_path(universe, character_name)
+            self.manifest.invalidate(blob_path)
+            self.manifest.invalidate(prefix=variant_prefix(blob_path))
             
             # Trigger CDN cache invalidation
             await cache_service.invalidate_image_cache(universe, character_name)
@@ -300,6 +350,8 @@ class ImageService:
             keys_to_remove = [key for key in self._image_versions.keys() if key.startswith(f"{universe}:")]
             for key in keys_to_remove:
                 del self._image_versions[key]
+            self.manifest.invalidate(prefix=f"{universe.lower()}/")
+            self.manifest.invalidate(prefix=f"{VARIANT_PREFIX}{universe.lower()}/")
             
             # Trigger CDN cache invalidation for entire universe
             result = await cache_service.invalidate_image_cache(universe)
@@ -420,11 +472,157 @@ class ImageService:
             True if image exists, False otherwise
         """
         try:
+            blob_path = self.blob_service._get_blob_path(universe, character_name)
+            if self.manifest.is_authoritative(blob_path):
+                return self.manifest.get(blob_path) is not None
             image_url = await self.blob_service.get_image_url(universe, character_name)
             return image_url is not None
         except Exception as e:
             logger.error(f"Error validating image for {character_name} in {universe}: {e}")
             return False
+    
+    def _variant_url(self, entry: ManifestEntry, use_cdn: bool = True) -> str:
+        """Versioned URL of a stored variant."""
+        base_url = f"{self.cdn_base_url}/{entry.blob_path}" if use_cdn and self.cdn_base_url else entry.url
+        return f"{base_url}?v={entry.version}"
+    
+    def _stored_variants(self, blob_path: str) -> Dict[str, Dict[int, ManifestEntry]]:
+        """
+        Variants of an image recorded in the manifest, by format and width.
+        
+        Only the manifest is consulted; probing the ladder in storage would
+        cost a call per rung, so until it loads images are served unresized.
+        """
+        variants: Dict[str, Dict[int, ManifestEntry]] = {}
+        for fmt in FORMAT_PREFERENCE:
+            for width in VARIANT_WIDTHS:
+                path = variant_blob_path(blob_path, width, fmt)
+                entry = self.manifest.get(path) if self.manifest.is_authoritative(path) else None
+                if entry is not None:
+                    variants.setdefault(fmt, {})[width] = entry
+        return variants
+    
+    def select_image_variant(
+        self,
+        universe: str,
+        character_name: str,
+        accept: Optional[str] = None,
+        width: Optional[int] = None,
+        dpr: Optional[float] = None,
+        viewport_width: Optional[int] = None,
+        save_data: bool = False
+    ) -> Optional[ManifestEntry]:
+        """
+        Pick the stored variant that best fits the client.
+        
+        The format is the most efficient one ``accept`` allows; the width is
+        the smallest rung covering the requested width, or the viewport width
+        scaled by the device pixel ratio when only client hints are given.
+        
+        Args:
+            universe: The comic universe (marvel, DC, image)
+            character_name: Name of the character
+            accept: Client ``Accept`` header
+            width: Display width in device pixels (``w`` or ``Sec-CH-Width``)
+            dpr: Device pixel ratio hint
+            viewport_width: Viewport width hint in CSS pixels
+            save_data: Whether the client sent ``Save-Data: on``
+            
+        Returns:
+            Manifest entry of the chosen variant, or None to serve the
+            original (no display width known, no variants stored, or the
+            display is wider than every variant)
+        """
+        target = target_width(width, dpr, viewport_width)
+        if target is None:
+            return None
+        
+        variants = self._stored_variants(self.blob_service._get_blob_path(universe, character_name))
+        for fmt in accepted_formats(accept):
+            if fmt in variants:
+                rungs = variants[fmt]
+                chosen = choose_width(target, list(rungs), save_data)
+                return rungs[chosen] if chosen is not None else None
+        return None
+    
+    def get_image_srcset(self, universe: str, character_name: str, use_cdn: bool = True) -> Dict[str, Any]:
+        """
+        Stored variants of an image as one ``srcset`` per format.
+        
+        Sources are ordered most efficient format first, for use as
+        ``<source type=... srcset=...>`` elements of a ``<picture>``.
+        
+        Args:
+            universe: The comic universe (marvel, DC, image)
+            character_name: Name of the character
+            use_cdn: Whether to use CDN URLs
+            
+        Returns:
+            Dictionary with the sources and the available widths
+        """
+        variants = self._stored_variants(self.blob_service._get_blob_path(universe, character_name))
+        sources = [
+            {
+                "type": VARIANT_FORMATS[fmt][1],
+                "srcset": ", ".join(f"{self._variant_url(entry, use_cdn)} {width}w"
+                                    for width, entry in sorted(rungs.items()))
+            }
+            for fmt, rungs in variants.items()
+        ]
+        return {
+            "universe": universe,
+            "character_name": character_name,
+            "sources": sources,
+            "widths": sorted({width for rungs in variants.values() for width in rungs})
+        }
+    
+    async def resolve_image(self, universe: str, character_name: str) -> Optional[ManifestEntry]:
+        """
+        Resolve the current revision of a character image for origin serving.
+        
+        Answered from the manifest when it is authoritative for the image, so
+        conditional requests can be checked without any storage call.
+        
+        Args:
+            universe: The comic universe (marvel, DC, image)
+            character_name: Name of the character
+            
+        Returns:
+            Manifest entry for the image, or None if it does not exist
+        """
+        blob_path = self.blob_service._get_blob_path(universe, character_name)
+        if self.manifest.is_authoritative(blob_path):
+            return self.manifest.get(blob_path)
+        
+        metadata = await self.blob_service.get_image_metadata(universe, character_name)
+        if metadata is None:
+            if self.manifest.loaded:
+                self.manifest.record_missing(blob_path)
+            return None
+        if self.manifest.loaded:
+            return self.manifest.record(metadata)
+        return ManifestEntry.from_properties(metadata)
+    
+    async def open_image_stream(self, entry: ManifestEntry, offset: Optional[int] = None,
+                                length: Optional[int] = None) -> AsyncIterator[bytes]:
+        """
+        Stream the content of a resolved image revision from storage.
+        
+        The download is pinned to the entry's ETag, so the bytes always match
+        the validators already sent to the client.
+        
+        Raises:
+            ResourceNotFoundError: If the image was deleted
+            ResourceModifiedError: If the image changed since it was resolved
+        """
+        try:
+            return await self.blob_service.open_image_stream(
+                entry.blob_path, offset=offset, length=length, etag=entry.etag or None
+            )
+        except (ResourceNotFoundError, ResourceModifiedError):
+            # The manifest is behind storage for this image; resolve it again next time
+            self.manifest.invalidate(entry.blob_path)
+            raise
 
 # Global instance
 image_service = ImageService()
\ No newline at end of file
@@ -1,10 +1,11 @@
 """Puzzle generation and management service"""
 
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
 import random
 import asyncio
+import time
 
 from app.models.puzzle import Puzzle, PuzzleCreate, PuzzleResponse
 from app.repositories.puzzle_repository import PuzzleRepository
@@ -15,9 +16,15 @@ logger = logging.getLogger(__name__)
 class PuzzleService:
     """Service for puzzle generation and management operations"""
     
+    # Built PuzzleResponse objects (and their serialized bytes) are reused for
+    # this long before the repository is consulted again
+    RESPONSE_CACHE_TTL_SECONDS = 60.0
+    RESPONSE_CACHE_MAX_ENTRIES = 64
+    
     def __init__(self):
         self.puzzle_repository = PuzzleRepository()
         self.universes = ["marvel", "DC", "image"]
+        self._response_cache: Dict[Tuple[str, str], Tuple[float, PuzzleResponse]] = {}
     
     def generate_puzzle_id(self, date: str, universe: str) -> str:
         """Generate puzzle ID in format YYYYMMDD-universe"""
@@ -63,7 +70,25 @@ class PuzzleService:
         if date is None:
             date = self.get_today_date()
         
-        return await self.puzzle_repository.get_puzzle_response(universe, date)
+        key = (universe, date)
+        cached = self._response_cache.get(key)
+        now = time.monotonic()
+        if cached and cached[0] > now:
+            return cached[1]
+        
+        puzzle_response = await self.puzzle_repository.get_puzzle_response(universe, date)
+        if puzzle_response is not None:
+            self._response_cache.pop(key, None)
+            if len(self._response_cache) >= self.RESPONSE_CACHE_MAX_ENTRIES:
+                # Evict the oldest entry
+                self._response_cache.pop(next(iter(self._response_cache)))
+            self._response_cache[key] = (now + self.RESPONSE_CACHE_TTL_SECONDS, puzzle_response)
+        
+        return puzzle_response
+    
+    def clear_response_cache(self) -> None:
+        """Drop cached puzzle responses after puzzles change"""
+        self._response_cache.clear()
     
     async def validate_puzzle_guess(self, puzzle_id: str, guess: str) -> tuple[bool, Optional[str], Optional[str]]:
         """Validate a guess against a puzzle and return result with image key"""
@@ -238,15 +263,21 @@ class PuzzleService:
         if not allowed_updates:
             raise ValueError("No valid fields to update")
         
-        return await self.puzzle_repository.update_puzzle(puzzle_id, allowed_updates)
+        updated_puzzle = await self.puzzle_repository.update_puzzle(puzzle_id, allowed_updates)
+        self.clear_response_cache()
+        return updated_puzzle
     
     async def delete_puzzle(self, puzzle_id: str) -> bool:
         """Delete a puzzle"""
-        return await self.puzzle_repository.delete_puzzle(puzzle_id)
+        deleted = await self.puzzle_repository.delete_puzzle(puzzle_id)
+        self.clear_response_cache()
+        return deleted
     
     async def cleanup_old_puzzles(self, days_to_keep: int = 365) -> int:
         """Clean up old puzzles"""
-        return await self.puzzle_repository.cleanup_old_puzzles(days_to_keep)
+        removed = await self.puzzle_repository.cleanup_old_puzzles(days_to_keep)
+        self.clear_response_cache()
+        return removed
     
     async def get_recent_puzzles(self, universe: str, limit: int = 10) -> List[PuzzleResponse]:
         """Get recent puzzles for a universe (without answers)"""
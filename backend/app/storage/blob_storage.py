@@ -3,44 +3,152 @@ Azure Blob Storage utilities for character images.
 Handles image upload, retrieval, and organization by universe.
 """
 
+import asyncio
 import logging
-from typing import Optional, List, BinaryIO
-from azure.storage.blob import BlobServiceClient, BlobClient, ContainerClient
-from azure.core.exceptions import ResourceNotFoundError, AzureError
+from contextlib import contextmanager
+from typing import Optional, List, BinaryIO, AsyncIterator, Set
+from urllib.parse import quote
+import aiohttp
+from azure.core.pipeline.transport import AioHttpTransport
+from azure.storage.blob import ContentSettings
+from azure.storage.blob.aio import BlobServiceClient, BlobClient, ContainerClient
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceNotFoundError, ResourceModifiedError, AzureError
 from app.config import settings
+from app.monitoring.tracing import SpanKind, create_child_span
+from app.storage.image_manifest import image_manifest
+from app.storage.image_variants import ImageVariant, variant_blob_path, variant_prefix
 
 logger = logging.getLogger(__name__)
 
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+class _PooledAioHttpTransport(AioHttpTransport):
+    """
+    SDK aiohttp transport whose session uses a bounded connection pool.
+    
+    The session is created on first use (inside the event loop) through the
+    public ``session`` attribute; the transport still owns and closes it.
+    """
+    
+    def __init__(self, max_connections: int, use_env_settings: bool = True, **kwargs):
+        super().__init__(use_env_settings=use_env_settings, **kwargs)
+        self.max_connections = max_connections
+        self.use_env_settings = use_env_settings
+    
+    async def open(self):
+        if not self.session:
+            # Same session settings the SDK uses, plus the connection limit
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                cookie_jar=aiohttp.DummyCookieJar(),
+                auto_decompress=False,
+                trust_env=self.use_env_settings
+            )
+        await super().open()
+
 class BlobStorageService:
-    """Service for managing character images in Azure Blob Storage."""
+    """
+    Service for managing character images in Azure Blob Storage.
+    
+    Uses the asyncio SDK client, so storage calls never block the event loop.
+    One client (and its aiohttp connection pool) is shared by all calls made
+    from the same event loop.
+    """
     
     def __init__(self):
         """Initialize the blob storage service with connection string."""
         self.connection_string = settings.azure_storage_connection_string
         self.container_name = settings.azure_storage_container_name
+        self.max_connections = settings.azure_storage_max_connections
+        self.upload_concurrency = settings.azure_storage_upload_concurrency
+        self.download_chunk_size = settings.azure_storage_download_chunk_size
         self._blob_service_client: Optional[BlobServiceClient] = None
         self._container_client: Optional[ContainerClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._closing: Set[asyncio.Task] = set()
+    
+    def _bound_to_other_loop(self) -> bool:
+        """Whether the cached client belongs to a different (e.g. finished) event loop."""
+        loop = _running_loop()
+        return loop is not None and self._client_loop is not None and self._client_loop is not loop
     
     @property
     def blob_service_client(self) -> BlobServiceClient:
-        """Lazy initialization of blob service client."""
-        if self._blob_service_client is None:
+        """Lazy initialization of the shared async blob service client."""
+        if self._blob_service_client is None or self._bound_to_other_loop():
             if not self.connection_string:
                 raise ValueError("Azure storage connection string not configured")
+            if self._blob_service_client is not None:
+                self._close_stale_client()
             self._blob_service_client = BlobServiceClient.from_connection_string(
-                self.connection_string
+                self.connection_string,
+                transport=_PooledAioHttpTransport(self.max_connections),
+                max_single_get_size=self.download_chunk_size,
+                max_chunk_get_size=self.download_chunk_size
             )
+            self._container_client = None
+            self._client_loop = _running_loop()
+        elif self._client_loop is None:
+            # Created outside a loop; its session opens on, and belongs to, the first loop that uses it
+            self._client_loop = _running_loop()
         return self._blob_service_client
     
     @property
     def container_client(self) -> ContainerClient:
         """Lazy initialization of container client."""
-        if self._container_client is None:
+        if self._container_client is None or self._bound_to_other_loop():
             self._container_client = self.blob_service_client.get_container_client(
                 self.container_name
             )
         return self._container_client
     
+    def _close_stale_client(self):
+        """Close the client of another event loop, which would otherwise leak its connection pool."""
+        client, loop = self._blob_service_client, self._client_loop
+        if loop.is_running():
+            # Still serving another thread; its connections must be closed there
+            asyncio.run_coroutine_threadsafe(self._close_client(client), loop)
+        else:
+            # The loop has finished; closing only drops its connections, so it can run here
+            task = asyncio.get_running_loop().create_task(self._close_client(client))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+    
+    @staticmethod
+    async def _close_client(client: BlobServiceClient):
+        try:
+            await client.close()
+        except Exception as e:
+            logger.warning(f"Failed to close blob storage client of a previous event loop: {e}")
+    
+    async def close(self):
+        """Close the shared client and its connection pool."""
+        client, self._blob_service_client = self._blob_service_client, None
+        self._container_client = None
+        self._client_loop = None
+        if client is not None:
+            await client.close()
+    
+    def _span_tags(self, blob_path: Optional[str] = None) -> dict:
+        """Tags for the client span around each storage call."""
+        tags = {"storage.type": "azure_blob", "storage.container": self.container_name}
+        if blob_path:
+            tags["storage.blob"] = blob_path
+        return tags
+    
+    @contextmanager
+    def _storage_span(self, operation_name: str, blob_path: Optional[str] = None):
+        """Client span around one storage call."""
+        with create_child_span(operation_name, SpanKind.CLIENT) as span_ctx:
+            for key, value in self._span_tags(blob_path).items():
+                span_ctx.add_tag(key, value)
+            yield span_ctx
+    
     def _get_blob_path(self, universe: str, character_name: str, file_extension: str = "jpg") -> str:
         """
         Generate blob path with universe-based folder organization.
@@ -62,7 +170,8 @@ class BlobStorageService:
         universe: str, 
         character_name: str, 
         image_data: BinaryIO,
-        content_type: str = "image/jpeg"
+        content_type: str = "image/jpeg",
+        metadata: Optional[dict] = None
     ) -> str:
         """
         Upload a character image to blob storage.
@@ -72,6 +181,7 @@ class BlobStorageService:
             character_name: Name of the character
             image_data: Binary image data
             content_type: MIME type of the image
+            metadata: Extra blob metadata (e.g. the perceptual hash)
             
         Returns:
             The blob path of the uploaded image
@@ -86,24 +196,29 @@ class BlobStorageService:
             blob_client = self.container_client.get_blob_client(blob_path)
             
             # Set content settings for proper image serving
-            content_settings = {
-                'content_type': content_type,
-                'cache_control': 'public, max-age=604800'  # 7 days cache
-            }
+            content_settings = ContentSettings(
+                content_type=content_type,
+                cache_control='public, max-age=604800'  # 7 days cache
+            )
             
             # Upload with metadata
             metadata = {
                 'universe': universe,
                 'character_name': character_name,
-                'uploaded_by': 'system'
+                'uploaded_by': 'system',
+                **(metadata or {})
             }
             
-            blob_client.upload_blob(
-                image_data,
-                overwrite=True,
-                content_settings=content_settings,
-                metadata=metadata
-            )
+            with self._storage_span("storage.upload_blob", blob_path):
+                await blob_client.upload_blob(
+                    image_data,
+                    overwrite=True,
+                    content_settings=content_settings,
+                    metadata=metadata,
+                    max_concurrency=self.upload_concurrency
+                )
+            
+            image_manifest.invalidate(blob_path)
             
             logger.info(f"Successfully uploaded image for {character_name} in {universe} universe")
             return blob_path
@@ -128,7 +243,10 @@ class BlobStorageService:
             blob_client = self.container_client.get_blob_client(blob_path)
             
             # Check if blob exists
-            if blob_client.exists():
+            with self._storage_span("storage.exists", blob_path):
+                exists = await blob_client.exists()
+            
+            if exists:
                 return blob_client.url
             else:
                 logger.warning(f"Image not found for {character_name} in {universe} universe")
@@ -153,7 +271,9 @@ class BlobStorageService:
             blob_path = self._get_blob_path(universe, character_name)
             blob_client = self.container_client.get_blob_client(blob_path)
             
-            blob_client.delete_blob()
+            with self._storage_span("storage.delete_blob", blob_path):
+                await blob_client.delete_blob()
+            image_manifest.invalidate(blob_path)
             logger.info(f"Successfully deleted image for {character_name} in {universe} universe")
             return True
             
@@ -164,6 +284,76 @@ class BlobStorageService:
             logger.error(f"Failed to delete image for {character_name}: {str(e)}")
             return False
     
+    async def upload_variants(self, universe: str, character_name: str,
+                              variants: List[ImageVariant]) -> List[str]:
+        """
+        Upload the responsive variants of a character image.
+        
+        Variants left over from a previous upload that are not part of the
+        new set (e.g. widths the new source is too small for) are deleted.
+        
+        Args:
+            universe: The comic universe (marvel, DC, image)
+            character_name: Name of the character
+            variants: Encoded variants from ``generate_variants``
+        
+        Returns:
+            Blob paths of the uploaded variants
+        
+        Raises:
+            AzureError: If an upload fails
+        """
+        source_path = self._get_blob_path(universe, character_name)
+        
+        async def upload(variant: ImageVariant) -> str:
+            blob_path = variant_blob_path(source_path, variant.width, variant.format)
+            blob_client = self.container_client.get_blob_client(blob_path)
+            with self._storage_span("storage.upload_blob", blob_path):
+                await blob_client.upload_blob(
+                    variant.data,
+                    overwrite=True,
+                    content_settings=ContentSettings(
+                        content_type=variant.content_type,
+                        cache_control='public, max-age=31536000, immutable'
+                    ),
+                    metadata={'variant_of': source_path, 'width': str(variant.width)}
+                )
+            image_manifest.invalidate(blob_path)
+            return blob_path
+        
+        uploaded = await asyncio.gather(*(upload(variant) for variant in variants))
+        await self.delete_variants(universe, character_name, keep=set(uploaded))
+        logger.info(f"Uploaded {len(uploaded)} variants for {character_name} in {universe} universe")
+        return list(uploaded)
+    
+    async def delete_variants(self, universe: str, character_name: str, keep: Optional[set] = None) -> int:
+        """
+        Delete the responsive variants of a character image.
+        
+        Args:
+            universe: The comic universe (marvel, DC, image)
+            character_name: Name of the character
+            keep: Variant blob paths to leave in place
+        
+        Returns:
+            Number of variants deleted
+        """
+        prefix = variant_prefix(self._get_blob_path(universe, character_name))
+        deleted = 0
+        try:
+            with self._storage_span("storage.list_blobs", prefix):
+                names = [blob.name async for blob in self.container_client.list_blobs(name_starts_with=prefix)]
+            for name in names:
+                if keep and name in keep:
+                    continue
+                with self._storage_span("storage.delete_blob", name):
+                    await self.container_client.delete_blob(name)
+                image_manifest.invalidate(name)
+                deleted += 1
+        except AzureError as e:
+            logger.error(f"Failed to delete variants for {character_name}: {str(e)}")
+        return deleted
+    
     async def get_image_metadata(self, universe: str, character_name: str) -> Optional[dict]:
         """
         Get metadata for a character image including version information.
@@ -180,17 +370,10 @@ class BlobStorageService:
             blob_client = self.container_client.get_blob_client(blob_path)
             
             # Get blob properties which include etag and last modified
-            properties = blob_client.get_blob_properties()
-            
-            return {
-                "etag": properties.etag,
-                "last_modified": properties.last_modified.isoformat() if properties.last_modified else None,
-                "content_length": properties.size,
-                "content_type": properties.content_settings.content_type if properties.content_settings else None,
-                "metadata": properties.metadata or {},
-                "blob_path": blob_path,
-                "url": blob_client.url
-            }
+            with self._storage_span("storage.get_blob_properties", blob_path):
+                properties = await blob_client.get_blob_properties()
+            
+            return self._properties_to_dict(properties, blob_path, blob_client.url)
             
         except ResourceNotFoundError:
             logger.warning(f"Image metadata not found for {character_name} in {universe}")
@@ -216,7 +399,11 @@ class BlobStorageService:
             blob_client = self.container_client.get_blob_client(blob_path)
             
             # Update blob metadata
-            blob_client.set_blob_metadata(metadata)
+            with self._storage_span("storage.set_blob_metadata", blob_path):
+                await blob_client.set_blob_metadata(metadata)
+            
+            # Setting metadata changes the blob's ETag
+            image_manifest.invalidate(blob_path)
             
             logger.info(f"Updated metadata for {character_name} in {universe}")
             return True
@@ -228,6 +415,96 @@ class BlobStorageService:
             logger.error(f"Failed to update metadata for {character_name}: {str(e)}")
             return False
     
+    async def update_blob_metadata(self, blob_path: str, metadata: dict, etag: Optional[str] = None) -> bool:
+        """
+        Replace the metadata of a blob by path.
+        
+        Args:
+            blob_path: Path of the blob in the container
+            metadata: Complete new metadata (existing keys are not merged)
+            etag: Only update this revision of the blob
+            
+        Returns:
+            True if metadata was updated; False if the blob is gone or has changed
+        """
+        blob_client = self.container_client.get_blob_client(blob_path)
+        conditions = {"etag": f'"{etag}"', "match_condition": MatchConditions.IfNotModified} if etag else {}
+        
+        try:
+            with self._storage_span("storage.set_blob_metadata", blob_path):
+                await blob_client.set_blob_metadata(metadata, **conditions)
+            image_manifest.invalidate(blob_path)
+            return True
+        except (ResourceNotFoundError, ResourceModifiedError):
+            logger.warning(f"Cannot update metadata - blob missing or changed: {blob_path}")
+            return False
+        except AzureError as e:
+            logger.error(f"Failed to update metadata for {blob_path}: {str(e)}")
+            return False
+    
+    @staticmethod
+    def _properties_to_dict(properties, blob_path: str, url: str) -> dict:
+        """Flatten SDK blob properties into the metadata dict returned by this service."""
+        return {
+            "etag": properties.etag,
+            "last_modified": properties.last_modified.isoformat() if properties.last_modified else None,
+            "content_length": properties.size,
+            "content_type": properties.content_settings.content_type if properties.content_settings else None,
+            "metadata": properties.metadata or {},
+            "blob_path": blob_path,
+            "url": url
+        }
+    
+    async def list_image_properties(self, prefix: Optional[str] = None) -> List[dict]:
+        """
+        Get metadata for every image from a single container listing.
+        
+        Blob metadata is included, so stored perceptual hashes come with it.
+        
+        Args:
+            prefix: Optional blob path prefix (e.g. "marvel/")
+            
+        Returns:
+            List of metadata dicts, in the same format as get_image_metadata
+        """
+        container_url = self.container_client.url
+        
+        with self._storage_span("storage.list_blobs", prefix):
+            return [
+                self._properties_to_dict(blob, blob.name, f"{container_url}/{quote(blob.name)}")
+                async for blob in self.container_client.list_blobs(name_starts_with=prefix, include=["metadata"])
+            ]
+    
+    async def open_image_stream(self, blob_path: str, offset: Optional[int] = None,
+                                length: Optional[int] = None,
+                                etag: Optional[str] = None) -> AsyncIterator[bytes]:
+        """
+        Start downloading a blob (or a byte range of it) and iterate its chunks.
+    
+        Content is fetched one ``download_chunk_size`` request at a time, so
+        the whole image is never held in memory.
+    
+        Args:
+            blob_path: Path of the blob in the container
+            offset: First byte to return (None for the whole blob)
+            length: Number of bytes to return from ``offset``
+            etag: Only download this revision of the blob
+    
+        Returns:
+            Async iterator over the content chunks
+    
+        Raises:
+            ResourceNotFoundError: If the blob does not exist
+            ResourceModifiedError: If the blob no longer matches ``etag``
+        """
+        blob_client = self.container_client.get_blob_client(blob_path)
+        conditions = {"etag": f'"{etag}"', "match_condition": MatchConditions.IfNotModified} if etag else {}
+    
+        # The first request is made here, so missing or changed blobs fail before any bytes are sent
+        with self._storage_span("storage.download_blob", blob_path):
+            downloader = await blob_client.download_blob(offset=offset, length=length, **conditions)
+        return downloader.chunks()
+    
     async def list_images_by_universe(self, universe: str) -> List[str]:
         """
         List all character images in a specific universe.
@@ -240,7 +517,8 @@ class BlobStorageService:
         """
         try:
             prefix = f"{universe.lower()}/"
-            blob_list = self.container_client.list_blobs(name_starts_with=prefix)
+            with self._storage_span("storage.list_blobs", prefix):
+                blob_list = [blob async for blob in self.container_client.list_blobs(name_starts_with=prefix)]
             
             character_names = []
             for blob in blob_list:
@@ -269,13 +547,15 @@ class BlobStorageService:
         """
         try:
             # Try to get container properties (this will fail if container doesn't exist)
-            self.container_client.get_container_properties()
+            with self._storage_span("storage.get_container_properties"):
+                await self.container_client.get_container_properties()
             return True
             
         except ResourceNotFoundError:
             # Container doesn't exist, create it
             try:
-                self.container_client.create_container(public_access='blob')
+                with self._storage_span("storage.create_container"):
+                    await self.container_client.create_container(public_access='blob')
                 logger.info(f"Created blob storage container: {self.container_name}")
                 return True
             except AzureError as e:
@@ -0,0 +1,286 @@
+"""
+In-memory manifest of character images in blob storage.
+
+The manifest maps each blob path to its ETag, last-modified time,
+precomputed version hash and perceptual hash (from blob metadata). It is loaded from a single container listing at
+startup and refreshed in the background, so resolving an image URL needs no
+storage calls in steady state. Writes made by this process (uploads,
+deletes, metadata updates, explicit invalidation) mark the affected path
+stale; a stale path is resolved from storage once and then re-recorded.
+
+With a ``ManifestBroadcast`` (Redis) invalidations are also published to the
+other workers and CLI processes, which apply them within
+``sync_interval`` seconds. Without one, other processes only see a change at
+their next refresh, up to ``refresh_interval`` seconds later.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.storage.perceptual_hash import PHASH_METADATA_KEY, parse_hash
+
+logger = logging.getLogger(__name__)
+
+def compute_image_version(etag: str, last_modified: Optional[str]) -> str:
+    """Short version hash used for cache busting (stable for the same blob revision)."""
+    version_string = f"{etag}:{last_modified}" if last_modified else etag
+    return hashlib.md5(version_string.encode()).hexdigest()[:8]
+
+@dataclass
+class ManifestEntry:
+    """Cached properties of one image blob."""
+    blob_path: str
+    url: str
+    etag: str
+    last_modified: Optional[str]
+    version: str
+    content_length: Optional[int] = None
+    content_type: Optional[str] = None
+    perceptual_hash: Optional[int] = None
+    recorded_at: float = field(default_factory=time.monotonic)
+    
+    @classmethod
+    def from_properties(cls, properties: Dict[str, Any]) -> 'ManifestEntry':
+        """Build an entry from a ``get_image_metadata``/``list_image_properties`` dict."""
+        etag = (properties.get("etag") or "").strip('"')
+        last_modified = properties.get("last_modified")
+        return cls(
+            blob_path=properties["blob_path"],
+            url=properties["url"],
+            etag=etag,
+            last_modified=last_modified,
+            version=compute_image_version(etag, last_modified),
+            content_length=properties.get("content_length"),
+            content_type=properties.get("content_type"),
+            perceptual_hash=parse_hash((properties.get("metadata") or {}).get(PHASH_METADATA_KEY))
+        )
+    
+    def version_info(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "source": "manifest"
+        }
+
+class ManifestBroadcast:
+    """
+    Invalidation log shared by every process through Redis.
+    
+    Each invalidation bumps a sequence counter and is appended to a capped
+    list in the same transaction, so the last list item always carries the
+    counter's value. Readers poll the counter and read only when it moved; a
+    reader that fell further behind than the list holds invalidates everything.
+    """
+    
+    def __init__(self, redis_client, key_prefix: str = "image_manifest", max_length: int = 1000):
+        self.redis = redis_client
+        self.sequence_key = f"{key_prefix}:sequence"
+        self.log_key = f"{key_prefix}:invalidations"
+        self.max_length = max_length
+        # Identifies this process's own invalidations, which are already applied
+        self.origin = uuid.uuid4().hex
+    
+    def publish(self, blob_path: Optional[str] = None, prefix: Optional[str] = None):
+        """Append an invalidation for the other processes."""
+        payload = json.dumps({"origin": self.origin, "blob_path": blob_path, "prefix": prefix})
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.incr(self.sequence_key)
+        pipe.rpush(self.log_key, payload)
+        pipe.ltrim(self.log_key, -self.max_length, -1)
+        pipe.execute()
+    
+    def sequence(self) -> int:
+        value = self.redis.get(self.sequence_key)
+        return int(value) if value is not None else 0
+    
+    def read_since(self, since: int) -> Tuple[int, Optional[List[Dict[str, Any]]]]:
+        """
+        Invalidations published after sequence number ``since``, and the
+        sequence number they reach. ``None`` means some were already trimmed.
+        """
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.get(self.sequence_key)
+        pipe.lrange(self.log_key, 0, -1)
+        value, items = pipe.execute()
+        sequence = int(value) if value is not None else 0
+        missed = sequence - since
+        if missed <= 0:
+            return sequence, []
+        if missed > len(items):
+            return sequence, None
+        invalidations = [json.loads(item) for item in items[len(items) - missed:]]
+        return sequence, [item for item in invalidations if item.get("origin") != self.origin]
+
+def create_manifest_broadcast(redis_url: Optional[str]) -> Optional[ManifestBroadcast]:
+    """Connect the invalidation broadcast, or return None if Redis is not configured or reachable."""
+    if not redis_url:
+        return None
+    try:
+        import redis
+        client = redis.from_url(redis_url)
+        client.ping()  # Test connection
+        logger.info("Connected to Redis for image manifest invalidations")
+        return ManifestBroadcast(client)
+    except Exception as e:
+        logger.warning(f"Redis not available, image manifest invalidations stay local: {e}")
+        return None
+
+class ImageManifest:
+    """Blob path -> ManifestEntry map kept in sync with the image container."""
+    
+    def __init__(self, refresh_interval: float = 300.0, sync_interval: float = 1.0,
+                 broadcast: Optional[ManifestBroadcast] = None):
+        self.refresh_interval = refresh_interval
+        self.sync_interval = sync_interval
+        self.broadcast = broadcast
+        self.entries: Dict[str, ManifestEntry] = {}
+        self.loaded = False
+        self.last_refresh: Optional[float] = None
+        self._stale: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._broadcast_sequence: Optional[int] = None
+    
+    def is_authoritative(self, blob_path: str) -> bool:
+        """Whether a lookup for ``blob_path`` can be answered without storage calls."""
+        return self.loaded and blob_path not in self._stale
+    
+    def get(self, blob_path: str) -> Optional[ManifestEntry]:
+        return self.entries.get(blob_path)
+    
+    def record(self, properties: Dict[str, Any]) -> ManifestEntry:
+        """Store fresh properties for a blob (clears its stale mark)."""
+        entry = ManifestEntry.from_properties(properties)
+        self.entries[entry.blob_path] = entry
+        self._stale.pop(entry.blob_path, None)
+        return entry
+    
+    def record_missing(self, blob_path: str):
+        """Record that a blob does not exist (clears its stale mark)."""
+        self.entries.pop(blob_path, None)
+        self._stale.pop(blob_path, None)
+    
+    def invalidate(self, blob_path: Optional[str] = None, prefix: Optional[str] = None) -> int:
+        """Mark one path, or every known path under ``prefix``, as stale here and in other processes."""
+        if self.broadcast is not None:
+            try:
+                self.broadcast.publish(blob_path, prefix)
+            except Exception as e:
+                logger.warning(f"Failed to broadcast image manifest invalidation: {e}")
+        return self._invalidate(blob_path, prefix)
+    
+    def _invalidate(self, blob_path: Optional[str] = None, prefix: Optional[str] = None) -> int:
+        now = time.monotonic()
+        paths = [blob_path] if blob_path else [path for path in self.entries if path.startswith(prefix or "")]
+        for path in paths:
+            self.entries.pop(path, None)
+            self._stale[path] = now
+        return len(paths)
+    
+    def apply_listing(self, items: List[Dict[str, Any]], started: float) -> Dict[str, int]:
+        """
+        Replace the manifest with a container listing taken at ``started``.
+        
+        Unchanged blobs keep their entry; entries recorded and paths
+        invalidated after the listing started are newer than it and are kept.
+        """
+        entries: Dict[str, ManifestEntry] = {}
+        added = updated = 0
+        for properties in items:
+            path = properties["blob_path"]
+            existing = self.entries.get(path)
+            etag = (properties.get("etag") or "").strip('"')
+            if existing is not None and (existing.etag == etag or existing.recorded_at > started):
+                entries[path] = existing
+                continue
+            if path in self._stale and self._stale[path] > started:
+                continue
+            entries[path] = ManifestEntry.from_properties(properties)
+            if existing is None:
+                added += 1
+            else:
+                updated += 1
+        
+        for path, entry in self.entries.items():
+            if path not in entries and entry.recorded_at > started:
+                entries[path] = entry
+        removed = len(self.entries.keys() - entries.keys())
+        
+        self.entries = entries
+        self._stale = {path: at for path, at in self._stale.items() if at > started}
+        self.loaded = True
+        self.last_refresh = time.time()
+        return {"added": added, "updated": updated, "removed": removed, "total": len(entries)}
+    
+    async def sync(self) -> int:
+        """Apply invalidations other processes published since the last sync."""
+        if self.broadcast is None:
+            return 0
+        if self._broadcast_sequence is None:
+            # Earlier invalidations are covered by the listing this process starts from
+            self._broadcast_sequence = await asyncio.to_thread(self.broadcast.sequence)
+            return 0
+        if await asyncio.to_thread(self.broadcast.sequence) == self._broadcast_sequence:
+            return 0
+        
+        sequence, invalidations = await asyncio.to_thread(self.broadcast.read_since, self._broadcast_sequence)
+        self._broadcast_sequence = sequence
+        if invalidations is None:
+            logger.warning("Missed image manifest invalidations; marking every image stale")
+            return self._invalidate(prefix="")
+        return sum(self._invalidate(item.get("blob_path"), item.get("prefix")) for item in invalidations)
+    
+    async def refresh(self, blob_service) -> Dict[str, int]:
+        """Reload from one container listing."""
+        started = time.monotonic()
+        items = await blob_service.list_image_properties()
+        changes = self.apply_listing(items, started)
+        logger.info(f"Image manifest refreshed: {changes}")
+        return changes
+    
+    def start(self, blob_service, refresh_interval: Optional[float] = None,
+              sync_interval: Optional[float] = None):
+        """Load the manifest and keep refreshing and syncing it on the running event loop."""
+        if refresh_interval is not None:
+            self.refresh_interval = refresh_interval
+        if sync_interval is not None:
+            self.sync_interval = sync_interval
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run(blob_service))
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self, blob_service):
+        next_refresh = 0.0
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.warning(f"Image manifest invalidation sync failed: {e}")
+            if time.monotonic() >= next_refresh:
+                try:
+                    await self.refresh(blob_service)
+                except Exception as e:
+                    # Until a listing succeeds, lookups fall back to per-request storage calls
+                    logger.warning(f"Image manifest refresh failed: {e}")
+                next_refresh = time.monotonic() + self.refresh_interval
+            if self.broadcast is None:
+                await asyncio.sleep(self.refresh_interval)
+            else:
+                await asyncio.sleep(min(self.sync_interval, self.refresh_interval))
+
+# Global image manifest (started with the application when storage is configured)
+image_manifest = ImageManifest()
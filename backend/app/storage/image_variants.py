@@ -0,0 +1,161 @@
+"""
+Responsive variants of character images.
+
+Every uploaded image is stored alongside a fixed ladder of resized copies
+per output format. Variant blobs live under ``variants/`` so they are never
+listed as character images; the image manifest records them like any other
+blob, and the serving side picks one from the ``Accept`` header and client
+hints, or lists them as a ``srcset``.
+"""
+
+import logging
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from PIL import Image, ImageOps
+
+try:
+    import pillow_avif  # noqa: F401  (registers the AVIF encoder on older Pillow)
+except ImportError:
+    pass
+
+logger = logging.getLogger(__name__)
+
+VARIANT_PREFIX = "variants/"
+VARIANT_WIDTHS: Tuple[int, ...] = (320, 640, 960, 1280)
+
+# Variant format -> (Pillow format, content type)
+VARIANT_FORMATS: Dict[str, Tuple[str, str]] = {
+    "avif": ("AVIF", "image/avif"),
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+}
+# Smallest output first; JPEG is acceptable to every client
+FORMAT_PREFERENCE: Tuple[str, ...] = ("avif", "webp", "jpeg")
+
+ENCODER_OPTIONS: Dict[str, Dict] = {
+    "avif": {"quality": 60, "speed": 6},
+    "webp": {"quality": 80, "method": 4},
+    "jpeg": {"quality": 82, "optimize": True, "progressive": True},
+}
+
+def variant_prefix(blob_path: str) -> str:
+    """Blob prefix holding every variant of an image."""
+    return f"{VARIANT_PREFIX}{blob_path.rsplit('.', 1)[0]}/"
+
+def variant_blob_path(blob_path: str, width: int, fmt: str) -> str:
+    """Blob path of one variant, e.g. ``variants/marvel/spider-man/640w.webp``."""
+    return f"{variant_prefix(blob_path)}{width}w.{fmt}"
+
+def parse_variant_path(blob_path: str) -> Optional[Tuple[int, str]]:
+    """(width, format) of a variant blob path, or None for any other blob."""
+    if not blob_path.startswith(VARIANT_PREFIX):
+        return None
+    width_text, _, fmt = blob_path.rsplit("/", 1)[-1].partition(".")
+    if not width_text.endswith("w") or not width_text[:-1].isdigit() or fmt not in VARIANT_FORMATS:
+        return None
+    return int(width_text[:-1]), fmt
+
+def supported_formats() -> Tuple[str, ...]:
+    """Variant formats this Pillow build can encode (AVIF needs libavif)."""
+    Image.init()
+    return tuple(fmt for fmt in FORMAT_PREFERENCE if VARIANT_FORMATS[fmt][0] in Image.SAVE)
+
+@dataclass
+class ImageVariant:
+    """One encoded rung of the ladder."""
+    width: int
+    height: int
+    format: str
+    data: bytes
+    
+    @property
+    def content_type(self) -> str:
+        return VARIANT_FORMATS[self.format][1]
+
+def generate_variants(data: bytes, widths: Iterable[int] = VARIANT_WIDTHS,
+                      formats: Optional[Sequence[str]] = None) -> List[ImageVariant]:
+    """
+    Resize and encode an image into every ladder width and format.
+    
+    The source is decoded once; widths larger than the source are skipped
+    rather than upscaled.
+    
+    Args:
+        data: Encoded source image
+        widths: Ladder widths in pixels
+        formats: Variant formats to encode (default: every supported format)
+    
+    Returns:
+        List of encoded variants, smallest width first
+    """
+    formats = formats or supported_formats()
+    with Image.open(BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    
+    variants = []
+    for width in sorted(widths):
+        if width > image.width:
+            break
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.Resampling.LANCZOS) if width < image.width else image
+        for fmt in formats:
+            frame = resized
+            if fmt == "jpeg" and frame.mode == "RGBA":
+                # JPEG has no alpha channel; flatten onto white
+                frame = Image.new("RGB", frame.size, (255, 255, 255))
+                frame.paste(resized, mask=resized.getchannel("A"))
+            output = BytesIO()
+            frame.save(output, format=VARIANT_FORMATS[fmt][0], **ENCODER_OPTIONS[fmt])
+            variants.append(ImageVariant(width, height, fmt, output.getvalue()))
+    return variants
+
+def accepted_formats(accept: Optional[str]) -> List[str]:
+    """
+    Variant formats an ``Accept`` header allows, most preferred first.
+    
+    AVIF and WebP are only used when named explicitly (``image/*`` does not
+    guarantee decoder support); JPEG is always included as the last resort.
+    """
+    qualities = {}
+    for part in (accept or "").split(","):
+        media_type, *params = part.strip().split(";")
+        quality = 1.0
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[media_type.strip().lower()] = quality
+    
+    formats = [fmt for fmt in FORMAT_PREFERENCE
+               if fmt != "jpeg" and qualities.get(VARIANT_FORMATS[fmt][1], 0) > 0]
+    return formats + ["jpeg"]
+
+def target_width(width: Optional[float] = None, dpr: Optional[float] = None,
+                 viewport_width: Optional[float] = None) -> Optional[int]:
+    """Display width in device pixels, from an explicit width or client hints."""
+    if width:
+        return int(width)
+    if viewport_width:
+        return int(viewport_width * (dpr or 1.0))
+    return None
+
+def choose_width(target: int, widths: Sequence[int], save_data: bool = False) -> Optional[int]:
+    """
+    Smallest available width covering ``target``, or None when none does
+    (the original is then served, as every variant would be upscaled).
+    
+    With ``Save-Data`` the next smaller width is used, trading sharpness for
+    bytes on slow or metered links; that is the largest width when none
+    covers ``target``.
+    """
+    widths = sorted(widths)
+    index = next((i for i, width in enumerate(widths) if width >= target), len(widths))
+    if save_data and index > 0:
+        index -= 1
+    return widths[index] if index < len(widths) else None
@@ -0,0 +1,215 @@
+"""
+Perceptual hashes of character images and a near-duplicate index over them.
+
+A 64-bit pHash is computed for every uploaded image and stored in the blob's
+metadata, so the container listing that feeds the image manifest carries it
+with no extra storage calls. Re-encodes, resizes and small crops of an image
+hash to within a few bits of it; the index answers "which stored images are
+within N bits of this one" through a BK-tree instead of a linear scan.
+"""
+
+import math
+import operator
+import statistics
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+from app.storage.image_variants import VARIANT_PREFIX
+
+PHASH_METADATA_KEY = "phash"
+HASH_SIZE = 8  # 8x8 low-frequency DCT coefficients -> 64-bit hash
+DEFAULT_MAX_DISTANCE = 10  # Hamming distance (of 64 bits) treated as a near-duplicate
+
+_SAMPLE_SIZE = HASH_SIZE * 4
+# DCT-II basis rows for the low frequencies only; the other 24 are never used
+_DCT_BASIS = [
+    [math.cos(math.pi * (2 * n + 1) * k / (2 * _SAMPLE_SIZE)) for n in range(_SAMPLE_SIZE)]
+    for k in range(HASH_SIZE)
+]
+
+def perceptual_hash(data: bytes) -> int:
+    """
+    64-bit pHash of an encoded image.
+    
+    The image is reduced to 32x32 luminance (JPEGs are decoded at 1/8 scale,
+    luminance only) and the hash sets one bit per low-frequency DCT
+    coefficient above their median.
+    
+    Args:
+        data: Encoded image
+    
+    Returns:
+        Hash as an unsigned 64-bit integer
+    """
+    with Image.open(BytesIO(data)) as source:
+        source.draft("L", (_SAMPLE_SIZE, _SAMPLE_SIZE))
+        image = ImageOps.exif_transpose(source)
+        if "A" in image.getbands():
+            # Hash what is shown: transparent areas over white
+            image = Image.alpha_composite(Image.new("RGBA", image.size, "white"), image.convert("RGBA"))
+        sample = image.convert("L").resize((_SAMPLE_SIZE, _SAMPLE_SIZE), Image.Resampling.LANCZOS,
+                                           reducing_gap=2.0)
+    
+    pixels = list(sample.getdata())
+    rows = [pixels[y * _SAMPLE_SIZE:(y + 1) * _SAMPLE_SIZE] for y in range(_SAMPLE_SIZE)]
+    # Separable 2D DCT, computing only the HASH_SIZE x HASH_SIZE block that is kept
+    partial = [[sum(map(operator.mul, row, basis)) for basis in _DCT_BASIS] for row in rows]
+    columns = list(zip(*partial))
+    coefficients = [sum(map(operator.mul, basis, column)) for basis in _DCT_BASIS for column in columns]
+    
+    median = statistics.median(coefficients)
+    value = 0
+    for coefficient in coefficients:
+        value = (value << 1) | (coefficient > median)
+    return value
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+def format_hash(value: int) -> str:
+    """Hex form stored in blob metadata."""
+    return f"{value:016x}"
+
+def parse_hash(text: Optional[str]) -> Optional[int]:
+    """Hash from blob metadata, or None when absent or malformed."""
+    if not text:
+        return None
+    try:
+        return int(text, 16)
+    except ValueError:
+        return None
+
+class _Node:
+    __slots__ = ("value", "keys", "children")
+    
+    def __init__(self, value: int, key: str):
+        self.value = value
+        self.keys = [key]
+        self.children: Dict[int, "_Node"] = {}
+
+class BKTree:
+    """
+    Burkhard-Keller tree over hashes under Hamming distance.
+    
+    Children are keyed by their distance to the parent; by the triangle
+    inequality a search within ``d`` of a query at distance ``x`` from a node
+    only descends into children keyed ``x - d`` to ``x + d``.
+    """
+    
+    def __init__(self):
+        self._root: Optional[_Node] = None
+        self._size = 0
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    def add(self, value: int, key: str):
+        self._size += 1
+        if self._root is None:
+            self._root = _Node(value, key)
+            return
+        node = self._root
+        while True:
+            distance = hamming_distance(value, node.value)
+            if distance == 0:
+                node.keys.append(key)
+                return
+            child = node.children.get(distance)
+            if child is None:
+                node.children[distance] = _Node(value, key)
+                return
+            node = child
+    
+    def search(self, value: int, max_distance: int) -> List[Tuple[int, str]]:
+        """(distance, key) of every entry within ``max_distance`` of ``value``, closest first."""
+        results = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming_distance(value, node.value)
+            if distance <= max_distance:
+                results.extend((distance, key) for key in node.keys)
+            low, high = distance - max_distance, distance + max_distance
+            stack.extend(child for child_distance, child in node.children.items()
+                         if low <= child_distance <= high)
+        return sorted(results)
+
+class PerceptualHashIndex:
+    """Blob path -> perceptual hash, searchable for near-duplicates."""
+    
+    def __init__(self, max_distance: int = DEFAULT_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self.hashes: Dict[str, int] = {}
+        self.unhashed: List[str] = []
+        self._tree = BKTree()
+    
+    @classmethod
+    def from_manifest(cls, manifest, max_distance: int = DEFAULT_MAX_DISTANCE) -> 'PerceptualHashIndex':
+        """
+        Index every character image in an image manifest.
+        
+        Variants are resized copies of their image and are left out; images
+        uploaded before hashing are listed in ``unhashed``.
+        """
+        index = cls(max_distance)
+        for entry in manifest.entries.values():
+            if entry.blob_path.startswith(VARIANT_PREFIX):
+                continue
+            if entry.perceptual_hash is None:
+                index.unhashed.append(entry.blob_path)
+            else:
+                index.add(entry.blob_path, entry.perceptual_hash)
+        return index
+    
+    def __len__(self) -> int:
+        return len(self.hashes)
+    
+    def add(self, blob_path: str, value: int):
+        """Index (or re-index) an image."""
+        if self.hashes.get(blob_path) == value:
+            return
+        self.hashes[blob_path] = value
+        self._tree.add(value, blob_path)
+    
+    def find_similar(self, value: int, max_distance: Optional[int] = None,
+                     exclude: Optional[str] = None) -> List[Tuple[str, int]]:
+        """
+        Indexed images within ``max_distance`` bits of a hash.
+        
+        Args:
+            value: Perceptual hash to look up
+            max_distance: Largest Hamming distance to report (default: the index's)
+            exclude: Blob path to leave out (e.g. the image being replaced)
+        
+        Returns:
+            List of (blob_path, distance), closest first
+        """
+        max_distance = self.max_distance if max_distance is None else max_distance
+        matches = {}
+        for distance, blob_path in self._tree.search(value, max_distance):
+            # A re-indexed path leaves its old hash in the tree; only its current one counts
+            if blob_path != exclude and hamming_distance(value, self.hashes[blob_path]) == distance:
+                matches.setdefault(blob_path, distance)
+        return sorted(matches.items(), key=lambda match: (match[1], match[0]))
+    
+    def duplicate_groups(self, max_distance: Optional[int] = None) -> List[List[str]]:
+        """Groups of images linked by near-duplicate matches, largest first."""
+        parent = {path: path for path in self.hashes}
+        
+        def root(path: str) -> str:
+            while parent[path] != path:
+                parent[path] = parent[parent[path]]
+                path = parent[path]
+            return path
+        
+        for path, value in self.hashes.items():
+            for match, _ in self.find_similar(value, max_distance, exclude=path):
+                parent[root(match)] = root(path)
+        
+        groups: Dict[str, List[str]] = {}
+        for path in self.hashes:
+            groups.setdefault(root(path), []).append(path)
+        return sorted((sorted(group) for group in groups.values() if len(group) > 1),
+                      key=lambda group: (-len(group), group[0]))
@@ -6,54 +6,218 @@ Supports image validation, optimization, and batch operations.
 
 import asyncio
 import argparse
+import json
 import logging
 import mimetypes
+import os
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from io import BytesIO
 from pathlib import Path
-from typing import List, Dict, Any, Optional, BinaryIO
+from typing import List, Dict, Any, Optional, BinaryIO, Tuple
 from PIL import Image
 import hashlib
+import aiohttp
+from azure.core.exceptions import ServiceRequestError, ServiceResponseError
 
+from app.database.retry import RetryConfig, retry_async
 from app.storage.blob_storage import BlobStorageService
+from app.storage.image_manifest import ImageManifest, create_manifest_broadcast, image_manifest
+from app.storage.image_variants import VARIANT_PREFIX, ImageVariant, generate_variants
+from app.storage.perceptual_hash import (
+    DEFAULT_MAX_DISTANCE, PHASH_METADATA_KEY, PerceptualHashIndex, format_hash, perceptual_hash
+)
 from app.config import settings
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Failures worth retrying once the SDK's own per-request retries are exhausted
+TRANSIENT_UPLOAD_ERRORS = (
+    ServiceRequestError, ServiceResponseError, aiohttp.ClientError, asyncio.TimeoutError, ConnectionError
+)
+
+@dataclass
+class PreparedImage:
+    """An image file inspected (and optionally processed) for upload; built in a worker process"""
+    image_path: Path
+    original_size: int = 0
+    perceptual_hash: Optional[int] = None
+    data: Optional[bytes] = None
+    content_type: Optional[str] = None
+    variants: List[ImageVariant] = field(default_factory=list)
+    error: Optional[str] = None
+
+def validate_image_file(image_path: Path, max_file_size: int) -> Dict[str, Any]:
+    """
+    Validate an image file.
+    
+    Args:
+        image_path: Path to image file
+        max_file_size: Largest accepted file size in bytes
+        
+    Returns:
+        Validation result
+    """
+    result = {'valid': False, 'error': None}
+    
+    try:
+        # Check file size
+        file_size = image_path.stat().st_size
+        if file_size > max_file_size:
+            result['error'] = f"File too large: {file_size} bytes"
+            return result
+        
+        # Check if it's a valid image
+        with Image.open(image_path) as img:
+            # Verify image can be loaded
+            img.verify()
+            
+            # Re-open for dimension check (verify() closes the image)
+            with Image.open(image_path) as img2:
+                width, height = img2.size
+                
+                # Check dimensions
+                if width < 100 or height < 100:
+                    result['error'] = f"Image too small: {width}x{height} (minimum: 100x100)"
+                    return result
+                
+                if width > 4000 or height > 4000:
+                    result['error'] = f"Image too large: {width}x{height} (maximum: 4000x4000)"
+                    return result
+        
+        result['valid'] = True
+        
+    except Exception as e:
+        result['error'] = f"Invalid image: {str(e)}"
+    
+    return result
+
+def optimize_image_file(image_path: Path, max_dimensions: Tuple[int, int], reducing_gap: float) -> Tuple[bytes, str]:
+    """
+    Optimize image for web delivery.
+    
+    Args:
+        image_path: Path to original image
+        max_dimensions: Max width/height
+        reducing_gap: Margin over max_dimensions kept by draft decoding and box reduction
+        
+    Returns:
+        Tuple of (optimized_image_bytes, content_type)
+    """
+    with Image.open(image_path) as img:
+        # Decode large JPEGs at a reduced DCT scale; must happen before the first load
+        img.draft(None, (int(max_dimensions[0] * reducing_gap), int(max_dimensions[1] * reducing_gap)))
+        
+        # Convert to RGB if necessary (for JPEG output)
+        if img.mode in ('RGBA', 'LA', 'P'):
+            # Create white background for transparent images
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            if img.mode == 'P':
+                img = img.convert('RGBA')
+            background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
+            img = background
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
+        
+        # Resize if too large
+        if img.size[0] > max_dimensions[0] or img.size[1] > max_dimensions[1]:
+            img.thumbnail(max_dimensions, Image.Resampling.LANCZOS, reducing_gap=reducing_gap)
+        
+        # Save optimized image
+        output = BytesIO()
+        img.save(output, format='JPEG', quality=85, optimize=True)
+        
+        return output.getvalue(), 'image/jpeg'
+
+def inspect_image(image_path: Path, max_file_size: int, validate: bool = True) -> PreparedImage:
+    """
+    Validate an image file and compute its perceptual hash (cheap: no full decode).
+    
+    Validation failures are returned in ``error``; an undecodable image
+    without validation just has no hash.
+    """
+    prepared = PreparedImage(image_path=image_path)
+    if validate:
+        validation = validate_image_file(image_path, max_file_size)
+        if not validation['valid']:
+            prepared.error = validation['error']
+            return prepared
+    
+    data = image_path.read_bytes()
+    prepared.original_size = len(data)
+    try:
+        prepared.perceptual_hash = perceptual_hash(data)
+    except Exception as e:
+        logger.warning(f"Cannot compute perceptual hash of {image_path.name}: {e}")
+    return prepared
+
+def process_image(prepared: PreparedImage, max_dimensions: Tuple[int, int], reducing_gap: float,
+                  optimize: bool = True, variants: bool = True) -> PreparedImage:
+    """
+    Optimize an inspected image and encode its responsive variants.
+    
+    Variant failures are logged rather than raised: the original can still
+    be uploaded and is served until variants exist.
+    """
+    image_path = prepared.image_path
+    if optimize:
+        prepared.data, prepared.content_type = optimize_image_file(image_path, max_dimensions, reducing_gap)
+    else:
+        prepared.data = image_path.read_bytes()
+        prepared.content_type = mimetypes.guess_type(str(image_path))[0] or 'image/jpeg'
+    
+    if variants:
+        try:
+            prepared.variants = generate_variants(prepared.data)
+        except Exception as e:
+            logger.warning(f"Failed to create variants for {image_path.name}: {e}")
+    return prepared
+
 class ImageManager:
     """CLI tool for managing character images"""
     
     def __init__(self):
         self.blob_service = BlobStorageService()
+        # Let the API workers see uploads and deletes without waiting for a manifest refresh
+        if image_manifest.broadcast is None:
+            image_manifest.broadcast = create_manifest_broadcast(settings.redis_url)
         self.supported_formats = {'.jpg', '.jpeg', '.png', '.webp'}
         self.max_file_size = 10 * 1024 * 1024  # 10MB
         self.max_dimensions = (2048, 2048)  # Max width/height
+        self.reducing_gap = 2.0  # Margin over max_dimensions kept by draft decoding and box reduction
+        self.upload_retry = RetryConfig(
+            max_attempts=4, base_delay=1.0, max_delay=30.0, retryable_exceptions=TRANSIENT_UPLOAD_ERRORS
+        )
     
     async def upload_image(self, universe: str, character_name: str, image_path: Path,
-                          optimize: bool = True, overwrite: bool = False) -> Dict[str, Any]:
+                          optimize: bool = True, overwrite: bool = False,
+                          variants: bool = True,
+                          duplicate_index: Optional[PerceptualHashIndex] = None) -> Dict[str, Any]:
         """
         Upload a single character image.
         
+        The perceptual hash of the image is stored with it. With a
+        ``duplicate_index``, an image that is a near-duplicate of an indexed
+        one (other than the image it replaces) is rejected before processing,
+        and an uploaded image is added to the index.
+        
         Args:
             universe: Comic universe (marvel, DC, image)
             character_name: Character name
             image_path: Path to image file
             optimize: Whether to optimize the image
             overwrite: Whether to overwrite existing image
+            variants: Whether to generate and upload the responsive variants
+            duplicate_index: Index of stored images to check for near-duplicates
             
         Returns:
             Upload result with status and details
         """
-        result = {
-            'success': False,
-            'character': character_name,
-            'universe': universe,
-            'original_size': 0,
-            'final_size': 0,
-            'blob_path': None,
-            'error': None
-        }
+        result = self._upload_result(universe, character_name)
         
         try:
             # Validate file exists
@@ -80,26 +244,18 @@ class ImageManager:
                 result['error'] = f"Image already exists for {character_name} (use --overwrite to replace)"
                 return result
             
-            # Process image
-            if optimize:
-                processed_data, content_type = await self._optimize_image(image_path)
-            else:
-                with open(image_path, 'rb') as f:
-                    processed_data = f.read()
-                content_type = mimetypes.guess_type(str(image_path))[0] or 'image/jpeg'
-            
-            result['final_size'] = len(processed_data)
+            # Flag near-duplicates before any processing
+            loop = asyncio.get_running_loop()
+            prepared = await loop.run_in_executor(None, inspect_image, image_path, self.max_file_size, False)
+            if self._is_duplicate(universe, character_name, prepared, duplicate_index, result):
+                return result
             
-            # Upload to blob storage
-            from io import BytesIO
-            blob_path = await self.blob_service.upload_image(
-                universe, character_name, BytesIO(processed_data), content_type
+            # Process image (CPU-bound; keep it off the event loop)
+            prepared = await loop.run_in_executor(
+                None, process_image, prepared, self.max_dimensions, self.reducing_gap, optimize, variants
             )
             
-            result['success'] = True
-            result['blob_path'] = blob_path
-            
-            logger.info(f"Successfully uploaded {character_name} ({universe}): {result['original_size']} -> {result['final_size']} bytes")
+            return await self._store_image(universe, character_name, prepared, result)
             
         except Exception as e:
             result['error'] = str(e)
@@ -109,7 +265,12 @@ class ImageManager:
     
     async def bulk_upload(self, universe: str, images_dir: Path, 
                          optimize: bool = True, overwrite: bool = False,
-                         dry_run: bool = False) -> Dict[str, Any]:
+                         dry_run: bool = False, variants: bool = True,
+                         check_duplicates: bool = False,
+                         max_distance: int = DEFAULT_MAX_DISTANCE,
+                         workers: Optional[int] = None,
+                         concurrency: int = 8,
+                         resume: bool = True) -> Dict[str, Any]:
         """
         Upload multiple images from a directory.
         
@@ -121,12 +282,33 @@ class ImageManager:
         
         Character names are derived from filenames (without extension).
         
+        Images flow through a staged pipeline so CPU and network work overlap:
+        the directory scan drops files that are already uploaded; a process
+        pool validates, hashes, optimizes and encodes variants; and up to
+        ``concurrency`` uploads run at once, retrying transient storage
+        errors with exponential backoff (``upload_retry``). Bounded queues
+        between the stages keep memory flat on large directories.
+        
+        Every completed upload is appended to a state file in ``images_dir``;
+        with ``resume``, files recorded there (same size and modification
+        time) are skipped, so an interrupted run continues where it stopped.
+        
+        With ``check_duplicates``, every image is compared against the stored
+        images and the ones uploaded earlier in the batch; near-duplicates are
+        skipped (reported only, in a dry run).
+        
         Args:
             universe: Comic universe (marvel, DC, image)
             images_dir: Directory containing images
             optimize: Whether to optimize images
             overwrite: Whether to overwrite existing images
             dry_run: If True, validate but don't upload
+            variants: Whether to generate and upload responsive variants
+            check_duplicates: Whether to skip near-duplicates of existing images
+            max_distance: Largest hash distance (of 64 bits) treated as a near-duplicate
+            workers: Processes for validation and optimization (default: CPU count)
+            concurrency: Uploads in flight at once
+            resume: Skip files recorded as uploaded by an earlier run
             
         Returns:
             Bulk upload statistics
@@ -137,6 +319,8 @@ class ImageManager:
             'invalid_images': 0,
             'uploaded': 0,
             'skipped': 0,
+            'duplicates': 0,
+            'resumed': 0,
             'errors': [],
             'total_original_size': 0,
             'total_final_size': 0
@@ -147,11 +331,12 @@ class ImageManager:
         
         logger.info(f"Starting bulk upload from {images_dir} to {universe} universe")
         
-        # Find all image files
-        image_files = []
+        # Stage 1: scan
+        image_files = set()
         for ext in self.supported_formats:
-            image_files.extend(images_dir.glob(f"*{ext}"))
-            image_files.extend(images_dir.glob(f"*{ext.upper()}"))
+            image_files.update(images_dir.glob(f"*{ext}"))
+            image_files.update(images_dir.glob(f"*{ext.upper()}"))
+        image_files = sorted(image_files)
         
         stats['total_files'] = len(image_files)
         
@@ -159,51 +344,128 @@ class ImageManager:
             logger.warning(f"No image files found in {images_dir}")
             return stats
         
-        # Process each image
+        state_path = images_dir / f".bulk-upload-{universe.lower()}.jsonl"
+        completed = self._load_upload_state(state_path) if resume else {}
+        
+        # One listing answers both "already stored?" and "near-duplicate of a stored image?"
+        listing = []
+        if check_duplicates or not (overwrite or dry_run):
+            listing = await self.blob_service.list_image_properties(
+                None if check_duplicates else self._universe_prefix(universe)
+            )
+        existing = set() if overwrite or dry_run else {properties['blob_path'] for properties in listing}
+        duplicate_index = self._build_hash_index(listing, max_distance) if check_duplicates else None
+        
+        pending = []
         for image_path in image_files:
-            # Extract character name from filename
             character_name = self._filename_to_character_name(image_path.stem)
+            if completed.get(image_path.name) == self._file_signature(image_path):
+                stats['resumed'] += 1
+            elif existing and self.blob_service._get_blob_path(universe, character_name) in existing:
+                stats['skipped'] += 1
+                stats['errors'].append(
+                    f"{image_path.name}: Image already exists for {character_name} (use --overwrite to replace)"
+                )
+            else:
+                pending.append((image_path, character_name))
+        
+        if stats['resumed']:
+            logger.info(f"Resuming: {stats['resumed']} files already uploaded by an earlier run")
+        
+        progress = {'done': 0, 'total': len(pending), 'started': time.monotonic(), 'reported': 0.0}
+        queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+        loop = asyncio.get_running_loop()
+        
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            # Images in the pool plus finished ones waiting for an upload slot
+            processing_slots = asyncio.Semaphore((workers or os.cpu_count() or 1) * 2)
+            
+            async def prepare(image_path: Path, character_name: str):
+                """Stage 2: validate, hash and process one file in the pool, then queue it"""
+                async with processing_slots:
+                    result = self._upload_result(universe, character_name)
+                    prepared = None
+                    try:
+                        prepared = await loop.run_in_executor(pool, inspect_image, image_path, self.max_file_size)
+                        if prepared.error is None and not self._is_duplicate(
+                            universe, character_name, prepared, duplicate_index, result
+                        ) and not dry_run:
+                            prepared = await loop.run_in_executor(
+                                pool, process_image, prepared, self.max_dimensions, self.reducing_gap,
+                                optimize, variants
+                            )
+                    except Exception as e:
+                        result['error'] = f"Processing failed: {e}"
+                    await queue.put((image_path, character_name, prepared, result))
+            
+            async def produce():
+                try:
+                    await asyncio.gather(*(prepare(image_path, name) for image_path, name in pending))
+                finally:
+                    for _ in range(concurrency):
+                        await queue.put(None)
+            
+            async def upload_worker(state_file):
+                """Stage 3: upload processed images"""
+                while True:
+                    item = await queue.get()
+                    if item is None:
+                        return
+                    image_path, character_name, prepared, result = item
+                    
+                    if prepared is not None and prepared.error is not None:
+                        stats['invalid_images'] += 1
+                        stats['errors'].append(f"{image_path.name}: {prepared.error}")
+                    else:
+                        if prepared is not None:
+                            stats['valid_images'] += 1
+                            stats['total_original_size'] += prepared.original_size
+                        
+                        if result['duplicates']:
+                            stats['duplicates'] += 1
+                            if not dry_run:
+                                stats['skipped'] += 1
+                            stats['errors'].append(f"{image_path.name}: {result['error']}")
+                        elif result['error']:
+                            stats['skipped'] += 1
+                            stats['errors'].append(f"{image_path.name}: {result['error']}")
+                        elif dry_run:
+                            logger.info(f"Would upload: {character_name} from {image_path.name}")
+                        else:
+                            result = await self._store_image(universe, character_name, prepared, result)
+                            if result['success']:
+                                stats['uploaded'] += 1
+                                stats['total_final_size'] += result['final_size']
+                                self._record_upload(state_file, image_path, result['blob_path'])
+                            else:
+                                stats['skipped'] += 1
+                                stats['errors'].append(f"{image_path.name}: {result['error']}")
+                    
+                    progress['done'] += 1
+                    self._report_progress(progress, stats)
             
+            state_file = None if dry_run else open(state_path, 'a')
             try:
-                # Validate image
-                validation_result = await self._validate_image(image_path)
-                if not validation_result['valid']:
-                    stats['invalid_images'] += 1
-                    stats['errors'].append(f"{image_path.name}: {validation_result['error']}")
-                    continue
-                
-                stats['valid_images'] += 1
-                stats['total_original_size'] += image_path.stat().st_size
-                
-                if dry_run:
-                    logger.info(f"Would upload: {character_name} from {image_path.name}")
-                    continue
-                
-                # Upload image
-                result = await self.upload_image(
-                    universe, character_name, image_path, optimize, overwrite
-                )
-                
-                if result['success']:
-                    stats['uploaded'] += 1
-                    stats['total_final_size'] += result['final_size']
-                else:
-                    stats['skipped'] += 1
-                    stats['errors'].append(f"{image_path.name}: {result['error']}")
-                
-            except Exception as e:
-                stats['invalid_images'] += 1
-                stats['errors'].append(f"{image_path.name}: {str(e)}")
+                await asyncio.gather(produce(), *(upload_worker(state_file) for _ in range(concurrency)))
+            finally:
+                if state_file is not None:
+                    state_file.close()
         
-        logger.info(f"Bulk upload complete: {stats['uploaded']} uploaded, {stats['skipped']} skipped")
+        logger.info(f"Bulk upload complete: {stats['uploaded']} uploaded, {stats['skipped']} skipped, "
+                    f"{stats['duplicates']} near-duplicates, {stats['resumed']} already uploaded")
         return stats
     
-    async def validate_images(self, universe: Optional[str] = None) -> Dict[str, Any]:
+    async def validate_images(self, universe: Optional[str] = None,
+                              max_distance: int = DEFAULT_MAX_DISTANCE) -> Dict[str, Any]:
         """
         Validate images in blob storage.
         
+        Also groups stored images that are near-duplicates of each other and
+        counts images without a perceptual hash (see ``index_hashes``).
+        
         Args:
             universe: Validate specific universe (optional)
+            max_distance: Largest hash distance (of 64 bits) treated as a near-duplicate
             
         Returns:
             Validation results
@@ -212,6 +474,8 @@ class ImageManager:
             'total_images': 0,
             'accessible_images': 0,
             'inaccessible_images': 0,
+            'duplicate_groups': [],
+            'unhashed_images': 0,
             'errors': []
         }
         
@@ -233,8 +497,74 @@ class ImageManager:
             except Exception as e:
                 results['errors'].append(f"Error validating {univ} universe: {str(e)}")
         
+        try:
+            index = await self.load_hash_index(universe, max_distance)
+            results['duplicate_groups'] = index.duplicate_groups()
+            results['unhashed_images'] = len(index.unhashed)
+        except Exception as e:
+            results['errors'].append(f"Error checking for duplicate images: {str(e)}")
+        
         return results
     
+    async def load_hash_index(self, universe: Optional[str] = None,
+                              max_distance: int = DEFAULT_MAX_DISTANCE) -> PerceptualHashIndex:
+        """
+        Build the near-duplicate index from one container listing.
+        
+        Args:
+            universe: Index only this universe (default: all images)
+            max_distance: Largest hash distance (of 64 bits) treated as a near-duplicate
+            
+        Returns:
+            PerceptualHashIndex over the stored images
+        """
+        listing = await self.blob_service.list_image_properties(self._universe_prefix(universe))
+        return self._build_hash_index(listing, max_distance)
+    
+    async def index_hashes(self, universe: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Compute and store perceptual hashes for images uploaded without one.
+        
+        Each image is downloaded and hashed, and the hash is added to its
+        existing metadata, conditional on the blob being unchanged since it
+        was listed.
+        
+        Args:
+            universe: Only this universe (default: all images)
+            
+        Returns:
+            Backfill statistics
+        """
+        stats = {'total_images': 0, 'already_hashed': 0, 'hashed': 0, 'errors': []}
+        
+        for properties in await self.blob_service.list_image_properties(self._universe_prefix(universe)):
+            blob_path = properties['blob_path']
+            if blob_path.startswith(VARIANT_PREFIX):
+                continue
+            stats['total_images'] += 1
+            metadata = properties.get('metadata') or {}
+            if metadata.get(PHASH_METADATA_KEY):
+                stats['already_hashed'] += 1
+                continue
+            
+            try:
+                etag = (properties.get('etag') or '').strip('"')
+                chunks = await self.blob_service.open_image_stream(blob_path, etag=etag)
+                data = b''.join([chunk async for chunk in chunks])
+                image_hash = await asyncio.get_running_loop().run_in_executor(None, perceptual_hash, data)
+                
+                if await self.blob_service.update_blob_metadata(
+                    blob_path, {**metadata, PHASH_METADATA_KEY: format_hash(image_hash)}, etag=etag
+                ):
+                    stats['hashed'] += 1
+                else:
+                    stats['errors'].append(f"{blob_path}: changed or deleted while hashing")
+            except Exception as e:
+                stats['errors'].append(f"{blob_path}: {str(e)}")
+        
+        logger.info(f"Hash backfill complete: {stats['hashed']} hashed, {stats['already_hashed']} already hashed")
+        return stats
+    
     async def list_images(self, universe: str) -> List[str]:
         """
         List all images in a universe.
@@ -264,11 +594,157 @@ class ImageManager:
             return False
         
         success = await self.blob_service.delete_image(universe, character_name)
+        await self.blob_service.delete_variants(universe, character_name)
         if success:
             logger.info(f"Deleted image for {character_name} in {universe} universe")
         
         return success
     
+    @staticmethod
+    def _upload_result(universe: str, character_name: str) -> Dict[str, Any]:
+        return {
+            'success': False,
+            'character': character_name,
+            'universe': universe,
+            'original_size': 0,
+            'final_size': 0,
+            'blob_path': None,
+            'variants': 0,
+            'duplicates': [],
+            'error': None
+        }
+    
+    def _is_duplicate(self, universe: str, character_name: str, prepared: PreparedImage,
+                      duplicate_index: Optional[PerceptualHashIndex], result: Dict[str, Any]) -> bool:
+        """
+        Check an inspected image against the near-duplicate index.
+        
+        A unique image is added to the index right away (before any upload
+        is awaited), so concurrent uploads of near-duplicates are caught too.
+        """
+        if duplicate_index is None or prepared.perceptual_hash is None:
+            return False
+        blob_path = self.blob_service._get_blob_path(universe, character_name)
+        result['duplicates'] = duplicate_index.find_similar(prepared.perceptual_hash, exclude=blob_path)
+        if result['duplicates']:
+            result['error'] = self._duplicate_error(result['duplicates'])
+            return True
+        duplicate_index.add(blob_path, prepared.perceptual_hash)
+        return False
+    
+    async def _store_image(self, universe: str, character_name: str, prepared: PreparedImage,
+                           result: Dict[str, Any]) -> Dict[str, Any]:
+        """Upload a processed image and its variants, retrying transient storage errors."""
+        try:
+            hash_metadata = (
+                {PHASH_METADATA_KEY: format_hash(prepared.perceptual_hash)}
+                if prepared.perceptual_hash is not None else None
+            )
+            
+            async def upload_original():
+                # A fresh stream per attempt; a failed attempt may have consumed the last one
+                return await self.blob_service.upload_image(
+                    universe, character_name, BytesIO(prepared.data), prepared.content_type, metadata=hash_metadata
+                )
+            
+            blob_path = await retry_async(upload_original, self.upload_retry)
+            
+            result['original_size'] = prepared.original_size
+            result['final_size'] = len(prepared.data)
+            result['success'] = True
+            result['blob_path'] = blob_path
+            
+            if prepared.variants:
+                result['variants'] = await self._upload_variants(universe, character_name, prepared.variants)
+            
+            logger.info(f"Successfully uploaded {character_name} ({universe}): {result['original_size']} -> {result['final_size']} bytes")
+            
+        except Exception as e:
+            result['error'] = str(e)
+            logger.error(f"Failed to upload {character_name}: {e}")
+        
+        return result
+    
+    def _build_hash_index(self, listing: List[dict], max_distance: int) -> PerceptualHashIndex:
+        """Near-duplicate index over the images in a container listing."""
+        manifest = ImageManifest()
+        manifest.apply_listing(listing, time.monotonic())
+        return PerceptualHashIndex.from_manifest(manifest, max_distance)
+    
+    @staticmethod
+    def _duplicate_error(duplicates: List[tuple]) -> str:
+        matches = ", ".join(f"{blob_path} (distance {distance})" for blob_path, distance in duplicates[:3])
+        return f"Near-duplicate of {matches} (use --allow-duplicates to upload anyway)"
+    
+    @staticmethod
+    def _universe_prefix(universe: Optional[str]) -> Optional[str]:
+        return f"{universe.lower()}/" if universe else None
+    
+    @staticmethod
+    def _file_signature(image_path: Path) -> List[int]:
+        """Size and modification time; a changed file is uploaded again on resume."""
+        stat = image_path.stat()
+        return [stat.st_size, stat.st_mtime_ns]
+    
+    @staticmethod
+    def _load_upload_state(state_path: Path) -> Dict[str, List[int]]:
+        """File name -> signature of every upload recorded by earlier runs."""
+        completed = {}
+        if state_path.exists():
+            with open(state_path, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A run interrupted mid-write leaves a torn last line
+                        continue
+                    completed[record['file']] = record['signature']
+        return completed
+    
+    def _record_upload(self, state_file, image_path: Path, blob_path: str):
+        if state_file is None:
+            return
+        state_file.write(json.dumps({
+            'file': image_path.name,
+            'signature': self._file_signature(image_path),
+            'blob_path': blob_path
+        }) + '\n')
+        state_file.flush()
+    
+    @staticmethod
+    def _report_progress(progress: Dict[str, Any], stats: Dict[str, Any], interval: float = 5.0):
+        """Log progress at most every ``interval`` seconds, and once at the end."""
+        now = time.monotonic()
+        if progress['done'] < progress['total'] and now - progress['reported'] < interval:
+            return
+        progress['reported'] = now
+        elapsed = now - progress['started']
+        rate = progress['done'] / elapsed if elapsed > 0 else 0.0
+        logger.info(
+            f"Progress: {progress['done']}/{progress['total']} "
+            f"({stats['uploaded']} uploaded, {stats['skipped']} skipped, {stats['invalid_images']} invalid), "
+            f"{rate:.1f} images/s"
+        )
+    
+    async def _upload_variants(self, universe: str, character_name: str, variants: List[ImageVariant]) -> int:
+        """
+        Upload the responsive variant ladder of an uploaded image.
+        
+        A failure is logged rather than raised: the original is already
+        uploaded and is served until variants exist.
+        
+        Returns:
+            Number of variants uploaded
+        """
+        try:
+            uploaded = await retry_async(
+                self.blob_service.upload_variants, self.upload_retry, universe, character_name, variants
+            )
+            return len(uploaded)
+        except Exception as e:
+            logger.warning(f"Failed to upload variants for {character_name}: {e}")
+            return 0
+    
     async def _optimize_image(self, image_path: Path) -> tuple[bytes, str]:
         """
         Optimize image for web delivery.
@@ -279,28 +755,7 @@ class ImageManager:
         Returns:
             Tuple of (optimized_image_bytes, content_type)
         """
-        with Image.open(image_path) as img:
-            # Convert to RGB if necessary (for JPEG output)
-            if img.mode in ('RGBA', 'LA', 'P'):
-                # Create white background for transparent images
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                if img.mode == 'P':
-                    img = img.convert('RGBA')
-                background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                img = background
-            elif img.mode != 'RGB':
-                img = img.convert('RGB')
-            
-            # Resize if too large
-            if img.size[0] > self.max_dimensions[0] or img.size[1] > self.max_dimensions[1]:
-                img.thumbnail(self.max_dimensions, Image.Resampling.LANCZOS)
-            
-            # Save optimized image
-            from io import BytesIO
-            output = BytesIO()
-            img.save(output, format='JPEG', quality=85, optimize=True)
-            
-            return output.getvalue(), 'image/jpeg'
+        return optimize_image_file(image_path, self.max_dimensions, self.reducing_gap)
     
     async def _validate_image(self, image_path: Path) -> Dict[str, Any]:
         """
@@ -312,39 +767,7 @@ class ImageManager:
         Returns:
             Validation result
         """
-        result = {'valid': False, 'error': None}
-        
-        try:
-            # Check file size
-            file_size = image_path.stat().st_size
-            if file_size > self.max_file_size:
-                result['error'] = f"File too large: {file_size} bytes"
-                return result
-            
-            # Check if it's a valid image
-            with Image.open(image_path) as img:
-                # Verify image can be loaded
-                img.verify()
-                
-                # Re-open for dimension check (verify() closes the image)
-                with Image.open(image_path) as img2:
-                    width, height = img2.size
-                    
-                    # Check dimensions
-                    if width < 100 or height < 100:
-                        result['error'] = f"Image too small: {width}x{height} (minimum: 100x100)"
-                        return result
-                    
-                    if width > 4000 or height > 4000:
-                        result['error'] = f"Image too large: {width}x{height} (maximum: 4000x4000)"
-                        return result
-            
-            result['valid'] = True
-            
-        except Exception as e:
-            result['error'] = f"Invalid image: {str(e)}"
-        
-        return result
+        return validate_image_file(image_path, self.max_file_size)
     
     def _filename_to_character_name(self, filename: str) -> str:
         """
@@ -402,6 +825,10 @@ async def main():
     upload_parser.add_argument('image', type=Path, help='Image file path')
     upload_parser.add_argument('--no-optimize', action='store_true', help='Skip image optimization')
     upload_parser.add_argument('--overwrite', action='store_true', help='Overwrite existing image')
+    upload_parser.add_argument('--no-variants', action='store_true', help='Skip responsive variant generation')
+    upload_parser.add_argument('--allow-duplicates', action='store_true', help='Upload even if a near-duplicate is stored')
+    upload_parser.add_argument('--max-distance', type=int, default=DEFAULT_MAX_DISTANCE,
+                               help='Largest perceptual hash distance treated as a near-duplicate')
     
     # Bulk upload command
     bulk_parser = subparsers.add_parser('bulk-upload', help='Upload multiple images from directory')
@@ -410,6 +837,14 @@ async def main():
     bulk_parser.add_argument('--no-optimize', action='store_true', help='Skip image optimization')
     bulk_parser.add_argument('--overwrite', action='store_true', help='Overwrite existing images')
     bulk_parser.add_argument('--dry-run', action='store_true', help='Validate only, do not upload')
+    bulk_parser.add_argument('--no-variants', action='store_true', help='Skip responsive variant generation')
+    bulk_parser.add_argument('--allow-duplicates', action='store_true', help='Upload near-duplicates of stored images')
+    bulk_parser.add_argument('--max-distance', type=int, default=DEFAULT_MAX_DISTANCE,
+                             help='Largest perceptual hash distance treated as a near-duplicate')
+    bulk_parser.add_argument('--workers', type=int, help='Processes for validation and optimization (default: CPU count)')
+    bulk_parser.add_argument('--concurrency', type=int, default=8, help='Uploads in flight at once')
+    bulk_parser.add_argument('--retries', type=int, default=3, help='Retries of a failed upload (transient errors only)')
+    bulk_parser.add_argument('--no-resume', action='store_true', help='Re-upload files recorded by an earlier run')
     
     # List images command
     list_parser = subparsers.add_parser('list', help='List images in universe')
@@ -418,6 +853,12 @@ async def main():
     # Validate images command
     validate_parser = subparsers.add_parser('validate', help='Validate images in storage')
     validate_parser.add_argument('--universe', choices=['marvel', 'DC', 'image'], help='Validate specific universe')
+    validate_parser.add_argument('--max-distance', type=int, default=DEFAULT_MAX_DISTANCE,
+                                 help='Largest perceptual hash distance treated as a near-duplicate')
+    
+    # Index hashes command
+    index_parser = subparsers.add_parser('index-hashes', help='Store perceptual hashes for images uploaded without one')
+    index_parser.add_argument('--universe', choices=['marvel', 'DC', 'image'], help='Index specific universe')
     
     # Delete image command
     delete_parser = subparsers.add_parser('delete', help='Delete a character image')
@@ -435,9 +876,13 @@ async def main():
     
     try:
         if args.command == 'upload':
+            duplicate_index = None if args.allow_duplicates else await manager.load_hash_index(
+                max_distance=args.max_distance
+            )
             result = await manager.upload_image(
                 args.universe, args.character, args.image,
-                optimize=not args.no_optimize, overwrite=args.overwrite
+                optimize=not args.no_optimize, overwrite=args.overwrite,
+                variants=not args.no_variants, duplicate_index=duplicate_index
             )
             
             if result['success']:
@@ -445,15 +890,19 @@ async def main():
                 print(f"  Original size: {result['original_size']} bytes")
                 print(f"  Final size: {result['final_size']} bytes")
                 print(f"  Blob path: {result['blob_path']}")
+                print(f"  Variants: {result['variants']}")
             else:
                 print(f"Upload failed: {result['error']}")
                 sys.exit(1)
         
         elif args.command == 'bulk-upload':
+            manager.upload_retry.max_attempts = args.retries + 1
             stats = await manager.bulk_upload(
                 args.universe, args.directory,
                 optimize=not args.no_optimize, overwrite=args.overwrite,
-                dry_run=args.dry_run
+                dry_run=args.dry_run, variants=not args.no_variants,
+                check_duplicates=not args.allow_duplicates, max_distance=args.max_distance,
+                workers=args.workers, concurrency=args.concurrency, resume=not args.no_resume
             )
             
             print(f"Bulk Upload Results:")
@@ -462,6 +911,8 @@ async def main():
             print(f"  Invalid images: {stats['invalid_images']}")
             print(f"  Uploaded: {stats['uploaded']}")
             print(f"  Skipped: {stats['skipped']}")
+            print(f"  Near-duplicates: {stats['duplicates']}")
+            print(f"  Already uploaded (resumed): {stats['resumed']}")
             print(f"  Original size: {stats['total_original_size']} bytes")
             print(f"  Final size: {stats['total_final_size']} bytes")
             
@@ -479,17 +930,39 @@ async def main():
                 print(f"  {character}")
         
         elif args.command == 'validate':
-            results = await manager.validate_images(args.universe)
+            results = await manager.validate_images(args.universe, args.max_distance)
             print(f"Image Validation Results:")
             print(f"  Total images: {results['total_images']}")
             print(f"  Accessible: {results['accessible_images']}")
             print(f"  Inaccessible: {results['inaccessible_images']}")
+            print(f"  Near-duplicate groups: {len(results['duplicate_groups'])}")
+            print(f"  Without perceptual hash: {results['unhashed_images']}")
+            
+            if results['duplicate_groups']:
+                print(f"\nNear-duplicates:")
+                for group in results['duplicate_groups']:
+                    print(f"  {', '.join(group)}")
+            
+            if results['unhashed_images']:
+                print(f"\nRun 'index-hashes' to include images without a hash in duplicate checks")
             
             if results['errors']:
                 print(f"\nErrors:")
                 for error in results['errors']:
                     print(f"  {error}")
         
+        elif args.command == 'index-hashes':
+            stats = await manager.index_hashes(args.universe)
+            print(f"Perceptual Hash Indexing Results:")
+            print(f"  Total images: {stats['total_images']}")
+            print(f"  Already hashed: {stats['already_hashed']}")
+            print(f"  Hashed: {stats['hashed']}")
+            
+            if stats['errors']:
+                print(f"\nErrors:")
+                for error in stats['errors']:
+                    print(f"  {error}")
+        
         elif args.command == 'delete':
             success = await manager.delete_image(args.universe, args.character, args.confirm)
             if args.confirm:
@@ -16,6 +16,7 @@ from cli.backup_manager import backup_cli
 from cli.storage_reliability import storage_cli
 from cli.health_monitor import health_cli
 from app.database.connection import get_cosmos_db
+from app.storage.perceptual_hash import DEFAULT_MAX_DISTANCE
 
 
 async def main():
@@ -100,6 +101,10 @@ Examples:
     image_upload.add_argument('image', type=Path, help='Image file path')
     image_upload.add_argument('--no-optimize', action='store_true', help='Skip image optimization')
     image_upload.add_argument('--overwrite', action='store_true', help='Overwrite existing image')
+    image_upload.add_argument('--no-variants', action='store_true', help='Skip responsive variant generation')
+    image_upload.add_argument('--allow-duplicates', action='store_true', help='Upload even if a near-duplicate is stored')
+    image_upload.add_argument('--max-distance', type=int, default=DEFAULT_MAX_DISTANCE,
+                              help='Largest perceptual hash distance treated as a near-duplicate')
     
     # Image bulk upload
     image_bulk = image_subparsers.add_parser('bulk-upload', help='Upload multiple images from directory')
@@ -108,6 +113,14 @@ Examples:
     image_bulk.add_argument('--no-optimize', action='store_true', help='Skip image optimization')
     image_bulk.add_argument('--overwrite', action='store_true', help='Overwrite existing images')
     image_bulk.add_argument('--dry-run', action='store_true', help='Validate only, do not upload')
+    image_bulk.add_argument('--no-variants', action='store_true', help='Skip responsive variant generation')
+    image_bulk.add_argument('--allow-duplicates', action='store_true', help='Upload near-duplicates of stored images')
+    image_bulk.add_argument('--max-distance', type=int, default=DEFAULT_MAX_DISTANCE,
+                            help='Largest perceptual hash distance treated as a near-duplicate')
+    image_bulk.add_argument('--workers', type=int, help='Processes for validation and optimization (default: CPU count)')
+    image_bulk.add_argument('--concurrency', type=int, default=8, help='Uploads in flight at once')
+    image_bulk.add_argument('--retries', type=int, default=3, help='Retries of a failed upload (transient errors only)')
+    image_bulk.add_argument('--no-resume', action='store_true', help='Re-upload files recorded by an earlier run')
     
     # Image list
     image_list = image_subparsers.add_parser('list', help='List images in universe')
@@ -116,6 +129,12 @@ Examples:
     # Image validate
     image_validate = image_subparsers.add_parser('validate', help='Validate images in storage')
     image_validate.add_argument('--universe', choices=['marvel', 'DC', 'image'], help='Validate specific universe')
+    image_validate.add_argument('--max-distance', type=int, default=DEFAULT_MAX_DISTANCE,
+                                help='Largest perceptual hash distance treated as a near-duplicate')
+    
+    # Image index hashes
+    image_index = image_subparsers.add_parser('index-hashes', help='Store perceptual hashes for images uploaded without one')
+    image_index.add_argument('--universe', choices=['marvel', 'DC', 'image'], help='Index specific universe')
     
     # Image delete
     image_delete = image_subparsers.add_parser('delete', help='Delete a character image')
@@ -254,9 +273,13 @@ Examples:
             manager = ImageManager()
             
             if args.image_command == 'upload':
+                duplicate_index = None if args.allow_duplicates else await manager.load_hash_index(
+                    max_distance=args.max_distance
+                )
                 result = await manager.upload_image(
                     args.universe, args.character, args.image,
-                    optimize=not args.no_optimize, overwrite=args.overwrite
+                    optimize=not args.no_optimize, overwrite=args.overwrite,
+                    variants=not args.no_variants, duplicate_index=duplicate_index
                 )
                 
                 if result['success']:
@@ -264,15 +287,19 @@ Examples:
                     print(f"  Original size: {result['original_size']} bytes")
                     print(f"  Final size: {result['final_size']} bytes")
                     print(f"  Blob path: {result['blob_path']}")
+                    print(f"  Variants: {result['variants']}")
                 else:
                     print(f"Upload failed: {result['error']}")
                     sys.exit(1)
             
             elif args.image_command == 'bulk-upload':
+                manager.upload_retry.max_attempts = args.retries + 1
                 stats = await manager.bulk_upload(
                     args.universe, args.directory,
                     optimize=not args.no_optimize, overwrite=args.overwrite,
-                    dry_run=args.dry_run
+                    dry_run=args.dry_run, variants=not args.no_variants,
+                    check_duplicates=not args.allow_duplicates, max_distance=args.max_distance,
+                    workers=args.workers, concurrency=args.concurrency, resume=not args.no_resume
                 )
                 
                 print(f"Bulk Upload Results:")
@@ -281,6 +308,8 @@ Examples:
                 print(f"  Invalid images: {stats['invalid_images']}")
                 print(f"  Uploaded: {stats['uploaded']}")
                 print(f"  Skipped: {stats['skipped']}")
+                print(f"  Near-duplicates: {stats['duplicates']}")
+                print(f"  Already uploaded (resumed): {stats['resumed']}")
                 print(f"  Original size: {stats['total_original_size']} bytes")
                 print(f"  Final size: {stats['total_final_size']} bytes")
                 
@@ -298,17 +327,39 @@ Examples:
                     print(f"  {character}")
             
             elif args.image_command == 'validate':
-                results = await manager.validate_images(args.universe)
+                results = await manager.validate_images(args.universe, args.max_distance)
                 print(f"Image Validation Results:")
                 print(f"  Total images: {results['total_images']}")
                 print(f"  Accessible: {results['accessible_images']}")
                 print(f"  Inaccessible: {results['inaccessible_images']}")
+                print(f"  Near-duplicate groups: {len(results['duplicate_groups'])}")
+                print(f"  Without perceptual hash: {results['unhashed_images']}")
+                
+                if results['duplicate_groups']:
+                    print(f"\nNear-duplicates:")
+                    for group in results['duplicate_groups']:
+                        print(f"  {', '.join(group)}")
+                
+                if results['unhashed_images']:
+                    print(f"\nRun 'image index-hashes' to include images without a hash in duplicate checks")
                 
                 if results['errors']:
                     print(f"\nErrors:")
                     for error in results['errors']:
                         print(f"  {error}")
             
+            elif args.image_command == 'index-hashes':
+                stats = await manager.index_hashes(args.universe)
+                print(f"Perceptual Hash Indexing Results:")
+                print(f"  Total images: {stats['total_images']}")
+                print(f"  Already hashed: {stats['already_hashed']}")
+                print(f"  Hashed: {stats['hashed']}")
+                
+                if stats['errors']:
+                    print(f"\nErrors:")
+                    for error in stats['errors']:
+                        print(f"  {error}")
+            
             elif args.image_command == 'delete':
                 success = await manager.delete_image(args.universe, args.character, args.confirm)
                 if args.confirm:
@@ -7,22 +7,43 @@ from app.api.users import router as users_router
 from app.api.game import router as game_router
 from app.api.images import router as images_router
 from app.api.image_versions import router as image_versions_router
-from app.api.monitoring import router as monitoring_router
+from app.api.monitoring import router as monitoring_router, metrics as prometheus_metrics
 from app.api.cache import router as cache_router
 from app.api.health import router as health_router, startup_health_checks
 from app.api.auth import router as auth_router
 from app.api.streaks import router as streaks_router
-from app.middleware.rate_limiting import rate_limit_middleware
+from app.api.responses import FastJSONResponse
+from app.middleware.rate_limiting import rate_limiter
+from app.middleware.asgi import (
+    FastPathMiddleware,
+    SecurityHeadersMiddleware,
+    CSRFASGIMiddleware,
+    ThreatProtectionASGIMiddleware,
+    RateLimitASGIMiddleware,
+)
 from app.security.threat_protection import ThreatProtectionMiddleware, CaptchaProvider
-from app.auth.middleware import add_security_headers
 from app.security.content_moderation import security_headers
 from app.security.csrf_protection import CSRFMiddleware, csrf_protection
+from app.security.config import SecurityConfig
+from app.monitoring.logging_config import setup_logging, stop_logging
+from app.monitoring.tracing import BatchSpanExporter, trace_collector
+from app.monitoring.executor import install_default_executor
+from app.monitoring.metrics import slo_evaluator
+from app.monitoring.middleware import MonitoringMiddleware
+from app.storage.blob_storage import blob_storage_service
+from app.storage.image_manifest import create_manifest_broadcast, image_manifest
 
 # Load environment variables
 load_dotenv()
 
+# Static payloads shared by the routes below and the ASGI fast path
+ROOT_RESPONSE = {"message": "ComicGuess API is running"}
+HEALTH_RESPONSE = {"status": "healthy", "service": "comicguess-api"}
+USER_HEALTH_RESPONSE = {"status": "healthy", "service": "user_management"}
+
 app = FastAPI(
     title="ComicGuess API",
+    default_response_class=FastJSONResponse,
     description="""
     Daily comic character guessing game API.
     
@@ -125,11 +146,24 @@ csrf_middleware = CSRFMiddleware(
     exempt_paths={"/health", "/", "/api/auth/login", "/api/auth/register"}
 )
 
-# Add security middlewares (order matters)
-app.middleware("http")(add_security_headers)
-app.middleware("http")(csrf_middleware)
-app.middleware("http")(threat_protection)
-app.middleware("http")(rate_limit_middleware)
+# Request metrics and tracing; innermost, so it times the routed request only
+app.add_middleware(MonitoringMiddleware)
+
+# Add security middlewares as pure ASGI layers (order matters: the last one
+# added runs first, so rate limiting sees every request before the rest)
+app.add_middleware(ThreatProtectionASGIMiddleware, policy=threat_protection)
+app.add_middleware(CSRFASGIMiddleware, policy=csrf_middleware)
+headers_config = SecurityConfig.get_security_headers_config()
+if headers_config["enabled"]:
+    app.add_middleware(SecurityHeadersMiddleware, csp_nonce=headers_config["csp_nonce"])
+
+# Fixed responses served straight from pre-rendered bytes
+app.add_middleware(FastPathMiddleware, responses={
+    "/": ROOT_RESPONSE,
+    "/health": HEALTH_RESPONSE,
+    "/user/health": USER_HEALTH_RESPONSE,
+}, security_headers_enabled=headers_config["enabled"])
+app.add_middleware(RateLimitASGIMiddleware, limiter=rate_limiter)
 
 # Configure CORS with security considerations
 allowed_origins = [
@@ -169,21 +203,45 @@ app.include_router(images_router)
 app.include_router(image_versions_router)
 app.include_router(cache_router)
 app.include_router(monitoring_router, prefix="/api/monitor", tags=["monitoring"])
+# Conventional scrape path for Prometheus
+app.add_api_route("/metrics", prometheus_metrics, methods=["GET"], include_in_schema=False)
 app.include_router(health_router, prefix="/api", tags=["health"])
 
 @app.get("/")
 async def root():
-    return {"message": "ComicGuess API is running"}
+    return ROOT_RESPONSE
 
 @app.get("/health")
 async def basic_health_check():
     """Basic health check for load balancers"""
-    return {"status": "healthy", "service": "comicguess-api"}
+    return HEALTH_RESPONSE
 
 
 @app.on_event("startup")
 async def startup_event():
     """Application startup event handler"""
+    from app.config import settings
+    setup_logging(
+        settings.log_level,
+        enable_json=settings.log_format == "json",
+        async_logging=settings.log_async,
+        queue_size=settings.log_queue_size,
+        route_sample_rates=settings.route_sample_rates,
+    )
+    trace_collector.configure(
+        head_sample_rate=settings.trace_sample_rate,
+        slow_threshold_ms=settings.trace_slow_threshold_ms,
+        exporter=BatchSpanExporter(settings.trace_export_dir, settings.trace_export_endpoint)
+        if settings.trace_export_dir or settings.trace_export_endpoint else None,
+    )
+    # Bare run_in_executor(None, ...) calls then also carry trace/correlation context
+    install_default_executor()
+    slo_evaluator.start(settings.slo_evaluation_interval)
+    if settings.image_manifest_refresh_interval > 0:
+        image_manifest.broadcast = create_manifest_broadcast(settings.redis_url)
+        image_manifest.start(blob_storage_service, settings.image_manifest_refresh_interval,
+                             settings.image_manifest_sync_interval)
+    
     await startup_health_checks()
     
     # Quick Cosmos DB health check
@@ -204,12 +262,18 @@ async def shutdown_event():
     """Application shutdown event handler"""
     from app.monitoring.health import health_monitor
     await health_monitor.graceful_shutdown()
+    await slo_evaluator.stop()
+    await image_manifest.stop()
+    await blob_storage_service.close()
+    if trace_collector.exporter is not None:
+        trace_collector.exporter.shutdown()
+    stop_logging()
 
 @app.get("/api/security/csrf-token")
 async def get_csrf_token(user_id: str = None, session_id: str = None):
     """Get a CSRF token for form submissions"""
-    from app.security.csrf_protection import generate_csrf_token
-    token = generate_csrf_token(user_id, session_id)
+    from app.security.csrf_protection import generate_csrf_token_async
+    token = await generate_csrf_token_async(user_id, session_id)
     return {"csrf_token": token}
 
 @app.get("/api/security/headers")
@@ -221,7 +285,7 @@ async def get_security_info():
 @app.get("/user/health")
 async def user_service_health():
     """Health check endpoint for user service"""
-    return {"status": "healthy", "service": "user_management"}
+    return USER_HEALTH_RESPONSE
 
 if __name__ == "__main__":
     import uvicorn
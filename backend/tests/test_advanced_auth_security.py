@@ -13,7 +13,8 @@ from app.auth.jwt_handler import (
     revoke_all_user_tokens, logout_user, validate_token_security
 )
 from app.auth.session import (
-    SessionManager, UserSession, SessionSecurityInfo
+    SessionManager, UserSession, SessionSecurityInfo,
+    SessionStore, InMemorySessionStore, RedisSessionStore, SessionNearCache
 )
 from app.models.user import User
 
@@ -492,7 +493,7 @@ class TestSessionManager:
         
         assert refreshed_session is None
         # Session should be invalidated
-        assert self.test_user.id not in self.session_manager._active_sessions
+        assert self.session_manager.store.get(self.test_user.id) is None
     
     def test_session_security_info_retrieval(self):
         """Test retrieval of session security information"""
@@ -510,7 +511,7 @@ class TestSessionManager:
             )
         )
         
-        self.session_manager._active_sessions[self.test_user.id] = session
+        self.session_manager.store.save(session)
         
         # Get security info
         security_info = self.session_manager.get_session_security_info(self.test_user.id)
@@ -522,6 +523,154 @@ class TestSessionManager:
         assert "is_high_risk" in security_info
 
 
+class CountingSharedStore(InMemorySessionStore):
+    """In-memory store that behaves like a shared store and counts reads"""
+    
+    is_shared = True
+    
+    def __init__(self):
+        super().__init__()
+        self.reads = 0
+        self.touches = 0
+    
+    def get(self, user_id):
+        self.reads += 1
+        return super().get(user_id)
+    
+    def touch(self, session):
+        self.touches += 1
+
+
+class TestSessionStores:
+    """Test pluggable session storage and the per-worker near-cache"""
+    
+    def setup_method(self):
+        """Setup test environment"""
+        self.session = UserSession(
+            user_id="user_123",
+            username="testuser",
+            email="test@example.com",
+            created_at=datetime.now(timezone.utc),
+            last_activity=datetime.now(timezone.utc),
+            access_token="test_token",
+            refresh_token="refresh_token",
+            security_info=SessionSecurityInfo(
+                ip_address="192.168.1.100",
+                user_agent="Mozilla/5.0 (Test Browser)"
+            )
+        )
+    
+    def test_session_record_round_trip(self):
+        """Sessions survive serialization to a flat store record"""
+        restored = UserSession.from_record(self.session.to_record())
+        
+        assert restored.session_id == self.session.session_id
+        assert restored.refresh_token == "refresh_token"
+        assert restored.token_family is None
+        assert restored.security_info == self.session.security_info
+        assert abs((restored.last_activity - self.session.last_activity).total_seconds()) < 0.001
+    
+    def test_store_interface_is_abstract(self):
+        """Backends must implement the whole store interface"""
+        with pytest.raises(TypeError):
+            SessionStore()
+    
+    def test_near_cache_expiry(self):
+        """Near-cache entries expire after their TTL"""
+        cache = SessionNearCache(ttl_seconds=60)
+        cache.put(self.session)
+        assert cache.get("user_123") is self.session
+        
+        with patch('app.auth.session.time.monotonic', return_value=time.monotonic() + 61):
+            assert cache.get("user_123") is None
+    
+    def test_near_cache_is_bounded(self):
+        """The least recently used entry is evicted when the cache is full"""
+        cache = SessionNearCache(ttl_seconds=60, max_entries=1)
+        other = UserSession.from_record({**self.session.to_record(), "user_id": "user_456"})
+        
+        cache.put(self.session)
+        cache.put(other)
+        
+        assert cache.get("user_123") is None
+        assert cache.get("user_456") is other
+    
+    def test_shared_store_reads_go_through_near_cache(self):
+        """Repeated lookups on a shared store are served from the near-cache"""
+        store = CountingSharedStore()
+        store.save(self.session)
+        manager = SessionManager(store=store, near_cache_ttl=60)
+        
+        with patch.object(UserSession, 'is_expired', return_value=False):
+            for _ in range(5):
+                assert manager.get_session("user_123") is not None
+        
+        assert store.reads == 1
+        # Activity write-back is throttled
+        assert store.touches == 1
+    
+    def test_activity_write_times_are_bounded(self):
+        """Throttle state is kept only for sessions written within the interval"""
+        store = CountingSharedStore()
+        manager = SessionManager(store=store, activity_write_interval=60)
+        sessions = [UserSession.from_record({**self.session.to_record(), "session_id": f"session_{i}"})
+                    for i in range(3)]
+        
+        now = time.monotonic()
+        with patch('app.auth.session.time.monotonic', return_value=now):
+            for session in sessions[:2]:
+                manager._persist_activity(session)
+            manager._persist_activity(sessions[0])
+        assert store.touches == 2
+        
+        # Sessions that expired in the store by TTL are never removed explicitly
+        with patch('app.auth.session.time.monotonic', return_value=now + 61):
+            manager._persist_activity(sessions[2])
+        assert list(manager._last_activity_write) == ["session_2"]
+    
+    def test_shared_store_failed_login_lockout(self):
+        """Lockouts are read from the store, not per-worker state"""
+        store = InMemorySessionStore()
+        worker_a = SessionManager(store=store)
+        worker_b = SessionManager(store=store)
+        
+        for _ in range(5):
+            worker_a.record_failed_login("user_123", "192.168.1.100")
+        
+        assert worker_b.is_account_locked("user_123")
+    
+    def test_redis_store_keys_and_ttl(self):
+        """The Redis store writes a hash and session-id key with matching TTLs"""
+        redis_client = MagicMock()
+        pipe = redis_client.pipeline.return_value
+        store = RedisSessionStore(redis_client)
+        
+        store.save(self.session)
+        
+        pipe.hset.assert_called_once()
+        assert pipe.hset.call_args[0][0] == "session:user:user_123"
+        ttl = pipe.expire.call_args[0][1]
+        assert 0 < ttl <= 24 * 3600
+        pipe.set.assert_called_once_with(
+            f"session:id:{self.session.session_id}", "user_123", ex=ttl
+        )
+        pipe.execute.assert_called_once()
+    
+    def test_redis_store_failed_login_counter(self):
+        """Failed logins use an atomic counter with a window TTL"""
+        redis_client = MagicMock()
+        pipe = redis_client.pipeline.return_value
+        pipe.execute.return_value = [3, 1, True, 1, True, {b"10.0.0.1"}]
+        store = RedisSessionStore(redis_client)
+        
+        info = store.record_failed_login("user_123", "10.0.0.1", timedelta(minutes=15))
+        
+        pipe.hincrby.assert_called_once_with("session:failed:user_123", "count", 1)
+        pipe.expire.assert_any_call("session:failed:user_123", 900)
+        assert info["count"] == 3
+        assert info["ip_addresses"] == {"10.0.0.1"}
+
+
 @pytest.mark.integration
 class TestAdvancedAuthIntegration:
     """Integration tests for advanced authentication security"""
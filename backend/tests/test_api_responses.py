@@ -0,0 +1,103 @@
+"""Tests for the fast JSON response path"""
+
+import json
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, patch
+
+from app.api import responses
+from app.api.responses import FastJSONResponse, PreSerializedJSONResponse, dumps, model_response
+from app.models.guess import Guess
+from app.models.puzzle import PuzzleResponse
+from app.services.puzzle_service import PuzzleService
+
+class TestFastJSONResponse:
+    """Test orjson-backed rendering"""
+    
+    def setup_method(self):
+        self.guess = Guess(
+            user_id="user123",
+            puzzle_id="20240115-marvel",
+            guess="Spider-Man",
+            is_correct=True,
+            attempt_number=1,
+            timestamp=datetime(2024, 1, 15, 10, 30, 0, 123)
+        )
+    
+    def test_matches_standard_encoding(self):
+        """Output matches what FastAPI's JSONResponse produced for plain data"""
+        content = {"date": "2024-01-15", "count": 3, "ok": True, "name": "Móns"}
+        expected = json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        
+        assert FastJSONResponse(content).body == expected
+    
+    def test_models_and_datetimes(self):
+        """Nested models and datetimes serialize like model_dump_json"""
+        body = json.loads(dumps({"guesses": [self.guess], "at": datetime(2024, 1, 15, 10, 30)}))
+        
+        assert body["guesses"][0] == json.loads(self.guess.model_dump_json())
+        assert body["at"] == "2024-01-15T10:30:00"
+    
+    def test_stdlib_fallback(self):
+        """Serialization still works when orjson is not installed"""
+        with patch.object(responses, "orjson", None):
+            body = json.loads(dumps({"guess": self.guess, "tags": {"a"}}))
+        
+        assert body["guess"]["timestamp"] == "2024-01-15T10:30:00.000123"
+        assert body["tags"] == ["a"]
+    
+    def test_model_response(self):
+        """Models are serialized directly with the given headers"""
+        response = model_response(self.guess, headers={"Cache-Control": "no-store"})
+        
+        assert response.body == self.guess.model_dump_json().encode("utf-8")
+        assert response.headers["cache-control"] == "no-store"
+        assert response.media_type == "application/json"
+    
+    def test_aware_datetimes_keep_offset_format(self):
+        """Timezone-aware timestamps keep the +00:00 suffix clients already parse"""
+        aware = self.guess.model_copy(update={"timestamp": datetime(2024, 1, 15, 10, 30, tzinfo=timezone.utc)})
+        
+        assert json.loads(model_response(aware).body)["timestamp"] == "2024-01-15T10:30:00+00:00"
+        assert json.loads(dumps({"guess": aware}))["guess"]["timestamp"] == "2024-01-15T10:30:00+00:00"
+
+class TestPuzzleResponseCache:
+    """Test pre-serialized daily puzzle responses"""
+    
+    def setup_method(self):
+        self.service = PuzzleService()
+        self.puzzle_response = PuzzleResponse(
+            id="20240115-marvel",
+            universe="marvel",
+            active_date="2024-01-15"
+        )
+    
+    def test_json_bytes_computed_once(self):
+        """The serialized body is cached on the immutable response"""
+        body = self.puzzle_response.json_bytes
+        
+        assert body is self.puzzle_response.json_bytes
+        assert json.loads(body) == self.puzzle_response.model_dump()
+        assert PreSerializedJSONResponse(body).body is body
+        with pytest.raises(Exception):
+            self.puzzle_response.universe = "DC"
+    
+    @pytest.mark.asyncio
+    async def test_response_reused_until_invalidated(self):
+        """Repeated lookups reuse the built response until puzzles change"""
+        with patch.object(self.service.puzzle_repository, "get_puzzle_response",
+                          new_callable=AsyncMock) as mock_get:
+            mock_get.return_value = self.puzzle_response
+            
+            first = await self.service.get_daily_puzzle_response("marvel", "2024-01-15")
+            second = await self.service.get_daily_puzzle_response("marvel", "2024-01-15")
+            assert first is second
+            assert mock_get.call_count == 1
+            
+            with patch.object(self.service.puzzle_repository, "delete_puzzle",
+                              new_callable=AsyncMock, return_value=True):
+                await self.service.delete_puzzle("20240115-marvel")
+            
+            mock_get.return_value = None
+            assert await self.service.get_daily_puzzle_response("marvel", "2024-01-15") is None
+            assert mock_get.call_count == 2
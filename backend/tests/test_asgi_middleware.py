@@ -0,0 +1,333 @@
+"""Tests for the pure ASGI middleware pipeline"""
+
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from app.middleware.asgi import (
+    CSRFASGIMiddleware,
+    FastPathMiddleware,
+    RateLimitASGIMiddleware,
+    SecurityHeadersMiddleware,
+    ThreatProtectionASGIMiddleware,
+    merge_headers,
+)
+from app.middleware.rate_limiting import RateLimiter
+from app.monitoring.middleware import HTTP_REQUESTS_TOTAL, MonitoringMiddleware, PerformanceMiddleware
+from app.security.content_moderation import SecurityHeadersManager
+from app.security.csrf_protection import CSRFMiddleware, CSRFProtection
+from app.security.threat_protection import (
+    CaptchaProvider, ThreatEvent, ThreatLevel, ThreatProtectionMiddleware
+)
+
+def create_app() -> FastAPI:
+    """Small app exposing the routes the middlewares care about"""
+    app = FastAPI()
+    app.state.calls = 0
+
+    @app.get("/health")
+    async def health():
+        app.state.calls += 1
+        return {"status": "from-route"}
+
+    @app.get("/items")
+    async def items():
+        return {"items": []}
+
+    @app.post("/items")
+    async def create_item(request: Request):
+        return {"received": (await request.json())}
+
+    @app.post("/guess")
+    async def guess(request: Request):
+        request.state.guess_failed = True
+        return {"received": (await request.json())}
+
+    @app.get("/boom")
+    async def boom():
+        raise ValueError("Test error")
+
+    return app
+
+class TestFastPathMiddleware:
+    """Test pre-rendered responses"""
+
+    def setup_method(self):
+        self.app = create_app()
+        self.app.add_middleware(FastPathMiddleware, responses={"/health": {"status": "healthy"}})
+        self.client = TestClient(self.app)
+
+    def test_serves_prerendered_response(self):
+        """Fast path answers without reaching the route"""
+        response = self.client.get("/health")
+
+        assert response.status_code == 200
+        assert response.json() == {"status": "healthy"}
+        assert response.headers["x-frame-options"] == "DENY"
+        assert response.headers["content-length"] == str(len(response.content))
+        assert self.app.state.calls == 0
+
+    def test_other_paths_and_methods_pass_through(self):
+        """Only GET requests for registered paths are short-circuited"""
+        assert self.client.get("/items").json() == {"items": []}
+        assert self.client.post("/health").status_code == 405
+
+    def test_security_headers_can_be_disabled(self):
+        """The baked-in header block follows the security headers setting"""
+        app = create_app()
+        app.add_middleware(FastPathMiddleware, responses={"/health": {"status": "healthy"}},
+                           security_headers_enabled=False)
+        response = TestClient(app).get("/health")
+
+        assert response.json() == {"status": "healthy"}
+        assert "x-frame-options" not in response.headers
+        assert "content-security-policy" not in response.headers
+
+class TestSecurityHeadersMiddleware:
+    """Test precomputed security headers"""
+
+    def test_headers_follow_route_class(self):
+        """Each route class gets its own precompiled header block"""
+        app = create_app()
+
+        @app.get("/api/status")
+        async def api_status():
+            return {"ok": True}
+
+        @app.get("/images/preload")
+        async def preload():
+            return JSONResponse({"ok": True}, headers={"Cache-Control": "public, max-age=3600"})
+
+        @app.get("/images/marvel/hero.jpg")
+        async def image():
+            return JSONResponse({"ok": True})
+
+        @app.get("/images/validate/bad")
+        async def invalid():
+            return JSONResponse({"detail": "Invalid universe"}, status_code=400)
+
+        app.add_middleware(SecurityHeadersMiddleware)
+        client = TestClient(app)
+        manager = SecurityHeadersManager()
+
+        web = client.get("/items")
+        for name, value in manager.get_security_headers("/items").items():
+            assert web.headers[name] == value
+
+        api = client.get("/api/status")
+        assert api.headers["content-security-policy"] == "default-src 'none'"
+        assert "x-frame-options" not in api.headers
+
+        # The endpoint's own Cache-Control wins over the route class default
+        images = client.get("/images/preload")
+        assert images.headers["cache-control"] == "public, max-age=3600"
+        assert images.headers["cross-origin-resource-policy"] == "cross-origin"
+
+        # Successful image payloads get the immutable default, errors never do
+        assert client.get("/images/marvel/hero.jpg").headers["cache-control"] == "public, max-age=31536000, immutable"
+        error = client.get("/images/validate/bad")
+        assert error.status_code == 400
+        assert "cache-control" not in error.headers
+        assert error.headers["cross-origin-resource-policy"] == "cross-origin"
+
+    def test_csp_nonce_per_request(self):
+        """Nonces are fresh per request and match request.state.csp_nonce"""
+        app = create_app()
+
+        @app.get("/page")
+        async def page(request: Request):
+            return {"nonce": request.state.csp_nonce}
+
+        app.add_middleware(SecurityHeadersMiddleware, csp_nonce=True)
+        client = TestClient(app)
+
+        first = client.get("/page")
+        second = client.get("/page")
+        nonce = first.json()["nonce"]
+
+        assert f"'nonce-{nonce}'" in first.headers["content-security-policy"]
+        assert nonce != second.json()["nonce"]
+        assert first.headers["x-frame-options"] == "DENY"
+
+    def test_docs_allow_cdn_assets(self):
+        """Swagger UI and ReDoc can load their CDN bundles"""
+        app = create_app()
+        app.add_middleware(SecurityHeadersMiddleware)
+        client = TestClient(app)
+
+        for path in ("/docs", "/redoc", "/openapi.json"):
+            response = client.get(path)
+            assert response.status_code == 200
+            assert "https://cdn.jsdelivr.net" in response.headers["content-security-policy"]
+            assert "cross-origin-embedder-policy" not in response.headers
+            assert response.headers["x-frame-options"] == "DENY"
+
+        # Other pages keep the strict policy
+        page = client.get("/items")
+        assert "cdn.jsdelivr.net" not in page.headers["content-security-policy"]
+        assert page.headers["cross-origin-embedder-policy"] == "require-corp"
+
+    def test_merge_headers_replaces_existing_values(self):
+        """Same-named headers are replaced rather than duplicated"""
+        message = {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"x-frame-options", b"SAMEORIGIN"), (b"content-type", b"text/plain")]
+        }
+        merge_headers(message, [(b"x-frame-options", b"DENY")])
+
+        assert message["headers"] == [(b"content-type", b"text/plain"), (b"x-frame-options", b"DENY")]
+
+class TestCSRFASGIMiddleware:
+    """Test CSRF enforcement at the ASGI layer"""
+
+    def setup_method(self):
+        self.protection = CSRFProtection("test-secret-key")
+        policy = CSRFMiddleware(self.protection, exempt_paths={"/health"})
+        app = create_app()
+        app.add_middleware(CSRFASGIMiddleware, policy=policy)
+        self.client = TestClient(app)
+
+    def test_missing_token_rejected(self):
+        """Protected methods without a token get a 403"""
+        response = self.client.post("/items", json={"name": "x"})
+
+        assert response.status_code == 403
+        assert response.json() == {"detail": "CSRF token required"}
+
+    def test_invalid_token_rejected(self):
+        """Forged tokens get a 403"""
+        response = self.client.post("/items", json={}, headers={"X-CSRF-Token": "forged"})
+
+        assert response.status_code == 403
+        assert response.json() == {"detail": "Invalid CSRF token"}
+
+    def test_valid_token_and_safe_methods_pass(self):
+        """Valid tokens and GET requests reach the route"""
+        token = self.protection.generate_token()
+
+        response = self.client.post("/items", json={"name": "x"}, headers={"X-CSRF-Token": token})
+        assert response.status_code == 200
+        assert response.json() == {"received": {"name": "x"}}
+        assert self.client.get("/items").status_code == 200
+
+class TestThreatProtectionASGIMiddleware:
+    """Test threat screening at the ASGI layer"""
+
+    def setup_method(self):
+        self.policy = ThreatProtectionMiddleware(CaptchaProvider("test_secret", "test_site_key"))
+        app = create_app()
+        app.add_middleware(ThreatProtectionASGIMiddleware, policy=self.policy)
+        self.client = TestClient(app)
+
+    def test_blocked_ip_rejected(self):
+        """Blocked clients never reach the route"""
+        self.policy.detector.blocked_ips.add("testclient")
+        response = self.client.get("/items")
+
+        assert response.status_code == 429
+        assert response.json()["blocked"] is True
+
+    def test_body_replayed_after_captcha_screening(self):
+        """A body read during CAPTCHA screening is still delivered to the route"""
+        now = datetime.utcnow()
+        self.policy.detector.threat_events = [
+            ThreatEvent(now - timedelta(minutes=minutes), "testclient", None,
+                        "rapid_requests", ThreatLevel.MEDIUM, {})
+            for minutes in (5, 10)
+        ]
+        payload = {"guess": "Batman", "captcha_response": "ok"}
+
+        with patch.object(self.policy.captcha_provider, "verify_captcha", AsyncMock(return_value=True)):
+            response = self.client.post("/guess", json=payload)
+
+        assert response.status_code == 200
+        assert response.json() == {"received": payload}
+
+        # The route flagged the guess as failed, which is recorded afterwards
+        assert self.policy.detector.threat_events[-1].threat_type == "failed_guess"
+
+class TestRateLimitASGIMiddleware:
+    """Test rate limiting at the ASGI layer"""
+
+    def setup_method(self):
+        self.limiter = RateLimiter()
+        self.limiter.limits["default"]["ip"]["requests"] = 2
+        app = create_app()
+        app.add_middleware(RateLimitASGIMiddleware, limiter=self.limiter)
+        self.client = TestClient(app)
+
+    def test_headers_and_limit(self):
+        """Responses carry limit headers until the limit is hit"""
+        first = self.client.get("/items")
+        assert first.headers["x-ratelimit-limit"] == "2"
+        assert first.headers["x-ratelimit-remaining"] == "1"
+
+        self.client.get("/items")
+        limited = self.client.get("/items")
+        assert limited.status_code == 429
+        assert limited.json()["limit_type"] == "ip"
+
+class TestMonitoringASGIMiddleware:
+    """Test the monitoring middlewares mounted as ASGI layers"""
+
+    def setup_method(self):
+        app = create_app()
+        app.add_middleware(PerformanceMiddleware)
+        app.add_middleware(MonitoringMiddleware)
+        self.client = TestClient(app, raise_server_exceptions=False)
+
+    def test_tracing_and_timing_headers(self):
+        """Monitored responses carry tracing and response time headers"""
+        response = self.client.get("/items", headers={"X-Correlation-ID": "corr-123"})
+
+        assert response.status_code == 200
+        assert response.headers["x-correlation-id"] == "corr-123"
+        assert response.headers["x-trace-id"]
+        assert response.headers["x-response-time"].endswith("ms")
+
+    def test_unhandled_error_becomes_500(self):
+        """Exceptions raised before the response starts become a traced 500"""
+        response = self.client.get("/boom")
+
+        assert response.status_code == 500
+        assert "error_id" in response.json()
+        assert response.headers["x-correlation-id"] == response.json()["correlation_id"]
+
+    def test_requests_recorded_by_route(self):
+        """Requests are counted under their route template, errors as 500s"""
+        ok = HTTP_REQUESTS_TOTAL.labels("GET", "/items", "200")
+        failed = HTTP_REQUESTS_TOTAL.labels("GET", "/boom", "500")
+        ok_before, failed_before = ok.get_value(), failed.get_value()
+
+        with patch("app.monitoring.middleware.metrics") as legacy_metrics:
+            self.client.get("/items")
+            self.client.get("/boom")
+
+        assert ok.get_value() == ok_before + 1
+        assert failed.get_value() == failed_before + 1
+        legacy_metrics.increment_counter.assert_not_called()
+        legacy_metrics.record_histogram.assert_not_called()
+
+class TestApplicationMiddlewareOrder:
+    """Test how the layers are stacked in the application"""
+
+    def setup_method(self):
+        from main import app
+        from app.middleware.rate_limiting import rate_limiter
+        self.limiter = rate_limiter
+        self.limiter.ip_windows.clear()
+        self.client = TestClient(app)
+
+    def teardown_method(self):
+        self.limiter.ip_windows.clear()
+
+    def test_rate_limit_runs_before_csrf(self):
+        """Requests CSRF would reject still count against the rate limit"""
+        with patch.dict(self.limiter.limits["default"]["ip"], {"requests": 3}):
+            statuses = [self.client.post("/api/simulate-guess").status_code for _ in range(5)]
+
+        assert statuses == [403, 403, 403, 429, 429]
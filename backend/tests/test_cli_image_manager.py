@@ -5,11 +5,14 @@ Tests for CLI image management tools.
 import pytest
 import tempfile
 from pathlib import Path
-from unittest.mock import AsyncMock, MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
 from PIL import Image
+from PIL.JpegImagePlugin import JpegImageFile
 import io
 
+from azure.core.exceptions import ServiceRequestError
 from cli.image_manager import ImageManager
+from app.storage.perceptual_hash import format_hash, parse_hash, perceptual_hash
 
 
 class TestImageManager:
@@ -66,6 +69,29 @@ class TestImageManager:
         # Clean up
         sample_image_file.unlink()
     
+    @pytest.mark.asyncio
+    async def test_upload_image_generates_variants(self, image_manager):
+        """Uploads also store the responsive variant ladder"""
+        img = Image.new('RGB', (700, 350), color='blue')
+        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as f:
+            img.save(f, format='JPEG')
+            image_path = Path(f.name)
+        image_manager.blob_service.get_image_url.return_value = None
+        image_manager.blob_service.upload_image.return_value = 'marvel/spider-man.jpg'
+        image_manager.blob_service.upload_variants.side_effect = lambda u, c, variants: [v.format for v in variants]
+        
+        result = await image_manager.upload_image('marvel', 'Spider-Man', image_path)
+        skipped = await image_manager.upload_image('marvel', 'Spider-Man', image_path, variants=False)
+        
+        variants = image_manager.blob_service.upload_variants.call_args[0][2]
+        assert {(v.width, v.format) for v in variants} >= {(320, 'webp'), (640, 'jpeg')}
+        assert all(v.width <= 700 for v in variants)
+        assert result['variants'] == len(variants)
+        assert skipped['variants'] == 0
+        image_manager.blob_service.upload_variants.assert_called_once()
+        
+        image_path.unlink()
+    
     @pytest.mark.asyncio
     async def test_upload_image_file_not_found(self, image_manager):
         """Test upload with non-existent file"""
@@ -200,6 +226,117 @@ class TestImageManager:
             assert stats['valid_images'] == 1
             image_manager.blob_service.upload_image.assert_not_called()
     
+    @pytest.mark.asyncio
+    async def test_bulk_upload_skips_near_duplicates(self, image_manager, sample_image_data):
+        """Test near-duplicates of stored images and of earlier files in the batch are skipped"""
+        stored = Image.new('RGB', (200, 200), color='white')
+        stored.paste(Image.new('RGB', (100, 200), color='black'))
+        stored_data = io.BytesIO()
+        stored.save(stored_data, format='PNG')
+        stored_hash = perceptual_hash(stored_data.getvalue())
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_path = Path(temp_dir)
+            stored.resize((150, 150)).save(temp_path / 'venom.jpg', format='JPEG', quality=70)
+            (temp_path / 'iron-man.jpg').write_bytes(sample_image_data)
+            (temp_path / 'iron-man-copy.jpg').write_bytes(sample_image_data)
+            
+            image_manager.blob_service._get_blob_path = Mock(side_effect=lambda u, c: f"{u}/{c.lower().replace(' ', '-')}.jpg")
+            image_manager.blob_service.list_image_properties.return_value = [{
+                'blob_path': 'marvel/symbiote.jpg', 'etag': '"1"', 'last_modified': None, 'url': '',
+                'metadata': {'phash': format_hash(stored_hash)}
+            }]
+            image_manager.blob_service.get_image_url.return_value = None
+            image_manager.blob_service.upload_image.side_effect = lambda u, c, *args, **kwargs: f"{u}/{c}.jpg"
+            
+            stats = await image_manager.bulk_upload(
+                'marvel', temp_path, check_duplicates=True, variants=False
+            )
+        
+        assert stats['uploaded'] == 1
+        assert stats['duplicates'] == 2
+        assert stats['skipped'] == 2
+        assert any('venom.jpg: Near-duplicate of marvel/symbiote.jpg' in error for error in stats['errors'])
+        # The stored hash travels with the upload
+        metadata = image_manager.blob_service.upload_image.call_args.kwargs['metadata']
+        assert parse_hash(metadata['phash']) is not None
+    
+    @pytest.mark.asyncio
+    async def test_bulk_upload_resumes_after_interruption(self, image_manager, sample_image_data):
+        """Test files recorded by an earlier run are skipped unless they changed"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_path = Path(temp_dir)
+            for filename in ['spider-man.jpg', 'iron-man.jpg', 'thor.jpg']:
+                (temp_path / filename).write_bytes(sample_image_data)
+            
+            def fail_thor(universe, character, *args, **kwargs):
+                if character == 'Thor':
+                    raise ValueError("Container is being deleted")
+                return f"{universe}/{character}.jpg"
+            
+            image_manager.blob_service.upload_image.side_effect = fail_thor
+            first = await image_manager.bulk_upload('marvel', temp_path, variants=False)
+            
+            state = (temp_path / '.bulk-upload-marvel.jsonl').read_text().splitlines()
+            assert first['uploaded'] == 2
+            assert len(state) == 2
+            
+            image_manager.blob_service.upload_image.side_effect = lambda u, c, *args, **kwargs: f"{u}/{c}.jpg"
+            image_manager.blob_service.upload_image.reset_mock()
+            with open(temp_path / 'iron-man.jpg', 'ab') as f:
+                f.write(b'\0')
+            second = await image_manager.bulk_upload('marvel', temp_path, variants=False)
+        
+        assert second['resumed'] == 1
+        assert second['uploaded'] == 2
+        uploaded = {call.args[1] for call in image_manager.blob_service.upload_image.call_args_list}
+        assert uploaded == {'Iron Man', 'Thor'}
+    
+    @pytest.mark.asyncio
+    async def test_bulk_upload_retries_transient_errors(self, image_manager, sample_image_file):
+        """Test transient storage errors are retried with a fresh stream"""
+        image_manager.upload_retry.base_delay = 0
+        image_manager.blob_service.upload_image.side_effect = [
+            ServiceRequestError("Connection reset by peer"), 'marvel/spider-man.jpg'
+        ]
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_path = Path(temp_dir)
+            (temp_path / 'spider-man.jpg').write_bytes(sample_image_file.read_bytes())
+            
+            stats = await image_manager.bulk_upload('marvel', temp_path, variants=False, resume=False)
+        
+        assert stats['uploaded'] == 1
+        assert stats['errors'] == []
+        streams = [call.args[2] for call in image_manager.blob_service.upload_image.call_args_list]
+        assert len(streams) == 2
+        assert streams[0] is not streams[1]
+    
+    @pytest.mark.asyncio
+    async def test_index_hashes_backfills_unhashed_images(self, image_manager, sample_image_data):
+        """Test hashes are computed for unhashed images and merged into their metadata"""
+        image_manager.blob_service.list_image_properties.return_value = [
+            {'blob_path': 'marvel/thor.jpg', 'etag': '"e1"', 'metadata': {'universe': 'marvel'}},
+            {'blob_path': 'marvel/loki.jpg', 'etag': '"e2"', 'metadata': {'phash': '00ff'}},
+            {'blob_path': 'variants/marvel/thor/320w.webp', 'etag': '"e3"', 'metadata': {}},
+        ]
+        
+        async def chunks():
+            yield sample_image_data
+        
+        image_manager.blob_service.open_image_stream.return_value = chunks()
+        image_manager.blob_service.update_blob_metadata.return_value = True
+        
+        stats = await image_manager.index_hashes('marvel')
+        
+        assert stats == {'total_images': 2, 'already_hashed': 1, 'hashed': 1, 'errors': []}
+        image_manager.blob_service.open_image_stream.assert_awaited_once_with('marvel/thor.jpg', etag='e1')
+        image_manager.blob_service.update_blob_metadata.assert_awaited_once_with(
+            'marvel/thor.jpg',
+            {'universe': 'marvel', 'phash': format_hash(perceptual_hash(sample_image_data))},
+            etag='e1'
+        )
+    
     @pytest.mark.asyncio
     async def test_bulk_upload_no_images(self, image_manager):
         """Test bulk upload with directory containing no images"""
@@ -315,6 +452,33 @@ class TestImageManager:
         finally:
             large_path.unlink()
     
+    @pytest.mark.asyncio
+    async def test_optimize_image_drafts_large_jpeg(self, image_manager):
+        """Test large JPEGs are decoded at a reduced DCT scale before resizing"""
+        image_manager.max_dimensions = (200, 200)
+        
+        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as f:
+            Image.new('RGB', (1600, 1200), color='blue').save(f, format='JPEG')
+            large_path = Path(f.name)
+        
+        decoded_sizes = []
+        original_draft = JpegImageFile.draft
+        
+        def draft(image, mode, size):
+            result = original_draft(image, mode, size)
+            decoded_sizes.append(image.size)
+            return result
+        
+        try:
+            with patch.object(JpegImageFile, 'draft', autospec=True, side_effect=draft):
+                optimized_data, _ = await image_manager._optimize_image(large_path)
+            
+            # Half scale is the smallest that still covers 200x200 with the reducing gap
+            assert decoded_sizes[0] == (800, 600)
+            assert Image.open(io.BytesIO(optimized_data)).size == (200, 150)
+        finally:
+            large_path.unlink()
+    
     @pytest.mark.asyncio
     async def test_validate_image_success(self, image_manager, sample_image_file):
         """Test successful image validation"""
@@ -2,6 +2,8 @@
 Tests for content moderation and security features
 """
 
+import asyncio
+import time
 import pytest
 from datetime import datetime, timedelta, timezone
 from unittest.mock import Mock, patch
@@ -11,7 +13,11 @@ from app.security.content_moderation import (
     ModerationAction, ContentCategory, ModerationResult
 )
 from app.security.csrf_protection import (
-    CSRFProtection, CSRFMiddleware, DependencyScanner
+    CSRFProtection, CSRFMiddleware, DependencyScanner, StatelessCSRFProtection,
+    CSRFGenerationStore
+)
+from app.security.pattern_scanner import (
+    PatternScanner, ScanRule, SUSPICIOUS_INPUT_RULES, default_scanner
 )
 
 
@@ -121,6 +127,58 @@ class TestProfanityFilter:
         filtered = self.filter._filter_content(content_with_profanity, ModerationAction.WARN)
         assert "badword1" not in filtered
         assert "*" in filtered
+    
+    def test_added_words_are_masked(self):
+        """Words added to the filter after construction are masked too"""
+        assert self.filter._filter_content("a frobnicate here", ModerationAction.WARN) == "a frobnicate here"
+        
+        self.filter.profanity_words.add("frobnicate")
+        assert self.filter._filter_content("a Frobnicate here", ModerationAction.WARN) == "a ********** here"
+        
+        self.filter.profanity_words.discard("frobnicate")
+        assert self.filter._filter_content("a frobnicate here", ModerationAction.WARN) == "a frobnicate here"
+
+
+class TestPatternScanner:
+    """Test the shared single-pass pattern scanner"""
+    
+    def test_reports_every_matching_rule(self):
+        """Overlapping hits from different rules are all reported"""
+        scanner = PatternScanner([
+            ScanRule("word", r"hell", "profanity", ignore_case=True),
+            ScanRule("caps", r"[A-Z]{4,}", "spam"),
+            ScanRule("repeat", r"(?P<ch>.)(?P=ch){2,}", "spam"),
+        ])
+        
+        result = scanner.scan("HELLOOO")
+        assert result.rule_names("profanity") == ["word"]
+        assert result.rule_names("spam") == ["caps", "repeat"]
+        assert [m.text for m in result.by_category("spam")] == ["HELLOOO", "OOO"]
+    
+    def test_matches_per_rule_are_non_overlapping(self):
+        """Each rule yields the same matches as running it on its own"""
+        scanner = PatternScanner([ScanRule("caps", r"[A-Z]{4,}", "spam")])
+        
+        result = scanner.scan("ABCDEF gh IJKL")
+        assert [m.text for m in result.matches] == ["ABCDEF", "IJKL"]
+    
+    def test_category_filter(self):
+        """Scans can be limited to a subset of categories"""
+        result = default_scanner.scan("b4dw0rd1 select", categories=("suspicious",))
+        assert result.rule_names("profanity") == []
+        assert result.first("suspicious").rule.name == "sql_keywords"
+    
+    def test_first_follows_rule_priority(self):
+        """The first suspicious match follows the declared rule order"""
+        scanner = PatternScanner(SUSPICIOUS_INPUT_RULES)
+        
+        match = scanner.scan("x select <b>", categories=("suspicious",)).first("suspicious")
+        assert match.rule.name == "quoted_markup"
+    
+    def test_empty_input(self):
+        """Empty input produces no matches"""
+        assert default_scanner.scan("").matches == []
+        assert default_scanner.normalize("") == ""
 
 
 class TestContentModerationManager:
@@ -283,6 +341,28 @@ class TestSecurityHeadersManager:
         assert 'Custom-Header' in headers
         assert headers['Custom-Header'] == 'custom-value'
     
+    def test_header_blocks_precompiled(self):
+        """Test header blocks are encoded once per route class"""
+        api_block = self.headers_manager.get_header_block('/api/users')
+        assert api_block is self.headers_manager.get_header_block('/api/guess')
+        assert (b'content-security-policy', b"default-src 'none'") in api_block.raw_headers
+        assert not api_block.supports_nonce
+        
+        image_block = self.headers_manager.get_header_block('/images/character.jpg')
+        assert (b'cache-control', b'public, max-age=31536000, immutable') in image_block.raw_defaults
+        assert all(name != b'cache-control' for name, _ in image_block.raw_headers)
+    
+    def test_header_block_nonce(self):
+        """Test CSP nonces are spliced in without rebuilding the block"""
+        block = self.headers_manager.get_header_block('/')
+        assert block.supports_nonce
+        
+        headers = dict(block.with_nonce('abc123'))
+        csp = headers[b'content-security-policy'].decode()
+        assert "'nonce-abc123'" in csp
+        assert csp == self.headers_manager._build_csp_header('abc123')
+        assert len(headers) == len(block.raw_headers)
+    
     def test_csp_compliance_validation(self):
         """Test CSP compliance validation"""
         # Test content with violations
@@ -471,6 +551,139 @@ class TestCSRFProtection:
         assert stats['valid_tokens'] == 0
 
 
+class FakeRedis:
+    """Minimal shared Redis stand-in for generation counters"""
+    
+    def __init__(self):
+        self.data = {}
+    
+    def get(self, key):
+        value = self.data.get(key)
+        return str(value).encode() if value is not None else None
+    
+    def incr(self, key):
+        self.data[key] = self.data.get(key, 0) + 1
+        return self.data[key]
+    
+    def scan_iter(self, match=None, count=None):
+        prefix = match.rstrip('*') if match else ''
+        return iter([key for key in self.data if key.startswith(prefix)])
+
+
+class TestStatelessCSRFProtection:
+    """Test stateless (signed, table-free) CSRF tokens"""
+    
+    def setup_method(self):
+        """Setup test environment"""
+        self.csrf = StatelessCSRFProtection("test-secret-key")
+    
+    def test_token_validation_without_storage(self):
+        """Tokens validate without any server-side token table"""
+        token = self.csrf.generate_token("test_user", "test_session")
+        
+        assert self.csrf.active_tokens == {}
+        assert self.csrf.validate_token(token, "test_user", "test_session") is True
+    
+    def test_token_validates_on_another_worker(self):
+        """A token issued by one instance validates on another sharing the key"""
+        token = self.csrf.generate_token("test_user", "test_session")
+        other_worker = StatelessCSRFProtection("test-secret-key")
+        
+        assert other_worker.validate_token(token, "test_user", "test_session") is True
+        assert StatelessCSRFProtection("other-key").validate_token(
+            token, "test_user", "test_session") is False
+    
+    def test_binding_and_tampering(self):
+        """Tokens are bound to user/session and reject tampered fields"""
+        token = self.csrf.generate_token("test_user", "test_session")
+        
+        assert self.csrf.validate_token(token, "wrong_user", "test_session") is False
+        assert self.csrf.validate_token(token, "test_user", "wrong_session") is False
+        
+        version, nonce, expires, generation, signature = token.split('.')
+        extended = '.'.join([version, nonce, str(int(expires) + 3600), generation, signature])
+        assert self.csrf.validate_token(extended, "test_user", "test_session") is False
+        
+        assert self.csrf.validate_token("invalid_token", "test_user", "test_session") is False
+        assert self.csrf.validate_token("", "test_user", "test_session") is False
+        assert self.csrf.validate_token(None, "test_user", "test_session") is False
+    
+    def test_token_expiration(self):
+        """Expired tokens are rejected"""
+        token = self.csrf.generate_token("test_user", "test_session")
+        
+        with patch('app.security.csrf_protection.time.time', return_value=time.time() + 7200):
+            assert self.csrf.validate_token(token, "test_user", "test_session") is False
+    
+    def test_user_token_revocation(self):
+        """Revocation bumps the user's generation and leaves other users alone"""
+        token1 = self.csrf.generate_token("test_user", "session1")
+        token2 = self.csrf.generate_token("other_user", "session2")
+        
+        self.csrf.revoke_user_tokens("test_user")
+        
+        assert self.csrf.validate_token(token1, "test_user", "session1") is False
+        assert self.csrf.validate_token(token2, "other_user", "session2") is True
+        
+        # Tokens issued after revocation are valid again
+        token3 = self.csrf.generate_token("test_user", "session1")
+        assert self.csrf.validate_token(token3, "test_user", "session1") is True
+    
+    def test_revocation_shared_between_workers(self):
+        """Revoking on one worker rejects the user's tokens on another"""
+        redis_client = FakeRedis()
+        worker_a = StatelessCSRFProtection(
+            "test-secret-key", generation_store=CSRFGenerationStore(redis_client))
+        worker_b = StatelessCSRFProtection(
+            "test-secret-key", generation_store=CSRFGenerationStore(redis_client))
+        
+        token = worker_a.generate_token("test_user", "session1")
+        assert worker_b.validate_token(token, "test_user", "session1") is True
+        
+        worker_a.revoke_user_tokens("test_user")
+        worker_a.revoke_user_tokens("test_user")
+        assert redis_client.data == {"csrf_generation:test_user": 2}
+        assert worker_a.validate_token(token, "test_user", "session1") is False
+        
+        # Worker B's cached generation expires after the cache TTL
+        with patch('app.security.csrf_protection.time.monotonic', return_value=time.monotonic() + 2):
+            assert worker_b.validate_token(token, "test_user", "session1") is False
+            fresh = worker_a.generate_token("test_user", "session1")
+            assert worker_b.validate_token(fresh, "test_user", "session1") is True
+        
+        assert worker_b.get_stats()['revoked_users'] == 1
+    
+    @pytest.mark.asyncio
+    async def test_generation_reads_off_loop_and_bounded(self):
+        """The request path reads generations in a worker thread into a bounded cache"""
+        redis_client = FakeRedis()
+        store = CSRFGenerationStore(redis_client, max_cached_users=2)
+        csrf = StatelessCSRFProtection("test-secret-key", generation_store=store)
+        token = csrf.generate_token("user_0", "session1")
+        
+        with patch('app.security.csrf_protection.asyncio.to_thread', wraps=asyncio.to_thread) as to_thread:
+            assert await csrf.validate_token_async(token, "user_0", "session1") is True
+            for i in range(5):
+                await csrf.prefetch(f"user_{i}")
+        
+        # user_0 was still cached from generating the token
+        assert to_thread.call_count == 4
+        assert list(store._cache) == ["user_3", "user_4"]
+    
+    def test_token_info_and_stats(self):
+        """Token info is decoded from the token itself"""
+        token = self.csrf.generate_token("test_user", "test_session")
+        
+        info = self.csrf.get_token_info(token)
+        assert info['generation'] == 0
+        assert info['time_remaining'] > 0
+        assert self.csrf.get_token_info("nonexistent") is None
+        
+        stats = self.csrf.get_stats()
+        assert stats['mode'] == "stateless"
+        assert stats['tokens_issued'] == 1
+
+
 class TestDependencyScanner:
     """Test dependency vulnerability scanning"""
     
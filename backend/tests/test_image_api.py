@@ -5,7 +5,10 @@ Tests for Image API endpoints.
 import pytest
 from fastapi.testclient import TestClient
 from unittest.mock import AsyncMock, patch
+from azure.core.exceptions import ResourceModifiedError
 from app.api.images import router
+from app.services.image_service import image_service
+from app.storage.image_manifest import ManifestEntry
 from fastapi import FastAPI
 
 # Create test app
@@ -231,4 +234,180 @@ class TestImageAPI:
         
         # Test invalid quality (too large)
         response = client.get("/images/character/marvel/Spider-Man?quality=150")
-        assert response.status_code == 422  # Validation error
\ No newline at end of file
+        assert response.status_code == 422  # Validation error
+
+class TestOriginImageServing:
+    """Test cases for the conditional, range-aware origin endpoint."""
+    
+    CONTENT = bytes(range(256)) * 4
+    
+    def make_entry(self, etag="0x8D1"):
+        return ManifestEntry(
+            blob_path="marvel/spider-man.jpg",
+            url="https://testaccount.blob.core.windows.net/character-images/marvel/spider-man.jpg",
+            etag=etag,
+            last_modified="2024-01-02T03:04:05+00:00",
+            version="abcd1234",
+            content_length=len(self.CONTENT),
+            content_type="image/jpeg"
+        )
+    
+    def stream(self, offset=None, length=None):
+        data = self.CONTENT[offset or 0:(offset or 0) + length] if length else self.CONTENT
+        
+        async def chunks():
+            for i in range(0, len(data), 100):
+                yield data[i:i + 100]
+        return chunks()
+    
+    @pytest.fixture
+    def origin(self):
+        """Patch manifest resolution and storage streaming on the real image service."""
+        with patch.object(image_service, "resolve_image", AsyncMock(return_value=self.make_entry())) as resolve, \
+             patch.object(image_service, "open_image_stream",
+                          AsyncMock(side_effect=lambda entry, offset=None, length=None: self.stream(offset, length))) as open_stream:
+            yield resolve, open_stream
+    
+    def test_full_image_is_streamed_with_versioned_headers(self, origin):
+        response = client.get("/images/origin/marvel/Spider-Man")
+        
+        assert response.status_code == 200
+        assert response.content == self.CONTENT
+        assert response.headers["etag"] == '"0x8D1"'
+        assert response.headers["x-image-version"] == "abcd1234"
+        assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+        assert response.headers["last-modified"] == "Tue, 02 Jan 2024 03:04:05 GMT"
+        assert response.headers["accept-ranges"] == "bytes"
+        assert response.headers["content-type"] == "image/jpeg"
+        assert response.headers["content-length"] == str(len(self.CONTENT))
+    
+    def test_if_none_match_returns_304_without_storage(self, origin):
+        _, open_stream = origin
+        
+        response = client.get("/images/origin/marvel/Spider-Man", headers={"If-None-Match": 'W/"other", "0x8D1"'})
+        
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == '"0x8D1"'
+        open_stream.assert_not_called()
+    
+    def test_if_modified_since(self, origin):
+        _, open_stream = origin
+        
+        response = client.get("/images/origin/marvel/Spider-Man",
+                              headers={"If-Modified-Since": "Tue, 02 Jan 2024 03:04:05 GMT"})
+        assert response.status_code == 304
+        open_stream.assert_not_called()
+        
+        response = client.get("/images/origin/marvel/Spider-Man",
+                              headers={"If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT"})
+        assert response.status_code == 200
+    
+    def test_if_none_match_takes_precedence(self, origin):
+        response = client.get("/images/origin/marvel/Spider-Man", headers={
+            "If-None-Match": '"stale"',
+            "If-Modified-Since": "Tue, 02 Jan 2024 03:04:05 GMT"
+        })
+        
+        assert response.status_code == 200
+    
+    def test_byte_range(self, origin):
+        _, open_stream = origin
+        
+        response = client.get("/images/origin/marvel/Spider-Man", headers={"Range": "bytes=100-299"})
+        
+        assert response.status_code == 206
+        assert response.content == self.CONTENT[100:300]
+        assert response.headers["content-range"] == f"bytes 100-299/{len(self.CONTENT)}"
+        assert response.headers["content-length"] == "200"
+        assert open_stream.call_args.kwargs == {"offset": 100, "length": 200}
+    
+    def test_suffix_and_open_ended_ranges(self, origin):
+        size = len(self.CONTENT)
+        
+        response = client.get("/images/origin/marvel/Spider-Man", headers={"Range": "bytes=-24"})
+        assert response.status_code == 206
+        assert response.content == self.CONTENT[-24:]
+        assert response.headers["content-range"] == f"bytes {size - 24}-{size - 1}/{size}"
+        
+        response = client.get("/images/origin/marvel/Spider-Man", headers={"Range": "bytes=1000-5000"})
+        assert response.status_code == 206
+        assert response.content == self.CONTENT[1000:]
+    
+    def test_unsatisfiable_range(self, origin):
+        response = client.get("/images/origin/marvel/Spider-Man", headers={"Range": "bytes=5000-"})
+        
+        assert response.status_code == 416
+        assert response.headers["content-range"] == f"bytes */{len(self.CONTENT)}"
+    
+    def test_multiple_ranges_and_stale_if_range_serve_full_image(self, origin):
+        response = client.get("/images/origin/marvel/Spider-Man", headers={"Range": "bytes=0-1,5-6"})
+        assert response.status_code == 200
+        assert response.content == self.CONTENT
+        
+        response = client.get("/images/origin/marvel/Spider-Man",
+                              headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+        assert response.status_code == 200
+        assert response.content == self.CONTENT
+    
+    def test_missing_image(self, origin):
+        resolve, _ = origin
+        resolve.return_value = None
+        
+        response = client.get("/images/origin/marvel/Nobody")
+        
+        assert response.status_code == 404
+    
+    def test_changed_blob_is_resolved_again(self, origin):
+        resolve, open_stream = origin
+        resolve.side_effect = [self.make_entry("0x8D1"), self.make_entry("0x8D2")]
+        open_stream.side_effect = [ResourceModifiedError("changed"), self.stream()]
+        
+        response = client.get("/images/origin/marvel/Spider-Man")
+        
+        assert response.status_code == 200
+        assert response.headers["etag"] == '"0x8D2"'
+        assert response.content == self.CONTENT
+    
+    def test_invalid_universe(self, origin):
+        response = client.get("/images/origin/invalid/Spider-Man")
+        
+        assert response.status_code == 400
+    
+    def test_universe_is_case_insensitive(self, origin):
+        resolve, _ = origin
+        
+        for universe in ("DC", "dc", "Marvel"):
+            assert client.get(f"/images/origin/{universe}/Batman").status_code == 200
+        assert [call.args[0] for call in resolve.call_args_list] == ["dc", "dc", "marvel"]
+    
+    def test_serves_negotiated_variant(self, origin):
+        variant = self.make_entry("0x8D9")
+        variant.blob_path = "variants/marvel/spider-man/640w.webp"
+        variant.content_type = "image/webp"
+        with patch.object(image_service, "select_image_variant", return_value=variant) as select:
+            response = client.get("/images/origin/marvel/Spider-Man?w=600",
+                                  headers={"Accept": "image/webp", "Sec-CH-DPR": "2", "Save-Data": "on"})
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/webp"
+        assert response.headers["etag"] == '"0x8D9"'
+        assert "Accept" in response.headers["vary"]
+        assert "Sec-CH-Width" in response.headers["accept-ch"]
+        assert select.call_args.kwargs == {
+            "accept": "image/webp", "width": 600, "dpr": 2.0, "viewport_width": None, "save_data": True
+        }
+        origin[0].assert_not_called()
+    
+    def test_srcset_endpoint(self):
+        srcset = {"universe": "marvel", "character_name": "Spider-Man", "widths": [320],
+                  "sources": [{"type": "image/webp", "srcset": "https://cdn/variants/marvel/spider-man/320w.webp?v=1 320w"}]}
+        with patch.object(image_service, "get_image_srcset", return_value=srcset):
+            response = client.get("/images/srcset/marvel/Spider-Man")
+        
+        assert response.status_code == 200
+        assert response.json()["data"] == srcset
+        
+        with patch.object(image_service, "get_image_srcset", return_value=srcset):
+            assert client.get("/images/srcset/DC/Batman").status_code == 200
+        assert response.headers["cache-control"] == "public, max-age=3600"
@@ -3,8 +3,10 @@ Tests for Image Service with CDN integration and fallback handling.
 """
 
 import pytest
+import time
 from unittest.mock import Mock, AsyncMock, patch
 from app.services.image_service import ImageService
+from app.storage.image_manifest import ImageManifest, ManifestBroadcast, compute_image_version
 from app.storage.exceptions import StorageError
 
 class TestImageService:
@@ -283,4 +285,146 @@ class TestImageService:
             service = ImageService()
             
             # Should handle empty connection string gracefully
-            assert service.cdn_base_url is None
\ No newline at end of file
+            assert service.cdn_base_url is None
+class FakeRedis:
+    """Minimal shared Redis stand-in for the invalidation log."""
+    
+    def __init__(self):
+        self.data = {}
+    
+    def get(self, key):
+        value = self.data.get(key)
+        return str(value).encode() if value is not None else None
+    
+    def incr(self, key):
+        self.data[key] = self.data.get(key, 0) + 1
+        return self.data[key]
+    
+    def rpush(self, key, value):
+        self.data.setdefault(key, []).append(value.encode())
+    
+    def ltrim(self, key, start, end):
+        self.data[key] = self.data[key][start:] if end == -1 else self.data[key][start:end + 1]
+    
+    def lrange(self, key, start, end):
+        return list(self.data.get(key, []))
+    
+    def pipeline(self, transaction=True):
+        client = self
+        
+        class Pipeline:
+            def __init__(self):
+                self.calls = []
+            
+            def __getattr__(self, name):
+                return lambda *args: self.calls.append((name, args))
+            
+            def execute(self):
+                return [getattr(client, name)(*args) for name, args in self.calls]
+        
+        return Pipeline()
+
+class TestImageManifest:
+    """Test manifest-based image resolution."""
+    
+    def _properties(self, path, etag="0x1", last_modified="2024-01-15T10:30:00+00:00"):
+        return {
+            "blob_path": path,
+            "etag": f'"{etag}"',
+            "last_modified": last_modified,
+            "content_length": 1024,
+            "content_type": "image/jpeg",
+            "url": f"https://testaccount.blob.core.windows.net/character-images/{path}"
+        }
+    
+    @pytest.fixture
+    def service(self):
+        with patch('app.services.image_service.settings') as mock_settings:
+            mock_settings.azure_storage_connection_string = ""
+            service = ImageService()
+        service.blob_service = Mock()
+        service.blob_service._get_blob_path.side_effect = lambda u, c: f"{u.lower()}/{c.lower().replace(' ', '-')}.jpg"
+        service.blob_service.get_image_url = AsyncMock(return_value=None)
+        service.blob_service.get_image_metadata = AsyncMock(return_value=None)
+        service.manifest = ImageManifest()
+        service.manifest.apply_listing([self._properties("marvel/spider-man.jpg")], started=time.monotonic())
+        return service
+    
+    @pytest.mark.asyncio
+    async def test_resolves_without_storage_calls(self, service):
+        """A loaded manifest answers hits and misses without touching storage."""
+        hit = await service.get_character_image_url("marvel", "Spider-Man")
+        miss = await service.get_character_image_url("marvel", "Nobody")
+        
+        assert hit["url"].endswith("/marvel/spider-man.jpg?v=" + hit["version"])
+        assert hit["version"] == compute_image_version("0x1", "2024-01-15T10:30:00+00:00")
+        assert hit["etag"] == "0x1"
+        assert miss["is_fallback"] is True
+        assert await service.validate_image_exists("marvel", "Spider-Man") is True
+        service.blob_service.get_image_url.assert_not_called()
+        service.blob_service.get_image_metadata.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_invalidation_refetches_once(self, service):
+        """An invalidated path is read from storage once, then served from the manifest again."""
+        updated = self._properties("marvel/spider-man.jpg", etag="0x2")
+        service.blob_service.get_image_url = AsyncMock(return_value=updated["url"])
+        service.blob_service.get_image_metadata = AsyncMock(return_value=updated)
+        
+        with patch('app.services.image_service.cache_service') as mock_cache_service:
+            mock_cache_service.invalidate_image_cache = AsyncMock()
+            await service.invalidate_image_version("marvel", "Spider-Man")
+        first = await service.get_character_image_url("marvel", "Spider-Man")
+        second = await service.get_character_image_url("marvel", "Spider-Man")
+        
+        assert first["etag"] == second["etag"] == "0x2"
+        assert service.blob_service.get_image_metadata.await_count == 1
+    
+    def test_refresh_is_incremental(self):
+        """Unchanged entries are kept, changes applied and newer local writes preserved."""
+        manifest = ImageManifest()
+        manifest.apply_listing([self._properties("dc/batman.jpg"), self._properties("dc/joker.jpg"),
+                                self._properties("dc/robin.jpg")], started=time.monotonic())
+        batman = manifest.get("dc/batman.jpg")
+        
+        started = time.monotonic()
+        manifest.invalidate("dc/robin.jpg")
+        changes = manifest.apply_listing([self._properties("dc/batman.jpg"), self._properties("dc/joker.jpg", "0x2"),
+                                          self._properties("dc/robin.jpg"), self._properties("dc/bane.jpg")],
+                                         started=started)
+        
+        assert changes == {"added": 1, "updated": 1, "removed": 0, "total": 3}
+        assert manifest.get("dc/batman.jpg") is batman
+        assert manifest.get("dc/joker.jpg").etag == "0x2"
+        assert not manifest.is_authoritative("dc/robin.jpg")
+    
+    @pytest.mark.asyncio
+    async def test_invalidations_reach_other_workers(self):
+        """Invalidations on one worker mark the path stale on the others at their next sync."""
+        redis_client = FakeRedis()
+        listing = [self._properties("dc/batman.jpg"), self._properties("dc/joker.jpg"),
+                   self._properties("marvel/thor.jpg")]
+        worker_a = ImageManifest(broadcast=ManifestBroadcast(redis_client, max_length=2))
+        worker_b = ImageManifest(broadcast=ManifestBroadcast(redis_client, max_length=2))
+        for manifest in (worker_a, worker_b):
+            await manifest.sync()
+            manifest.apply_listing(listing, started=time.monotonic())
+        
+        worker_a.invalidate("dc/batman.jpg")
+        assert worker_b.is_authoritative("dc/batman.jpg")
+        assert await worker_b.sync() == 1
+        assert not worker_b.is_authoritative("dc/batman.jpg")
+        assert worker_b.is_authoritative("dc/joker.jpg")
+        
+        # Nothing new; a worker does not re-apply its own invalidations
+        assert await worker_b.sync() == 0
+        assert await worker_a.sync() == 0
+        assert worker_a.is_authoritative("marvel/thor.jpg")
+        
+        # A worker that missed trimmed invalidations treats every image as stale
+        worker_b.record(self._properties("dc/batman.jpg"))
+        for _ in range(3):
+            worker_a.invalidate("dc/joker.jpg")
+        await worker_b.sync()
+        assert worker_b.entries == {}
+        assert not worker_b.is_authoritative("marvel/thor.jpg")
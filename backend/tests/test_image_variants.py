@@ -0,0 +1,152 @@
+"""
+Tests for responsive image variants: generation, negotiation and selection.
+"""
+
+import io
+import time
+import pytest
+from unittest.mock import Mock, AsyncMock, patch
+from PIL import Image
+from app.services.image_service import ImageService
+from app.storage.image_manifest import ImageManifest
+from app.storage.image_variants import (
+    accepted_formats, choose_width, generate_variants, parse_variant_path,
+    supported_formats, target_width, variant_blob_path
+)
+
+def _encoded(width, height, mode="RGB"):
+    output = io.BytesIO()
+    if mode == "RGBA":
+        Image.new(mode, (width, height), (255, 0, 0, 128)).save(output, format="PNG")
+    else:
+        Image.new(mode, (width, height), "red").save(output, format="JPEG")
+    return output.getvalue()
+
+class TestVariantGeneration:
+    """Test ladder generation from one decoded source."""
+    
+    def test_ladder_skips_upscaling(self):
+        variants = generate_variants(_encoded(1000, 500), formats=("webp", "jpeg"))
+        
+        assert [(v.width, v.format) for v in variants] == [
+            (320, "webp"), (320, "jpeg"), (640, "webp"), (640, "jpeg"), (960, "webp"), (960, "jpeg")
+        ]
+        assert variants[0].height == 160
+        for variant in variants:
+            with Image.open(io.BytesIO(variant.data)) as decoded:
+                assert decoded.size == (variant.width, variant.height)
+                assert decoded.format == {"webp": "WEBP", "jpeg": "JPEG"}[variant.format]
+    
+    def test_transparent_source_is_flattened_for_encoded(self):
+        variants = generate_variants(_encoded(400, 400, mode="RGBA"), widths=(320,), formats=("webp", "jpeg"))
+        
+        modes = {}
+        for variant in variants:
+            with Image.open(io.BytesIO(variant.data)) as decoded:
+                modes[variant.format] = decoded.mode
+        assert modes == {"webp": "RGBA", "jpeg": "RGB"}
+    
+    def test_supported_formats_always_include_webp_and_encoded(self):
+        assert {"webp", "jpeg"} <= set(supported_formats())
+    
+    def test_variant_paths_round_trip(self):
+        path = variant_blob_path("marvel/spider-man.jpg", 640, "webp")
+        
+        assert path == "variants/marvel/spider-man/640w.webp"
+        assert parse_variant_path(path) == (640, "webp")
+        assert parse_variant_path("marvel/spider-man.jpg") is None
+
+class TestVariantNegotiation:
+    """Test Accept and client hint handling."""
+    
+    def test_accepted_formats(self):
+        chrome = "image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8"
+        
+        assert accepted_formats(chrome) == ["avif", "webp", "jpeg"]
+        assert accepted_formats("image/webp,*/*") == ["webp", "jpeg"]
+        assert accepted_formats("image/avif;q=0,image/webp") == ["webp", "jpeg"]
+        assert accepted_formats("image/*") == ["jpeg"]
+        assert accepted_formats(None) == ["jpeg"]
+    
+    def test_target_width(self):
+        assert target_width(width=500) == 500
+        assert target_width(viewport_width=390, dpr=3) == 1170
+        assert target_width(viewport_width=800) == 800
+        assert target_width(dpr=2) is None
+    
+    def test_choose_width(self):
+        widths = [320, 640, 960, 1280]
+        
+        assert choose_width(300, widths) == 320
+        assert choose_width(641, widths) == 960
+        assert choose_width(4000, widths) is None  # The original is served
+        assert choose_width(4000, widths, save_data=True) == 1280
+        assert choose_width(641, widths, save_data=True) == 640
+        assert choose_width(100, widths, save_data=True) == 320
+
+class TestVariantSelection:
+    """Test manifest-backed variant selection in the image service."""
+    
+    def _properties(self, path, content_type="image/jpeg"):
+        return {
+            "blob_path": path,
+            "etag": f'"etag-{path}"',
+            "last_modified": "2024-01-15T10:30:00+00:00",
+            "content_length": 1024,
+            "content_type": content_type,
+            "url": f"https://testaccount.blob.core.windows.net/character-images/{path}"
+        }
+    
+    @pytest.fixture
+    def service(self):
+        with patch('app.services.image_service.settings') as mock_settings:
+            mock_settings.azure_storage_connection_string = ""
+            service = ImageService()
+        service.blob_service = Mock()
+        service.blob_service._get_blob_path.side_effect = lambda u, c: f"{u.lower()}/{c.lower().replace(' ', '-')}.jpg"
+        service.blob_service.get_image_url = AsyncMock(return_value=None)
+        listing = [self._properties("marvel/spider-man.jpg")]
+        for width in (320, 640):
+            listing.append(self._properties(variant_blob_path("marvel/spider-man.jpg", width, "webp"), "image/webp"))
+            listing.append(self._properties(variant_blob_path("marvel/spider-man.jpg", width, "jpeg")))
+        service.manifest = ImageManifest()
+        service.manifest.apply_listing(listing, started=time.monotonic())
+        return service
+    
+    def test_selects_format_and_width(self, service):
+        webp = service.select_image_variant("marvel", "Spider-Man", accept="image/avif,image/webp", width=500)
+        jpeg = service.select_image_variant("marvel", "Spider-Man", accept="image/*", viewport_width=300, dpr=1)
+        
+        assert webp.blob_path == "variants/marvel/spider-man/640w.webp"
+        assert jpeg.blob_path == "variants/marvel/spider-man/320w.jpeg"
+    
+    def test_no_width_or_no_variants_serves_original(self, service):
+        assert service.select_image_variant("marvel", "Spider-Man", accept="image/webp") is None
+        assert service.select_image_variant("marvel", "Nobody", accept="image/webp", width=500) is None
+        # Wider than every variant: upscaled variants would be worse than the original
+        assert service.select_image_variant("marvel", "Spider-Man", accept="image/webp", width=1000) is None
+    
+    def test_stale_variant_is_skipped(self, service):
+        service.manifest.invalidate("variants/marvel/spider-man/320w.webp")
+        
+        entry = service.select_image_variant("marvel", "Spider-Man", accept="image/webp", width=300)
+        
+        assert entry.blob_path == "variants/marvel/spider-man/640w.webp"
+    
+    def test_srcset(self, service):
+        srcset = service.get_image_srcset("marvel", "Spider-Man")
+        
+        assert [source["type"] for source in srcset["sources"]] == ["image/webp", "image/jpeg"]
+        assert srcset["widths"] == [320, 640]
+        first, second = srcset["sources"][0]["srcset"].split(", ")
+        assert first.startswith("https://testaccount.blob.core.windows.net/character-images/variants/marvel/spider-man/320w.webp?v=")
+        assert first.endswith(" 320w") and second.endswith(" 640w")
+    
+    @pytest.mark.asyncio
+    async def test_optimized_url_prefers_stored_variant(self, service):
+        result = await service.get_optimized_image_url("marvel", "Spider-Man", width=600, accept="image/webp")
+        
+        assert result["optimized"] is True
+        assert result["variant"] == {"width": 640, "format": "webp", "content_type": "image/webp"}
+        assert "/variants/marvel/spider-man/640w.webp?v=" in result["url"]
+        assert "w=600" not in result["url"]
@@ -4,6 +4,8 @@ Tests for comprehensive logging and tracing system.
 
 import pytest
 import asyncio
+import logging
+import queue
 import time
 import json
 from unittest.mock import Mock, patch, AsyncMock
@@ -11,19 +13,25 @@ from fastapi import Request
 from fastapi.responses import JSONResponse
 
 from app.monitoring.tracing import (
-    TracingContext, SpanKind, SpanStatus, trace_collector,
+    TracingContext, SpanKind, SpanStatus, Span, trace_collector, TraceCollector, BatchSpanExporter,
     get_trace_id, get_span_id, set_trace_context,
     trace_function, trace_database_operation, trace_http_request
 )
 from app.monitoring.log_aggregation import (
-    LogAggregator, LogEntry, LogLevel, LogFilter,
+    LogAggregator, LogEntry, LogLevel, LogFilter, log_aggregator,
     search_logs, get_log_stats, get_trace_logs
 )
+from app.monitoring import logging_config
 from app.monitoring.logging_config import (
     set_correlation_id, get_correlation_id, 
-    log_performance, MetricsCollector
+    log_performance, MetricsCollector, get_logger,
+    setup_logging, stop_logging, NonBlockingQueueHandler, RequestLogSampler
 )
 from app.monitoring.middleware import MonitoringMiddleware
+from app.monitoring.executor import InstrumentedExecutor, EXECUTOR_QUEUE_WAIT_MS, run_in_executor
+from app.monitoring.error_tracking import (
+    ErrorTracker, ErrorContext, ErrorSeverity, ErrorCategory, normalize_route
+)
 
 class TestDistributedTracing:
     """Test distributed tracing functionality."""
@@ -155,6 +163,76 @@ class TestDistributedTracing:
         assert exported["traceId"] == trace_id
         assert len(exported["spans"]) > 0
 
+class TestTraceSampling:
+    """Test head/tail trace sampling and batched export."""
+    
+    def setup_method(self):
+        self.collector = TraceCollector(head_sample_rate=0.0, slow_threshold_ms=500, max_traces=2)
+    
+    def _trace(self, name, duration_ms=10, error=None, children=1):
+        """Record a finished root span with children directly on the collector."""
+        trace = f"trace-{name}"
+        for i in range(children):
+            child = Span(trace, f"{name}-child-{i}", f"{name}-root", "db.query", 0.0, 0.001, 1.0)
+            self.collector.add_span(child)
+        root = Span(trace, f"{name}-root", None, f"GET /{name}", 0.0, duration_ms / 1000,
+                    duration_ms, kind=SpanKind.SERVER, is_local_root=True)
+        if error:
+            root.set_error(error)
+        self.collector.add_span(root)
+        return trace
+    
+    def test_tail_keeps_slow_and_error_traces(self):
+        """Unsampled traces are kept only when slow or failing."""
+        fast = self._trace("fast")
+        slow = self._trace("slow", duration_ms=800)
+        failed = self._trace("failed", error=ValueError("boom"))
+        
+        assert self.collector.get_trace(fast) == []
+        assert len(self.collector.get_trace(slow)) == 2
+        assert self.collector.get_trace(failed)[-1].status == SpanStatus.ERROR
+        assert self.collector.dropped_traces == 1
+        assert not self.collector.pending
+    
+    def test_stores_are_bounded(self):
+        """Kept and in-progress traces are capped, oldest first."""
+        self.collector.head_sample_rate = 1.0
+        self.collector.max_pending_traces = 3
+        for name in ["a", "b", "c"]:
+            self._trace(name)
+        for i in range(5):
+            self.collector.add_span(Span(f"open-{i}", "span", "parent", "op", 0.0, 0.001, 1.0))
+        
+        assert list(self.collector.spans) == ["trace-b", "trace-c"]
+        assert list(self.collector.pending) == ["open-2", "open-3", "open-4"]
+    
+    def test_head_sampling_is_per_trace(self):
+        """The head decision depends only on the trace ID."""
+        self.collector.head_sample_rate = 0.25
+        decisions = [self.collector.is_head_sampled(f"trace-{i}") for i in range(400)]
+        
+        assert decisions == [self.collector.is_head_sampled(f"trace-{i}") for i in range(400)]
+        assert 50 < sum(decisions) < 150
+    
+    def test_batched_otlp_export(self, tmp_path):
+        """Kept spans are written as OTLP/JSON batches."""
+        exporter = BatchSpanExporter(directory=str(tmp_path), max_batch_size=2)
+        self.collector.exporter = exporter
+        self._trace("slow", duration_ms=900, children=2)
+        exporter.flush()
+        
+        batches = [json.loads(path.read_text()) for path in sorted(tmp_path.iterdir())]
+        spans = [span for batch in batches
+                 for span in batch["resourceSpans"][0]["scopeSpans"][0]["spans"]]
+        assert len(batches) == 2
+        assert len(spans) == 3
+        root = spans[-1]
+        assert root["name"] == "GET /slow"
+        assert root["kind"] == 2
+        assert len(root["traceId"]) == 32 and len(root["spanId"]) == 16
+        assert "parentSpanId" not in root and spans[0]["parentSpanId"] == root["spanId"]
+        assert exporter.exported_spans == 3
+
 class TestLogAggregation:
     """Test log aggregation and search functionality."""
     
@@ -303,6 +381,81 @@ class TestLogAggregation:
         # Verify all logs have the same trace ID
         for log in trace_logs:
             assert log.trace_id == trace_id
+    
+    def test_indices_follow_ring_buffer(self):
+        """Entries leaving the buffer leave the indices, and index keys are capped."""
+        aggregator = LogAggregator(max_entries=10, max_index_keys=4)
+        
+        for i in range(25):
+            aggregator.add_entry(LogEntry(
+                time.time(), LogLevel.INFO, "app.service", f"Message {i}", f"corr-{i}", f"trace-{i % 3}"))
+        
+        assert len(aggregator.entries) == 10
+        assert len(aggregator.indices['level']['INFO']) == 10
+        assert len(aggregator.indices['correlation_id']) == 4
+        assert aggregator.get_correlation_logs("corr-0") == []
+        assert [e.message for e in aggregator.get_trace_logs("trace-0")] == ["Message 15", "Message 18", "Message 21", "Message 24"]
+    
+    def test_full_text_search_uses_postings(self):
+        """Text and field searches walk posting lists and return newest first."""
+        aggregator = LogAggregator(max_entries=50)
+        for i in range(60):
+            message = "Database timeout on users" if i % 10 == 0 else f"Request {i} completed"
+            aggregator.add_entry(LogEntry(
+                time.time(), LogLevel.ERROR if i % 10 == 0 else LogLevel.INFO, "app.service",
+                message, f"corr-{i}", extra_fields={"path": f"/api/{i % 2}"}))
+        
+        filter_obj = LogFilter()
+        filter_obj.text = "TIMEOUT database"
+        results = aggregator.search(filter_obj, limit=2)
+        assert [r.correlation_id for r in results] == ["corr-50", "corr-40"]
+        assert len(aggregator.token_index["timeout"]) == 5  # Only buffered entries
+        
+        filter_obj = LogFilter()
+        filter_obj.message_pattern = "Database timeout on"
+        filter_obj.extra_filters = {"path": "/api/0"}
+        with patch.object(LogFilter, "matches", autospec=True, side_effect=LogFilter.matches) as matches:
+            assert len(aggregator.search(filter_obj)) == 5
+        assert matches.call_count == 5  # Candidates came from the "timeout" posting list
+        
+        assert search_logs(text="no such words here") == []
+    
+    def test_evicted_tokens_fall_back_to_scan(self):
+        """Entries whose token was evicted from the index are still found."""
+        aggregator = LogAggregator(max_entries=100, max_token_keys=50, max_index_keys=4)
+        aggregator.add_entry(LogEntry(
+            time.time(), LogLevel.ERROR, "app.payments", "payment gateway timeout", "corr-gateway"))
+        for i in range(60):
+            aggregator.add_entry(LogEntry(
+                time.time(), LogLevel.INFO, "app.service", f"unique{i}", f"corr-{i}"))
+        
+        assert "gateway" not in aggregator.token_index
+        filter_obj = LogFilter()
+        filter_obj.text = "gateway"
+        assert [r.correlation_id for r in aggregator.search(filter_obj)] == ["corr-gateway"]
+        assert [e.message for e in aggregator.get_correlation_logs("corr-gateway")] == ["payment gateway timeout"]
+        
+        # A token re-created after its eviction covers only the newer entries itself
+        aggregator.add_entry(LogEntry(
+            time.time(), LogLevel.ERROR, "app.payments", "gateway retry", "corr-retry"))
+        assert len(aggregator.token_index["gateway"]) == 1
+        results = aggregator.search(filter_obj)
+        assert [r.correlation_id for r in results] == ["corr-retry", "corr-gateway"]
+    
+    @pytest.mark.asyncio
+    async def test_cleanup_expires_head_of_buffer(self):
+        """Retention cleanup pops expired entries and their index references."""
+        aggregator = LogAggregator(retention_hours=1)
+        now = time.time()
+        aggregator.add_entry(LogEntry(now - 7200, LogLevel.ERROR, "app.old", "Old", "corr-old", "trace-1"))
+        aggregator.add_entry(LogEntry(now, LogLevel.ERROR, "app.new", "New", "corr-new", "trace-1"))
+        
+        await aggregator._cleanup_old_entries()
+        
+        assert [e.message for e in aggregator.entries] == ["New"]
+        assert "corr-old" not in aggregator.indices['correlation_id']
+        assert "app.old" not in aggregator.indices['logger']
+        assert [e.message for e in aggregator.get_trace_logs("trace-1")] == ["New"]
 
 class TestMonitoringMiddleware:
     """Test monitoring middleware integration."""
@@ -406,6 +559,167 @@ class TestPerformanceLogging:
         
         # These should not raise exceptions and should log appropriately
 
+class TestAsyncLogging:
+    """Test the queue-based logging pipeline."""
+    
+    def setup_method(self):
+        self.loggers = [logging.getLogger(name) for name in (None, 'app', 'uvicorn', 'azure')]
+        self.saved = [(logger.handlers, logger.level, logger.propagate) for logger in self.loggers]
+    
+    def teardown_method(self):
+        stop_logging()
+        for logger, (handlers, level, propagate) in zip(self.loggers, self.saved):
+            logger.handlers, logger.level, logger.propagate = handlers, level, propagate
+    
+    def test_listener_formats_and_aggregates(self):
+        """Records are ingested on the listener thread, with per-route sampling."""
+        setup_logging("INFO", route_sample_rates={"/health": 0})
+        logger = get_logger("test.async")
+        
+        set_correlation_id("corr-async-pipeline")
+        logger.info("Request completed", extra={'path': '/api/puzzle'})
+        logger.info("Request completed", extra={'path': '/health'})
+        logger.warning("Slow request detected", extra={'path': '/health'})
+        stats = logging_config.logging_pipeline.get_stats()
+        stop_logging()
+        
+        entries = log_aggregator.get_correlation_logs("corr-async-pipeline")
+        assert [(e.message, e.extra_fields['path']) for e in entries] == [
+            ("Request completed", "/api/puzzle"), ("Slow request detected", "/health")]
+        assert stats['sampled_out'] == 1
+    
+    def test_overflow_drops_instead_of_blocking(self):
+        """A full queue drops records and counts them by level."""
+        handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+        for message in ["first", "second", "third"]:
+            handler.handle(logging.LogRecord("app.test", logging.INFO, __file__, 1, message, None, None))
+        
+        assert handler.queue.get_nowait().getMessage() == "first"
+        assert handler.dropped == {"INFO": 2}
+    
+    def test_sampling_keeps_request_lines_together(self):
+        """The sampling decision depends only on the correlation ID."""
+        sampler = RequestLogSampler({"/api": 0.5})
+        
+        def keep(correlation):
+            record = logging.LogRecord("app.test", logging.INFO, __file__, 1, "Request started", None, None)
+            record.path, record.correlation_id = "/api/guess", correlation
+            return sampler.filter(record)
+        
+        decisions = {f"corr-{i}": keep(f"corr-{i}") for i in range(200)}
+        assert all(keep(correlation) == kept for correlation, kept in decisions.items())
+        assert 50 < sum(decisions.values()) < 150
+
+class TestExecutorPropagation:
+    """Test context propagation and timing in the instrumented executor."""
+    
+    def setup_method(self):
+        self.executor = InstrumentedExecutor(max_workers=1, name="test")
+    
+    def teardown_method(self):
+        self.executor.shutdown(wait=True)
+    
+    @pytest.mark.asyncio
+    async def test_context_visible_in_worker(self):
+        """Correlation and trace IDs set on the request reach the worker thread."""
+        set_correlation_id("corr-executor")
+        with TracingContext("GET /api/puzzle", SpanKind.SERVER) as ctx:
+            seen = await asyncio.get_running_loop().run_in_executor(
+                self.executor, lambda: (get_correlation_id(), get_trace_id()))
+        
+        assert seen == ("corr-executor", ctx.span.trace_id)
+    
+    @pytest.mark.asyncio
+    async def test_client_span_gets_queue_and_run_times(self):
+        """A saturated pool shows up as queue wait, not as execution time."""
+        loop = asyncio.get_running_loop()
+        with patch('app.monitoring.executor.get_executor', return_value=self.executor):
+            with TracingContext("GET /api/images", SpanKind.SERVER):
+                blocker = loop.run_in_executor(self.executor, time.sleep, 0.1)
+                with patch.object(trace_collector, 'add_span') as add_span:
+                    await run_in_executor("storage.exists", lambda: True, tags={"storage.blob": "marvel/x.jpg"})
+                await blocker
+        
+        span = add_span.call_args[0][0]
+        assert span.operation_name == "storage.exists"
+        assert span.kind == SpanKind.CLIENT
+        assert span.tags["storage.blob"] == "marvel/x.jpg"
+        assert span.tags["executor.queue_wait_ms"] >= 50
+        assert span.tags["executor.run_ms"] < span.tags["executor.queue_wait_ms"]
+        assert EXECUTOR_QUEUE_WAIT_MS.labels("test", "storage.exists").collect().count == 1
+    
+class TestErrorTracking:
+    """Test fingerprinted error aggregation."""
+    
+    def setup_method(self):
+        self.tracker = ErrorTracker(max_groups=3, max_exemplars=2)
+    
+    def _fail(self, message, path="/api/users/42", exc_type=ValueError, **kwargs):
+        try:
+            raise exc_type(message)
+        except Exception as e:
+            return self.tracker.track_error(e, context=ErrorContext(request_path=path, request_method="GET"),
+                                            **kwargs)
+    
+    def test_identical_errors_share_a_group(self):
+        """Message and path IDs do not split a group; exemplars are capped."""
+        for i in range(50):
+            last_id = self._fail(f"user {i} not found", path=f"/api/users/{i}")
+        
+        assert len(self.tracker.groups) == 1
+        group = next(iter(self.tracker.groups.values()))
+        assert group.count == 50
+        assert group.route == "GET /api/users/{id}"
+        assert group.last_error_id == last_id
+        assert [len(e.stack_trace) > 0 for e in group.exemplars] == [True, True]
+    
+    def test_type_and_route_split_groups(self):
+        """Different exception types or routes are different errors."""
+        self._fail("a")
+        self._fail("a", exc_type=KeyError)
+        self._fail("a", path="/api/puzzle/today")
+        
+        assert len(self.tracker.groups) == 3
+        assert normalize_route("POST", "/api/images/0f8fad5b-d9cb-469f-a165-70867728950e") == \
+            "POST /api/images/{id}"
+    
+    def test_groups_are_bounded(self):
+        """The least recently seen group is evicted first."""
+        self._fail("a", path="/a")
+        self._fail("b", path="/b")
+        self._fail("c", path="/c")
+        self._fail("a", path="/a")
+        self._fail("d", path="/d")
+        
+        assert sorted(g.route for g in self.tracker.groups.values()) == ["GET /a", "GET /c", "GET /d"]
+        assert self.tracker.evicted_groups == 1
+    
+    def test_summary_uses_rolling_windows(self):
+        """The summary counts per window without scanning events."""
+        with patch('app.monitoring.error_tracking.time.time', return_value=1_000_000.0):
+            for _ in range(4):
+                self._fail("db down", category=ErrorCategory.DATABASE)
+        with patch('app.monitoring.error_tracking.time.time', return_value=1_000_000.0 + 2 * 3600):
+            self._fail("bad input", path="/api/guess", severity=ErrorSeverity.LOW)
+            recent = self.tracker.get_error_summary(hours=1)
+            daily = self.tracker.get_error_summary(hours=24)
+            weekly = self.tracker.get_error_summary(hours=168)
+        
+        # Longer periods are clamped to the day the buckets cover
+        assert weekly['hours'] == 24
+        assert weekly['total_errors'] == daily['total_errors']
+        assert weekly['error_rate'] == daily['error_rate'] == 5 / 24
+        with pytest.raises(ValueError):
+            self.tracker.get_error_summary(hours=0)
+        
+        assert recent['total_errors'] == 1
+        assert recent['by_severity'] == {'low': 1}
+        assert daily['total_errors'] == 5
+        assert daily['by_category'] == {'database': 4, 'system': 1}
+        assert daily['distinct_errors'] == 2
+        assert daily['most_common_errors'] == {'database:ValueError': 4, 'system:ValueError': 1}
+        assert daily['top_error_groups'][0]['window_count'] == 4
+    
 class TestIntegration:
     """Test integration between tracing, logging, and aggregation."""
     
@@ -4,15 +4,21 @@ Tests for metrics collection and SLO monitoring system.
 
 import pytest
 import asyncio
+import os
+import subprocess
+import sys
+import threading
 import time
 from unittest.mock import Mock, patch
 
 from app.monitoring.metrics import (
-    MetricsRegistry, Histogram, Counter, Gauge,
-    SLOTarget, SLOMonitor, SLOStatus, AlertManager,
+    MetricsRegistry, Histogram, Counter, Gauge, QuantileSketch,
+    SLOTarget, SLOMonitor, SLOStatus, AlertManager, SLOEvaluator,
     metrics_registry, slo_monitor, alert_manager,
     increment_counter, observe_histogram, set_gauge
 )
+from app.monitoring.error_tracking import ErrorCategory, ErrorSeverity, ErrorTracker
+from app.monitoring.shared_metrics import SharedMetricsSegment, read_shared_metrics
 from app.monitoring.runbooks import (
     IncidentRunbook, RunbookStep, HighLatencyRunbook,
     HighErrorRateRunbook, RunbookManager, runbook_manager
@@ -127,6 +133,243 @@ class TestMetricsRegistry:
         assert "test_gauge" in exported["gauges"]
         assert exported["gauges"]["test_gauge"]["value"] == 67.89
 
+class TestHistogram:
+    """Test bucketed histograms and the quantile sketch."""
+    
+    def test_cumulative_buckets(self):
+        """Bucket counts are cumulative and bounds are inclusive."""
+        histogram = Histogram(buckets=[10, 100])
+        for value in [5, 10, 11, 100, 5000]:
+            histogram.observe(value)
+        
+        assert histogram.get_bucket_counts() == [(10, 2), (100, 4), (float('inf'), 5)]
+        assert [bucket.count for bucket in histogram.buckets] == [2, 4, 5]
+    
+    def test_percentiles_within_relative_accuracy(self):
+        """Percentiles stay within the sketch's relative error."""
+        histogram = Histogram()
+        values = list(range(1, 10001))
+        for value in values:
+            histogram.observe(value)
+        
+        for percentile in [50, 95, 99, 99.9]:
+            exact = values[int(percentile / 100.0 * len(values))]
+            assert histogram.get_percentile(percentile) == pytest.approx(exact, rel=0.02)
+        
+        assert histogram.get_percentiles([0, 100]) == pytest.approx([1, 10000], rel=0.01)
+        assert len(histogram.sketch.bins) < 1000
+    
+    def test_merge_matches_single_histogram(self):
+        """Merging per-worker histograms equals observing everything in one."""
+        combined, first, second = Histogram(), Histogram(), Histogram()
+        for value in range(1, 2001):
+            combined.observe(value)
+            (first if value % 2 else second).observe(value)
+        
+        first.merge(second)
+        
+        assert first.count == combined.count
+        assert first.sum == combined.sum
+        assert first.get_bucket_counts() == combined.get_bucket_counts()
+        assert first.get_percentiles([50, 99]) == combined.get_percentiles([50, 99])
+        
+        with pytest.raises(ValueError):
+            first.merge(Histogram(buckets=[1, 2, 3]))
+    
+    def test_sketch_memory_is_bounded(self):
+        """The lowest bins are folded together once max_bins is reached."""
+        sketch = QuantileSketch(max_bins=16)
+        for exponent in range(-10, 30):
+            sketch.add(2.0 ** exponent)
+        sketch.add(0)
+        
+        assert len(sketch.bins) <= 16
+        assert sketch.count == 41
+        assert sketch.quantile(1.0) == 2.0 ** 29
+        assert sketch.quantile(0.0) == 0.0
+
+class TestLabeledMetrics:
+    """Test pre-bound labeled metrics and Prometheus exposition."""
+    
+    def test_children_are_bound_once(self):
+        """labels() returns the same child for the same label values."""
+        registry = MetricsRegistry()
+        family = registry.counter("requests_total", "Requests", ("method", "route"))
+        
+        child = family.labels("GET", "/items")
+        assert family.labels(method="GET", route="/items") is child
+        assert registry.counter("requests_total", "Requests", ("method", "route")) is family
+        
+        with pytest.raises(ValueError):
+            family.labels("GET")
+        with pytest.raises(ValueError):
+            registry.gauge("requests_total")
+    
+    def test_thread_shards_merged_on_read(self):
+        """Each thread records into its own shard; reads see the total."""
+        registry = MetricsRegistry()
+        counter = registry.counter("work_total").labels()
+        histogram = registry.histogram("work_ms", buckets=[10, 100]).labels()
+        
+        def work():
+            for value in range(100):
+                counter.inc()
+                histogram.observe(value)
+        
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert counter.get_value() == 400
+        merged = histogram.collect()
+        assert merged.count == 400
+        assert merged.get_bucket_counts() == [(10, 44), (100, 400), (float('inf'), 400)]
+    
+    def test_prometheus_exposition(self):
+        """Families and name{k=v} metrics render in the text format."""
+        registry = MetricsRegistry()
+        registry.counter("http_requests_total", "HTTP requests", ("route",)).labels('/a"b').inc(2)
+        registry.histogram("latency_ms", "Latency", ("route",), buckets=[10]).labels("/a").observe(5)
+        registry.increment_counter("legacy_total", 3, {"method": "GET"})
+        registry.increment_counter("legacy_total", 1, {"method": "POST"})
+        
+        text = "".join(registry.generate_exposition())
+        
+        assert "# HELP http_requests_total HTTP requests\n# TYPE http_requests_total counter" in text
+        assert 'http_requests_total{route="/a\\"b"} 2\n' in text
+        assert 'latency_ms_bucket{route="/a",le="10"} 1\n' in text
+        assert 'latency_ms_bucket{route="/a",le="+Inf"} 1\n' in text
+        assert 'latency_ms_count{route="/a"} 1\n' in text
+        assert text.count("# TYPE legacy_total counter") == 1
+        assert 'legacy_total{method="GET"} 3\n' in text
+        
+        exported = registry.export_metrics()
+        assert exported["counters"]["http_requests_total{route=/a\"b}"]["value"] == 2
+
+class TestSharedMetrics:
+    """Test multi-process aggregation through memory-mapped segments."""
+    
+    def setup_method(self):
+        self.segments = []
+    
+    def teardown_method(self):
+        for segment in self.segments:
+            segment.close()
+    
+    def _worker(self, directory, worker_id, **kwargs):
+        segment = SharedMetricsSegment(str(directory), worker_id=worker_id, **kwargs)
+        self.segments.append(segment)
+        return MetricsRegistry(segment)
+    
+    def test_workers_aggregate_without_ipc(self, tmp_path):
+        """Any worker's export reports the sum over every worker's segment."""
+        workers = [self._worker(tmp_path, str(i)) for i in range(3)]
+        for i, registry in enumerate(workers):
+            requests = registry.counter("http_requests_total", "Requests", ("route",))
+            latency = registry.histogram("latency_ms", "Latency", ("route",), buckets=[10, 100])
+            requests.labels("/a").inc(i + 1)
+            for value in range(1, 101):
+                latency.labels("/a").observe(value * (i + 1))
+        # A child that only the last worker has seen is still reported everywhere
+        workers[2].counter("http_requests_total", "Requests", ("route",)).labels("/b").inc()
+        
+        exported = workers[0].export_metrics()
+        assert exported["counters"]["http_requests_total{route=/a}"]["value"] == 6
+        assert exported["counters"]["http_requests_total{route=/b}"]["value"] == 1
+        
+        histogram = exported["histograms"]["latency_ms{route=/a}"]
+        assert histogram["count"] == 300
+        assert histogram["sum"] == sum(range(1, 101)) * 6
+        assert histogram["buckets"] == [(10, 10 + 5 + 3), (100, 100 + 50 + 33), (float('inf'), 300)]
+        
+        single = Histogram([10, 100])
+        for i in range(3):
+            for value in range(1, 101):
+                single.observe(value * (i + 1))
+        assert histogram["p95"] == pytest.approx(single.get_percentile(95), rel=0.03)
+        
+        text = "".join(workers[1].generate_exposition())
+        assert 'http_requests_total{route="/a"} 6\n' in text
+        assert 'latency_ms_count{route="/a"} 300\n' in text
+    
+    def test_segment_grows_and_reopens(self, tmp_path):
+        """Segments grow past their initial size and keep values when reopened."""
+        segment = SharedMetricsSegment(str(tmp_path), worker_id="w", initial_size=64)
+        for i in range(100):
+            segment.add(f"key_{i}", i)
+        segment.set("gauge", 2.5)
+        segment.close()
+        
+        reopened = SharedMetricsSegment(str(tmp_path), worker_id="w", initial_size=64)
+        self.segments.append(reopened)
+        reopened.add("key_99")
+        
+        totals = read_shared_metrics(str(tmp_path))
+        assert totals["key_99"] == 100
+        assert totals["gauge"] == 2.5
+        assert len(totals) == 101
+    
+    def test_slo_outcomes_use_registry(self, tmp_path):
+        """SLO outcomes are counted in the (shareable) registry."""
+        registry = self._worker(tmp_path, "0")
+        monitor = SLOMonitor(registry)
+        monitor.record_measurement("api_response_time_p95", 100.0)
+        monitor.record_measurement("api_response_time_p95", 900.0)
+        monitor.record_measurement("unknown_slo", 1.0)
+        
+        counters = registry.export_metrics()["counters"]
+        assert counters["slo_measurements_total{outcome=good,slo=api_response_time_p95}"]["value"] == 1
+        assert counters["slo_measurements_total{outcome=bad,slo=api_response_time_p95}"]["value"] == 1
+    
+    def test_slo_status_aggregates_workers(self, tmp_path):
+        """Every worker evaluates SLOs over the measurements of all workers."""
+        now = time.time()
+        monitors = [SLOMonitor(self._worker(tmp_path, str(i))) for i in range(2)]
+        for _ in range(9):
+            monitors[0].record_measurement("api_response_time_p95", 100.0, now)
+        monitors[1].record_measurement("api_response_time_p95", 900.0, now)
+        # Outside the 5m burn-rate window but inside the 24h SLO window
+        monitors[1].record_measurement("api_response_time_p95", 900.0, now - 3600)
+        
+        for monitor in monitors:
+            status = monitor.evaluate()["api_response_time_p95"]
+            assert status.total_measurements == 11
+            assert status.successful_measurements == 9
+            assert status.burn_rates["5m"] == pytest.approx((1 / 10) / 0.05)
+    
+    def test_gauges_of_exited_workers_are_dropped(self, tmp_path):
+        """Counters of an exited worker stay in the totals, its gauges do not."""
+        exited = subprocess.Popen([sys.executable, "-c", "pass"])
+        exited.wait()
+        for worker_id in (str(os.getpid()), str(exited.pid)):
+            registry = self._worker(tmp_path, worker_id)
+            registry.counter("jobs_total", "Jobs").labels().inc()
+            registry.gauge("pending_tasks", "Pending").labels().set(3)
+        
+        exported = registry.export_metrics()
+        assert exported["counters"]["jobs_total"]["value"] == 2
+        assert exported["gauges"]["pending_tasks"]["value"] == 3
+    
+    def test_error_summary_aggregates_workers(self, tmp_path):
+        """Error totals and rates cover every worker; groups stay per worker."""
+        trackers = []
+        for i in range(2):
+            segment = SharedMetricsSegment(str(tmp_path), worker_id=str(i))
+            self.segments.append(segment)
+            trackers.append(ErrorTracker(segment=segment))
+        trackers[0].track_error(ValueError("bad input"), ErrorSeverity.LOW, ErrorCategory.VALIDATION)
+        for _ in range(2):
+            trackers[1].track_error(ConnectionError("reset"), ErrorSeverity.HIGH, ErrorCategory.NETWORK)
+        
+        summary = trackers[0].get_error_summary(hours=1)
+        assert summary["total_errors"] == 3
+        assert summary["by_category"] == {"validation": 1, "network": 2}
+        assert summary["by_severity"] == {"low": 1, "high": 2}
+        assert summary["error_rate"] == 3
+        assert summary["distinct_errors"] == 1
+
 class TestSLOMonitoring:
     """Test SLO monitoring functionality."""
     
@@ -228,6 +471,59 @@ class TestSLOMonitoring:
         assert len(violations) == 1
         assert violations[0].target.name == "strict_slo"
         assert not violations[0].is_meeting_target
+    
+    def _monitor(self, target_percentage=99.0, window_hours=1):
+        monitor = SLOMonitor(MetricsRegistry())
+        monitor.add_slo_target(SLOTarget(
+            name="bucketed_slo",
+            description="Bucketed SLO",
+            target_percentage=target_percentage,
+            measurement_window_hours=window_hours,
+            metric_name="test_metric",
+            threshold_value=100.0,
+            comparison="lt"
+        ))
+        return monitor
+    
+    def test_measurements_are_bucketed(self):
+        """Measurements fold into fixed minute buckets; old ones fall out of the window."""
+        monitor = self._monitor()
+        now = time.time()
+        for i in range(5000):
+            monitor.record_measurement("bucketed_slo", 50 if i % 10 else 150, now - (i % 30))
+        monitor.record_measurement("bucketed_slo", 150, now - 2 * 3600)
+        
+        status = monitor.calculate_slo_status("bucketed_slo", now)
+        assert len(monitor.windows["bucketed_slo"]._good) == 60
+        assert status.total_measurements == 5000
+        assert status.successful_measurements == 4500
+    
+    def test_multi_window_burn_rates(self):
+        """Burn rate is the error ratio over each window divided by the error budget."""
+        monitor = self._monitor(window_hours=24)
+        now = 1_700_000_000.0
+        for i in range(100):
+            monitor.record_measurement("bucketed_slo", 50, now - 3 * 3600 - i)
+        for i in range(10):
+            monitor.record_measurement("bucketed_slo", 150 if i < 5 else 50, now - i)
+        
+        burn_rates = monitor.calculate_slo_status("bucketed_slo", now).burn_rates
+        assert burn_rates["5m"] == pytest.approx(50.0)
+        assert burn_rates["1h"] == pytest.approx(50.0)
+        assert burn_rates["6h"] == pytest.approx(5 / 110 / 0.01)
+    
+    def test_status_is_cached_between_evaluations(self):
+        """Readers get the last evaluation until it goes stale."""
+        monitor = self._monitor()
+        monitor.record_measurement("bucketed_slo", 150)
+        assert len(monitor.check_slo_violations()) == 1
+        
+        for _ in range(1000):
+            monitor.record_measurement("bucketed_slo", 50)
+        assert monitor.get_all_slo_status()["bucketed_slo"].total_measurements == 1
+        
+        monitor.evaluate()
+        assert monitor.check_slo_violations() == []
 
 class TestAlertManager:
     """Test alert management functionality."""
@@ -340,6 +636,46 @@ class TestAlertManager:
         time.sleep(1.1)
         alert_mgr.check_alerts()
         assert len(alert_mgr.alert_history) > initial_alert_count
+    
+    def test_fast_burn_alert(self):
+        """A fast burn over both the long and short window pages once."""
+        monitor = SLOMonitor(MetricsRegistry())
+        alert_mgr = AlertManager(monitor)
+        monitor.add_slo_target(SLOTarget(
+            name="burning_slo",
+            description="Burning SLO",
+            target_percentage=99.0,
+            measurement_window_hours=24,
+            metric_name="test_metric",
+            threshold_value=100.0,
+            comparison="lt"
+        ))
+        
+        current_time = time.time()
+        for i in range(20):
+            monitor.record_measurement("burning_slo", 150 if i % 4 == 0 else 50, current_time - i)
+        alert_mgr.check_alerts()
+        
+        burn_alerts = [a for a in alert_mgr.alert_history if a['type'].startswith('burn_rate')]
+        assert [a['type'] for a in burn_alerts] == ['burn_rate_fast']
+        assert burn_alerts[0]['burn_rates']['1h'] == pytest.approx(25.0)
+    
+    @pytest.mark.asyncio
+    async def test_background_evaluator(self):
+        """The evaluator refreshes cached status and checks alerts on its schedule."""
+        monitor = SLOMonitor(MetricsRegistry())
+        alert_mgr = AlertManager(monitor)
+        evaluator = SLOEvaluator(monitor, alert_mgr, interval=0.01)
+        
+        evaluator.start()
+        await asyncio.sleep(0.05)
+        monitor.record_measurement("api_success_rate", 0.0)
+        await asyncio.sleep(0.05)
+        await evaluator.stop()
+        
+        assert monitor.max_status_age >= 0.02
+        assert monitor.get_all_slo_status()["api_success_rate"].total_measurements == 1
+        assert any(a['slo_name'] == 'api_success_rate' for a in alert_mgr.alert_history)
 
 class TestRunbooks:
     """Test incident response runbooks."""
@@ -15,6 +15,7 @@ with patch.dict('sys.modules', {
     'app.config.settings': MagicMock()
 }):
     from app.api.monitoring import router
+    from app.monitoring.metrics import metrics_registry
     from fastapi import FastAPI
     
     # Create a minimal test app with just the monitoring router
@@ -74,6 +75,15 @@ class TestMonitoringEndpoints:
         assert "# HELP" in content
         assert "# TYPE" in content
     
+    def test_metrics_include_registry(self):
+        """Registry metrics are streamed after the application metrics."""
+        metrics_registry.counter("test_scrapes_total", "Scrape test counter").labels().inc()
+        
+        response = client.get("/api/monitor/metrics")
+        
+        assert response.headers["content-type"] == "text/plain; version=0.0.4; charset=utf-8"
+        assert "# TYPE test_scrapes_total counter\ntest_scrapes_total 1\n" in response.text
+    
     def test_detailed_health_basic(self):
         """Test detailed health check basic functionality."""
         response = client.get("/api/monitor/health/detailed")
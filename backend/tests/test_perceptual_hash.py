@@ -0,0 +1,146 @@
+"""
+Tests for perceptual hashing and the near-duplicate index.
+"""
+
+import io
+import random
+import time
+import pytest
+from PIL import Image, ImageChops
+from app.storage.image_manifest import ImageManifest, ManifestEntry
+from app.storage.perceptual_hash import (
+    BKTree, PerceptualHashIndex, format_hash, hamming_distance, parse_hash, perceptual_hash
+)
+
+def _artwork(seed, size=(600, 800)):
+    detail = Image.effect_mandelbrot(size, (-0.75 + seed * 0.1, 0.05, -0.70 + seed * 0.1, 0.0875), 100)
+    gradient = Image.linear_gradient("L").resize(size)
+    return Image.merge("RGB", (detail, ImageChops.blend(gradient, detail, 0.5), gradient.rotate(seed * 40)))
+
+def _encoded(image, fmt="JPEG", **options):
+    output = io.BytesIO()
+    image.save(output, format=fmt, **options)
+    return output.getvalue()
+
+class TestPerceptualHash:
+    """Test hash stability across re-encodes and separation of different images."""
+    
+    @pytest.fixture
+    def artwork(self):
+        return _artwork(0)
+    
+    def test_reencodes_and_resizes_stay_close(self, artwork):
+        reference = perceptual_hash(_encoded(artwork, quality=95))
+        
+        copies = [
+            _encoded(artwork, quality=40),
+            _encoded(artwork, "WEBP", quality=60),
+            _encoded(artwork, "PNG"),
+            _encoded(artwork.resize((300, 400))),
+            _encoded(artwork.crop((6, 8, 600, 800))),
+        ]
+        for copy in copies:
+            assert hamming_distance(reference, perceptual_hash(copy)) <= 6
+    
+    def test_different_images_are_far_apart(self, artwork):
+        reference = perceptual_hash(_encoded(artwork))
+        
+        for seed in range(1, 4):
+            assert hamming_distance(reference, perceptual_hash(_encoded(_artwork(seed)))) > 16
+    
+    def test_transparent_image_is_hashed_over_white(self, artwork):
+        transparent = artwork.convert("RGBA")
+        transparent.putalpha(255)
+        
+        assert hamming_distance(perceptual_hash(_encoded(transparent, "PNG")),
+                                perceptual_hash(_encoded(artwork, "PNG"))) <= 2
+    
+    def test_metadata_round_trip(self):
+        assert format_hash(0xABC) == "0000000000000abc"
+        assert parse_hash("0000000000000abc") == 0xABC
+        assert parse_hash(None) is None
+        assert parse_hash("not-hex") is None
+
+class TestBKTree:
+    """Test BK-tree search against a linear scan."""
+    
+    def test_search_matches_linear_scan(self):
+        rng = random.Random(7)
+        values = [rng.getrandbits(64) for _ in range(500)]
+        # Near copies of a few values
+        values += [value ^ (1 << rng.randrange(64)) for value in values[:20]]
+        tree = BKTree()
+        for i, value in enumerate(values):
+            tree.add(value, str(i))
+        
+        for query in values[:30] + [rng.getrandbits(64) for _ in range(10)]:
+            expected = sorted((hamming_distance(query, value), str(i)) for i, value in enumerate(values)
+                              if hamming_distance(query, value) <= 12)
+            assert tree.search(query, 12) == expected
+        assert len(tree) == 520
+    
+    def test_equal_hashes_share_a_node(self):
+        tree = BKTree()
+        tree.add(5, "a")
+        tree.add(5, "b")
+        
+        assert tree.search(5, 0) == [(0, "a"), (0, "b")]
+
+class TestPerceptualHashIndex:
+    """Test the manifest-backed near-duplicate index."""
+    
+    def _properties(self, path, phash=None):
+        return {
+            "blob_path": path,
+            "etag": f'"etag-{path}"',
+            "last_modified": "2024-01-15T10:30:00+00:00",
+            "metadata": {"phash": format_hash(phash)} if phash is not None else {},
+            "url": f"https://testaccount.blob.core.windows.net/character-images/{path}"
+        }
+    
+    def test_manifest_entry_reads_hash_from_metadata(self):
+        assert ManifestEntry.from_properties(self._properties("marvel/thor.jpg", 0xFF)).perceptual_hash == 0xFF
+        assert ManifestEntry.from_properties(self._properties("marvel/thor.jpg")).perceptual_hash is None
+    
+    def test_from_manifest_skips_variants_and_lists_unhashed(self):
+        manifest = ImageManifest()
+        manifest.apply_listing([
+            self._properties("marvel/thor.jpg", 0b1111),
+            self._properties("marvel/loki.jpg"),
+            self._properties("variants/marvel/thor/320w.webp", 0b1111),
+        ], started=time.monotonic())
+        
+        index = PerceptualHashIndex.from_manifest(manifest)
+        
+        assert index.hashes == {"marvel/thor.jpg": 0b1111}
+        assert index.unhashed == ["marvel/loki.jpg"]
+    
+    def test_find_similar(self):
+        index = PerceptualHashIndex(max_distance=3)
+        index.add("marvel/thor.jpg", 0b0000)
+        index.add("marvel/thor-alt.jpg", 0b0011)
+        index.add("dc/batman.jpg", 0b11111111)
+        
+        assert index.find_similar(0b0001) == [("marvel/thor-alt.jpg", 1), ("marvel/thor.jpg", 1)]
+        assert index.find_similar(0b0001, exclude="marvel/thor.jpg") == [("marvel/thor-alt.jpg", 1)]
+        assert index.find_similar(0b0001, max_distance=0) == []
+    
+    def test_reindexed_path_only_matches_current_hash(self):
+        index = PerceptualHashIndex(max_distance=2)
+        index.add("marvel/thor.jpg", 0)
+        index.add("marvel/thor.jpg", 0xFFFF)
+        
+        assert index.find_similar(0) == []
+        assert index.find_similar(0xFFFF) == [("marvel/thor.jpg", 0)]
+        assert len(index) == 1
+    
+    def test_duplicate_groups(self):
+        index = PerceptualHashIndex(max_distance=2)
+        index.add("a", 0b000000)
+        index.add("b", 0b000011)
+        index.add("c", 0b001111)  # Linked to "a" through "b"
+        index.add("d", 0xFFFF0000)
+        index.add("e", 0xFFFF0001)
+        index.add("f", 0x0F0F0F0F0F)
+        
+        assert index.duplicate_groups() == [["a", "b", "c"], ["d", "e"]]
@@ -2,6 +2,7 @@
 Tests for Azure Blob Storage utilities.
 """
 
+import asyncio
 import pytest
 from unittest.mock import Mock, AsyncMock, patch, MagicMock
 from io import BytesIO
@@ -9,6 +10,20 @@ from azure.core.exceptions import ResourceNotFoundError, AzureError
 from app.storage.blob_storage import BlobStorageService
 from app.storage.exceptions import StorageError
 
+class AsyncIterator:
+    """Async iterable standing in for the SDK's AsyncItemPaged."""
+    
+    def __init__(self, items):
+        self.items = list(items)
+    
+    def __aiter__(self):
+        return self
+    
+    async def __anext__(self):
+        if not self.items:
+            raise StopAsyncIteration
+        return self.items.pop(0)
+
 class TestBlobStorageService:
     """Test cases for BlobStorageService."""
     
@@ -55,7 +70,7 @@ class TestBlobStorageService:
         """Test successful image upload."""
         # Mock the container client directly
         mock_container = Mock()
-        mock_blob_client = Mock()
+        mock_blob_client = AsyncMock()
         mock_container.get_blob_client.return_value = mock_blob_client
         mock_blob_service._container_client = mock_container
         
@@ -77,7 +92,7 @@ class TestBlobStorageService:
     async def test_upload_image_failure(self, mock_blob_service, sample_image_data):
         """Test image upload failure handling."""
         mock_container = Mock()
-        mock_blob_client = Mock()
+        mock_blob_client = AsyncMock()
         mock_blob_client.upload_blob.side_effect = AzureError("Upload failed")
         mock_container.get_blob_client.return_value = mock_blob_client
         mock_blob_service._container_client = mock_container
@@ -91,7 +106,7 @@ class TestBlobStorageService:
     async def test_get_image_url_exists(self, mock_blob_service):
         """Test getting image URL when image exists."""
         mock_container = Mock()
-        mock_blob_client = Mock()
+        mock_blob_client = AsyncMock()
         mock_blob_client.exists.return_value = True
         mock_blob_client.url = "https://test.blob.core.windows.net/test-container/marvel/spider-man.jpg"
         mock_container.get_blob_client.return_value = mock_blob_client
@@ -106,7 +121,7 @@ class TestBlobStorageService:
     async def test_get_image_url_not_exists(self, mock_blob_service):
         """Test getting image URL when image doesn't exist."""
         mock_container = Mock()
-        mock_blob_client = Mock()
+        mock_blob_client = AsyncMock()
         mock_blob_client.exists.return_value = False
         mock_container.get_blob_client.return_value = mock_blob_client
         mock_blob_service._container_client = mock_container
@@ -119,7 +134,7 @@ class TestBlobStorageService:
     async def test_get_image_url_azure_error(self, mock_blob_service):
         """Test getting image URL with Azure error."""
         mock_container = Mock()
-        mock_blob_client = Mock()
+        mock_blob_client = AsyncMock()
         mock_blob_client.exists.side_effect = AzureError("Connection failed")
         mock_container.get_blob_client.return_value = mock_blob_client
         mock_blob_service._container_client = mock_container
@@ -132,7 +147,7 @@ class TestBlobStorageService:
     async def test_delete_image_success(self, mock_blob_service):
         """Test successful image deletion."""
         mock_container = Mock()
-        mock_blob_client = Mock()
+        mock_blob_client = AsyncMock()
         mock_container.get_blob_client.return_value = mock_blob_client
         mock_blob_service._container_client = mock_container
         
@@ -141,11 +156,73 @@ class TestBlobStorageService:
         assert result is True
         mock_blob_client.delete_blob.assert_called_once()
     
+    @pytest.mark.asyncio
+    async def test_open_image_stream_pins_etag(self, mock_blob_service):
+        """Streams are ranged downloads conditioned on the resolved ETag."""
+        from azure.core import MatchConditions
+        mock_container = Mock()
+        mock_blob_client = AsyncMock()
+        mock_downloader = Mock()
+        mock_downloader.chunks.return_value = AsyncIterator([b"ab", b"cd"])
+        mock_blob_client.download_blob.return_value = mock_downloader
+        mock_container.get_blob_client.return_value = mock_blob_client
+        mock_blob_service._container_client = mock_container
+        
+        chunks = await mock_blob_service.open_image_stream("marvel/spider-man.jpg", offset=10, length=4, etag="0x8D1")
+        
+        assert [chunk async for chunk in chunks] == [b"ab", b"cd"]
+        mock_blob_client.download_blob.assert_awaited_once_with(
+            offset=10, length=4, etag='"0x8D1"', match_condition=MatchConditions.IfNotModified
+        )
+    
+    @pytest.mark.asyncio
+    async def test_update_blob_metadata_is_conditional(self, mock_blob_service):
+        """Metadata updates only apply to the listed revision of a blob."""
+        from azure.core import MatchConditions
+        from azure.core.exceptions import ResourceModifiedError
+        mock_container = Mock()
+        mock_blob_client = AsyncMock()
+        mock_container.get_blob_client.return_value = mock_blob_client
+        mock_blob_service._container_client = mock_container
+        
+        assert await mock_blob_service.update_blob_metadata("marvel/thor.jpg", {"phash": "00ff"}, etag="0x8D1")
+        mock_blob_client.set_blob_metadata.assert_awaited_once_with(
+            {"phash": "00ff"}, etag='"0x8D1"', match_condition=MatchConditions.IfNotModified
+        )
+        
+        mock_blob_client.set_blob_metadata.side_effect = ResourceModifiedError("changed")
+        assert await mock_blob_service.update_blob_metadata("marvel/thor.jpg", {"phash": "00ff"}, etag="0x8D1") is False
+    
+    @pytest.mark.asyncio
+    async def test_upload_variants_replaces_stale_rungs(self, mock_blob_service):
+        """Variants are uploaded under variants/ and leftovers from a previous upload are removed."""
+        from app.storage.image_variants import ImageVariant
+        mock_container = Mock()
+        mock_blob_client = AsyncMock()
+        mock_container.get_blob_client.return_value = mock_blob_client
+        mock_container.delete_blob = AsyncMock()
+        stale = Mock()
+        stale.name = "variants/marvel/spider-man/1280w.webp"
+        kept = Mock()
+        kept.name = "variants/marvel/spider-man/320w.webp"
+        mock_container.list_blobs.return_value = AsyncIterator([kept, stale])
+        mock_blob_service._container_client = mock_container
+        
+        paths = await mock_blob_service.upload_variants(
+            "marvel", "Spider-Man", [ImageVariant(320, 160, "webp", b"data")]
+        )
+        
+        assert paths == ["variants/marvel/spider-man/320w.webp"]
+        mock_container.get_blob_client.assert_called_once_with("variants/marvel/spider-man/320w.webp")
+        assert mock_blob_client.upload_blob.call_args.kwargs["content_settings"].content_type == "image/webp"
+        mock_container.list_blobs.assert_called_once_with(name_starts_with="variants/marvel/spider-man/")
+        mock_container.delete_blob.assert_awaited_once_with("variants/marvel/spider-man/1280w.webp")
+    
     @pytest.mark.asyncio
     async def test_delete_image_not_found(self, mock_blob_service):
         """Test deleting non-existent image."""
         mock_container = Mock()
-        mock_blob_client = Mock()
+        mock_blob_client = AsyncMock()
         mock_blob_client.delete_blob.side_effect = ResourceNotFoundError("Not found")
         mock_container.get_blob_client.return_value = mock_blob_client
         mock_blob_service._container_client = mock_container
@@ -158,7 +235,7 @@ class TestBlobStorageService:
     async def test_delete_image_azure_error(self, mock_blob_service):
         """Test image deletion with Azure error."""
         mock_container = Mock()
-        mock_blob_client = Mock()
+        mock_blob_client = AsyncMock()
         mock_blob_client.delete_blob.side_effect = AzureError("Delete failed")
         mock_container.get_blob_client.return_value = mock_blob_client
         mock_blob_service._container_client = mock_container
@@ -179,7 +256,7 @@ class TestBlobStorageService:
         mock_blob3 = Mock()
         mock_blob3.name = "marvel/captain-america.jpg"
         
-        mock_container.list_blobs.return_value = [mock_blob1, mock_blob2, mock_blob3]
+        mock_container.list_blobs.return_value = AsyncIterator([mock_blob1, mock_blob2, mock_blob3])
         mock_blob_service._container_client = mock_container
         
         characters = await mock_blob_service.list_images_by_universe("marvel")
@@ -203,7 +280,7 @@ class TestBlobStorageService:
     async def test_ensure_container_exists_already_exists(self, mock_blob_service):
         """Test container existence check when container already exists."""
         mock_container = Mock()
-        mock_container.get_container_properties.return_value = {}
+        mock_container.get_container_properties = AsyncMock(return_value={})
         mock_blob_service._container_client = mock_container
         
         result = await mock_blob_service.ensure_container_exists()
@@ -215,8 +292,8 @@ class TestBlobStorageService:
     async def test_ensure_container_exists_create_new(self, mock_blob_service):
         """Test container creation when container doesn't exist."""
         mock_container = Mock()
-        mock_container.get_container_properties.side_effect = ResourceNotFoundError("Not found")
-        mock_container.create_container.return_value = {}
+        mock_container.get_container_properties = AsyncMock(side_effect=ResourceNotFoundError("Not found"))
+        mock_container.create_container = AsyncMock(return_value={})
         mock_blob_service._container_client = mock_container
         
         result = await mock_blob_service.ensure_container_exists()
@@ -228,8 +305,8 @@ class TestBlobStorageService:
     async def test_ensure_container_exists_create_failure(self, mock_blob_service):
         """Test container creation failure."""
         mock_container = Mock()
-        mock_container.get_container_properties.side_effect = ResourceNotFoundError("Not found")
-        mock_container.create_container.side_effect = AzureError("Create failed")
+        mock_container.get_container_properties = AsyncMock(side_effect=ResourceNotFoundError("Not found"))
+        mock_container.create_container = AsyncMock(side_effect=AzureError("Create failed"))
         mock_blob_service._container_client = mock_container
         
         result = await mock_blob_service.ensure_container_exists()
@@ -269,6 +346,39 @@ class TestBlobStorageService:
         assert container2 == mock_container
         assert mock_blob_service_client.get_container_client.call_count == 1
     
+    def test_shared_async_client_per_event_loop(self, mock_blob_service):
+        """One pooled async client is shared within a loop and rebuilt for a new loop."""
+        async def clients():
+            first = mock_blob_service.blob_service_client
+            second = mock_blob_service.blob_service_client
+            return first, second
+        
+        first, second = asyncio.run(clients())
+        third, _ = asyncio.run(clients())
+        
+        assert first is second
+        assert third is not first
+        assert first._config.transport.max_connections == mock_blob_service.max_connections
+    
+    def test_client_of_finished_loop_is_closed(self, mock_blob_service):
+        """Replacing the client of a finished event loop closes its connection pool."""
+        async def open_client():
+            client = mock_blob_service.blob_service_client
+            await client.__aenter__()
+            return client._config.transport
+        
+        async def replace_client():
+            mock_blob_service.blob_service_client
+            await asyncio.gather(*mock_blob_service._closing)
+        
+        transport = asyncio.run(open_client())
+        session = transport.session
+        assert session.connector.limit == mock_blob_service.max_connections
+        
+        asyncio.run(replace_client())
+        assert transport.session is None
+        assert session.closed
+    
     def test_missing_connection_string(self):
         """Test error when connection string is not configured."""
         with patch('app.storage.blob_storage.settings') as mock_settings:
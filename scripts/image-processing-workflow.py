@@ -8,9 +8,11 @@ import asyncio
 import logging
 import json
 import os
-from typing import Dict, List, Optional, Any
+import time
+from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass, asdict
 from datetime import datetime
+from io import BytesIO
 from pathlib import Path
 
 # Storage imports - configure for your preferred storage solution
@@ -34,6 +36,7 @@ except ImportError:
 
 # Import our image optimizer
 try:
+    from PIL import Image
     from image_optimizer import ImageOptimizer, ImageOptimizationResult
 except ImportError:
     print("image_optimizer.py not found in the same directory")
@@ -195,6 +198,20 @@ class ImageProcessingWorkflow:
             quality=85,
             output_format='AVIF'  # Next-gen format
         )
+        
+        self.thumbnail_optimizer = ImageOptimizer(
+            target_width=200,
+            target_height=150,
+            quality=80,
+            output_format='WEBP'
+        )
+        
+        # Variant name -> (optimizer, content type); each is encoded from the same decoded source
+        self.variant_optimizers = {
+            'webp': (self.webp_optimizer, 'image/webp'),
+            'avif': (self.avif_optimizer, 'image/avif'),
+            'thumbnail': (self.thumbnail_optimizer, 'image/webp')
+        }
     
     def generate_blob_paths(self, job: ImageProcessingJob) -> Dict[str, str]:
         """
@@ -219,13 +236,15 @@ class ImageProcessingWorkflow:
             'thumbnail': f"{base_path}/thumbnail.webp"
         }
     
-    async def upload_original_image(self, job: ImageProcessingJob, blob_path: str) -> str:
+    async def upload_original_image(self, job: ImageProcessingJob, blob_path: str,
+                                    image_data: Optional[bytes] = None) -> str:
         """
         Upload original image to blob storage.
         
         Args:
             job: Image processing job
             blob_path: Blob storage path
+            image_data: Source bytes already in memory (read from job.source_path otherwise)
             
         Returns:
             Blob URL
@@ -243,20 +262,23 @@ class ImageProcessingWorkflow:
                 content_disposition=f'inline; filename="{job.character_name}.jpg"'
             )
             
+            if image_data is None:
+                with open(job.source_path, 'rb') as f:
+                    image_data = f.read()
+            
             # Upload file
-            with open(job.source_path, 'rb') as data:
-                blob_client.upload_blob(
-                    data,
-                    overwrite=True,
-                    content_settings=content_settings,
-                    metadata={
-                        'universe': job.universe,
-                        'character': job.character_name,
-                        'is_primary': str(job.is_primary),
-                        'upload_date': datetime.utcnow().isoformat(),
-                        **(job.metadata or {})
-                    }
-                )
+            blob_client.upload_blob(
+                image_data,
+                overwrite=True,
+                content_settings=content_settings,
+                metadata={
+                    'universe': job.universe,
+                    'character': job.character_name,
+                    'is_primary': str(job.is_primary),
+                    'upload_date': datetime.utcnow().isoformat(),
+                    **(job.metadata or {})
+                }
+            )
             
             return blob_client.url
             
@@ -264,150 +286,136 @@ class ImageProcessingWorkflow:
             logger.error(f"Error uploading original image: {e}")
             raise
     
+    def decode_source(self, image_data: bytes) -> Tuple[Image.Image, str, Tuple[int, int], bool]:
+        """
+        Decode a source image once and strip its EXIF data.
+        
+        JPEG sources are decoded at the smallest DCT scale that still covers
+        the largest variant (with the optimizers' reducing gap), so a
+        multi-megapixel original never costs a full decode.
+        
+        Args:
+            image_data: Encoded source image
+            
+        Returns:
+            Tuple of (decoded image, original format, original dimensions, exif_stripped)
+        """
+        image = Image.open(BytesIO(image_data))
+        original_dimensions = image.size
+        largest_variant = (
+            max(optimizer.target_width for optimizer, _ in self.variant_optimizers.values()),
+            max(optimizer.target_height for optimizer, _ in self.variant_optimizers.values())
+        )
+        self.webp_optimizer.draft_image(image, largest_variant)
+        image.load()
+        cleaned_image, exif_stripped = self.webp_optimizer.strip_exif_data(image)
+        return cleaned_image, image.format, original_dimensions, exif_stripped
+    
+    def encode_variant(self, variant: str, image: Image.Image, source_name: str, original_size: int,
+                       original_format: str, original_dimensions: Tuple[int, int],
+                       exif_stripped: bool) -> Tuple[Optional[bytes], ImageOptimizationResult]:
+        """
+        Resize and encode one variant from the shared decoded image.
+        
+        Runs in a worker thread; Pillow releases the GIL while resizing and
+        encoding, so the variants of one image are encoded in parallel.
+        """
+        optimizer, _ = self.variant_optimizers[variant]
+        start_time = time.perf_counter()
+        
+        try:
+            data, dimensions = optimizer.encode_image(image)
+            error = None
+        except Exception as e:
+            data, dimensions, error = None, (0, 0), str(e)
+        
+        optimized_size = len(data) if data else 0
+        return data, ImageOptimizationResult(
+            original_path=source_name,
+            optimized_path='',
+            original_size_bytes=original_size,
+            optimized_size_bytes=optimized_size,
+            compression_ratio=(original_size - optimized_size) / original_size * 100 if data else 0,
+            format_original=original_format,
+            format_optimized=optimizer.output_format,
+            dimensions_original=original_dimensions,
+            dimensions_optimized=dimensions,
+            exif_stripped=exif_stripped,
+            processing_time_seconds=time.perf_counter() - start_time,
+            error=error
+        )
+    
     async def create_optimized_versions(self, 
                                       source_blob_path: str, 
-                                      target_paths: Dict[str, str]) -> Dict[str, ImageOptimizationResult]:
+                                      target_paths: Dict[str, str],
+                                      source_data: Optional[bytes] = None) -> Dict[str, ImageOptimizationResult]:
         """
         Create optimized versions of an image.
         
+        The source is decoded and EXIF-stripped once in memory; every variant
+        is resized and encoded from that image in parallel and uploaded
+        straight from its in-memory buffer, without temporary files.
+        
         Args:
             source_blob_path: Source blob path
             target_paths: Dictionary of format -> target blob path
+            source_data: Source bytes already in memory (downloaded otherwise)
             
         Returns:
             Dictionary of format -> optimization result
         """
-        results = {}
+        variants = [variant for variant in self.variant_optimizers if variant in target_paths]
         
         try:
-            # Download source image to temporary file
-            source_blob_client = self.blob_service_client.get_blob_client(
-                container=self.container_name,
-                blob=source_blob_path
-            )
-            
-            temp_dir = Path("temp_processing")
-            temp_dir.mkdir(exist_ok=True)
-            
-            temp_source = temp_dir / f"source_{datetime.now().timestamp()}.jpg"
+            if source_data is None:
+                source_blob_client = self.blob_service_client.get_blob_client(
+                    container=self.container_name,
+                    blob=source_blob_path
+                )
+                source_data = source_blob_client.download_blob().readall()
             
-            # Download source
-            with open(temp_source, 'wb') as f:
-                download_stream = source_blob_client.download_blob()
-                f.write(download_stream.readall())
+            loop = asyncio.get_running_loop()
+            decoded = await loop.run_in_executor(None, self.decode_source, source_data)
+            image, original_format, original_dimensions, exif_stripped = decoded
             
-            # Create WebP version
-            if 'webp' in target_paths:
-                temp_webp = temp_dir / f"webp_{datetime.now().timestamp()}.webp"
-                webp_result = self.webp_optimizer.optimize_single_image(str(temp_source), str(temp_webp))
-                
-                if not webp_result.error:
-                    # Upload WebP version
-                    webp_blob_client = self.blob_service_client.get_blob_client(
-                        container=self.container_name,
-                        blob=target_paths['webp']
-                    )
-                    
-                    content_settings = ContentSettings(
-                        content_type='image/webp',
-                        cache_control='public, max-age=31536000'
-                    )
-                    
-                    with open(temp_webp, 'rb') as f:
-                        webp_blob_client.upload_blob(
-                            f,
-                            overwrite=True,
-                            content_settings=content_settings
-                        )
-                    
-                    webp_result.optimized_path = target_paths['webp']
+            async def create_variant(variant: str) -> ImageOptimizationResult:
+                data, result = await loop.run_in_executor(
+                    None, self.encode_variant, variant, image, source_blob_path,
+                    len(source_data), original_format, original_dimensions, exif_stripped
+                )
                 
-                results['webp'] = webp_result
+                if data is None:
+                    if variant == 'avif':
+                        logger.warning(f"AVIF optimization failed (may not be supported): {result.error}")
+                    return result
                 
-                # Cleanup
-                if temp_webp.exists():
-                    temp_webp.unlink()
-            
-            # Create AVIF version (if supported)
-            if 'avif' in target_paths:
-                try:
-                    temp_avif = temp_dir / f"avif_{datetime.now().timestamp()}.avif"
-                    avif_result = self.avif_optimizer.optimize_single_image(str(temp_source), str(temp_avif))
-                    
-                    if not avif_result.error:
-                        # Upload AVIF version
-                        avif_blob_client = self.blob_service_client.get_blob_client(
-                            container=self.container_name,
-                            blob=target_paths['avif']
-                        )
-                        
-                        content_settings = ContentSettings(
-                            content_type='image/avif',
-                            cache_control='public, max-age=31536000'
-                        )
-                        
-                        with open(temp_avif, 'rb') as f:
-                            avif_blob_client.upload_blob(
-                                f,
-                                overwrite=True,
-                                content_settings=content_settings
-                            )
-                        
-                        avif_result.optimized_path = target_paths['avif']
-                    
-                    results['avif'] = avif_result
-                    
-                    # Cleanup
-                    if temp_avif.exists():
-                        temp_avif.unlink()
-                        
-                except Exception as e:
-                    logger.warning(f"AVIF optimization failed (may not be supported): {e}")
-            
-            # Create thumbnail
-            if 'thumbnail' in target_paths:
-                thumbnail_optimizer = ImageOptimizer(
-                    target_width=200,
-                    target_height=150,
-                    quality=80,
-                    output_format='WEBP'
+                _, content_type = self.variant_optimizers[variant]
+                blob_client = self.blob_service_client.get_blob_client(
+                    container=self.container_name,
+                    blob=target_paths[variant]
                 )
                 
-                temp_thumb = temp_dir / f"thumb_{datetime.now().timestamp()}.webp"
-                thumb_result = thumbnail_optimizer.optimize_single_image(str(temp_source), str(temp_thumb))
-                
-                if not thumb_result.error:
-                    # Upload thumbnail
-                    thumb_blob_client = self.blob_service_client.get_blob_client(
-                        container=self.container_name,
-                        blob=target_paths['thumbnail']
-                    )
-                    
-                    content_settings = ContentSettings(
-                        content_type='image/webp',
-                        cache_control='public, max-age=31536000'
-                    )
-                    
-                    with open(temp_thumb, 'rb') as f:
-                        thumb_blob_client.upload_blob(
-                            f,
-                            overwrite=True,
-                            content_settings=content_settings
-                        )
-                    
-                    thumb_result.optimized_path = target_paths['thumbnail']
+                content_settings = ContentSettings(
+                    content_type=content_type,
+                    cache_control='public, max-age=31536000'
+                )
                 
-                results['thumbnail'] = thumb_result
+                blob_client.upload_blob(
+                    data,
+                    overwrite=True,
+                    content_settings=content_settings
+                )
                 
-                # Cleanup
-                if temp_thumb.exists():
-                    temp_thumb.unlink()
+                result.optimized_path = target_paths[variant]
+                return result
             
-            # Cleanup source
-            if temp_source.exists():
-                temp_source.unlink()
+            variant_results = await asyncio.gather(*(create_variant(variant) for variant in variants))
             
-            return results
+            # An AVIF encoder may be missing; report AVIF only when it was produced
+            return {
+                variant: result for variant, result in zip(variants, variant_results)
+                if not (variant == 'avif' and result.error)
+            }
             
         except Exception as e:
             logger.error(f"Error creating optimized versions: {e}")
@@ -429,15 +437,20 @@ class ImageProcessingWorkflow:
             # Generate blob paths
             blob_paths = self.generate_blob_paths(job)
             
+            # Read the source once; it is uploaded and processed from memory
+            with open(job.source_path, 'rb') as f:
+                source_data = f.read()
+            
             # Upload original image
             logger.info(f"Uploading original image for {job.character_name}")
-            original_url = await self.upload_original_image(job, blob_paths['original'])
+            original_url = await self.upload_original_image(job, blob_paths['original'], source_data)
             
             # Create optimized versions
             logger.info(f"Creating optimized versions for {job.character_name}")
             optimization_results = await self.create_optimized_versions(
                 blob_paths['original'],
-                blob_paths
+                blob_paths,
+                source_data
             )
             
             # Generate CDN URLs
@@ -12,8 +12,9 @@ import logging
 import statistics
 from typing import Dict, List, Any, Optional
 from datetime import datetime, timedelta
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field
 import os
+import re
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -42,6 +43,7 @@ class PerformanceReport:
     error_rate: float
     recommendations: List[str]
     detailed_metrics: Dict[str, Any]
+    server_metrics: Dict[str, Any] = field(default_factory=dict)
 
 class PerformanceMonitor:
     """Performance monitoring utility."""
@@ -123,6 +125,42 @@ class PerformanceMonitor:
         
         return endpoint_metrics
     
+    async def fetch_server_metrics(self) -> Dict[str, Any]:
+        """
+        Scrape the API's Prometheus endpoint for server-side request latency.
+        
+        Returns per-route request counts and the upper bound of the bucket
+        holding the p95 from the http_request_duration_ms histogram, as seen
+        by the server rather than this client.
+        """
+        try:
+            async with self.session.get(f"{self.base_url}/metrics") as response:
+                if response.status != 200:
+                    return {}
+                text = await response.text()
+        except Exception as e:
+            logger.warning(f"Metrics scrape failed: {e}")
+            return {}
+        
+        buckets: Dict[str, Dict[float, float]] = {}
+        sample = re.compile(r'^http_request_duration_ms_bucket\{(.*)\} (\S+)$')
+        for line in text.splitlines():
+            match = sample.match(line)
+            if not match:
+                continue
+            labels = dict(re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', match.group(1)))
+            bound = float('inf') if labels['le'] == '+Inf' else float(labels['le'])
+            route_buckets = buckets.setdefault(f"{labels['method']} {labels['route']}", {})
+            route_buckets[bound] = route_buckets.get(bound, 0) + float(match.group(2))
+        
+        server_metrics = {}
+        for route, route_buckets in buckets.items():
+            bounds = sorted(route_buckets)
+            total = route_buckets[bounds[-1]]
+            p95 = next((bound for bound in bounds if route_buckets[bound] >= total * 0.95), bounds[-1])
+            server_metrics[route] = {'requests': int(total), 'p95_bucket_ms': p95}
+        return server_metrics
+    
     def analyze_cache_performance(self, endpoint_metrics: List[PerformanceMetric]) -> Dict[str, Any]:
         """Analyze cache performance for an endpoint."""
         if not endpoint_metrics:
@@ -283,6 +321,8 @@ class PerformanceMonitor:
                         'cache_analysis': self.analyze_cache_performance(metrics)
                     }
         
+        server_metrics = await self.fetch_server_metrics()
+        
         return PerformanceReport(
             generated_at=datetime.utcnow().isoformat(),
             test_duration_minutes=duration_minutes,
@@ -294,7 +334,8 @@ class PerformanceMonitor:
             cache_hit_rate=cache_hit_rate,
             error_rate=error_rate,
             recommendations=recommendations,
-            detailed_metrics=detailed_metrics
+            detailed_metrics=detailed_metrics,
+            server_metrics=server_metrics
         )
 
 async def main():
@@ -341,6 +382,11 @@ async def main():
         if 'cache_analysis' in metrics:
             cache = metrics['cache_analysis']
             print(f"  Cache hit rate: {cache.get('cache_hit_rate', 0):.1f}%")
+    
+    if report.server_metrics:
+        print("\nSERVER-SIDE LATENCY (from /metrics):")
+        for route, metrics in sorted(report.server_metrics.items()):
+            print(f"  {route}: {metrics['requests']} requests, p95 <= {metrics['p95_bucket_ms']}ms")
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
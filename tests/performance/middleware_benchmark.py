@@ -0,0 +1,163 @@
+"""
+Middleware overhead benchmark for the ComicGuess API.
+
+Builds the security middleware stack twice around a trivial endpoint, once
+with the function middlewares wrapped in ``BaseHTTPMiddleware`` (the old
+``app.middleware("http")`` registration) and once with the pure ASGI classes
+in ``app.middleware.asgi``, adding one layer at a time. Requests are driven
+straight through the ASGI interface so the numbers measure only middleware
+cost, not sockets or HTTP parsing.
+
+Usage:
+    python tests/performance/middleware_benchmark.py [--requests 5000]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../backend'))
+
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse
+
+from app.auth.middleware import add_security_headers
+from app.middleware.asgi import (
+    CSRFASGIMiddleware,
+    FastPathMiddleware,
+    RateLimitASGIMiddleware,
+    SecurityHeadersMiddleware,
+    ThreatProtectionASGIMiddleware,
+)
+from app.middleware.rate_limiting import RateLimiter, get_endpoint_type
+from app.security.csrf_protection import CSRFMiddleware, CSRFProtection
+from app.security.threat_protection import ThreatProtectionMiddleware
+
+HEALTH_RESPONSE = {"status": "healthy", "service": "comicguess-api"}
+
+async def endpoint(scope, receive, send):
+    """Innermost app: the same JSON body the /health route returns"""
+    await JSONResponse(HEALTH_RESPONSE)(scope, receive, send)
+
+def unlimited_rate_limiter() -> RateLimiter:
+    """Rate limiter whose limits are never hit during a benchmark run"""
+    limiter = RateLimiter()
+    for config in limiter.limits.values():
+        config["ip"]["requests"] = config["user"]["requests"] = 10 ** 9
+    return limiter
+
+def legacy_rate_limit(limiter: RateLimiter) -> Callable:
+    """Equivalent of rate_limit_middleware bound to a private limiter"""
+    async def middleware(request, call_next):
+        endpoint_type = get_endpoint_type(request.url.path)
+        rejection = await limiter.check_rate_limit(request, endpoint_type)
+        if rejection:
+            return rejection
+        response = await call_next(request)
+        ip_info = limiter.get_rate_limit_info(request, endpoint_type)["ip"]
+        response.headers["X-RateLimit-Limit"] = str(ip_info["limit"])
+        response.headers["X-RateLimit-Remaining"] = str(ip_info["remaining"])
+        response.headers["X-RateLimit-Reset"] = str(int(time.time() + ip_info["window"]))
+        return response
+    return middleware
+
+def build_layers() -> Dict[str, List[Tuple[str, Callable]]]:
+    """Layer factories for each style, innermost first"""
+    csrf = CSRFMiddleware(CSRFProtection("benchmark-secret"), exempt_paths={"/health"})
+    threat = ThreatProtectionMiddleware()
+    limiter = unlimited_rate_limiter()
+
+    def function_layer(dispatch):
+        return lambda app: BaseHTTPMiddleware(app, dispatch=dispatch)
+
+    return {
+        "http function": [
+            ("security headers", function_layer(add_security_headers)),
+            ("csrf", function_layer(csrf)),
+            ("threat protection", function_layer(threat)),
+            ("rate limit", function_layer(legacy_rate_limit(limiter))),
+        ],
+        "pure asgi": [
+            ("security headers", lambda app: SecurityHeadersMiddleware(app)),
+            ("csrf", lambda app: CSRFASGIMiddleware(app, policy=csrf)),
+            ("threat protection", lambda app: ThreatProtectionASGIMiddleware(app, policy=threat)),
+            ("rate limit", lambda app: RateLimitASGIMiddleware(app, limiter=limiter)),
+        ],
+    }
+
+async def time_requests(app, path: str, requests: int) -> float:
+    """Median time per request in microseconds"""
+    scope_template = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "headers": [(b"host", b"testserver"), (b"user-agent", b"benchmark")],
+        "client": ("10.0.0.1", 50000),
+        "server": ("testserver", 80),
+    }
+
+    async def send(message):
+        pass
+
+    samples = []
+    for _ in range(requests):
+        scope = dict(scope_template)
+        # An empty body, then a disconnect once the server reads past it
+        messages = iter([
+            {"type": "http.request", "body": b"", "more_body": False},
+            {"type": "http.disconnect"},
+        ])
+
+        async def receive():
+            return next(messages, {"type": "http.disconnect"})
+
+        start = time.perf_counter()
+        await app(scope, receive, send)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1_000_000
+
+async def run_benchmark(requests: int, path: str) -> None:
+    """Print cumulative and per-layer cost for both middleware styles"""
+    baseline = await time_requests(endpoint, path, requests)
+    print(f"endpoint only: {baseline:8.1f} us/request\n")
+
+    totals = {}
+    for style, layers in build_layers().items():
+        print(f"{style}")
+        app = endpoint
+        previous = baseline
+        for name, wrap in layers:
+            app = wrap(app)
+            current = await time_requests(app, path, requests)
+            print(f"  + {name:<18} {current:8.1f} us/request  (layer {current - previous:+7.1f} us)")
+            previous = current
+        totals[style] = previous - baseline
+        print(f"  middleware total   {totals[style]:8.1f} us/request\n")
+
+    fast_path = FastPathMiddleware(app, responses={"/health": HEALTH_RESPONSE})
+    fast = await time_requests(fast_path, "/health", requests)
+    print(f"fast path /health:   {fast:8.1f} us/request")
+
+    legacy, asgi = totals["http function"], totals["pure asgi"]
+    if asgi > 0:
+        print(f"pure asgi overhead is {legacy / asgi:.1f}x lower than http function middlewares")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark middleware overhead")
+    parser.add_argument("--requests", type=int, default=5000, help="Requests per measurement")
+    parser.add_argument("--path", default="/api/puzzle/today", help="Request path to exercise")
+    args = parser.parse_args()
+
+    asyncio.run(run_benchmark(args.requests, args.path))
+
+if __name__ == "__main__":
+    main()
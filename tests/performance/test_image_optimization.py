@@ -6,12 +6,16 @@ import pytest
 import os
 import tempfile
 import json
+import importlib.util
+import time
+from io import BytesIO
 from unittest.mock import Mock, patch, MagicMock
 from pathlib import Path
 import sys
 
 # Add scripts directory to path
-sys.path.append(os.path.join(os.path.dirname(__file__), '../../scripts'))
+SCRIPTS_DIR = os.path.join(os.path.dirname(__file__), '../../scripts')
+sys.path.append(SCRIPTS_DIR)
 
 try:
     from image_optimizer import ImageOptimizer, ImageOptimizationResult, CloudStorageImageOptimizer
@@ -27,6 +31,35 @@ except ImportError:
     CloudflareCache = None
     PIL_AVAILABLE = False
 
+def load_script(module_name, file_name):
+    """Load a script from scripts/ (hyphenated file names are not importable by name)"""
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(SCRIPTS_DIR, file_name))
+    module = importlib.util.module_from_spec(spec)
+    # Registered first: the workflow imports the optimizer by this name, and pool workers unpickle by it
+    sys.modules[module_name] = module
+    try:
+        spec.loader.exec_module(module)
+    except (ImportError, SystemExit):
+        # The scripts exit when an optional dependency is missing
+        del sys.modules[module_name]
+        return None
+    return module
+
+def jpeg_bytes(size=(4000, 3000), exif=True):
+    """A JPEG source image, with an EXIF block by default"""
+    from PIL import Image
+    image = Image.linear_gradient('L').resize(size).convert('RGB')
+    output = BytesIO()
+    if exif:
+        exif_data = Image.Exif()
+        exif_data[0x010F] = 'Test Camera'  # Make
+        image.save(output, format='JPEG', quality=90, exif=exif_data.tobytes())
+    else:
+        image.save(output, format='JPEG', quality=90)
+    return output.getvalue()
+
 class TestImageOptimizer:
     """Test image optimization functionality."""
     
@@ -390,5 +423,161 @@ class TestImageOptimizationConfiguration:
             
             assert abs(compression_ratio - case['expected_ratio']) < 0.1
 
+class TestWorkflowScript:
+    """Test scripts/image-processing-workflow.py loaded with importlib."""
+    
+    @pytest.fixture
+    def workflow_module(self):
+        if load_script('image_optimizer', 'image-optimizer.py') is None:
+            pytest.skip("Image optimizer dependencies not available")
+        module = load_script('image_processing_workflow', 'image-processing-workflow.py')
+        if module is None:
+            pytest.skip("Image processing workflow dependencies not available")
+        return module
+    
+    @pytest.fixture
+    def workflow(self, workflow_module):
+        workflow = workflow_module.ImageProcessingWorkflow(
+            storage_connection_string='test_connection',
+            container_name='test_container',
+            cdn_base_url='https://cdn.example.com'
+        )
+        workflow.blob_service_client = Mock()
+        # The script leaves the storage SDK to be configured; record uploads instead
+        with patch.object(workflow_module, 'ContentSettings', Mock(side_effect=lambda **kwargs: kwargs), create=True):
+            yield workflow
+    
+    def uploads(self, workflow):
+        """Uploaded blob path -> (data, content settings)"""
+        blob_paths = [call.kwargs['blob'] for call in workflow.blob_service_client.get_blob_client.call_args_list]
+        upload_calls = workflow.blob_service_client.get_blob_client.return_value.upload_blob.call_args_list
+        return {path: (call.args[0], call.kwargs['content_settings']) for path, call in zip(blob_paths, upload_calls)}
+    
+    def test_decode_source_drafts_jpeg_and_strips_exif(self, workflow):
+        """JPEG sources are decoded at a reduced scale that still covers every variant"""
+        image, original_format, original_dimensions, exif_stripped = workflow.decode_source(jpeg_bytes())
+        
+        assert original_format == 'JPEG'
+        assert original_dimensions == (4000, 3000)
+        assert exif_stripped is True
+        # 1/2 DCT scale: the largest variant (800x600) times the reducing gap still fits
+        assert image.size == (2000, 1500)
+        
+        image, _, _, exif_stripped = workflow.decode_source(jpeg_bytes((400, 300), exif=False))
+        assert image.size == (400, 300)
+        assert exif_stripped is False
+    
+    @pytest.mark.asyncio
+    async def test_create_optimized_versions_from_one_decode(self, workflow):
+        """Every variant is encoded from a single decode and uploaded from memory"""
+        from PIL import Image
+        source = jpeg_bytes()
+        targets = {'webp': 'marvel/hero/optimized.webp', 'thumbnail': 'marvel/hero/thumbnail.webp'}
+        
+        with patch.object(workflow, 'decode_source', wraps=workflow.decode_source) as decode:
+            results = await workflow.create_optimized_versions('marvel/hero/original.jpg', targets, source)
+        
+        decode.assert_called_once_with(source)
+        assert set(results) == {'webp', 'thumbnail'}
+        assert results['webp'].dimensions_optimized == (800, 600)
+        assert results['thumbnail'].dimensions_optimized == (200, 150)
+        assert all(result.error is None and result.exif_stripped for result in results.values())
+        
+        uploads = self.uploads(workflow)
+        assert set(uploads) == set(targets.values())
+        for variant, path in targets.items():
+            data, content_settings = uploads[path]
+            output = Image.open(BytesIO(data))
+            assert output.size == results[variant].dimensions_optimized
+            assert not output.getexif()
+            assert results[variant].optimized_size_bytes == len(data)
+            assert results[variant].optimized_path == path
+            assert content_settings['content_type'] == 'image/webp'
+    
+    @pytest.mark.asyncio
+    async def test_avif_failure_is_not_reported(self, workflow, caplog):
+        """A missing AVIF encoder drops the AVIF variant without failing the others"""
+        targets = {'webp': 'dc/hero/optimized.webp', 'avif': 'dc/hero/optimized.avif',
+                   'thumbnail': 'dc/hero/thumbnail.webp'}
+        
+        with patch.object(workflow.avif_optimizer, 'encode_image', side_effect=KeyError('AVIF')):
+            results = await workflow.create_optimized_versions('dc/hero/original.jpg', targets, jpeg_bytes())
+        
+        assert set(results) == {'webp', 'thumbnail'}
+        assert set(self.uploads(workflow)) == {targets['webp'], targets['thumbnail']}
+        assert "AVIF optimization failed" in caplog.text
+
+class TestParallelOptimizeDirectory:
+    """Test resumable batch optimization in scripts/image-optimizer.py."""
+    
+    @pytest.fixture
+    def optimizer_module(self):
+        module = load_script('image_optimizer', 'image-optimizer.py')
+        if module is None:
+            pytest.skip("Image optimizer dependencies not available")
+        return module
+    
+    @pytest.fixture
+    def directories(self, tmp_path):
+        input_dir = tmp_path / 'input'
+        (input_dir / 'dc').mkdir(parents=True)
+        for name in ('marvel-hero.jpg', 'image-hero.jpg', 'dc/dc-hero.jpg'):
+            (input_dir / name).write_bytes(jpeg_bytes((640, 480), exif=False))
+        return input_dir, tmp_path / 'output'
+    
+    def run(self, optimizer_module, directories, quality=80):
+        input_dir, output_dir = directories
+        optimizer = optimizer_module.ImageOptimizer(target_width=200, target_height=150,
+                                                    quality=quality, output_format='JPEG')
+        return optimizer.parallel_optimize_directory(str(input_dir), str(output_dir), workers=2)
+    
+    def test_resume_skips_up_to_date_outputs(self, optimizer_module, directories):
+        """A second run skips everything the first one completed"""
+        first = self.run(optimizer_module, directories)
+        assert (first.optimized, first.skipped, first.failed) == (3, 0, 0)
+        assert (directories[1] / 'dc' / 'dc-hero.jpeg').exists()
+        
+        second = self.run(optimizer_module, directories)
+        assert (second.optimized, second.skipped, second.failed) == (0, 3, 0)
+        with open(second.report_path) as report:
+            assert len(report.readlines()) == 3
+    
+    def test_settings_change_redoes_outputs(self, optimizer_module, directories):
+        """Outputs recorded with other settings are optimized again"""
+        self.run(optimizer_module, directories)
+        
+        summary = self.run(optimizer_module, directories, quality=60)
+        assert (summary.optimized, summary.skipped) == (3, 0)
+    
+    def test_mtime_bump_uses_source_hash(self, optimizer_module, directories):
+        """A newer input is skipped while its content still matches the recorded hash"""
+        input_dir, _ = directories
+        self.run(optimizer_module, directories)
+        
+        future = time.time() + 60
+        touched = input_dir / 'marvel-hero.jpg'
+        os.utime(touched, (future, future))
+        summary = self.run(optimizer_module, directories)
+        assert (summary.optimized, summary.skipped) == (0, 3)
+        
+        changed = input_dir / 'image-hero.jpg'
+        changed.write_bytes(jpeg_bytes((480, 640), exif=False))
+        os.utime(changed, (future, future))
+        summary = self.run(optimizer_module, directories)
+        assert (summary.optimized, summary.skipped) == (1, 2)
+    
+    def test_failed_record_is_redone(self, optimizer_module, directories):
+        """An image whose latest record is a failure is optimized again despite its output"""
+        input_dir, _ = directories
+        summary = self.run(optimizer_module, directories)
+        
+        failed = str(input_dir / 'dc' / 'dc-hero.jpg')
+        with open(summary.report_path, 'a') as report:
+            report.write(json.dumps({'original_path': failed, 'error': 'interrupted'}) + '\n')
+        
+        summary = self.run(optimizer_module, directories)
+        assert (summary.optimized, summary.skipped, summary.failed) == (1, 2, 0)
+        assert optimizer_module.ImageOptimizer.load_report(Path(summary.report_path))[failed]['error'] is None
+
 if __name__ == '__main__':
     pytest.main([__file__])
\ No newline at end of file
@@ -0,0 +1,156 @@
+"""
+Thumbnail fast path benchmark for the image optimizer.
+
+Runs every source image through ``ImageOptimizer`` twice per output size:
+once on the full-decode path (``reducing_gap=None``: decode every pixel,
+one LANCZOS pass over the whole image) and once on the fast path (JPEG
+``draft()`` decoding at a reduced DCT scale plus ``reducing_gap`` box
+reduction before LANCZOS). Time covers decode, resize and encode; quality
+is the mean SSIM of the fast resized image against the full-decode one,
+measured before encoding so codec noise does not mask resampling error.
+
+Without ``--images`` a synthetic 12 MP photo-like source is generated and
+benchmarked as both JPEG and PNG.
+
+Usage:
+    python tests/performance/thumbnail_benchmark.py [--images a.jpg b.png] [--repeat 5]
+"""
+
+import argparse
+import importlib.util
+import os
+import statistics
+import time
+from io import BytesIO
+from typing import Callable, List, Tuple
+
+from PIL import Image, ImageChops, ImageFilter
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(__file__), '../../scripts')
+
+# Output sizes of the processing workflow: (name, width, height, quality)
+TARGETS = [
+    ("thumbnail", 200, 150, 80),
+    ("optimized", 800, 600, 85),
+]
+
+def load_optimizer_class():
+    """ImageOptimizer from scripts/image-optimizer.py (not importable by name)"""
+    spec = importlib.util.spec_from_file_location(
+        "image_optimizer", os.path.join(SCRIPTS_DIR, "image-optimizer.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.ImageOptimizer
+
+def synthetic_sources(size: Tuple[int, int] = (4000, 3000)) -> List[Tuple[str, bytes]]:
+    """A detailed photo-like image encoded as JPEG and PNG"""
+    detail = Image.effect_mandelbrot(size, (-0.75, 0.05, -0.70, 0.0875), 200)
+    grain = Image.effect_noise(size, 24)
+    gradient = Image.linear_gradient("L").resize(size)
+    red = ImageChops.add(detail, grain, scale=1.5)
+    green = ImageChops.blend(gradient, detail, 0.6)
+    blue = ImageChops.multiply(gradient.transpose(Image.Transpose.ROTATE_180), grain.filter(ImageFilter.SMOOTH))
+    image = Image.merge("RGB", (red, green, blue))
+
+    sources = []
+    for fmt, options in (("JPEG", {"quality": 92}), ("PNG", {"compress_level": 1})):
+        output = BytesIO()
+        image.save(output, format=fmt, **options)
+        sources.append((f"synthetic.{fmt.lower()}", output.getvalue()))
+    return sources
+
+def ssim(a: Image.Image, b: Image.Image, window: int = 8, stride: int = 4) -> float:
+    """Mean SSIM of the luminance over sliding windows (pure Python, via integral images)"""
+    if a.size != b.size:
+        b = b.resize(a.size, Image.Resampling.LANCZOS)
+    width, height = a.size
+    x = list(a.convert("L").getdata())
+    y = list(b.convert("L").getdata())
+
+    def integral(values: List[float]) -> List[List[float]]:
+        table = [[0.0] * (width + 1) for _ in range(height + 1)]
+        for row in range(height):
+            running = 0.0
+            above, current = table[row], table[row + 1]
+            offset = row * width
+            for col in range(width):
+                running += values[offset + col]
+                current[col + 1] = above[col + 1] + running
+        return table
+
+    sums = [integral(values) for values in (
+        x, y, [v * v for v in x], [v * v for v in y], [u * v for u, v in zip(x, y)]
+    )]
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    n = window * window
+    scores = []
+    for top in range(0, height - window + 1, stride):
+        for left in range(0, width - window + 1, stride):
+            bottom, right = top + window, left + window
+            sx, sy, sxx, syy, sxy = (
+                t[bottom][right] - t[top][right] - t[bottom][left] + t[top][left] for t in sums
+            )
+            mx, my = sx / n, sy / n
+            vx, vy, cov = sxx / n - mx * mx, syy / n - my * my, sxy / n - mx * my
+            scores.append(((2 * mx * my + c1) * (2 * cov + c2)) / ((mx * mx + my * my + c1) * (vx + vy + c2)))
+    return statistics.fmean(scores)
+
+def resize_path(optimizer) -> Callable[[bytes], Image.Image]:
+    """Decode and resize exactly as ImageOptimizer.optimize_single_image does"""
+    def run(data: bytes) -> Image.Image:
+        with Image.open(BytesIO(data)) as image:
+            optimizer.draft_image(image)
+            image.load()
+            return optimizer.resize_image(image)
+    return run
+
+def median_ms(run: Callable[[], object], repeat: int) -> float:
+    """Median wall time of ``run`` in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+def run_benchmark(sources: List[Tuple[str, bytes]], repeat: int, reducing_gap: float) -> None:
+    """Print time and SSIM of the fast path against the full-decode path"""
+    ImageOptimizer = load_optimizer_class()
+    print(f"{'source':<28} {'target':<18} {'full ms':>9} {'fast ms':>9} {'speedup':>8} {'SSIM':>7}")
+
+    for name, data in sources:
+        with Image.open(BytesIO(data)) as probe:
+            label = f"{name} {probe.width}x{probe.height}"
+        for target, width, height, quality in TARGETS:
+            full = ImageOptimizer(width, height, quality, 'WEBP', reducing_gap=None)
+            fast = ImageOptimizer(width, height, quality, 'WEBP', reducing_gap=reducing_gap)
+
+            def end_to_end(optimizer):
+                return lambda: optimizer.encode_image(resize_path(optimizer)(data))
+
+            full_ms = median_ms(end_to_end(full), repeat)
+            fast_ms = median_ms(end_to_end(fast), repeat)
+            score = ssim(resize_path(full)(data), resize_path(fast)(data))
+            print(f"{label:<28} {f'{target} {width}x{height}':<18} {full_ms:9.1f} {fast_ms:9.1f} "
+                  f"{full_ms / fast_ms:7.1f}x {score:7.4f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the thumbnail fast path")
+    parser.add_argument("--images", nargs="*", help="Source images (default: synthetic 12 MP JPEG and PNG)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement")
+    parser.add_argument("--reducing-gap", type=float, default=2.0, help="Fast path reducing gap")
+    args = parser.parse_args()
+
+    if args.images:
+        sources = []
+        for path in args.images:
+            with open(path, "rb") as f:
+                sources.append((os.path.basename(path), f.read()))
+    else:
+        sources = synthetic_sources()
+
+    run_benchmark(sources, args.repeat, args.reducing_gap)
+
+if __name__ == "__main__":
+    main()